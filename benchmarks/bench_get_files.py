@@ -0,0 +1,96 @@
+"""Benchmark of FileService.get_files() on large directories.
+
+Compares the current os.scandir()-based listing with the former glob()-based one,
+which did several stat calls per file. The scandir listing is measured with the metadata cache
+disabled; listing from a warm cache is reported separately.
+
+Usage:
+    python -m benchmarks.bench_get_files [number_of_files ...]
+
+Default sizes are 10000, 100000 and 1000000 files.
+"""
+
+import glob
+import logging
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+from config import ServerConfig
+from server.FileService import FileService
+
+DEFAULT_SIZES = [10_000, 100_000, 1_000_000]
+REPEATS = 3
+
+
+def glob_get_files(data_directory: str) -> list:
+    """Former implementation of FileService.get_files()."""
+
+    result = list()
+    for filename in glob.glob(os.path.join(os.getcwd(), "*")):
+        if os.path.isfile(filename):
+            result.append(
+                dict(
+                    name=filename.replace(data_directory, "."),
+                    create_date=datetime.fromtimestamp(os.path.getctime(filename)),
+                    edit_date=datetime.fromtimestamp(os.path.getmtime(filename)),
+                    size=os.path.getsize(filename),
+                )
+            )
+    return result
+
+
+def best_time(func) -> float:
+    """Best wall time of several runs of func()."""
+
+    timings = list()
+    for _ in range(REPEATS):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def service_time(cached: bool) -> float:
+    """Best time of FileService.get_files() with the configured metadata cache or without it."""
+
+    config = ServerConfig().config
+    cache_entries = config["fs_cache_entries"]
+    if not cached:
+        config["fs_cache_entries"] = 0
+    fs = FileService()
+    try:
+        if cached:
+            # The first listing fills the cache.
+            fs.get_files()
+        return best_time(fs.get_files)
+    finally:
+        fs.close()
+        config["fs_cache_entries"] = cache_entries
+
+
+def main(sizes: list):
+    logging.disable(logging.CRITICAL)
+    print(f"{'files':>10} {'glob, s':>10} {'scandir, s':>11} {'speedup':>8} {'cached, s':>10}")
+    for size in sizes:
+        with tempfile.TemporaryDirectory() as data_directory:
+            ServerConfig().config["data_directory"] = data_directory
+            os.chdir(data_directory)
+            for i in range(size):
+                with open(f"file_{i}.bin", "wb") as f:
+                    f.write(b"x" * (i % 128))
+
+            glob_time = best_time(lambda: glob_get_files(data_directory))
+            scandir_time = service_time(cached=False)
+            cached_time = service_time(cached=True)
+            print(
+                f"{size:>10} {glob_time:>10.3f} {scandir_time:>11.3f} {glob_time / scandir_time:>7.1f}x"
+                f" {cached_time:>10.3f}"
+            )
+            os.chdir(tempfile.gettempdir())
+
+
+if __name__ == "__main__":
+    main([int(arg) for arg in sys.argv[1:]] or DEFAULT_SIZES)
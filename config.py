@@ -29,6 +29,43 @@ class ServerConfig:
         "db_host": {"dest": "db_host", "env": "DB_HOST", "default": "127.0.0.1"},
         "db_port": {"dest": "db_port", "env": "DB_PORT", "default": 49153},
         "db_name": {"dest": "db_name", "env": "DB_NAME", "default": "users_db"},
+        "fs_workers": {"dest": "fs_workers", "env": "FS_WORKERS", "default": 4},
+        "fs_queue_depth": {"dest": "fs_queue_depth", "env": "FS_QUEUE_DEPTH", "default": 64},
+        "fs_cache_entries": {"dest": "fs_cache_entries", "env": "FS_CACHE_ENTRIES", "default": 100000},
+        "fs_cache_bytes": {"dest": "fs_cache_bytes", "env": "FS_CACHE_BYTES", "default": 64 * 1024 * 1024},
+        "dedup": {"dest": "dedup", "env": "DEDUP", "default": False},
+        "compression": {"dest": "compression", "env": "COMPRESSION", "default": "none"},
+        "durability": {"dest": "durability", "env": "DURABILITY", "default": "none"},
+        "group_commit_ms": {"dest": "group_commit_ms", "env": "GROUP_COMMIT_MS", "default": 5},
+        "batch_parallelism": {"dest": "batch_parallelism", "env": "BATCH_PARALLELISM", "default": 8},
+        "batch_max_operations": {"dest": "batch_max_operations", "env": "BATCH_MAX_OPERATIONS", "default": 1000},
+        "trash_purge_rate": {"dest": "trash_purge_rate", "env": "TRASH_PURGE_RATE", "default": 10000},
+        "trash_workers": {"dest": "trash_workers", "env": "TRASH_WORKERS", "default": 4},
+        "pack_threshold": {"dest": "pack_threshold", "env": "PACK_THRESHOLD", "default": 0},
+        "content_cache_bytes": {
+            "dest": "content_cache_bytes",
+            "env": "CONTENT_CACHE_BYTES",
+            "default": 64 * 1024 * 1024,
+        },
+        "mmap_threshold": {"dest": "mmap_threshold", "env": "MMAP_THRESHOLD", "default": 1024 * 1024},
+        "upload_chunk_size": {"dest": "upload_chunk_size", "env": "UPLOAD_CHUNK_SIZE", "default": 8 * 1024 * 1024},
+        "upload_session_ttl": {"dest": "upload_session_ttl", "env": "UPLOAD_SESSION_TTL", "default": 7 * 24 * 3600},
+        "copy_workers": {"dest": "copy_workers", "env": "COPY_WORKERS", "default": 4},
+        "catalog": {"dest": "catalog", "env": "CATALOG", "default": False},
+        "catalog_reconcile_interval": {
+            "dest": "catalog_reconcile_interval",
+            "env": "CATALOG_RECONCILE_INTERVAL",
+            "default": 3600,
+        },
+        "search_index": {"dest": "search_index", "env": "SEARCH_INDEX", "default": False},
+        "search_workers": {"dest": "search_workers", "env": "SEARCH_WORKERS", "default": 2},
+        "search_index_rate": {
+            "dest": "search_index_rate",
+            "env": "SEARCH_INDEX_RATE",
+            "default": 16 * 1024 * 1024,
+        },
+        "change_feed_history": {"dest": "change_feed_history", "env": "CHANGE_FEED_HISTORY", "default": 10000},
+        "change_feed_buffer": {"dest": "change_feed_buffer", "env": "CHANGE_FEED_BUFFER", "default": 1000},
     }
 
     @classmethod
@@ -47,6 +84,20 @@ class ServerConfig:
             result_dict[key] = cls._CONFIG_INFO[key][dict_name]
         return result_dict
 
+    @staticmethod
+    def to_bool(value) -> bool:
+        """Convert a flag value from any config source to bool.
+
+        Args:
+            value - bool from the config file or string from environment variables.
+
+        Returns:
+            bool: True for true, yes, on or 1 (case-insensitive).
+        """
+        if isinstance(value, str):
+            return value.strip().lower() in ("true", "yes", "on", "1")
+        return bool(value)
+
     # This makes me a singleton!
     def __new__(cls):
         if not hasattr(cls, "instance"):
@@ -52,23 +52,44 @@ def main(args: argparse.Namespace):
 
     auth_middleware = BasicAuthMiddleware(force=False)
     handler = WebHandler()
-    app = web.Application(middlewares=[auth_middleware])
+    app = web.Application(middlewares=[auth_middleware, handler.session_middleware])
     app.add_routes(
         [
             web.get("/", handler.handle),
+            web.get("/stats", handler.stats),
+            web.get("/usage", handler.get_usage),
+            web.post("/usage/quota", handler.set_quota),
+            web.post("/usage/reconcile", handler.reconcile_usage),
+            web.get("/catalog", handler.query_catalog),
+            web.post("/catalog/reconcile", handler.reconcile_catalog),
+            web.get("/search", handler.search_files),
+            web.get("/changes", handler.watch_changes),
             web.get("/current_dir", handler.current_dir),
             web.post("/change_dir", handler.change_dir),
             web.post("/delete_dir", handler.delete_dir),
+            web.post("/copy_dir", handler.copy_dir),
+            web.post("/move_dir", handler.move_dir),
 
             web.get("/files", handler.get_files),
             web.get("/files/{filename}", handler.get_file_data),
             web.post("/files", handler.create_file),
+            web.post("/files/batch", handler.batch),
+            web.post("/files/copy", handler.copy_file),
+            web.post("/files/move", handler.move_file),
             web.delete("/files/{filename}", handler.delete_file),
+            web.get("/archive", handler.get_archive),
+            web.post("/uploads", handler.open_upload_session),
+            web.get("/uploads/{upload_id}", handler.get_upload_session),
+            web.put(r"/uploads/{upload_id}/{number:\d+}", handler.put_upload_chunk),
+            web.post("/uploads/{upload_id}/commit", handler.commit_upload_session),
+            web.delete("/uploads/{upload_id}", handler.abort_upload_session),
 
             web.post("/register", handler.register),
             web.post("/login", handler.login),
         ]
     )
+    app.on_response_prepare.append(handler.on_response_prepare)
+    app.on_cleanup.append(handler.on_cleanup)
     web.run_app(app, port=server_config["port"], host=server_config["host"])
 
     logging.info("Server stopped")
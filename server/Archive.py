@@ -0,0 +1,187 @@
+"""Incremental archive encoders.
+
+Archives are produced piece by piece: every call returns the bytes which are ready to be sent,
+so neither the archive nor a whole file is kept in memory.
+
+Imports:
+    tarfile
+    zipfile
+    zlib
+
+Provides:
+    FORMATS
+    make_archive()
+    TarStream
+    ZipStream
+"""
+
+import tarfile
+import time
+import typing
+import zipfile
+import zlib
+
+# Archive format -> content type and file name extension.
+FORMATS = {
+    "tar": ("application/x-tar", ".tar"),
+    "tar.gz": ("application/gzip", ".tar.gz"),
+    "zip": ("application/zip", ".zip"),
+}
+GZIP_LEVEL = 6
+ZIP_LEVEL = 6
+# Zip can't store dates before 1980.
+ZIP_MIN_DATE = (1980, 1, 1, 0, 0, 0)
+
+
+class TarStream:
+    """Encoder of a tar archive, optionally gzip-compressed.
+
+    A file is added with add_file(), followed by its content passed to write() and end_file().
+    File size is declared in advance: extra content is cut, missing content is filled with zeros.
+    """
+
+    def __init__(self, compress: bool = False):
+        self._compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS) if compress else None
+        self._size = 0
+        self._remaining = 0
+        self._written = 0
+
+    def _out(self, data: bytes) -> bytes:
+        self._written += len(data)
+        if self._compressor is not None:
+            return self._compressor.compress(data)
+        return data
+
+    def add_file(self, name: str, size: int, mtime: float) -> bytes:
+        """Start a file.
+
+        Args:
+            name (str): Name of the file in the archive.
+            size (int): Size of the file content.
+            mtime (float): Modification time of the file.
+
+        Returns:
+            Bytes to send.
+        """
+
+        info = tarfile.TarInfo(name)
+        info.size = size
+        info.mtime = int(mtime)
+        info.mode = 0o644
+        self._size = self._remaining = size
+        return self._out(info.tobuf(format=tarfile.PAX_FORMAT, encoding="utf-8", errors="surrogateescape"))
+
+    def write(self, data: bytes) -> bytes:
+        """Add content of the current file.
+
+        Returns:
+            Bytes to send.
+        """
+
+        data = data[: self._remaining]
+        self._remaining -= len(data)
+        return self._out(data)
+
+    def end_file(self) -> bytes:
+        """Finish the current file.
+
+        Returns:
+            Bytes to send.
+        """
+
+        padding = self._remaining + (-self._size) % tarfile.BLOCKSIZE
+        self._remaining = 0
+        return self._out(b"\0" * padding)
+
+    def close(self) -> bytes:
+        """Finish the archive.
+
+        Returns:
+            The last bytes to send.
+        """
+
+        end = b"\0" * (2 * tarfile.BLOCKSIZE)
+        end += b"\0" * ((-(self._written + len(end))) % tarfile.RECORDSIZE)
+        data = self._out(end)
+        if self._compressor is not None:
+            data += self._compressor.flush()
+        return data
+
+
+class _Sink:
+    """Unseekable file object which collects data written by ZipFile."""
+
+    def __init__(self):
+        self._chunks = list()
+
+    def write(self, data: bytes) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self) -> None:
+        pass
+
+    def take(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+class ZipStream:
+    """Encoder of a zip archive with deflated files.
+
+    ZipFile writes to an unseekable stream, so sizes and checksums follow file content in data descriptors.
+    """
+
+    def __init__(self):
+        self._sink = _Sink()
+        self._zip = zipfile.ZipFile(self._sink, "w", compression=zipfile.ZIP_DEFLATED, compresslevel=ZIP_LEVEL)
+        self._file = None
+
+    def add_file(self, name: str, size: int, mtime: float) -> bytes:
+        """See TarStream.add_file()."""
+
+        date_time = max(time.localtime(mtime)[:6], ZIP_MIN_DATE)
+        info = zipfile.ZipInfo(name, date_time=date_time)
+        info.compress_type = zipfile.ZIP_DEFLATED
+        info.file_size = size
+        self._file = self._zip.open(info, "w", force_zip64=size >= zipfile.ZIP64_LIMIT)
+        return self._sink.take()
+
+    def write(self, data: bytes) -> bytes:
+        """See TarStream.write()."""
+
+        self._file.write(data)
+        return self._sink.take()
+
+    def end_file(self) -> bytes:
+        """See TarStream.end_file()."""
+
+        self._file.close()
+        self._file = None
+        return self._sink.take()
+
+    def close(self) -> bytes:
+        """See TarStream.close()."""
+
+        self._zip.close()
+        return self._sink.take()
+
+
+def make_archive(archive_format: str) -> typing.Union[TarStream, ZipStream]:
+    """Make an encoder of an archive.
+
+    Args:
+        archive_format (str): One of FORMATS.
+
+    Raises:
+        ValueError: if the format is unknown.
+    """
+
+    if archive_format == "tar":
+        return TarStream()
+    if archive_format == "tar.gz":
+        return TarStream(compress=True)
+    if archive_format == "zip":
+        return ZipStream()
+    raise ValueError(f"Unknown archive format: {archive_format}")
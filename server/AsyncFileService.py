@@ -0,0 +1,345 @@
+"""Asynchronous facade for the file service.
+
+Imports:
+    asyncio
+    concurrent.futures
+    functools
+
+Provides class:
+    AsyncFileService
+"""
+
+import asyncio
+import functools
+import logging
+import typing
+from concurrent.futures import ThreadPoolExecutor
+
+from config import ServerConfig
+
+from .FileService import DEFAULT_SESSION, FileService
+
+
+class AsyncFileService:
+    """Runs blocking FileService methods in a bounded thread pool.
+
+    At most `fs_workers` operations run at once and at most `fs_queue_depth` more are handed to the pool
+    and wait for a free worker. Further callers wait on the event loop until a slot is released.
+    Background indexing waits while operations run, see FileService.foreground().
+    """
+
+    def __init__(self, file_service: FileService = None):
+        self._logger = logging.getLogger(__name__)
+        self._config = ServerConfig().config
+        self._fs = file_service if file_service is not None else FileService()
+
+        workers = int(self._config["fs_workers"])
+        queue_depth = int(self._config["fs_queue_depth"])
+        self._max_pending = workers + queue_depth
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="FileService")
+        self._slots = None
+
+    async def _run(self, func, *args, **kwargs):
+        """Run func(*args, **kwargs) in the thread pool and return its result."""
+
+        if self._slots is None:
+            # Created lazily to bind to the running event loop.
+            self._slots = asyncio.BoundedSemaphore(self._max_pending)
+
+        async with self._slots:
+            loop = asyncio.get_running_loop()
+            with self._fs.foreground():
+                return await loop.run_in_executor(self._executor, functools.partial(func, *args, **kwargs))
+
+    async def get_file_metadata(self, filename: str, session: str = DEFAULT_SESSION) -> dict:
+        """See FileService.get_file_metadata()."""
+        return await self._run(self._fs.get_file_metadata, filename, session=session)
+
+    async def current_dir(self, session: str = DEFAULT_SESSION) -> str:
+        """See FileService.current_dir()."""
+        return await self._run(self._fs.current_dir, session=session)
+
+    async def change_dir(self, path: str, autocreate: bool = True, session: str = DEFAULT_SESSION) -> str:
+        """See FileService.change_dir()."""
+        return await self._run(self._fs.change_dir, path, autocreate=autocreate, session=session)
+
+    async def delete_dir(self, path: str, recursive: bool = True) -> None:
+        """See FileService.delete_dir()."""
+        return await self._run(self._fs.delete_dir, path, recursive=recursive)
+
+    async def get_files(self, session: str = DEFAULT_SESSION) -> list:
+        """See FileService.get_files()."""
+        return await self._run(self._fs.get_files, session=session)
+
+    async def get_files_page(self, **kwargs) -> dict:
+        """See FileService.get_files_page()."""
+        return await self._run(self._fs.get_files_page, **kwargs)
+
+    async def walk_dir(self, path: str = ".", recursive: bool = True, session: str = DEFAULT_SESSION) -> list:
+        """See FileService.walk_dir()."""
+        return await self._run(self._fs.walk_dir, path, recursive=recursive, session=session)
+
+    async def query_files(self, **kwargs) -> dict:
+        """See FileService.query_files()."""
+        return await self._run(self._fs.query_files, **kwargs)
+
+    async def search_files(self, text: str, **kwargs) -> dict:
+        """See FileService.search_files()."""
+        return await self._run(self._fs.search_files, text, **kwargs)
+
+    async def subscribe_changes(
+        self, path: str = ".", after: typing.Optional[int] = None, session: str = DEFAULT_SESSION
+    ):
+        """See FileService.subscribe_changes()."""
+        return await self._run(self._fs.subscribe_changes, path, after=after, session=session)
+
+    async def watch_changes(self, subscription, timeout: float) -> typing.AsyncIterator[list]:
+        """Wait for changes of a subscription, see FileService.subscribe_changes().
+
+        Events are delivered without the thread pool: publishers wake up the event loop.
+        The subscription is closed when iteration stops.
+
+        Args:
+            subscription (Subscription): Subscription from subscribe_changes().
+            timeout (float): Time in seconds after which an empty list is yielded if there are no events.
+
+        Yields:
+            Lists of events.
+        """
+
+        loop = asyncio.get_running_loop()
+        wakeup = asyncio.Event()
+        subscription.set_notify(lambda: loop.call_soon_threadsafe(wakeup.set))
+        try:
+            while True:
+                try:
+                    await asyncio.wait_for(wakeup.wait(), timeout)
+                except asyncio.TimeoutError:
+                    pass
+                wakeup.clear()
+                yield subscription.get()
+        finally:
+            subscription.close()
+
+    async def get_file_data(self, filename: str, session: str = DEFAULT_SESSION) -> dict:
+        """See FileService.get_file_data()."""
+        return await self._run(self._fs.get_file_data, filename, session=session)
+
+    async def get_encoded_file_data(
+        self, filename: str, encode: typing.Callable[[dict], bytes], session: str = DEFAULT_SESSION
+    ) -> bytes:
+        """See FileService.get_encoded_file_data()."""
+        return await self._run(self._fs.get_encoded_file_data, filename, encode, session=session)
+
+    async def get_file_path(self, filename: str, session: str = DEFAULT_SESSION) -> str:
+        """See FileService.get_file_path()."""
+        return await self._run(self._fs.get_file_path, filename, session=session)
+
+    async def get_file_hash(self, filename: str, session: str = DEFAULT_SESSION) -> str:
+        """See FileService.get_file_hash()."""
+        return await self._run(self._fs.get_file_hash, filename, session=session)
+
+    async def read_file_range(
+        self, filename: str, offset: int, length: int, session: str = DEFAULT_SESSION
+    ) -> bytes:
+        """See FileService.read_file_range()."""
+        return await self._run(self._fs.read_file_range, filename, offset, length, session=session)
+
+    async def is_packed(self, filename: str, session: str = DEFAULT_SESSION) -> bool:
+        """See FileService.is_packed()."""
+        return await self._run(self._fs.is_packed, filename, session=session)
+
+    async def get_stored_format(self, filename: str, session: str = DEFAULT_SESSION) -> typing.Optional[dict]:
+        """See FileService.get_stored_format()."""
+        return await self._run(self._fs.get_stored_format, filename, session=session)
+
+    async def read_file_chunks(
+        self,
+        filename: str,
+        offset: int,
+        length: int,
+        chunk_size: int,
+        decode: bool = True,
+        session: str = DEFAULT_SESSION,
+    ) -> typing.AsyncIterator[bytes]:
+        """Read a part of a file in chunks.
+
+        Args:
+            filename (str): Filename.
+            offset (int): Position of the first byte to read.
+            length (int): Maximum number of bytes to read.
+            chunk_size (int): Maximum size of a chunk.
+            decode (bool): See FileService.open_reader().
+            session (str): Session ID, see FileService.change_dir().
+
+        Yields:
+            Chunks of the file. Less than length bytes are yielded if the end of file is reached.
+        """
+
+        reader = await self._run(self._fs.open_reader, filename, offset, decode=decode, session=session)
+        try:
+            while length > 0:
+                chunk = await self._run(reader.read, min(chunk_size, length))
+                if not chunk:
+                    break
+                length -= len(chunk)
+                yield chunk
+        finally:
+            await self._run(reader.close)
+
+    async def create_file(self, filename: str, content: bytes, session: str = DEFAULT_SESSION) -> dict:
+        """See FileService.create_file()."""
+        return await self._run(self._fs.create_file, filename, content, session=session)
+
+    async def create_file_stream(
+        self, filename: str, chunks: typing.AsyncIterable[bytes], session: str = DEFAULT_SESSION
+    ) -> dict:
+        """Create a file from an asynchronous stream of chunks.
+
+        Chunks are written one by one to a temporary file which is renamed into place
+        when the stream is exhausted, so memory usage does not depend on the file size.
+
+        Args:
+            filename (str): Filename.
+            chunks (AsyncIterable[bytes]): File content.
+            session (str): Session ID, see FileService.change_dir().
+
+        Returns:
+            See FileService.finish_upload().
+        """
+
+        upload_file = await self._run(self._fs.open_upload, filename, session=session)
+        try:
+            async for chunk in chunks:
+                await self._run(upload_file.write, chunk)
+            return await self._run(self._fs.finish_upload, upload_file, filename, session=session)
+        except BaseException:
+            await self._run(self._fs.abort_upload, upload_file)
+            raise
+
+    async def open_upload_session(
+        self,
+        filename: str,
+        size: int,
+        chunk_size: typing.Optional[int] = None,
+        sha256: typing.Optional[str] = None,
+        session: str = DEFAULT_SESSION,
+    ) -> dict:
+        """See FileService.open_upload_session()."""
+        return await self._run(
+            self._fs.open_upload_session, filename, size, chunk_size=chunk_size, sha256=sha256, session=session
+        )
+
+    async def get_upload_session(self, upload_id: str) -> dict:
+        """See FileService.get_upload_session()."""
+        return await self._run(self._fs.get_upload_session, upload_id)
+
+    async def write_upload_chunk(self, upload_id: str, number: int, chunks: typing.AsyncIterable[bytes]) -> dict:
+        """Write a chunk of an upload session from an asynchronous stream.
+
+        Args:
+            upload_id (str): Session ID, see FileService.open_upload_session().
+            number (int): Chunk number starting from 0.
+            chunks (AsyncIterable[bytes]): Chunk content.
+
+        Returns:
+            See FileService.get_upload_session().
+        """
+
+        writer = await self._run(self._fs.open_upload_chunk, upload_id, number)
+        try:
+            async for chunk in chunks:
+                await self._run(writer.write, chunk)
+            return await self._run(self._fs.finish_upload_chunk, writer)
+        except BaseException:
+            await self._run(self._fs.abort_upload_chunk, writer)
+            raise
+
+    async def commit_upload_session(self, upload_id: str, sha256: typing.Optional[str] = None) -> dict:
+        """See FileService.commit_upload_session()."""
+        return await self._run(self._fs.commit_upload_session, upload_id, sha256=sha256)
+
+    async def abort_upload_session(self, upload_id: str) -> None:
+        """See FileService.abort_upload_session()."""
+        return await self._run(self._fs.abort_upload_session, upload_id)
+
+    async def copy_file(self, source: str, destination: str, session: str = DEFAULT_SESSION) -> dict:
+        """See FileService.copy_file()."""
+        return await self._run(self._fs.copy_file, source, destination, session=session)
+
+    async def move_file(self, source: str, destination: str, session: str = DEFAULT_SESSION) -> dict:
+        """See FileService.move_file()."""
+        return await self._run(self._fs.move_file, source, destination, session=session)
+
+    async def copy_dir(self, path: str, new_path: str, session: str = DEFAULT_SESSION) -> dict:
+        """See FileService.copy_dir()."""
+        return await self._run(self._fs.copy_dir, path, new_path, session=session)
+
+    async def move_dir(self, path: str, new_path: str, session: str = DEFAULT_SESSION) -> str:
+        """See FileService.move_dir()."""
+        return await self._run(self._fs.move_dir, path, new_path, session=session)
+
+    async def delete_file(self, filename: str, session: str = DEFAULT_SESSION) -> None:
+        """See FileService.delete_file()."""
+        return await self._run(self._fs.delete_file, filename, session=session)
+
+    async def cache_stats(self) -> dict:
+        """See FileService.cache_stats()."""
+        return self._fs.cache_stats()
+
+    async def durability_stats(self) -> dict:
+        """See FileService.durability_stats()."""
+        return self._fs.durability_stats()
+
+    async def get_usage(self, path: str = ".") -> dict:
+        """See FileService.get_usage()."""
+        return await self._run(self._fs.get_usage, path)
+
+    async def set_quota(
+        self, path: str = ".", max_bytes: typing.Optional[int] = None, max_files: typing.Optional[int] = None
+    ) -> dict:
+        """See FileService.set_quota()."""
+        return await self._run(self._fs.set_quota, path, max_bytes=max_bytes, max_files=max_files)
+
+    async def reconcile_usage(self) -> dict:
+        """See FileService.reconcile_usage()."""
+        return await self._run(self._fs.reconcile_usage)
+
+    async def pack_stats(self) -> dict:
+        """See FileService.pack_stats()."""
+        return await self._run(self._fs.pack_stats)
+
+    async def upload_stats(self) -> dict:
+        """See FileService.upload_stats()."""
+        return await self._run(self._fs.upload_stats)
+
+    async def content_cache_stats(self) -> dict:
+        """See FileService.content_cache_stats()."""
+        return self._fs.content_cache_stats()
+
+    async def catalog_stats(self) -> dict:
+        """See FileService.catalog_stats()."""
+        return await self._run(self._fs.catalog_stats)
+
+    async def change_feed_stats(self) -> dict:
+        """See FileService.change_feed_stats()."""
+        return self._fs.change_feed_stats()
+
+    async def search_stats(self) -> dict:
+        """See FileService.search_stats()."""
+        return await self._run(self._fs.search_stats)
+
+    async def reconcile_catalog(self) -> dict:
+        """See FileService.reconcile_catalog()."""
+        return await self._run(self._fs.reconcile_catalog)
+
+    async def trash_stats(self) -> dict:
+        """See FileService.trash_stats()."""
+        return self._fs.trash_stats()
+
+    def shutdown(self) -> None:
+        """Wait for running operations and stop the thread pool."""
+
+        self._logger.debug("Shutting down file service workers")
+        self._executor.shutdown(wait=True)
+        self._fs.close()
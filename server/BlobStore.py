@@ -0,0 +1,152 @@
+"""Content-addressed storage of file bodies.
+
+Imports:
+    os
+    threading
+
+Provides class:
+    BlobStore
+"""
+
+import logging
+import os
+import threading
+import typing
+
+BLOBS_DIR = ".blobs"
+
+
+class BlobStore:
+    """Stores every distinct file body once, as a blob named by its SHA-256 hash.
+
+    Blobs are kept in `<root>/.blobs/<first two hex digits>/<hash>` and user-visible files are hard links
+    to them. The link count of a blob is its reference count: a blob is removed when the last user-visible
+    link to it is deleted, i.e. when its link count drops to 1.
+    """
+
+    def __init__(self, root: str, sync_dir: typing.Optional[typing.Callable[[str], None]] = None):
+        """
+        Args:
+            root (str): Data directory.
+            sync_dir (Callable): Function which flushes a directory to disk after a blob is added to it.
+        """
+
+        self._logger = logging.getLogger(__name__)
+        self._sync_dir = sync_dir
+        self._blobs_dir = os.path.join(os.path.abspath(root), BLOBS_DIR)
+        os.makedirs(self._blobs_dir, exist_ok=True)
+        # Serializes linking to blobs and removing them.
+        self._lock = threading.Lock()
+        # (st_dev, st_ino) -> blob path. Built lazily, see _find_blob().
+        self._inodes = None
+
+    def _blob_path(self, digest: str) -> str:
+        return os.path.join(self._blobs_dir, digest[:2], digest)
+
+    def _find_blob(self, stat_result: os.stat_result) -> typing.Optional[str]:
+        """Find a blob by inode of a file linked to it."""
+
+        if self._inodes is None:
+            self._inodes = dict()
+            for dirpath, _, filenames in os.walk(self._blobs_dir):
+                for filename in filenames:
+                    blob_stat = os.stat(os.path.join(dirpath, filename))
+                    self._inodes[(blob_stat.st_dev, blob_stat.st_ino)] = os.path.join(dirpath, filename)
+        return self._inodes.get((stat_result.st_dev, stat_result.st_ino))
+
+    def _remember(self, blob_path: str) -> None:
+        if self._inodes is not None:
+            blob_stat = os.stat(blob_path)
+            self._inodes[(blob_stat.st_dev, blob_stat.st_ino)] = blob_path
+
+    def _link(self, blob_path: str, filename: str) -> None:
+        """Atomically make filename a link to a blob, replacing an existing file."""
+
+        target_dir, target_name = os.path.split(os.path.abspath(filename))
+        temp_path = os.path.join(target_dir, f".{target_name}.{os.urandom(8).hex()}.link")
+        os.link(blob_path, temp_path)
+        try:
+            os.replace(temp_path, filename)
+        except BaseException:
+            os.remove(temp_path)
+            raise
+
+    def store_file(self, temp_path: str, digest: str, filename: str) -> None:
+        """Move a file with known hash into the store and link filename to its blob.
+
+        If the blob already exists, the file is removed.
+
+        Args:
+            temp_path (str): Path to a file in the same filesystem.
+            digest (str): SHA-256 hex digest of the file content.
+            filename (str): User-visible filename.
+        """
+
+        blob_path = self._blob_path(digest)
+        with self._lock:
+            if not os.path.exists(blob_path):
+                os.makedirs(os.path.dirname(blob_path), exist_ok=True)
+                os.replace(temp_path, blob_path)
+                if self._sync_dir is not None:
+                    self._sync_dir(os.path.dirname(blob_path))
+                self._remember(blob_path)
+            else:
+                self._logger.debug(f"Blob {digest} is reused")
+                os.remove(temp_path)
+            self._link(blob_path, filename)
+
+    def find_digest(self, stat_result: os.stat_result) -> typing.Optional[str]:
+        """Get hash of a file linked to a blob.
+
+        Args:
+            stat_result (stat_result): Stat result of the file.
+
+        Returns:
+            SHA-256 hex digest or None if the file isn't linked to a blob.
+        """
+
+        if stat_result.st_nlink < 2:
+            return None
+        with self._lock:
+            blob_path = self._find_blob(stat_result)
+        return os.path.basename(blob_path) if blob_path is not None else None
+
+    def release(self, stat_result: os.stat_result) -> None:
+        """Remove a blob if a removed or replaced file was its last user-visible link.
+
+        Args:
+            stat_result (stat_result): Stat result of the file taken before it was removed.
+        """
+
+        if stat_result.st_nlink < 2:
+            # The file wasn't linked to a blob.
+            return
+        # The link count in stat_result may be stale if other links were removed concurrently, so the blob
+        # is checked and removed under the lock which store_file() holds while linking to it.
+        with self._lock:
+            blob_path = self._find_blob(stat_result)
+            if blob_path is not None and os.stat(blob_path).st_nlink == 1:
+                os.remove(blob_path)
+                del self._inodes[(stat_result.st_dev, stat_result.st_ino)]
+                self._logger.debug(f"Blob {os.path.basename(blob_path)} is removed")
+
+    def collect_garbage(self) -> int:
+        """Remove all blobs which have no user-visible links.
+
+        Returns:
+            Number of removed blobs.
+        """
+
+        removed = 0
+        with self._lock:
+            for dirpath, _, filenames in os.walk(self._blobs_dir):
+                for filename in filenames:
+                    blob_path = os.path.join(dirpath, filename)
+                    blob_stat = os.stat(blob_path)
+                    if blob_stat.st_nlink == 1:
+                        os.remove(blob_path)
+                        if self._inodes is not None:
+                            self._inodes.pop((blob_stat.st_dev, blob_stat.st_ino), None)
+                        removed += 1
+        self._logger.debug(f"{removed} blobs removed")
+        return removed
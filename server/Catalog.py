@@ -0,0 +1,401 @@
+"""Persistent catalog of file metadata with indexed queries.
+
+Imports:
+    os
+    sqlite3
+    threading
+
+Provides class:
+    Catalog
+"""
+
+import logging
+import os
+import sqlite3
+import threading
+import time
+import typing
+
+from .HashCache import META_DIR, is_reserved
+
+CATALOG_DB = "catalog.sqlite"
+# Key of the data directory itself.
+ROOT = "."
+# Pending changes are written at least this often, in seconds.
+FLUSH_INTERVAL = 1.0
+# Pending changes are written at once when there are more of them.
+MAX_PENDING = 10000
+# Sort keys and columns, files are sorted by path after them.
+SORT_COLUMNS = {"name": (), "size": ("size",), "create_date": ("ctime_ns",), "edit_date": ("mtime_ns",)}
+
+
+class Catalog:
+    """Path, size, creation and modification time and extension of every file, kept in an SQLite database.
+
+    Changes are collected in memory and written in batches by a background thread, queries write them first.
+    The same thread reconciles the catalog with files on disk: on start if it wasn't closed cleanly,
+    then every `reconcile_interval` seconds. Files changed during reconciliation may be cataloged wrong
+    until the next one. Hidden files and directories aren't cataloged.
+
+    Files are keyed by the directory relative to the data directory and the name, so a subtree is
+    a range of keys. Indexes on size, times and extension serve sorting and filtering.
+    """
+
+    def __init__(
+        self,
+        root: str,
+        list_dir: typing.Callable[[str], typing.Dict[str, typing.Tuple[int, int, int]]],
+        reconcile_interval: float = 0,
+    ):
+        """
+        Args:
+            root (str): Data directory.
+            list_dir (Callable): Function which gets files of a directory on disk by its absolute path,
+                as a dict of names and tuples of size, st_ctime_ns and st_mtime_ns.
+            reconcile_interval (float): Time in seconds between reconciliations, 0 to reconcile only after
+                an unclean shutdown.
+        """
+
+        self._logger = logging.getLogger(__name__)
+        self._root = os.path.abspath(root)
+        self._list_dir = list_dir
+        self._reconcile_interval = reconcile_interval
+        self._lock = threading.Lock()
+        # (dir, name) -> (size, ctime_ns, mtime_ns) or None for a removed file.
+        self._pending = dict()
+        self._wakeup = threading.Event()
+        self._stopped = False
+        self._reconcile_requested = False
+        self.reconciled_at = None
+
+        os.makedirs(os.path.join(self._root, META_DIR), exist_ok=True)
+        self._db = sqlite3.connect(
+            os.path.join(self._root, META_DIR, CATALOG_DB), check_same_thread=False, isolation_level=None
+        )
+        self._db.execute("PRAGMA journal_mode = WAL")
+        self._db.execute("PRAGMA synchronous = NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS files ("
+            " dir TEXT, name TEXT, ext TEXT, size INTEGER, ctime_ns INTEGER, mtime_ns INTEGER,"
+            " PRIMARY KEY (dir, name))"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS files_size ON files (size)")
+        self._db.execute("CREATE INDEX IF NOT EXISTS files_mtime ON files (mtime_ns)")
+        self._db.execute("CREATE INDEX IF NOT EXISTS files_ctime ON files (ctime_ns)")
+        self._db.execute("CREATE INDEX IF NOT EXISTS files_ext ON files (ext, dir)")
+        self._db.execute("CREATE TABLE IF NOT EXISTS state (key TEXT PRIMARY KEY, value REAL)")
+
+        clean = self._db.execute("SELECT value FROM state WHERE key = 'clean'").fetchone()
+        if clean is None or not clean[0]:
+            self._logger.info("Catalog wasn't saved, reconciling it")
+            self._reconcile_requested = True
+        reconciled_at = self._db.execute("SELECT value FROM state WHERE key = 'reconciled_at'").fetchone()
+        self.reconciled_at = reconciled_at[0] if reconciled_at is not None else None
+        # Pending changes are lost on a crash.
+        self._db.execute("INSERT OR REPLACE INTO state VALUES ('clean', 0)")
+
+        self._thread = threading.Thread(target=self._run, name="CatalogWriter", daemon=True)
+        self._thread.start()
+
+    def _key(self, path: str) -> typing.Tuple[str, str]:
+        directory, name = os.path.split(path)
+        return os.path.relpath(directory, self._root), name
+
+    def _tree_condition(self, directory: str) -> typing.Tuple[str, tuple]:
+        """Get SQL condition and its parameters which select files of a directory tree."""
+
+        key = os.path.relpath(directory, self._root)
+        if key == ROOT:
+            return "1", ()
+        # Paths of subdirectories sort between `key/` and `key0`.
+        return "(dir = ? OR (dir >= ? AND dir < ?))", (key, key + os.sep, key + chr(ord(os.sep) + 1))
+
+    @staticmethod
+    def _extension(name: str) -> str:
+        return os.path.splitext(name)[1][1:].lower()
+
+    def put(self, path: str, size: int, ctime_ns: int, mtime_ns: int) -> None:
+        """Add or update a file.
+
+        Args:
+            path (str): Absolute path to the file.
+            size (int): Size of the file content.
+            ctime_ns (int): Creation time in nanoseconds.
+            mtime_ns (int): Modification time in nanoseconds.
+        """
+
+        directory, name = self._key(path)
+        if name.startswith(".") or is_reserved(self._root, path):
+            return
+        with self._lock:
+            self._pending[directory, name] = (size, ctime_ns, mtime_ns)
+            if len(self._pending) >= MAX_PENDING:
+                self._wakeup.set()
+
+    def remove(self, path: str) -> None:
+        """Remove a file.
+
+        Args:
+            path (str): Absolute path to the file.
+        """
+
+        with self._lock:
+            self._pending[self._key(path)] = None
+            if len(self._pending) >= MAX_PENDING:
+                self._wakeup.set()
+
+    def _flush(self) -> None:
+        """Write pending changes. Called with the lock held."""
+
+        if not self._pending:
+            return
+        puts = [
+            (directory, name, self._extension(name)) + values
+            for (directory, name), values in self._pending.items()
+            if values is not None
+        ]
+        removes = [key for key, values in self._pending.items() if values is None]
+        self._pending = dict()
+        self._db.execute("BEGIN")
+        self._db.executemany("DELETE FROM files WHERE dir = ? AND name = ?", removes)
+        self._db.executemany("INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?, ?)", puts)
+        self._db.execute("COMMIT")
+
+    def flush(self) -> None:
+        """Write pending changes now."""
+
+        with self._lock:
+            self._flush()
+
+    def remove_tree(self, directory: str) -> None:
+        """Remove files of a directory tree.
+
+        Args:
+            directory (str): Absolute path to the directory.
+        """
+
+        condition, params = self._tree_condition(directory)
+        with self._lock:
+            self._flush()
+            self._db.execute(f"DELETE FROM files WHERE {condition}", params)
+
+    def move_tree(self, directory: str, new_directory: str) -> None:
+        """Move files of a renamed directory tree.
+
+        Args:
+            directory (str): Absolute path to the old directory.
+            new_directory (str): Absolute path to the new directory.
+        """
+
+        condition, params = self._tree_condition(directory)
+        key = os.path.relpath(directory, self._root)
+        new_key = os.path.relpath(new_directory, self._root)
+        with self._lock:
+            self._flush()
+            self._db.execute(
+                f"UPDATE OR REPLACE files SET dir = ? || substr(dir, ?) WHERE {condition}",
+                (new_key, len(key) + 1) + params,
+            )
+
+    def query(
+        self,
+        directory: str,
+        recursive: bool = True,
+        pattern: str = "",
+        ext: typing.Optional[str] = None,
+        min_size: typing.Optional[int] = None,
+        max_size: typing.Optional[int] = None,
+        modified_since: typing.Optional[float] = None,
+        modified_before: typing.Optional[float] = None,
+        sort_by: str = "name",
+        descending: bool = False,
+        limit: typing.Optional[int] = None,
+        after: typing.Optional[list] = None,
+    ) -> typing.Tuple[list, typing.Optional[list]]:
+        """Find files.
+
+        Args:
+            directory (str): Absolute path to a directory to search in.
+            recursive (bool): Search in subdirectories too.
+            pattern (str): Glob pattern of file names, case-sensitive.
+            ext (str): File name extension without dot, case-insensitive.
+            min_size (int): Minimum file size in bytes.
+            max_size (int): Maximum file size in bytes.
+            modified_since (float): Minimum modification time as a Unix timestamp.
+            modified_before (float): Modification time as a Unix timestamp which files are modified before.
+            sort_by (str): Sort key, one of SORT_COLUMNS. Files are sorted by path after it.
+            descending (bool): Sort in descending order.
+            limit (int): Maximum number of files. All files if None.
+            after (list): Sort key of the last file of the previous page, see the returned value.
+
+        Returns:
+            List of dicts with keys: path (absolute path), size, ctime_ns, mtime_ns; and a sort key to pass
+            as `after` for the next page, None if there are no more files.
+
+        Raises:
+            ValueError: if sort key is invalid.
+        """
+
+        if sort_by not in SORT_COLUMNS:
+            raise ValueError(f"Bad sort key: {sort_by}")
+        columns = SORT_COLUMNS[sort_by] + ("dir", "name")
+
+        if recursive:
+            condition, params = self._tree_condition(directory)
+            conditions, params = [condition], list(params)
+        else:
+            conditions, params = ["dir = ?"], [os.path.relpath(directory, self._root)]
+        if pattern:
+            conditions.append("name GLOB ?")
+            params.append(pattern)
+        if ext is not None:
+            conditions.append("ext = ?")
+            params.append(ext.lstrip(".").lower())
+        if min_size is not None:
+            conditions.append("size >= ?")
+            params.append(min_size)
+        if max_size is not None:
+            conditions.append("size <= ?")
+            params.append(max_size)
+        if modified_since is not None:
+            conditions.append("mtime_ns >= ?")
+            params.append(int(modified_since * 10**9))
+        if modified_before is not None:
+            conditions.append("mtime_ns < ?")
+            params.append(int(modified_before * 10**9))
+        if after is not None:
+            if len(after) != len(columns):
+                raise ValueError(f"Bad sort key: {after}")
+            conditions.append(f"({', '.join(columns)}) {'<' if descending else '>'} ({', '.join('?' * len(columns))})")
+            params.extend(after)
+        order = "DESC" if descending else "ASC"
+        sql = (
+            f"SELECT {', '.join(columns)}, size, ctime_ns, mtime_ns FROM files WHERE {' AND '.join(conditions)}"
+            f" ORDER BY {', '.join(f'{column} {order}' for column in columns)}"
+        )
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(limit + 1)
+
+        with self._lock:
+            self._flush()
+            rows = self._db.execute(sql, params).fetchall()
+
+        next_after = None
+        if limit is not None and len(rows) > limit:
+            rows = rows[:limit]
+            next_after = list(rows[-1][: len(columns)])
+        files = [
+            dict(
+                path=os.path.normpath(os.path.join(self._root, row[-5], row[-4])),
+                size=row[-3],
+                ctime_ns=row[-2],
+                mtime_ns=row[-1],
+            )
+            for row in rows
+        ]
+        return files, next_after
+
+    def reconcile(self) -> dict:
+        """Bring the catalog in line with files on disk.
+
+        Returns:
+            Dict with keys: added, updated, removed (numbers of files), seconds (duration).
+        """
+
+        self._logger.debug("Reconciling catalog")
+
+        started = time.monotonic()
+        counts = dict(added=0, updated=0, removed=0)
+        with self._lock:
+            self._flush()
+            unvisited = {directory for directory, in self._db.execute("SELECT DISTINCT dir FROM files")}
+
+        dirs = [self._root]
+        while dirs and not self._stopped:
+            path = dirs.pop()
+            key = os.path.relpath(path, self._root)
+            unvisited.discard(key)
+            try:
+                on_disk = self._list_dir(path)
+                with os.scandir(path) as entries:
+                    for entry in entries:
+                        if not entry.name.startswith(".") and entry.is_dir(follow_symlinks=False):
+                            dirs.append(entry.path)
+            except FileNotFoundError:
+                on_disk = dict()
+            with self._lock:
+                self._flush()
+                cataloged = {
+                    name: (size, ctime_ns, mtime_ns)
+                    for name, size, ctime_ns, mtime_ns in self._db.execute(
+                        "SELECT name, size, ctime_ns, mtime_ns FROM files WHERE dir = ?", (key,)
+                    )
+                }
+                puts = [
+                    (key, name, self._extension(name)) + values
+                    for name, values in on_disk.items()
+                    if cataloged.get(name) != values
+                ]
+                removes = [(key, name) for name in cataloged if name not in on_disk]
+                if puts or removes:
+                    self._db.execute("BEGIN")
+                    self._db.executemany("INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?, ?)", puts)
+                    self._db.executemany("DELETE FROM files WHERE dir = ? AND name = ?", removes)
+                    self._db.execute("COMMIT")
+            counts["added"] += sum(1 for put in puts if put[1] not in cataloged)
+            counts["updated"] += sum(1 for put in puts if put[1] in cataloged)
+            counts["removed"] += len(removes)
+
+        if not self._stopped:
+            with self._lock:
+                self._flush()
+                for key in unvisited:
+                    counts["removed"] += self._db.execute("DELETE FROM files WHERE dir = ?", (key,)).rowcount
+                self.reconciled_at = time.time()
+                self._db.execute("INSERT OR REPLACE INTO state VALUES ('reconciled_at', ?)", (self.reconciled_at,))
+
+        counts["seconds"] = time.monotonic() - started
+        self._logger.debug(f"Catalog reconciled: {counts}")
+        return counts
+
+    def _run(self) -> None:
+        next_reconcile = time.monotonic() + self._reconcile_interval if self._reconcile_interval > 0 else None
+        while not self._stopped:
+            if self._reconcile_requested:
+                self._reconcile_requested = False
+                try:
+                    self.reconcile()
+                except Exception as e:
+                    self._logger.error(f"Catalog reconciliation failed: {e}")
+            self._wakeup.wait(FLUSH_INTERVAL)
+            self._wakeup.clear()
+            if self._stopped:
+                return
+            self.flush()
+            if next_reconcile is not None and time.monotonic() >= next_reconcile:
+                self._reconcile_requested = True
+                next_reconcile = time.monotonic() + self._reconcile_interval
+
+    def stats(self) -> dict:
+        """Get catalog counters.
+
+        Returns:
+            Dict with keys: files (cataloged files), pending (changes not written yet),
+            reconciled_at (Unix time of the last reconciliation or None).
+        """
+
+        with self._lock:
+            files = self._db.execute("SELECT COUNT(*) FROM files").fetchone()[0]
+            return dict(files=files, pending=len(self._pending), reconciled_at=self.reconciled_at)
+
+    def close(self) -> None:
+        """Stop the background thread, write pending changes and mark the catalog as saved."""
+
+        self._stopped = True
+        self._wakeup.set()
+        self._thread.join()
+        with self._lock:
+            self._flush()
+            self._db.execute("INSERT OR REPLACE INTO state VALUES ('clean', 1)")
+            self._db.close()
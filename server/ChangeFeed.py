@@ -0,0 +1,354 @@
+"""Feed of file changes for subscribers watching directory trees.
+
+Imports:
+    collections
+    os
+    select
+    threading
+
+Provides class:
+    ChangeFeed
+"""
+
+import collections
+import logging
+import os
+import select
+import sys
+import threading
+import time
+import typing
+
+from .HashCache import is_reserved
+from .MetadataCache import _Inotify
+
+IN_ISDIR = 0x40000000
+# Changes seen by inotify are published after this delay in seconds, so that changes made by FileService
+# are published first and their inotify events are recognized, see ChangeFeed.publish().
+INOTIFY_DELAY = 0.2
+# Changes made by FileService are recognized in inotify events for this time in seconds.
+OWN_CHANGE_TTL = 5.0
+
+
+class Subscription:
+    """Bounded buffer of changes of a directory tree for one subscriber.
+
+    If the subscriber falls `capacity` events behind, buffered events are dropped and replaced with
+    a `reset` event, after which the subscriber should list the tree again.
+    """
+
+    def __init__(self, feed: "ChangeFeed", key: str, capacity: int):
+        self.key = key
+        self._feed = feed
+        self._capacity = capacity
+        self._events = collections.deque()
+        self._notify = None
+        self._notified = False
+        self.dropped = 0
+
+    def set_notify(self, notify: typing.Callable[[], None]) -> None:
+        """Set a function which is called from any thread when events arrive in an empty buffer.
+
+        Args:
+            notify (Callable): Function without arguments, it must not block.
+        """
+
+        with self._feed._lock:
+            self._notify = notify
+            self._notified = bool(self._events)
+        if self._notified:
+            notify()
+
+    def _put(self, event: dict) -> None:
+        """Add an event. Called with the feed lock held."""
+
+        if len(self._events) >= self._capacity:
+            self.dropped += len(self._events)
+            self._events.clear()
+            self._events.append(dict(id=event["id"] - 1, type="reset"))
+        self._events.append(event)
+        if not self._notified and self._notify is not None:
+            self._notified = True
+            self._notify()
+
+    def get(self) -> list:
+        """Take buffered events.
+
+        Returns:
+            List of events oldest first, see ChangeFeed.publish(). Empty if there are none.
+        """
+
+        with self._feed._lock:
+            events = list(self._events)
+            self._events.clear()
+            self._notified = False
+        return events
+
+    def close(self) -> None:
+        """Stop receiving events."""
+
+        self._feed._unsubscribe(self)
+
+
+class ChangeFeed:
+    """Publishes changes of files and directories to subscribers of directory trees.
+
+    Changes come from FileService, see publish(), and from inotify for changes made bypassing it. One inotify
+    watcher covers the whole data directory; it starts with the first subscriber. Every event is delivered
+    by appending it to buffers of subscribers of its directory and their ancestors, so the cost
+    of an event doesn't depend on the number of other subscribers.
+
+    Events are numbered. The last `history` events are kept, so a subscriber can resume after
+    the last event it got. Hidden files and directories aren't watched.
+    """
+
+    def __init__(self, root: str, history: int, capacity: int):
+        """
+        Args:
+            root (str): Data directory.
+            history (int): Number of last events kept for resuming.
+            capacity (int): Maximum number of events buffered for a subscriber.
+        """
+
+        self._logger = logging.getLogger(__name__)
+        self._root = os.path.abspath(root)
+        self._capacity = max(1, capacity)
+        self._lock = threading.Lock()
+        self._history = collections.deque(maxlen=max(1, history))
+        # IDs continue from the time of start, so IDs from a previous run are older.
+        self._last_id = time.time_ns() // 1000
+        # Directory relative to data directory -> its subscriptions.
+        self._subscribers = collections.defaultdict(set)
+        self._subscriptions = 0
+        # Absolute path -> time when FileService published its change.
+        self._own_changes = dict()
+        self.published = 0
+
+        self._inotify = None
+        self._inotify_failed = not sys.platform.startswith("linux")
+        # Watch descriptor -> absolute path of the watched directory and back.
+        self._watched = dict()
+        self._watches = dict()
+        self._stopped = False
+        self._thread = None
+
+    def _key(self, path: str) -> str:
+        return os.path.relpath(path, self._root)
+
+    def _event(self, change: str, path: str, is_dir: bool) -> dict:
+        """Make an event and deliver it to subscribers. Called with the lock held."""
+
+        self._last_id += 1
+        key = self._key(path)
+        event = dict(
+            id=self._last_id,
+            type=change,
+            path=os.path.join(".", key).replace(os.sep, "/"),
+            dir=is_dir,
+            time=time.time(),
+        )
+        self._history.append(event)
+        self.published += 1
+        if is_dir:
+            # Subscribers of a deleted or moved directory learn about it too.
+            for subscription in self._subscribers.get(key, ()):
+                subscription._put(event)
+        directory = os.path.dirname(key)
+        while True:
+            for subscription in self._subscribers.get(directory or ".", ()):
+                subscription._put(event)
+            if not directory:
+                break
+            directory = os.path.dirname(directory)
+        return event
+
+    def publish(self, change: str, path: str, is_dir: bool = False) -> None:
+        """Publish a change made by FileService.
+
+        Args:
+            change (str): create, modify or delete.
+            path (str): Absolute path to the changed file or directory.
+            is_dir (bool): The path is a directory.
+        """
+
+        if is_reserved(self._root, path):
+            return
+        now = time.monotonic()
+        with self._lock:
+            if self._inotify is not None:
+                self._own_changes[path] = now
+                if len(self._own_changes) > 2 * self._history.maxlen:
+                    self._own_changes = {
+                        key: when for key, when in self._own_changes.items() if now - when < OWN_CHANGE_TTL
+                    }
+            self._event(change, path, is_dir)
+
+    def subscribe(self, directory: str, after: typing.Optional[int] = None) -> Subscription:
+        """Subscribe to changes of a directory tree.
+
+        Args:
+            directory (str): Absolute path to the directory.
+            after (int): ID of the last event the subscriber got. Later kept events are buffered at once,
+                a `reset` event is buffered first if some of them aren't kept anymore.
+
+        Returns:
+            Subscription.
+        """
+
+        key = self._key(directory)
+        subscription = Subscription(self, key, self._capacity)
+        own_path = None if key == "." else os.path.join(".", key).replace(os.sep, "/")
+        prefix = "" if own_path is None else own_path + "/"
+        with self._lock:
+            if after is not None and after > self._last_id:
+                subscription._put(dict(id=self._last_id, type="reset"))
+            elif after is not None and after < self._last_id:
+                oldest = self._history[0]["id"] if self._history else self._last_id + 1
+                if after < oldest - 1:
+                    subscription._put(dict(id=after, type="reset"))
+                for event in self._history:
+                    if event["id"] <= after:
+                        continue
+                    # Like in _event(), subscribers of a deleted or moved directory learn about it too.
+                    if event["path"].startswith(prefix) or (event["dir"] and event["path"] == own_path):
+                        subscription._put(event)
+            self._subscribers[key].add(subscription)
+            self._subscriptions += 1
+        self._start_inotify()
+        return subscription
+
+    def _unsubscribe(self, subscription: Subscription) -> None:
+        with self._lock:
+            subscribers = self._subscribers.get(subscription.key)
+            if subscribers is not None and subscription in subscribers:
+                subscribers.discard(subscription)
+                self._subscriptions -= 1
+                if not subscribers:
+                    del self._subscribers[subscription.key]
+
+    def _start_inotify(self) -> None:
+        with self._lock:
+            if self._inotify is not None or self._inotify_failed:
+                return
+            try:
+                self._inotify = _Inotify()
+            except OSError as e:
+                self._inotify_failed = True
+                self._logger.warning(f"inotify is not available, only changes made by the server are published: {e}")
+                return
+            self._thread = threading.Thread(target=self._run, name="ChangeFeedWatcher", daemon=True)
+        self._watch_tree(self._root)
+        self._thread.start()
+
+    def _watch_tree(self, top: str) -> None:
+        """Watch a directory and its visible subdirectories."""
+
+        dirs = [top]
+        while dirs:
+            path = dirs.pop()
+            try:
+                wd = self._inotify.add_watch(path)
+            except OSError as e:
+                self._logger.warning(f"Can't watch {path}: {e}")
+                continue
+            self._watched[wd] = path
+            self._watches[path] = wd
+            try:
+                with os.scandir(path) as entries:
+                    for entry in entries:
+                        if not entry.name.startswith(".") and entry.is_dir(follow_symlinks=False):
+                            dirs.append(entry.path)
+            except OSError:
+                continue
+
+    def _unwatch_tree(self, top: str) -> None:
+        """Stop watching a directory tree which was moved away."""
+
+        prefix = os.path.join(top, "")
+        for path in [path for path in self._watches if path == top or path.startswith(prefix)]:
+            wd = self._watches.pop(path)
+            self._watched.pop(wd, None)
+            self._inotify.rm_watch(wd)
+
+    def _changes(self) -> typing.Iterator[typing.Tuple[str, str, bool]]:
+        """Turn pending inotify events into (change, path, is_dir) tuples."""
+
+        for wd, mask, name in self._inotify.read_events():
+            if mask & _Inotify.IN_Q_OVERFLOW:
+                yield "reset", self._root, True
+                continue
+            directory = self._watched.get(wd)
+            if mask & _Inotify.IN_IGNORED:
+                self._watched.pop(wd, None)
+                if directory is not None and self._watches.get(directory) == wd:
+                    del self._watches[directory]
+                continue
+            if directory is None or not name or name.startswith("."):
+                continue
+            path = os.path.join(directory, name)
+            is_dir = bool(mask & IN_ISDIR)
+            if mask & (_Inotify.IN_CREATE | _Inotify.IN_MOVED_TO):
+                if is_dir:
+                    self._watch_tree(path)
+                yield "create", path, is_dir
+            elif mask & (_Inotify.IN_DELETE | _Inotify.IN_MOVED_FROM):
+                if is_dir:
+                    self._unwatch_tree(path)
+                yield "delete", path, is_dir
+            elif mask & _Inotify.IN_CLOSE_WRITE:
+                yield "modify", path, is_dir
+
+    def _publish_external(self, change: str, path: str, is_dir: bool) -> None:
+        """Publish a change seen by inotify unless FileService published it."""
+
+        with self._lock:
+            if change == "reset":
+                self._logger.debug("inotify queue overflow, subscribers are reset")
+                self._last_id += 1
+                for subscriptions in self._subscribers.values():
+                    for subscription in subscriptions:
+                        subscription._put(dict(id=self._last_id, type="reset"))
+                return
+            # A write by FileService is seen as a rename of a hidden temporary file, a creation.
+            published_at = self._own_changes.get(path)
+            if published_at is not None and time.monotonic() - published_at < OWN_CHANGE_TTL:
+                return
+            self._event(change, path, is_dir)
+
+    def _run(self) -> None:
+        pending = collections.deque()
+        while not self._stopped:
+            timeout = INOTIFY_DELAY / 2 if pending else 1.0
+            readable, _, _ = select.select([self._inotify.fileno()], [], [], timeout)
+            if self._stopped:
+                return
+            now = time.monotonic()
+            if readable:
+                pending.extend((now, *change) for change in self._changes())
+            while pending and now - pending[0][0] >= INOTIFY_DELAY:
+                self._publish_external(*pending.popleft()[1:])
+
+    def stats(self) -> dict:
+        """Get feed counters.
+
+        Returns:
+            Dict with keys: subscribers, last_id (ID of the last event), published (events since start),
+            watched_dirs (directories watched by inotify).
+        """
+
+        with self._lock:
+            return dict(
+                subscribers=self._subscriptions,
+                last_id=self._last_id,
+                published=self.published,
+                watched_dirs=len(self._watches),
+            )
+
+    def close(self) -> None:
+        """Stop the inotify watcher."""
+
+        self._stopped = True
+        if self._thread is not None:
+            self._thread.join()
+        if self._inotify is not None:
+            self._inotify.close()
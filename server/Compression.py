@@ -0,0 +1,195 @@
+"""Compression of stored files.
+
+A compressed file starts with a header: magic bytes, codec id and size of the uncompressed content.
+The header is followed by a zlib or zstd stream. Content which starts with the magic bytes is never
+stored as is, see FileService._Upload, so the header can't be mistaken for content.
+
+Imports:
+    struct
+    zlib
+    zstandard (optional)
+
+Provides:
+    CODECS
+    CONTENT_ENCODINGS
+    HEADER
+    available_codecs()
+    compress()
+    decompress()
+    read_header()
+    Compressor
+    DecompressingReader
+"""
+
+import os
+import struct
+import typing
+import zlib
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover
+    zstandard = None
+
+MAGIC = b"\x89FSZ\r\n\x1a\n"
+HEADER = struct.Struct("<8sBQ")
+CODECS = {"zlib": 1, "zstd": 2}
+# HTTP content codings which match compressed streams.
+CONTENT_ENCODINGS = {"zlib": "deflate", "zstd": "zstd"}
+ZLIB_LEVEL = 6
+# Size of compressed data read from a file at once.
+READ_SIZE = 64 * 1024
+
+
+def available_codecs() -> list:
+    """Get names of codecs which can be used on this system."""
+
+    return [codec for codec in CODECS if codec != "zstd" or zstandard is not None]
+
+
+def _compressobj(codec: str):
+    if codec == "zstd":
+        return zstandard.ZstdCompressor().compressobj()
+    return zlib.compressobj(ZLIB_LEVEL)
+
+
+def _decompressobj(codec: str):
+    if codec == "zstd":
+        return zstandard.ZstdDecompressor().decompressobj()
+    return zlib.decompressobj()
+
+
+def pack_header(codec: str, size: int) -> bytes:
+    return HEADER.pack(MAGIC, CODECS[codec], size)
+
+
+def read_header(fd: int) -> typing.Optional[typing.Tuple[str, int]]:
+    """Read header of a compressed file.
+
+    Args:
+        fd (int): File descriptor.
+
+    Returns:
+        Codec name and uncompressed size or None if the file isn't compressed.
+    """
+
+    os.lseek(fd, 0, os.SEEK_SET)
+    data = os.read(fd, HEADER.size)
+    if len(data) < HEADER.size:
+        return None
+    magic, codec_id, size = HEADER.unpack(data)
+    if magic != MAGIC:
+        return None
+    for codec, known_id in CODECS.items():
+        if known_id == codec_id:
+            return codec, size
+    return None
+
+
+def compress(content: bytes, codec: str) -> bytes:
+    """Compress the whole content.
+
+    Returns:
+        Header and compressed stream.
+    """
+
+    compressor = _compressobj(codec)
+    return pack_header(codec, len(content)) + compressor.compress(content) + compressor.flush()
+
+
+def decompress(data: bytes) -> bytes:
+    """Decompress the whole content of a compressed file.
+
+    Args:
+        data (bytes): Header and compressed stream.
+
+    Returns:
+        Uncompressed content, at most of the size given in the header.
+    """
+
+    _, codec_id, size = HEADER.unpack_from(data)
+    codec = next(codec for codec, known_id in CODECS.items() if known_id == codec_id)
+    if codec == "zstd":
+        return zstandard.ZstdDecompressor().decompress(data[HEADER.size :], max_output_size=size)
+    return zlib.decompressobj().decompress(data[HEADER.size :], size)
+
+
+class Compressor:
+    """Streaming compressor which writes to a file.
+
+    The header is written on finish(), when the uncompressed size is known. The file is left open.
+    """
+
+    def __init__(self, file: typing.BinaryIO, codec: str):
+        self._file = file
+        self._codec = codec
+        self._compressor = _compressobj(codec)
+        self._size = 0
+        file.write(b"\0" * HEADER.size)
+
+    def write(self, data: bytes) -> int:
+        self._size += len(data)
+        self._file.write(self._compressor.compress(data))
+        return len(data)
+
+    def finish(self) -> None:
+        if self._compressor is None:
+            return
+        self._file.write(self._compressor.flush())
+        self._compressor = None
+        self._file.seek(0)
+        self._file.write(pack_header(self._codec, self._size))
+
+
+class DecompressingReader:
+    """Reads uncompressed content of a compressed file sequentially.
+
+    Starting from an offset requires decompression of everything before it. No more is decompressed
+    than is read, so a small stream which expands enormously doesn't fill memory.
+    """
+
+    def __init__(self, file: typing.BinaryIO, codec: str, offset: int = 0):
+        self._file = file
+        self._file.seek(HEADER.size)
+        if codec == "zstd":
+            self._decompressor = None
+            self._reader = zstandard.ZstdDecompressor().stream_reader(file, read_size=READ_SIZE, closefd=False)
+        else:
+            self._decompressor = _decompressobj(codec)
+            self._reader = None
+        self._buffer = bytearray()
+        self._eof = False
+        while offset > 0:
+            skipped = self.read(min(offset, 1024 * 1024))
+            if not skipped:
+                break
+            offset -= len(skipped)
+
+    def _decompress(self, size: int) -> bytes:
+        """Decompress at most size bytes. Returns empty bytes at the end of the stream."""
+
+        if self._reader is not None:
+            return self._reader.read(size)
+        while not self._decompressor.eof:
+            data = self._decompressor.unconsumed_tail or self._file.read(READ_SIZE)
+            if not data:
+                return self._decompressor.flush()
+            content = self._decompressor.decompress(data, size)
+            if content:
+                return content
+        return b""
+
+    def read(self, size: int) -> bytes:
+        while len(self._buffer) < size and not self._eof:
+            content = self._decompress(size - len(self._buffer))
+            if content:
+                self._buffer += content
+            else:
+                self._eof = True
+        data = bytes(self._buffer[:size])
+        # Deleting from the start of a bytearray doesn't move the rest.
+        del self._buffer[:size]
+        return data
+
+    def close(self) -> None:
+        self._file.close()
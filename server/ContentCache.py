@@ -0,0 +1,134 @@
+"""In-memory cache of file content.
+
+Imports:
+    collections
+    os
+    threading
+
+Provides class:
+    ContentCache
+"""
+
+import collections
+import os
+import threading
+import typing
+
+# Values larger than this part of the budget aren't cached, so that one file doesn't push out all others.
+MAX_VALUE_RATIO = 16
+
+
+class ContentCache:
+    """LRU cache of values made from file content, limited by their total size.
+
+    A value is stored with a validator of the file it was made from, e.g. inode, modification time and size.
+    A value is returned only while the validator matches, so files changed bypassing FileService
+    are never served stale.
+    """
+
+    def __init__(self, max_bytes: int):
+        """
+        Args:
+            max_bytes (int): Maximum total size of cached values.
+        """
+
+        self._max_bytes = max_bytes
+        self._max_value_bytes = max_bytes // MAX_VALUE_RATIO
+        # Path -> (validator, value), least recently used first.
+        self._values = collections.OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.bytes_served = 0
+
+    def _remove(self, path: str) -> None:
+        _, value = self._values.pop(path)
+        self._bytes -= len(value)
+
+    def get(self, path: str, validator: tuple) -> typing.Optional[bytes]:
+        """Get a cached value.
+
+        Args:
+            path (str): Absolute path to a file.
+            validator (tuple): Current validator of the file.
+
+        Returns:
+            Value or None if it isn't cached or the file has changed.
+        """
+
+        with self._lock:
+            cached = self._values.get(path)
+            if cached is None or cached[0] != validator:
+                if cached is not None:
+                    self._remove(path)
+                self.misses += 1
+                return None
+            self._values.move_to_end(path)
+            self.hits += 1
+            self.bytes_served += len(cached[1])
+            return cached[1]
+
+    def put(self, path: str, validator: tuple, value: bytes) -> None:
+        """Cache a value. Least recently used values are evicted to fit it into the budget.
+
+        Args:
+            path (str): Absolute path to a file.
+            validator (tuple): Validator of the file taken before the value was made.
+            value (bytes): Value.
+        """
+
+        if len(value) > self._max_value_bytes:
+            return
+        with self._lock:
+            if path in self._values:
+                self._remove(path)
+            self._values[path] = (validator, value)
+            self._bytes += len(value)
+            while self._bytes > self._max_bytes:
+                self._remove(next(iter(self._values)))
+                self.evictions += 1
+
+    def invalidate(self, path: str) -> None:
+        """Forget a value of a changed or deleted file.
+
+        Args:
+            path (str): Absolute path to a file.
+        """
+
+        with self._lock:
+            if path in self._values:
+                self._remove(path)
+
+    def invalidate_tree(self, path: str) -> None:
+        """Forget values of all files of a directory tree.
+
+        Args:
+            path (str): Absolute path to a directory.
+        """
+
+        prefix = os.path.join(path, "")
+        with self._lock:
+            for cached_path in [p for p in self._values if p.startswith(prefix)]:
+                self._remove(cached_path)
+
+    def stats(self) -> dict:
+        """Get cache counters.
+
+        Returns:
+            Dict with keys: entries, bytes, hits, misses, hit_ratio, evictions, bytes_served.
+        """
+
+        with self._lock:
+            requests = self.hits + self.misses
+            return dict(
+                entries=len(self._values),
+                bytes=self._bytes,
+                hits=self.hits,
+                misses=self.misses,
+                hit_ratio=self.hits / requests if requests else 0.0,
+                evictions=self.evictions,
+                bytes_served=self.bytes_served,
+            )
@@ -0,0 +1,169 @@
+"""Durability of written files.
+
+Imports:
+    ctypes
+    os
+    threading
+
+Provides:
+    MODES
+    Durability
+"""
+
+import ctypes
+import ctypes.util
+import logging
+import os
+import sys
+import threading
+import time
+import typing
+
+MODES = ("none", "fsync", "group")
+
+
+def _load_syncfs() -> typing.Optional[typing.Callable[[int], int]]:
+    """Get syncfs() of libc on Linux."""
+
+    if not sys.platform.startswith("linux"):
+        return None
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        return libc.syncfs
+    except (OSError, AttributeError):
+        return None
+
+
+class _Batch:
+    """File descriptors flushed together."""
+
+    def __init__(self):
+        self.fds = list()
+        self.done = threading.Event()
+        self.error = None
+
+
+class _GroupCommit:
+    """Flushes files of concurrent writers together.
+
+    The first writer which asks for a flush becomes the leader of a batch. It waits for the window
+    to let other writers join, then flushes the whole batch with one syncfs() call where it's available
+    or with fsync() of every file otherwise. Other writers wait until their batch is flushed.
+    """
+
+    def __init__(self, window: float):
+        self._window = window
+        self._lock = threading.Lock()
+        self._batch = None
+        self._syncfs = _load_syncfs()
+
+        self.batches = 0
+
+    def _flush(self, fds: list) -> None:
+        devices = {os.fstat(fd).st_dev for fd in fds}
+        if self._syncfs is not None and len(devices) == 1:
+            if self._syncfs(fds[0]) != 0:
+                errno = ctypes.get_errno()
+                raise OSError(errno, os.strerror(errno))
+            return
+        for fd in fds:
+            os.fsync(fd)
+
+    def sync(self, fd: int) -> None:
+        with self._lock:
+            batch = self._batch
+            is_leader = batch is None
+            if is_leader:
+                batch = self._batch = _Batch()
+            batch.fds.append(fd)
+
+        if is_leader:
+            time.sleep(self._window)
+            with self._lock:
+                self._batch = None
+                self.batches += 1
+            try:
+                self._flush(batch.fds)
+            except OSError as e:
+                batch.error = e
+            finally:
+                batch.done.set()
+        else:
+            batch.done.wait()
+
+        if batch.error is not None:
+            raise batch.error
+
+
+class Durability:
+    """Makes written files durable according to the configured mode.
+
+    Modes:
+        none - data is left in the page cache, a crash may lose recent writes.
+        fsync - every file and its directory are flushed before a write is reported as done.
+        group - like fsync, but flushes of concurrent writes are batched, see _GroupCommit.
+    """
+
+    def __init__(self, mode: str, window: float):
+        """
+        Args:
+            mode (str): One of MODES.
+            window (float): Time in seconds a group commit waits for other writers.
+
+        Raises:
+            ValueError: if mode is unknown.
+        """
+
+        if mode not in MODES:
+            raise ValueError(f"Unknown durability mode: {mode}")
+        self._logger = logging.getLogger(__name__)
+        self.mode = mode
+        self._group = _GroupCommit(window) if mode == "group" else None
+        self._lock = threading.Lock()
+        self.syncs = 0
+
+    def _sync(self, fd: int) -> None:
+        with self._lock:
+            self.syncs += 1
+        if self._group is not None:
+            self._group.sync(fd)
+        else:
+            os.fsync(fd)
+
+    def sync_file(self, fd: int) -> None:
+        """Flush content of a file to disk.
+
+        Args:
+            fd (int): File descriptor of the file.
+        """
+
+        if self.mode != "none":
+            self._sync(fd)
+
+    def sync_dir(self, path: str) -> None:
+        """Flush a directory to disk, so that files renamed into it survive a crash.
+
+        Args:
+            path (str): Path to the directory.
+        """
+
+        if self.mode == "none" or os.name == "nt":
+            # Directories can't be opened on Windows, renames are flushed by NTFS journal.
+            return
+        fd = os.open(path, os.O_RDONLY)
+        try:
+            self._sync(fd)
+        finally:
+            os.close(fd)
+
+    def stats(self) -> dict:
+        """Get flush counters.
+
+        Returns:
+            Dict with keys: mode, syncs, batches (group mode only).
+        """
+
+        result = dict(mode=self.mode, syncs=self.syncs)
+        if self._group is not None:
+            result["batches"] = self._group.batches
+        return result
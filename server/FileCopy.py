@@ -0,0 +1,80 @@
+"""Copying file content inside the kernel.
+
+Imports:
+    fcntl
+    os
+
+Provides function:
+    copy_data()
+"""
+
+import errno
+import os
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+# ioctl which makes a file share the extents of another one, e.g. on Btrfs and XFS.
+FICLONE = 0x40049409
+# Errors of copy methods which aren't supported for the given files.
+UNSUPPORTED_ERRNOS = {errno.EXDEV, errno.ENOSYS, errno.EINVAL, errno.EOPNOTSUPP, errno.ENOTTY, errno.EBADF}
+# Chunk size of the userspace fallback.
+COPY_CHUNK_SIZE = 1024 * 1024
+
+
+def copy_data(src_fd: int, dst_fd: int, size: int) -> str:
+    """Copy content of a file to an empty file.
+
+    A reflink clone is tried first, no data is copied then. Otherwise content is copied with
+    os.copy_file_range(), which doesn't pass data through userspace and may clone it too.
+    Content is read and written only if neither is supported.
+
+    Args:
+        src_fd (int): Descriptor of the source file.
+        dst_fd (int): Descriptor of the destination file opened for writing.
+        size (int): Size of the source file.
+
+    Returns:
+        Method used: "reflink", "copy_file_range" or "read_write".
+    """
+
+    if fcntl is not None and size:
+        try:
+            fcntl.ioctl(dst_fd, FICLONE, src_fd)
+            return "reflink"
+        except OSError as e:
+            if e.errno not in UNSUPPORTED_ERRNOS:
+                raise
+
+    method = "copy_file_range"
+    offset = 0
+    if hasattr(os, "copy_file_range"):
+        try:
+            while offset < size:
+                copied = os.copy_file_range(src_fd, dst_fd, size - offset, offset, offset)
+                if not copied:
+                    break
+                offset += copied
+        except OSError as e:
+            if e.errno not in UNSUPPORTED_ERRNOS:
+                raise
+    if offset < size:
+        method = "read_write"
+        os.lseek(dst_fd, offset, os.SEEK_SET)
+        if not hasattr(os, "pread"):
+            # No positional reads on Windows.
+            os.lseek(src_fd, offset, os.SEEK_SET)
+        while offset < size:
+            if hasattr(os, "pread"):
+                data = os.pread(src_fd, min(COPY_CHUNK_SIZE, size - offset), offset)
+            else:
+                data = os.read(src_fd, min(COPY_CHUNK_SIZE, size - offset))
+            if not data:
+                break
+            view = memoryview(data)
+            while view:
+                view = view[os.write(dst_fd, view) :]
+            offset += len(data)
+    return method
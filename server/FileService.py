@@ -2,139 +2,934 @@
 
 Imports:
     datetime
-    glob
-    errno
+    functools
     os
 
 Provides functions:
     change_dir()
     get_files()
+    get_files_page()
+    walk_dir()
+    query_files()
+    search_files()
+    subscribe_changes()
     get_file_data()
+    get_encoded_file_data()
+    get_file_path()
+    get_file_hash()
+    read_file_range()
+    open_reader()
+    is_packed()
+    get_stored_format()
     create_file()
+    open_upload()
+    finish_upload()
+    abort_upload()
+    open_upload_session()
+    get_upload_session()
+    open_upload_chunk()
+    finish_upload_chunk()
+    abort_upload_chunk()
+    commit_upload_session()
+    abort_upload_session()
+    copy_file()
+    move_file()
+    copy_dir()
+    move_dir()
     delete_file()
+    close_services()
 """
 
-import errno
-import glob
+import atexit
+import base64
+import collections
+import contextlib
+import fnmatch
+import functools
+import hashlib
+import heapq
+import json
 import logging
 import logging.config
+import mmap
 import os
-import shutil
+import re
+import stat
+import tempfile
+import threading
+import typing
+import weakref
+from concurrent import futures
 from datetime import datetime
 
 from config import ServerConfig
 
+from . import Compression
+from .BlobStore import BlobStore
+from .Catalog import SORT_COLUMNS, Catalog
+from .ChangeFeed import ChangeFeed
+from .ContentCache import ContentCache
+from .Durability import Durability
+from .FileCopy import copy_data
+from .HashCache import META_DIR, READ_CHUNK_SIZE, HashCache, is_reserved
+from .MetadataCache import MetadataCache
+from .PackStore import PackStore
+from .SearchIndex import SearchIndex
+from .Trash import Trash
+from .UploadSessions import UploadSessions
+from .Usage import UsageTracker
+
+# Present if compression was ever enabled, so files may have to be decompressed.
+COMPRESSED_MARKER = "compressed"
+# Codec of content which would be taken for a compressed file if it was stored as is, see _Upload.
+ESCAPE_CODEC = "zlib"
+# Number of files whose storage format is remembered.
+FORMATS_CACHE_SIZE = 100000
+# Number of validated pathnames and directories remembered.
+PATHS_CACHE_SIZE = 10000
+# Limits of Linux filesystems, in bytes.
+NAME_MAX = 255
+PATH_MAX = 4096
+WINDOWS_RESERVED_CHARS = set('<>:"|?*')
+# Session of clients which don't identify themselves.
+DEFAULT_SESSION = ""
+# Number of sessions whose working directories are remembered.
+MAX_SESSIONS = 10000
+
+# Services which aren't closed yet, see close_services().
+_open_services = weakref.WeakSet()
+
+
+@atexit.register
+def close_services() -> None:
+    """Close services which are still open, so that their background threads stop before the interpreter does."""
+
+    for service in list(_open_services):
+        service.close()
+
+
+@functools.lru_cache(maxsize=PATHS_CACHE_SIZE)
+def _check_pathname(pathname: str) -> bool:
+    """Check a pathname as a string: no parent directory references, no drive or stream separators,
+    no NUL characters and no names longer than the filesystem allows.
+    """
+
+    if not pathname.strip() or "\0" in pathname:
+        return False
+    try:
+        if len(os.fsencode(pathname)) > PATH_MAX:
+            return False
+        # Strip this pathname's Windows-specific drive specifier (e.g., `C:\`) if any.
+        _, pathname = os.path.splitdrive(pathname)
+        separators = os.path.sep + (os.path.altsep or "")
+        for pathname_part in re.split(f"[{re.escape(separators)}]", pathname):
+            if pathname_part == ".." or ":" in pathname_part:
+                return False
+            if len(os.fsencode(pathname_part)) > NAME_MAX:
+                return False
+            if os.name == "nt" and any(c in WINDOWS_RESERVED_CHARS or ord(c) < 32 for c in pathname_part):
+                return False
+    except UnicodeError:
+        # Lone surrogates can't be passed to the OS.
+        return False
+    return True
+
+
+class _Upload:
+    """Temporary file of a chunked upload. Computes SHA-256 of the content and compresses it if needed.
+
+    Content which starts with Compression.MAGIC is compressed even without a codec, so that a plain file
+    is never taken for a compressed one.
+    """
+
+    def __init__(
+        self,
+        file: typing.BinaryIO,
+        codec: typing.Optional[str] = None,
+        size: int = 0,
+        digest: typing.Optional[str] = None,
+    ):
+        """
+        Args:
+            file (BinaryIO): Temporary file.
+            codec (str): Compression codec or None.
+            size (int): Size of content which is already in the file.
+            digest (str): SHA-256 hex digest of content which is already in the file. Nothing is written then.
+        """
+
+        self._file = file
+        # Without a codec the writer is chosen once the start of the content is known.
+        self._writer = Compression.Compressor(file, codec) if codec is not None else None
+        self._head = b""
+        self._hasher = hashlib.sha256()
+        self._digest = digest
+        self.name = file.name
+        # Size of uncompressed content.
+        self.size = size
+
+    @property
+    def compressed(self) -> bool:
+        """Content written to the file is compressed."""
+
+        return isinstance(self._writer, Compression.Compressor)
+
+    def write(self, data: bytes) -> int:
+        self._hasher.update(data)
+        self.size += len(data)
+        if self._writer is None:
+            self._head += data
+            if len(self._head) < len(Compression.MAGIC):
+                return len(data)
+            if self._head.startswith(Compression.MAGIC):
+                self._writer = Compression.Compressor(self._file, ESCAPE_CODEC)
+            else:
+                self._writer = self._file
+            self._writer.write(self._head)
+            self._head = b""
+            return len(data)
+        self._writer.write(data)
+        return len(data)
+
+    def close(self, sync: typing.Optional[typing.Callable[[int], None]] = None) -> None:
+        """Finish writing and close the file.
+
+        Args:
+            sync (Callable): Function called with the file descriptor before the file is closed.
+        """
+
+        if self._file.closed:
+            return
+        if self._writer is None:
+            # Content shorter than the magic bytes.
+            self._file.write(self._head)
+            self._writer = self._file
+        if self._writer is not self._file:
+            self._writer.finish()
+        self._file.flush()
+        if sync is not None:
+            sync(self._file.fileno())
+        self._file.close()
+
+    def hexdigest(self) -> str:
+        return self._digest if self._digest is not None else self._hasher.hexdigest()
+
+
+class _FileReader:
+    """Sequential reader of a file starting at an offset. Uses positional reads where possible."""
+
+    def __init__(self, file: typing.BinaryIO, offset: int):
+        self._file = file
+        self._offset = offset
+
+    def read(self, size: int) -> bytes:
+        if hasattr(os, "pread"):
+            data = os.pread(self._file.fileno(), size, self._offset)
+        else:
+            # No positional reads on Windows.
+            self._file.seek(self._offset)
+            data = self._file.read(size)
+        self._offset += len(data)
+        return data
+
+    def close(self) -> None:
+        self._file.close()
+
+
+class _ListedFile:
+    """os.DirEntry-like view of a file from a cached directory listing."""
+
+    __slots__ = ("name", "_stat_result")
+
+    def __init__(self, name: str, stat_result: os.stat_result):
+        self.name = name
+        self._stat_result = stat_result
+
+    def is_file(self, follow_symlinks: bool = True) -> bool:
+        return True
+
+    def stat(self, follow_symlinks: bool = True) -> os.stat_result:
+        return self._stat_result
+
 
 class FileService:
     """File service class"""
 
+    SORT_KEYS = ("name", "size", "edit_date")
+
     def __init__(self):
         self._logger = logging.getLogger(__name__)
         self._config = ServerConfig().config
 
+        self._cache = None
+        if int(self._config["fs_cache_entries"]) > 0:
+            self._cache = MetadataCache(int(self._config["fs_cache_entries"]), int(self._config["fs_cache_bytes"]))
+
+        self._durability = Durability(
+            str(self._config["durability"]).strip().lower(), float(self._config["group_commit_ms"]) / 1000
+        )
+
+        self._blobs = None
+        if ServerConfig.to_bool(self._config["dedup"]):
+            self._blobs = BlobStore(self._config["data_directory"], sync_dir=self._durability.sync_dir)
+
+        self._hashes = HashCache(self._config["data_directory"])
+
+        # Files of at least this size are memory-mapped by get_file_data(), 0 disables mapping.
+        self._mmap_threshold = int(self._config["mmap_threshold"])
+
+        self._contents = None
+        if int(self._config["content_cache_bytes"]) > 0:
+            self._contents = ContentCache(int(self._config["content_cache_bytes"]))
+
+        # Files up to this size are kept in packs, see PackStore.
+        self._pack_threshold = int(self._config["pack_threshold"])
+        self._packs = None
+        if self._pack_threshold > 0:
+            self._packs = PackStore(
+                self._config["data_directory"],
+                sync_file=self._durability.sync_file if self._durability.mode != "none" else None,
+            )
+
+        self._usage = UsageTracker(
+            self._config["data_directory"], extra_usage=self._packs.usage if self._packs is not None else None
+        )
+
+        self._changes = ChangeFeed(
+            self._config["data_directory"],
+            int(self._config["change_feed_history"]),
+            int(self._config["change_feed_buffer"]),
+        )
+
+        self._uploads = UploadSessions(
+            self._config["data_directory"],
+            float(self._config["upload_session_ttl"]),
+            sync_file=self._durability.sync_file if self._durability.mode != "none" else None,
+        )
+
+        self._trash = Trash(
+            self._config["data_directory"],
+            int(self._config["trash_purge_rate"]),
+            int(self._config["trash_workers"]),
+            on_purged=self._blobs.collect_garbage if self._blobs is not None else None,
+        )
+
+        self._codec = None
+        codec = str(self._config["compression"]).strip().lower()
+        if codec not in ("none", "false", "no", "off", "0", ""):
+            if codec not in Compression.CODECS:
+                raise ValueError(f"Unknown compression: {codec}")
+            if codec not in Compression.available_codecs():
+                self._logger.warning(f"{codec} is not available, zlib is used")
+                codec = "zlib"
+            self._codec = codec
+
+        # Files written while compression was enabled stay compressed after it's disabled.
+        self._may_be_compressed = os.path.exists(
+            os.path.join(self._config["data_directory"], META_DIR, COMPRESSED_MARKER)
+        )
+        if self._codec is not None:
+            self._mark_compressed()
+        # (st_dev, st_ino) -> (st_size, st_mtime_ns, codec and uncompressed size or None).
+        self._formats = collections.OrderedDict()
+        self._formats_lock = threading.Lock()
+
+        # Session ID -> absolute path to its working directory, least recently used first.
+        self._work_dirs = collections.OrderedDict()
+        # Absolute paths to directories known not to be symlinks, see _confine().
+        self._safe_dirs = collections.OrderedDict()
+        self._sessions_lock = threading.Lock()
+
+        # Created last, the catalog and the index run in background and read compressed files.
+        self._catalog = None
+        if ServerConfig.to_bool(self._config["catalog"]):
+            self._catalog = Catalog(
+                self._config["data_directory"],
+                self._list_catalog_dir,
+                float(self._config["catalog_reconcile_interval"]),
+            )
+
+        self._search = None
+        if ServerConfig.to_bool(self._config["search_index"]):
+            self._search = SearchIndex(
+                self._config["data_directory"],
+                self._read_for_index,
+                self._list_catalog_dir,
+                int(self._config["search_workers"]),
+                int(self._config["search_index_rate"]),
+            )
+        _open_services.add(self)
+
+    def close(self) -> None:
+        """Release resources held by the service. Closing it again does nothing."""
+
+        if self not in _open_services:
+            return
+        _open_services.discard(self)
+        self._trash.close()
+        self._changes.close()
+        if self._search is not None:
+            self._search.close()
+        if self._catalog is not None:
+            self._catalog.close()
+        self._uploads.close()
+        self._usage.close()
+        if self._packs is not None:
+            self._packs.close()
+        if self._cache is not None:
+            self._cache.close()
+        self._hashes.close()
+
+    def cache_stats(self) -> dict:
+        """Get metadata cache counters.
+
+        Returns:
+            See MetadataCache.stats(). Empty dict if the cache is disabled.
+        """
+
+        return self._cache.stats() if self._cache is not None else dict()
+
+    def durability_stats(self) -> dict:
+        """Get flush counters.
+
+        Returns:
+            See Durability.stats().
+        """
+
+        return self._durability.stats()
+
+    def trash_stats(self) -> dict:
+        """Get counters of background deletion.
+
+        Returns:
+            See Trash.stats().
+        """
+
+        return self._trash.stats()
+
+    def pack_stats(self) -> dict:
+        """Get pack storage counters.
+
+        Returns:
+            See PackStore.stats(). Empty dict if packs are disabled.
+        """
+
+        return self._packs.stats() if self._packs is not None else dict()
+
+    def upload_stats(self) -> dict:
+        """Get counters of upload sessions.
+
+        Returns:
+            See UploadSessions.stats().
+        """
+
+        return self._uploads.stats()
+
+    def content_cache_stats(self) -> dict:
+        """Get content cache counters.
+
+        Returns:
+            See ContentCache.stats(). Empty dict if the cache is disabled.
+        """
+
+        return self._contents.stats() if self._contents is not None else dict()
+
+    def catalog_stats(self) -> dict:
+        """Get file catalog counters.
+
+        Returns:
+            Dict, see Catalog.stats(). Empty if the catalog is disabled.
+        """
+
+        return self._catalog.stats() if self._catalog is not None else dict()
+
+    def change_feed_stats(self) -> dict:
+        """Get change feed counters.
+
+        Returns:
+            Dict, see ChangeFeed.stats().
+        """
+
+        return self._changes.stats()
+
+    def search_stats(self) -> dict:
+        """Get full-text index counters.
+
+        Returns:
+            Dict, see SearchIndex.stats(). Empty if the index is disabled.
+        """
+
+        return self._search.stats() if self._search is not None else dict()
+
+    def foreground(self) -> typing.ContextManager:
+        """Get a context manager which marks a foreground operation, background indexing waits for it to finish.
+
+        Returns:
+            Context manager.
+        """
+
+        return self._search.foreground() if self._search is not None else contextlib.nullcontext()
+
+    def reconcile_catalog(self) -> dict:
+        """Bring the file catalog in line with files on disk, see Catalog.reconcile().
+
+        Returns:
+            Dict with keys: added, updated, removed (numbers of files), seconds (duration).
+
+        Raises:
+            RuntimeError: if the catalog is disabled.
+        """
+
+        if self._catalog is None:
+            raise RuntimeError("File catalog is disabled")
+        return self._catalog.reconcile()
+
+    def _usage_dir(self, path: str) -> str:
+        """Get absolute path to an existing directory relative to data directory."""
+
+        if not self.is_pathname_valid(path):
+            raise ValueError(f"Bad path: {path}")
+        directory = self._confine(os.path.abspath(self._config["data_directory"]), path, is_dir=True)
+        if not os.path.isdir(directory):
+            raise RuntimeError(f"Directory does not exist: {path}")
+        return directory
+
+    def get_usage(self, path: str = ".") -> dict:
+        """Get size and number of files of a directory tree.
+
+        Args:
+            path (str): Path to a directory relative to data directory.
+
+        Returns:
+            Dict with keys:
+            - bytes (int): total size of stored files
+            - files (int): number of files
+            - max_bytes (int): size quota, None if not set
+            - max_files (int): number of files quota, None if not set
+
+        Raises:
+            RuntimeError: if directory does not exist.
+            ValueError: if path is invalid.
+        """
+
+        return self._usage.get(self._usage_dir(path))
+
+    def set_quota(
+        self, path: str = ".", max_bytes: typing.Optional[int] = None, max_files: typing.Optional[int] = None
+    ) -> dict:
+        """Limit size and number of files of a directory tree.
+
+        Writes which would exceed the quota of a directory or any directory above it fail with EDQUOT.
+
+        Args:
+            path (str): Path to a directory relative to data directory.
+            max_bytes (int): Maximum total size of stored files, no limit if None.
+            max_files (int): Maximum number of files, no limit if None.
+
+        Returns:
+            See get_usage().
+
+        Raises:
+            RuntimeError: if directory does not exist.
+            ValueError: if path or a limit is invalid.
+        """
+
+        for limit in (max_bytes, max_files):
+            if limit is not None and (not isinstance(limit, int) or limit < 0):
+                raise ValueError(f"Bad quota: {limit}")
+        directory = self._usage_dir(path)
+        self._usage.set_quota(directory, max_bytes, max_files)
+        return self._usage.get(directory)
+
+    def reconcile_usage(self) -> dict:
+        """Recount disk usage from files on disk, see UsageTracker.reconcile().
+
+        Returns:
+            Usage of data directory, see get_usage().
+        """
+
+        return self._usage.reconcile()
+
     @staticmethod
     def is_pathname_valid(pathname: str) -> bool:
         """
         Check if pathname is valid.
 
+        The check doesn't touch the filesystem. Results are cached, see _check_pathname().
+
         Return:
             True - if the passed pathname is a valid pathname for the current OS;
             False - otherwise.
+        """
+        if not isinstance(pathname, str):
+            return False
+        return _check_pathname(pathname)
 
-        Borrowed here: https://stackoverflow.com/questions/9532499/check-whether-a-path-is-valid-in-python-without-creating-a-file-at-the-paths-ta
-        And slightly modified.
+    def _make_path_relative(self, path: str) -> str:
+        return path.replace(str(self._config["data_directory"]), ".")
+    
+    def _stored_format(self, filename: str, stat_result: os.stat_result) -> typing.Optional[typing.Tuple[str, int]]:
+        """Get codec and uncompressed size of a compressed file.
+
+        The header of the file is read once and remembered while the file doesn't change.
+
+        Args:
+            filename (str): file name
+            stat_result (stat_result): result of os.stat() for the file
+
+        Returns:
+            Codec name and uncompressed size or None if the file isn't compressed.
         """
-        # Windows-specific error code indicating an invalid pathname.
-        ERROR_INVALID_NAME = 123
 
-        # If this pathname is either not a string or is but is empty, this pathname is invalid.
+        if not self._may_be_compressed or stat_result.st_size < Compression.HEADER.size:
+            return None
+
+        key = (stat_result.st_dev, stat_result.st_ino)
+        with self._formats_lock:
+            known = self._formats.get(key)
+            if known is not None and known[:2] == (stat_result.st_size, stat_result.st_mtime_ns):
+                self._formats.move_to_end(key)
+                return known[2]
+
         try:
-            if not isinstance(pathname, str) or not pathname.strip():
-                return False
+            fd = os.open(filename, os.O_RDONLY)
+        except OSError:
+            # The file is gone, it's reported as it was stat'ed.
+            return None
+        try:
+            stored_format = Compression.read_header(fd)
+        finally:
+            os.close(fd)
 
-            # Strip this pathname's Windows-specific drive specifier (e.g., `C:\`) if any.
-            _, pathname = os.path.splitdrive(pathname)
+        with self._formats_lock:
+            self._formats[key] = (stat_result.st_size, stat_result.st_mtime_ns, stored_format)
+            if len(self._formats) > FORMATS_CACHE_SIZE:
+                self._formats.popitem(last=False)
+        return stored_format
 
-            # Directory guaranteed to exist.
-            root_dirname = os.path.dirname(__file__)
+    def _mark_compressed(self) -> None:
+        """Remember that files may be compressed, so that their headers are checked, see _stored_format()."""
 
-            # Test whether each path component split from this pathname is valid or
-            # not, ignoring non-existent and non-readable path components.
-            for pathname_part in pathname.split(os.path.sep):
-                if pathname_part == ".." or ":" in pathname_part:
-                    return False
-                try:
-                    os.lstat(root_dirname + pathname_part)
-                # If an OS-specific exception is raised, its error code
-                # indicates whether this pathname is valid or not. Unless this
-                # is the case, this exception implies an ignorable kernel or
-                # filesystem complaint (e.g., path not found or inaccessible).
-                #
-                # Only the following exceptions indicate invalid pathnames:
-                #
-                # * Instances of the Windows-specific "WindowsError" class
-                #   defining the "winerror" attribute whose value is
-                #   "ERROR_INVALID_NAME". Under Windows, "winerror" is more
-                #   fine-grained and hence useful than the generic "errno"
-                #   attribute. When a too-long pathname is passed, for example,
-                #   "errno" is "ENOENT" (i.e., no such file or directory) rather
-                #   than "ENAMETOOLONG" (i.e., file name too long).
-                # * Instances of the cross-platform "OSError" class defining the
-                #   generic "errno" attribute whose value is either:
-                #   * Under most POSIX-compatible OSes, "ENAMETOOLONG".
-                #   * Under some edge-case OSes (e.g., SunOS, *BSD), "ERANGE".
-                except OSError as exc:
-                    if hasattr(exc, "winerror"):
-                        if exc.winerror == ERROR_INVALID_NAME:
-                            return False
-                    elif exc.errno in {errno.ENAMETOOLONG, errno.ERANGE}:
-                        return False
-        # If a "TypeError" exception was raised, it almost certainly has the
-        # error message "embedded NUL character" indicating an invalid pathname.
-        except TypeError as exc:
-            return False
-        # If no exception was raised, all path components and hence this
-        # pathname itself are valid.
-        else:
-            return True
-        # If any other exception was raised, this is an unrelated fatal issue
-        # (e.g., a bug). Permit this exception to unwind the call stack.
+        if self._may_be_compressed:
+            return
+        marker = os.path.join(self._config["data_directory"], META_DIR, COMPRESSED_MARKER)
+        os.makedirs(os.path.dirname(marker), exist_ok=True)
+        open(marker, "wb").close()
+        self._may_be_compressed = True
 
-    def _make_path_relative(self, path: str) -> str:
-        return path.replace(str(self._config["data_directory"]), ".")
-    
-    def get_file_metadata(self, filename: str):
-        """Get file metadata.
+    def _size(self, filename: str, stat_result: os.stat_result) -> int:
+        """Get uncompressed size of a file."""
+
+        stored_format = self._stored_format(filename, stat_result)
+        return stored_format[1] if stored_format is not None else stat_result.st_size
+
+    def _metadata_from_stat(self, name: str, filename: str, stat_result: os.stat_result) -> dict:
+        """Make file metadata from a stat result.
 
         Args:
+            name (str): file name to report
             filename (str): file name
+            stat_result (stat_result): result of os.stat() for the file
         """
         file_meta = dict(
-            name=self._make_path_relative(filename),
-            create_date=datetime.fromtimestamp(os.path.getctime(filename)),
-            edit_date=datetime.fromtimestamp(os.path.getmtime(filename)),
-            size=os.path.getsize(filename),
+            name=name,
+            create_date=datetime.fromtimestamp(stat_result.st_ctime),
+            edit_date=datetime.fromtimestamp(stat_result.st_mtime),
+            size=self._size(filename, stat_result),
         )
         return file_meta
 
-    def current_dir(self) -> str:
-        """Get current directory of app.
+    def _stat(self, filename: str) -> os.stat_result:
+        """Get stat result of a file. Uses metadata cache if enabled."""
+
+        if self._cache is not None:
+            stat_result = self._cache.get_file(*os.path.split(os.path.abspath(filename)))
+            if stat_result is not None:
+                return stat_result
+        try:
+            return os.lstat(filename)
+        except FileNotFoundError:
+            record = self._packs.get(filename) if self._packs is not None else None
+            if record is None:
+                raise
+            return record.stat()
+
+    def _file_changed(
+        self,
+        filename: str,
+        digest: typing.Optional[str],
+        stat_result: typing.Optional[os.stat_result] = None,
+        created: bool = False,
+    ) -> None:
+        """Update metadata and hash caches after a file was written.
+
+        Args:
+            filename (str): file name
+            digest (str): SHA-256 hex digest of the file content, None if it's already cached, e.g. after a rename
+            stat_result (stat_result): stat result of a packed file, its hash is kept in the pack index
+            created (bool): the file didn't exist before
+        """
+
+        if stat_result is None:
+            stat_result = os.stat(filename)
+            if digest is not None:
+                self._hashes.put(stat_result, digest)
+        if self._cache is not None:
+            path, name = os.path.split(os.path.abspath(filename))
+            self._cache.update_file(path, name, stat_result)
+        if self._contents is not None:
+            self._contents.invalidate(os.path.abspath(filename))
+        if self._catalog is not None:
+            self._catalog.put(
+                os.path.abspath(filename),
+                self._size(filename, stat_result),
+                stat_result.st_ctime_ns,
+                stat_result.st_mtime_ns,
+            )
+        if self._search is not None:
+            self._search.add(os.path.abspath(filename))
+        self._changes.publish("create" if created else "modify", os.path.abspath(filename))
+
+    def _file_removed(self, filename: str) -> None:
+        """Update caches, the catalog and the search index and publish a change after a file was deleted."""
+
+        if self._cache is not None:
+            self._cache.remove_file(*os.path.split(os.path.abspath(filename)))
+        if self._contents is not None:
+            self._contents.invalidate(os.path.abspath(filename))
+        if self._catalog is not None:
+            self._catalog.remove(os.path.abspath(filename))
+        if self._search is not None:
+            self._search.remove(os.path.abspath(filename))
+        self._changes.publish("delete", os.path.abspath(filename))
+
+    def _list_catalog_dir(self, path: str) -> dict:
+        """Get files of a directory for the catalog and the search index, see Catalog.
+
+        The metadata cache isn't used, reconciliation would fill it with the whole tree.
+
+        Args:
+            path (str): Absolute path to a directory.
+
+        Returns:
+            Dict of file names and tuples of size, st_ctime_ns and st_mtime_ns.
+        """
+
+        files = dict()
+        with os.scandir(path) as entries:
+            for entry in entries:
+                if entry.name.startswith(".") or not entry.is_file(follow_symlinks=False):
+                    continue
+                stat_result = entry.stat(follow_symlinks=False)
+                files[entry.name] = (
+                    self._size(entry.path, stat_result),
+                    stat_result.st_ctime_ns,
+                    stat_result.st_mtime_ns,
+                )
+        if self._packs is not None:
+            for name, stat_result in self._packs.list_dir(path).items():
+                files[name] = (stat_result.st_size, stat_result.st_ctime_ns, stat_result.st_mtime_ns)
+        return files
+
+    def _read_for_index(self, path: str, max_bytes: int) -> typing.Optional[typing.Tuple[int, int, bytes]]:
+        """Read the start of a file for the search index, see SearchIndex.
+
+        Args:
+            path (str): Absolute path to a file.
+            max_bytes (int): Maximum number of bytes to read.
+
+        Returns:
+            Tuple of uncompressed size, st_mtime_ns and content, None if the file doesn't exist.
+        """
+
+        try:
+            try:
+                stat_result = os.lstat(path)
+            except FileNotFoundError:
+                record = self._packs.get(path) if self._packs is not None else None
+                if record is None:
+                    return None
+                stat_result = record.stat()
+            reader = self.open_reader(path)
+        except (FileNotFoundError, RuntimeError):
+            return None
+        try:
+            chunks = list()
+            remaining = max_bytes
+            while remaining > 0:
+                chunk = reader.read(min(READ_CHUNK_SIZE, remaining))
+                if not chunk:
+                    break
+                chunks.append(chunk)
+                remaining -= len(chunk)
+        finally:
+            reader.close()
+        return self._size(path, stat_result), stat_result.st_mtime_ns, b"".join(chunks)
+
+    def _scan_dir(self, path: str) -> dict:
+        """Get stat results of all visible files in a directory. Uses metadata cache if enabled.
+
+        Args:
+            path (str): Absolute path to a directory.
+
+        Returns:
+            Dict of file names and their stat results.
+        """
+
+        if self._cache is not None:
+            files = self._cache.get(path)
+            if files is not None:
+                return files
+            token = self._cache.begin(path)
+
+        files = dict()
+        with os.scandir(path) as entries:
+            for entry in entries:
+                # Hidden files are skipped like glob does.
+                if entry.name.startswith(".") or not entry.is_file(follow_symlinks=False):
+                    continue
+                files[entry.name] = entry.stat(follow_symlinks=False)
+        if self._packs is not None:
+            files.update(self._packs.list_dir(path))
+
+        if self._cache is not None:
+            self._cache.put(path, files, token)
+        return files
+
+    def get_file_metadata(self, filename: str, session: str = DEFAULT_SESSION):
+        """Get file metadata.
+
+        Args:
+            filename (str): file name
+            session (str): session ID, see change_dir()
+        """
+        path = self._resolve(filename, session)
+        return self._metadata_from_stat(self._make_path_relative(filename), path, self._stat(path))
+
+    def _work_dir(self, session: str) -> str:
+        """Get absolute path to working directory of a session."""
+
+        with self._sessions_lock:
+            work_dir = self._work_dirs.get(session)
+            if work_dir is not None:
+                self._work_dirs.move_to_end(session)
+                return work_dir
+        return os.path.abspath(self._config["data_directory"])
+
+    def _confine(self, base_dir: str, pathname: str, is_dir: bool = False) -> str:
+        """Resolve a pathname relative to a directory within data directory.
+
+        The path is normalized as a string. Directories on the way to the file are checked not to be symlinks,
+        valid directories are remembered. The last component of a file path isn't checked here: files are opened
+        and stat'ed without following symlinks, see _is_file() and _open().
+
+        Args:
+            base_dir (str): Absolute path to a directory within data directory.
+            pathname (str): Pathname, validated by is_pathname_valid().
+            is_dir (bool): Pathname is a directory, so its last component is checked too.
+                Directories replaced with symlinks bypassing FileService aren't noticed while they are remembered.
+
+        Returns:
+            Absolute normalized path.
+
+        Raises:
+            ValueError: if the path leads outside data directory or into a directory reserved for the service.
+        """
+
+        root = os.path.abspath(self._config["data_directory"])
+        path = os.path.normpath(os.path.join(base_dir, pathname))
+        if path != root and (not path.startswith(os.path.join(root, "")) or is_reserved(root, path)):
+            raise ValueError(f"Bad path: {pathname}")
+
+        parent = os.path.dirname(path) if path != root and not is_dir else path
+        with self._sessions_lock:
+            if parent in self._safe_dirs:
+                self._safe_dirs.move_to_end(parent)
+                return path
+
+        current = root
+        for part in os.path.relpath(parent, root).split(os.sep):
+            if part == os.curdir:
+                continue
+            current = os.path.join(current, part)
+            try:
+                is_link = stat.S_ISLNK(os.lstat(current).st_mode)
+            except FileNotFoundError:
+                # Nothing to follow yet, the directory will be checked again.
+                return path
+            if is_link:
+                raise ValueError(f"Bad path: {pathname}")
+
+        with self._sessions_lock:
+            self._safe_dirs[parent] = True
+            if len(self._safe_dirs) > PATHS_CACHE_SIZE:
+                self._safe_dirs.popitem(last=False)
+        return path
+
+    def _forget_dirs(self, path: str) -> None:
+        """Forget validated directories of a deleted directory tree."""
+
+        prefix = os.path.join(path, "")
+        with self._sessions_lock:
+            for safe_dir in [d for d in self._safe_dirs if d == path or d.startswith(prefix)]:
+                del self._safe_dirs[safe_dir]
+
+    def _resolve(self, filename: str, session: str) -> str:
+        """Get absolute path to a file relative to working directory of a session, see _confine()."""
+
+        return self._confine(self._work_dir(session), filename)
+
+    @staticmethod
+    def _is_file(path: str) -> bool:
+        """Check if path is a regular file, not following symlinks."""
+
+        try:
+            return stat.S_ISREG(os.lstat(path).st_mode)
+        except OSError:
+            return False
+
+    def _exists(self, path: str) -> bool:
+        """Check if path is a regular file or a packed file."""
+
+        return self._is_file(path) or (self._packs is not None and self._packs.get(path) is not None)
+
+    def _is_packed(self, path: str) -> bool:
+        """Check if path is a packed file. Plain files are checked first, they are more common."""
+
+        return self._packs is not None and not self._is_file(path) and self._packs.get(path) is not None
+
+    @staticmethod
+    def _open(path: str, mode: str) -> typing.BinaryIO:
+        """Open a file in binary mode without following a symlink in place of it."""
+
+        nofollow = getattr(os, "O_NOFOLLOW", 0)
+        return open(path, mode, opener=lambda name, flags: os.open(name, flags | nofollow, 0o666))
+
+    def current_dir(self, session: str = DEFAULT_SESSION) -> str:
+        """Get current directory of a session.
+
+        Args:
+            session (str): Session ID, see change_dir().
 
         Returns:
-            Current working directory of tha app
+            Working directory of the session relative to data directory.
         """
 
-        path = self._make_path_relative(os.getcwd())
+        path = self._make_path_relative(self._work_dir(session))
         self._logger.debug(f"Current directory is {path}")
 
         return path
 
-    def change_dir(self, path: str, autocreate: bool = True) -> str:
-        """Change current directory of app.
+    def change_dir(self, path: str, autocreate: bool = True, session: str = DEFAULT_SESSION) -> str:
+        """Change current directory of a session.
+
+        Every session has its own working directory which doesn't depend on the process working directory.
+        New sessions start in the data directory. Paths of files passed with a session are relative
+        to its working directory.
 
         Args:
-            path (str): Path to working directory with files.
+            path (str): Path to working directory with files relative to data directory.
             autocreate (bool): Create folder if it doesn't exist.
+            session (str): Session ID. Sessions which were not used for long are forgotten.
 
         Raises:
             RuntimeError: if directory does not exist and autocreate is False.
@@ -146,17 +941,22 @@ class FileService:
 
         if not self.is_pathname_valid(path):
             raise ValueError(f"Bad path: {path}")
-        if not os.path.exists(path) and not autocreate:
+        new_dir = self._confine(os.path.abspath(self._config["data_directory"]), path, is_dir=True)
+        if not autocreate and not os.path.isdir(new_dir):
             raise RuntimeError(f"Path does not exist: {path}")
 
-        os.chdir(self._config["data_directory"])
         try:
-            os.makedirs(path, exist_ok=autocreate)
-        except NotADirectoryError:
+            os.makedirs(new_dir, exist_ok=True)
+        except (NotADirectoryError, FileExistsError):
             raise ValueError(f"Bad path: {path}")
-        os.chdir(path)
 
-        new_path = self._make_path_relative(os.getcwd())
+        with self._sessions_lock:
+            self._work_dirs[session] = new_dir
+            self._work_dirs.move_to_end(session)
+            if len(self._work_dirs) > MAX_SESSIONS:
+                self._work_dirs.popitem(last=False)
+
+        new_path = self._make_path_relative(new_dir)
 
         self._logger.debug(f"Done")
 
@@ -164,10 +964,13 @@ class FileService:
 
     def delete_dir(self, path: str, recursive: bool = True) -> None:
         """Delete specified directory.
-        If path is a current directory, change current directory to its parent before deletion.
+        Sessions whose working directory is deleted are moved to its parent.
+
+        A directory is deleted recursively by moving it to the trash, its content is removed in background,
+        see Trash.
 
         Args:
-            path (str): Path to a directory to delete.
+            path (str): Path to a directory to delete relative to data directory.
             recursive (bool): if True delete all files and child directories recursively before deletion.
 
         Raises:
@@ -177,25 +980,59 @@ class FileService:
         """
 
         self._logger.debug(f'Removing directory "{path}"')
-        dir_to_delete = os.path.join(self._config["data_directory"], path)
 
-        if not self.is_pathname_valid(dir_to_delete):
+        if not self.is_pathname_valid(path):
             raise ValueError(f"Bad path: {path}")
-        if not os.path.exists(dir_to_delete):
+        root = os.path.abspath(self._config["data_directory"])
+        dir_to_delete = self._confine(root, path, is_dir=True)
+        if dir_to_delete == root:
+            raise ValueError(f"Bad path: {path}")
+        if not os.path.isdir(dir_to_delete):
             raise FileNotFoundError(f"Directory does not exist: {path}")
-        if os.listdir(dir_to_delete) and not recursive:
-            raise RuntimeError(f"Directory is not empty: {path}")
 
-        os.chdir(self._config["data_directory"])
         if recursive:
-            shutil.rmtree(path)
+            self._trash.move(dir_to_delete)
+            if self._packs is not None:
+                self._packs.remove_tree(dir_to_delete)
         else:
-            os.rmdir(path)
+            if not self._is_dir_empty(dir_to_delete) or (
+                self._packs is not None and self._packs.has_tree(dir_to_delete)
+            ):
+                raise RuntimeError(f"Directory is not empty: {path}")
+            os.rmdir(dir_to_delete)
+        self._usage.remove_tree(dir_to_delete)
+        if self._catalog is not None:
+            self._catalog.remove_tree(dir_to_delete)
+        if self._search is not None:
+            self._search.remove_tree(dir_to_delete)
+        self._changes.publish("delete", dir_to_delete, is_dir=True)
+
+        prefix = os.path.join(dir_to_delete, "")
+        with self._sessions_lock:
+            for session, work_dir in list(self._work_dirs.items()):
+                if work_dir == dir_to_delete or work_dir.startswith(prefix):
+                    self._work_dirs[session] = os.path.dirname(dir_to_delete)
+
+        self._forget_dirs(dir_to_delete)
+        if self._cache is not None:
+            self._cache.invalidate_tree(dir_to_delete)
+        if self._contents is not None:
+            self._contents.invalidate_tree(dir_to_delete)
         self._logger.debug(f"Done")
 
-    def get_files(self) -> list:
+    @staticmethod
+    def _is_dir_empty(path: str) -> bool:
+        """Check if a directory is empty. Only the first entry is read."""
+
+        with os.scandir(path) as entries:
+            return next(entries, None) is None
+
+    def get_files(self, session: str = DEFAULT_SESSION) -> list:
         """Get info about all files in working directory.
 
+        Args:
+            session (str): Session ID, see change_dir().
+
         Returns:
             List of dicts, which contains info about each file. Keys:
             - name (str): filename
@@ -207,93 +1044,1344 @@ class FileService:
         self._logger.debug("Getting files list")
 
         result = list()
-        cur_dir = os.path.join(os.getcwd(), "*")
-        files = glob.glob(cur_dir)
-        for filename in files:
-            if os.path.isfile(filename):
-                file_meta = self.get_file_metadata(filename)
-                result.append(file_meta)
+        cur_dir = self._work_dir(session)
+        rel_dir = self._make_path_relative(cur_dir)
+        for name, stat_result in self._scan_dir(cur_dir).items():
+            file_meta = self._metadata_from_stat(os.path.join(rel_dir, name), os.path.join(cur_dir, name), stat_result)
+            result.append(file_meta)
 
-        self._logger.debug(f"{len(files)} files found")
+        self._logger.debug(f"{len(result)} files found")
 
         return result
 
-    def get_file_data(self, filename: str) -> dict:
-        """Get full info about file.
+    @staticmethod
+    def _encode_cursor(sort_key: tuple) -> str:
+        return base64.urlsafe_b64encode(json.dumps(sort_key).encode()).decode()
+
+    @staticmethod
+    def _decode_cursor(cursor: str, length: int = 2) -> tuple:
+        try:
+            sort_key = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        except Exception:
+            raise ValueError(f"Bad cursor: {cursor}")
+        if not isinstance(sort_key, list) or len(sort_key) != length:
+            raise ValueError(f"Bad cursor: {cursor}")
+        return tuple(sort_key)
+
+    def get_files_page(
+        self,
+        limit: typing.Optional[int] = None,
+        cursor: typing.Optional[str] = None,
+        sort_by: str = "name",
+        descending: bool = False,
+        prefix: str = "",
+        pattern: str = "",
+        min_size: typing.Optional[int] = None,
+        max_size: typing.Optional[int] = None,
+        modified_since: typing.Optional[datetime] = None,
+        with_hash: bool = False,
+        session: str = DEFAULT_SESSION,
+    ) -> dict:
+        """Get info about a sorted and filtered page of files in working directory.
+
+        Only `limit` entries are kept in memory while the directory is scanned. If files are sorted
+        by name and not filtered by size or modification date, only files of the page are stat'ed.
 
         Args:
-            filename (str): Filename.
+            limit (int): Maximum number of files on the page. All files if None.
+            cursor (str): Continuation token returned for the previous page.
+            sort_by (str): Sort key, one of SORT_KEYS.
+            descending (bool): Sort in descending order.
+            prefix (str): Return only files with names starting with prefix.
+            pattern (str): Return only files with names matching glob pattern.
+            min_size (int): Return only files not smaller than min_size bytes.
+            max_size (int): Return only files not larger than max_size bytes.
+            modified_since (datetime): Return only files modified at or after this time.
+            with_hash (bool): Add SHA-256 of content of each file, see get_file_hash().
+            session (str): Session ID, see change_dir().
 
         Returns:
-            Dict, which contains full info about file. Keys:
-            - name (str): filename
-            - content (str): file content
-            - create_date (datetime): date of file creation
-            - edit_date (datetime): date of last file modification
-            - size (int): size of file in bytes
+            Dict with keys:
+            - files (list): list of dicts with info about each file, see get_files().
+              If with_hash is True, dicts also have `sha256` key.
+            - cursor (str): continuation token for the next page, None if there are no more files.
 
         Raises:
-            RuntimeError: if file does not exist.
-            ValueError: if filename is invalid.
+            ValueError: if sort key, limit or cursor is invalid.
         """
 
-        self._logger.debug(f'Reading file "{filename}"')
-
-        if not self.is_pathname_valid(filename):
-            raise ValueError(f"Bad filename: {filename}")
-        if not os.path.exists(filename):
-            raise RuntimeError(f"File does not exist: {filename}")
-
-        result = dict()
+        self._logger.debug(f"Getting files page: limit={limit}, sort_by={sort_by}, descending={descending}")
+
+        if sort_by not in self.SORT_KEYS:
+            raise ValueError(f"Bad sort key: {sort_by}")
+        if limit is not None and limit <= 0:
+            raise ValueError(f"Bad limit: {limit}")
+        after = self._decode_cursor(cursor) if cursor else None
+        if after is not None and not isinstance(after[0], str if sort_by == "name" else int):
+            raise ValueError(f"Bad cursor: {cursor}")
+        need_stat = sort_by != "name" or min_size is not None or max_size is not None or modified_since is not None
+        modified_since_ts = modified_since.timestamp() if modified_since is not None else None
+        cur_dir = self._work_dir(session)
+        rel_dir = self._make_path_relative(cur_dir)
+
+        def size_of(entry: os.DirEntry) -> int:
+            return self._size(os.path.join(cur_dir, entry.name), entry.stat())
+
+        def sort_key(entry: os.DirEntry) -> tuple:
+            if sort_by == "size":
+                return (size_of(entry), entry.name)
+            if sort_by == "edit_date":
+                return (entry.stat().st_mtime_ns, entry.name)
+            return ("", entry.name)
+
+        def is_after_cursor(key: tuple) -> bool:
+            return after is None or (key < after if descending else key > after)
+
+        def matching_entries(entries):
+            for entry in entries:
+                name = entry.name
+                if name.startswith(".") or not name.startswith(prefix):
+                    continue
+                if pattern and not fnmatch.fnmatchcase(name, pattern):
+                    continue
+                if not entry.is_file(follow_symlinks=False):
+                    continue
+                if need_stat:
+                    stat_result = entry.stat()
+                    if min_size is not None and size_of(entry) < min_size:
+                        continue
+                    if max_size is not None and size_of(entry) > max_size:
+                        continue
+                    if modified_since_ts is not None and stat_result.st_mtime < modified_since_ts:
+                        continue
+                key = sort_key(entry)
+                if is_after_cursor(key):
+                    yield key, entry
+
+        if self._cache is not None or self._packs is not None:
+            listed_files = self._scan_dir(cur_dir).items()
+            scanner = contextlib.nullcontext(_ListedFile(name, stat_result) for name, stat_result in listed_files)
+        else:
+            scanner = os.scandir(cur_dir)
+        with scanner as entries:
+            if limit is None:
+                page = sorted(matching_entries(entries), key=lambda item: item[0], reverse=descending)
+            else:
+                # One extra entry tells whether there is a next page.
+                select = heapq.nlargest if descending else heapq.nsmallest
+                page = select(limit + 1, matching_entries(entries), key=lambda item: item[0])
+
+            next_cursor = None
+            if limit is not None and len(page) > limit:
+                page = page[:limit]
+                next_cursor = self._encode_cursor(page[-1][0])
+
+            files = [
+                self._metadata_from_stat(
+                    os.path.join(rel_dir, entry.name), os.path.join(cur_dir, entry.name), entry.stat()
+                )
+                for _, entry in page
+            ]
+
+        if with_hash:
+            for file_meta, (_, entry) in zip(files, page):
+                file_meta["sha256"] = self._hash(os.path.join(cur_dir, entry.name))
 
-        result = self.get_file_metadata(filename)
-        content = bytes()
-        with open(filename, "rb") as f:
-            content = f.read()
-        result["content"] = content  # type: ignore
+        self._logger.debug(f"{len(files)} files found")
 
-        self._logger.debug(f"{len(content)} bytes read")
+        return dict(files=files, cursor=next_cursor)
 
-        return result
+    def walk_dir(self, path: str = ".", recursive: bool = True, session: str = DEFAULT_SESSION) -> list:
+        """Get files of a directory tree.
 
-    def create_file(self, filename: str, content: bytes) -> dict:
-        """Create a new file.
+        Hidden files and directories and symlinks are skipped.
 
         Args:
-            filename (str): Filename.
-            content (str): String with file content.
+            path (str): Path to a directory relative to working directory.
+            recursive (bool): Include files of child directories.
+            session (str): Session ID, see change_dir().
 
         Returns:
-            Dict, which contains name of created file. Keys:
-            - name (str): filename
+            List of dicts sorted by name. Keys:
+            - name (str): path to the file relative to the directory, with `/` separators
+            - path (str): absolute path to the file
+            - size (int): size of file in bytes
+            - mtime (float): time of last file modification
+
+        Raises:
+            RuntimeError: if directory does not exist.
+            ValueError: if path is invalid.
+        """
+
+        self._logger.debug(f'Walking directory "{path}"')
+
+        if not self.is_pathname_valid(path):
+            raise ValueError(f"Bad path: {path}")
+        top = self._confine(self._work_dir(session), path, is_dir=True)
+        if not os.path.isdir(top):
+            raise RuntimeError(f"Directory does not exist: {path}")
+
+        result = list()
+        dirs = [(top, "")]
+        while dirs:
+            cur_dir, rel_dir = dirs.pop()
+            for name, stat_result in self._scan_dir(cur_dir).items():
+                filename = os.path.join(cur_dir, name)
+                result.append(
+                    dict(
+                        name=rel_dir + name,
+                        path=filename,
+                        size=self._size(filename, stat_result),
+                        mtime=stat_result.st_mtime,
+                    )
+                )
+            if recursive:
+                with os.scandir(cur_dir) as entries:
+                    for entry in entries:
+                        if not entry.name.startswith(".") and entry.is_dir(follow_symlinks=False):
+                            dirs.append((entry.path, f"{rel_dir}{entry.name}/"))
+        result.sort(key=lambda file_meta: file_meta["name"])
+
+        self._logger.debug(f"{len(result)} files found")
+
+        return result
+
+    def query_files(
+        self,
+        path: str = ".",
+        recursive: bool = True,
+        pattern: str = "",
+        ext: typing.Optional[str] = None,
+        min_size: typing.Optional[int] = None,
+        max_size: typing.Optional[int] = None,
+        modified_since: typing.Optional[datetime] = None,
+        modified_before: typing.Optional[datetime] = None,
+        sort_by: str = "name",
+        descending: bool = False,
+        limit: typing.Optional[int] = None,
+        cursor: typing.Optional[str] = None,
+        session: str = DEFAULT_SESSION,
+    ) -> dict:
+        """Find files of a directory tree in the catalog, see Catalog.
+
+        Unlike walk_dir(), the tree isn't scanned, so answers take the same time for any size of the tree.
+
+        Args:
+            path (str): Path to a directory relative to working directory.
+            recursive (bool): Include files of child directories.
+            pattern (str): Return only files with names matching glob pattern.
+            ext (str): Return only files with this name extension, case-insensitive.
+            min_size (int): Return only files not smaller than min_size bytes.
+            max_size (int): Return only files not larger than max_size bytes.
+            modified_since (datetime): Return only files modified at or after this time.
+            modified_before (datetime): Return only files modified before this time.
+            sort_by (str): Sort key, one of Catalog.SORT_COLUMNS: name (full path), size, create_date, edit_date.
+            descending (bool): Sort in descending order.
+            limit (int): Maximum number of files on the page. All files if None.
+            cursor (str): Continuation token returned for the previous page.
+            session (str): Session ID, see change_dir().
+
+        Returns:
+            Dict with keys:
+            - files (list): list of dicts with info about each file, see get_files().
+            - cursor (str): continuation token for the next page, None if there are no more files.
+
+        Raises:
+            RuntimeError: if directory does not exist or the catalog is disabled.
+            ValueError: if path, sort key, limit or cursor is invalid.
+        """
+
+        self._logger.debug(f'Querying catalog of "{path}": sort_by={sort_by}, limit={limit}')
+
+        if self._catalog is None:
+            raise RuntimeError("File catalog is disabled")
+        if not self.is_pathname_valid(path):
+            raise ValueError(f"Bad path: {path}")
+        if sort_by not in SORT_COLUMNS:
+            raise ValueError(f"Bad sort key: {sort_by}")
+        if limit is not None and limit <= 0:
+            raise ValueError(f"Bad limit: {limit}")
+        after = self._decode_cursor(cursor, len(SORT_COLUMNS[sort_by]) + 2) if cursor else None
+        top = self._confine(self._work_dir(session), path, is_dir=True)
+        if not os.path.isdir(top):
+            raise RuntimeError(f"Directory does not exist: {path}")
+
+        files, next_after = self._catalog.query(
+            top,
+            recursive=recursive,
+            pattern=pattern,
+            ext=ext,
+            min_size=min_size,
+            max_size=max_size,
+            modified_since=modified_since.timestamp() if modified_since is not None else None,
+            modified_before=modified_before.timestamp() if modified_before is not None else None,
+            sort_by=sort_by,
+            descending=descending,
+            limit=limit,
+            after=list(after) if after is not None else None,
+        )
+        result = [
+            dict(
+                name=self._make_path_relative(file["path"]),
+                create_date=datetime.fromtimestamp(file["ctime_ns"] / 10**9),
+                edit_date=datetime.fromtimestamp(file["mtime_ns"] / 10**9),
+                size=file["size"],
+            )
+            for file in files
+        ]
+
+        self._logger.debug(f"{len(result)} files found")
+
+        return dict(files=result, cursor=self._encode_cursor(next_after) if next_after is not None else None)
+
+    def search_files(
+        self,
+        text: str,
+        path: str = ".",
+        limit: int = 100,
+        cursor: typing.Optional[str] = None,
+        session: str = DEFAULT_SESSION,
+    ) -> dict:
+        """Find lines of text files in a directory tree which contain all words of a text, see SearchIndex.
+
+        Files aren't read, lines come from the index. Recently written files may be missing until they are indexed.
+
+        Args:
+            text (str): Words to search for, case-insensitive.
+            path (str): Path to a directory relative to working directory.
+            limit (int): Maximum number of lines on the page.
+            cursor (str): Continuation token returned for the previous page.
+            session (str): Session ID, see change_dir().
+
+        Returns:
+            Dict with keys:
+            - results (list): list of dicts with keys: name (path to the file relative to data directory),
+              line (line number starting from 1), snippet (part of the line around matched words).
+            - cursor (str): continuation token for the next page, None if there are no more lines.
+
+        Raises:
+            RuntimeError: if directory does not exist or the index is disabled.
+            ValueError: if text, path, limit or cursor is invalid.
+        """
+
+        self._logger.debug(f'Searching "{text}" in "{path}"')
+
+        if self._search is None:
+            raise RuntimeError("Search index is disabled")
+        if not self.is_pathname_valid(path):
+            raise ValueError(f"Bad path: {path}")
+        if limit <= 0:
+            raise ValueError(f"Bad limit: {limit}")
+        after = self._decode_cursor(cursor, 1)[0] if cursor else None
+        if after is not None and not isinstance(after, int):
+            raise ValueError(f"Bad cursor: {cursor}")
+        top = self._confine(self._work_dir(session), path, is_dir=True)
+        if not os.path.isdir(top):
+            raise RuntimeError(f"Directory does not exist: {path}")
+
+        lines, next_after = self._search.search(text, top, limit, after)
+        results = [
+            dict(name=self._make_path_relative(line["path"]), line=line["line"], snippet=line["snippet"])
+            for line in lines
+        ]
+
+        self._logger.debug(f"{len(results)} lines found")
+
+        return dict(results=results, cursor=self._encode_cursor([next_after]) if next_after is not None else None)
+
+    def subscribe_changes(self, path: str = ".", after: typing.Optional[int] = None, session: str = DEFAULT_SESSION):
+        """Subscribe to changes of files and directories in a directory tree, see ChangeFeed.
+
+        Args:
+            path (str): Path to a directory relative to working directory.
+            after (int): ID of the last event got before, to resume after it.
+            session (str): Session ID, see change_dir().
+
+        Returns:
+            Subscription object with get(), set_notify() and close() methods. Events are dicts with keys:
+            id, type (create, modify, delete or reset), path (relative to data directory), dir, time.
+
+        Raises:
+            RuntimeError: if directory does not exist.
+            ValueError: if path is invalid.
+        """
+
+        self._logger.debug(f'Subscribing to changes of "{path}"')
+
+        if not self.is_pathname_valid(path):
+            raise ValueError(f"Bad path: {path}")
+        top = self._confine(self._work_dir(session), path, is_dir=True)
+        if not os.path.isdir(top):
+            raise RuntimeError(f"Directory does not exist: {path}")
+        return self._changes.subscribe(top, after)
+
+    def get_file_data(self, filename: str, session: str = DEFAULT_SESSION) -> dict:
+        """Get full info about file.
+
+        Args:
+            filename (str): Filename.
+            session (str): Session ID, see change_dir().
+
+        Large files are memory-mapped instead of read, see mmap_threshold config option. Their content
+        is a memoryview of the mapping, which is unmapped when the last reference to it is dropped.
+        The service never changes files in place, so a mapping stays valid after the file is replaced or deleted.
+
+        Returns:
+            Dict, which contains full info about file. Keys:
+            - name (str): filename
+            - content (bytes or memoryview): file content
+            - create_date (datetime): date of file creation
+            - edit_date (datetime): date of last file modification
+            - size (int): size of file in bytes
+
+        Raises:
+            RuntimeError: if file does not exist.
+            ValueError: if filename is invalid.
+        """
+
+        self._logger.debug(f'Reading file "{filename}"')
+
+        if not self.is_pathname_valid(filename):
+            raise ValueError(f"Bad filename: {filename}")
+        path = self._resolve(filename, session)
+        if not self._exists(path):
+            raise RuntimeError(f"File does not exist: {filename}")
+
+        result = dict()
+
+        result = self.get_file_metadata(filename, session=session)
+        content = self._packs.read(path) if self._is_packed(path) else None
+        if content is None:
+            with self._open(path, "rb") as f:
+                stat_result = os.fstat(f.fileno())
+                if 0 < self._mmap_threshold <= stat_result.st_size:
+                    content = memoryview(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+                else:
+                    content = f.read()
+            if self._stored_format(path, stat_result) is not None:
+                content = Compression.decompress(content)
+        result["content"] = content  # type: ignore
+
+        self._logger.debug(f"{len(content)} bytes read")
+
+        return result
+
+    def get_encoded_file_data(
+        self, filename: str, encode: typing.Callable[[dict], bytes], session: str = DEFAULT_SESSION
+    ) -> bytes:
+        """Get full info about file encoded for sending, e.g. as a JSON response body.
+
+        Encoded info is kept in the content cache, if enabled, so frequently requested files are neither
+        read nor encoded again. It's served while inode, modification time and size of the file don't change.
+        All callers must pass the same encode function.
+
+        Args:
+            filename (str): Filename.
+            encode (Callable): Function which encodes the result of get_file_data().
+            session (str): Session ID, see change_dir().
+
+        Returns:
+            Encoded info.
+
+        Raises:
+            RuntimeError: if file does not exist.
+            ValueError: if filename is invalid.
+        """
+
+        if self._contents is None:
+            return encode(self.get_file_data(filename, session=session))
+
+        if not self.is_pathname_valid(filename):
+            raise ValueError(f"Bad filename: {filename}")
+        path = self._resolve(filename, session)
+        # Not the metadata cache: it may lag behind files changed bypassing the service.
+        try:
+            stat_result = os.lstat(path)
+        except FileNotFoundError:
+            record = self._packs.get(path) if self._packs is not None else None
+            if record is None:
+                raise RuntimeError(f"File does not exist: {filename}")
+            stat_result = record.stat()
+        # Reported name depends on how the file was requested.
+        validator = (
+            stat_result.st_dev,
+            stat_result.st_ino,
+            stat_result.st_mtime_ns,
+            stat_result.st_size,
+            self._make_path_relative(filename),
+        )
+
+        encoded = self._contents.get(path, validator)
+        if encoded is None:
+            encoded = encode(self.get_file_data(filename, session=session))
+            self._contents.put(path, validator, encoded)
+        else:
+            self._logger.debug(f'File "{filename}" found in content cache')
+        return encoded
+
+    def get_file_path(self, filename: str, session: str = DEFAULT_SESSION) -> str:
+        """Get absolute path of an existing file.
+
+        Args:
+            filename (str): Filename.
+            session (str): Session ID, see change_dir().
+
+        Returns:
+            Absolute path to the file.
+
+        Raises:
+            RuntimeError: if file does not exist.
+            ValueError: if filename is invalid.
+        """
+
+        if not self.is_pathname_valid(filename):
+            raise ValueError(f"Bad filename: {filename}")
+        path = self._resolve(filename, session)
+        if not self._exists(path):
+            raise RuntimeError(f"File does not exist: {filename}")
+
+        return path
+
+    def _hash(self, filename: str) -> str:
+        """Get SHA-256 of a file content. The file is read only if its hash isn't known yet."""
+
+        if self._is_packed(filename):
+            record = self._packs.get(filename)
+            if record is not None:
+                return record.sha256
+        stat_result = os.stat(filename)
+        if self._blobs is not None:
+            digest = self._blobs.find_digest(stat_result)
+            if digest is not None:
+                return digest
+        if self._stored_format(filename, stat_result) is None:
+            return self._hashes.hash_file(filename)
+
+        # Hash of a compressed file is a hash of its uncompressed content.
+        digest = self._hashes.get(stat_result)
+        if digest is not None:
+            return digest
+        self._logger.debug(f'Hashing compressed file "{filename}"')
+        hasher = hashlib.sha256()
+        reader = self.open_reader(filename)
+        try:
+            for chunk in iter(lambda: reader.read(READ_CHUNK_SIZE), b""):
+                hasher.update(chunk)
+        finally:
+            reader.close()
+        digest = hasher.hexdigest()
+        if os.stat(filename).st_mtime_ns == stat_result.st_mtime_ns:
+            self._hashes.put(stat_result, digest)
+        return digest
+
+    def get_file_hash(self, filename: str, session: str = DEFAULT_SESSION) -> str:
+        """Get SHA-256 hash of file content.
+
+        Hashes are cached by file identity, size and modification time, so the file is read
+        only if it has changed since its hash was computed.
+
+        Args:
+            filename (str): Filename.
+            session (str): Session ID, see change_dir().
+
+        Returns:
+            SHA-256 hex digest.
+
+        Raises:
+            RuntimeError: if file does not exist.
+            ValueError: if filename is invalid.
+        """
+
+        if not self.is_pathname_valid(filename):
+            raise ValueError(f"Bad filename: {filename}")
+        path = self._resolve(filename, session)
+        if not self._exists(path):
+            raise RuntimeError(f"File does not exist: {filename}")
+
+        return self._hash(path)
+
+    def read_file_range(self, filename: str, offset: int, length: int, session: str = DEFAULT_SESSION) -> bytes:
+        """Read a part of a file without reading the rest of it.
+
+        Args:
+            filename (str): Filename.
+            session (str): Session ID, see change_dir().
+            offset (int): Position of the first byte to read.
+            length (int): Maximum number of bytes to read.
+
+        Returns:
+            Bytes read. Less than length bytes are returned if the end of file is reached.
+
+        Raises:
+            RuntimeError: if file does not exist.
+            ValueError: if filename is invalid.
+        """
+
+        if not self.is_pathname_valid(filename):
+            raise ValueError(f"Bad filename: {filename}")
+        path = self._resolve(filename, session)
+        if not self._exists(path):
+            raise RuntimeError(f"File does not exist: {filename}")
+
+        reader = self.open_reader(path, offset)
+        try:
+            return reader.read(length)
+        finally:
+            reader.close()
+
+    def open_reader(self, filename: str, offset: int = 0, decode: bool = True, session: str = DEFAULT_SESSION):
+        """Open a file for sequential reading from an offset.
+
+        Plain files are read with positional reads. Compressed files are decompressed from the start,
+        so reading from an offset costs as much as reading everything before it.
+
+        Args:
+            filename (str): Filename.
+            offset (int): Position of the first byte to read.
+            decode (bool): If False, compressed content of a compressed file is read as it is stored,
+                see get_stored_format(). The offset is relative to the start of compressed content.
+            session (str): Session ID, see change_dir().
+
+        Returns:
+            Reader object with read(size) and close() methods.
+
+        Raises:
+            RuntimeError: if file does not exist.
+            ValueError: if filename is invalid.
+        """
+
+        if not self.is_pathname_valid(filename):
+            raise ValueError(f"Bad filename: {filename}")
+        path = self._resolve(filename, session)
+        if not self._exists(path):
+            raise RuntimeError(f"File does not exist: {filename}")
+
+        if self._is_packed(path):
+            # Packed files are never compressed.
+            reader = self._packs.open_reader(path, offset)
+            if reader is not None:
+                return reader
+
+        f = self._open(path, "rb")
+        try:
+            stored_format = self._stored_format(path, os.fstat(f.fileno()))
+            if stored_format is None:
+                return _FileReader(f, offset)
+            if not decode:
+                return _FileReader(f, Compression.HEADER.size + offset)
+            return Compression.DecompressingReader(f, stored_format[0], offset)
+        except BaseException:
+            f.close()
+            raise
+
+    def is_packed(self, filename: str, session: str = DEFAULT_SESSION) -> bool:
+        """Check if a file is kept in a pack. Packed files have no path of their own and are read
+        with open_reader().
+
+        Args:
+            filename (str): Filename.
+            session (str): Session ID, see change_dir().
+
+        Raises:
+            ValueError: if filename is invalid.
+        """
+
+        if not self.is_pathname_valid(filename):
+            raise ValueError(f"Bad filename: {filename}")
+        return self._is_packed(self._resolve(filename, session))
+
+    def get_stored_format(self, filename: str, session: str = DEFAULT_SESSION) -> typing.Optional[dict]:
+        """Get format of a compressed file.
+
+        Args:
+            filename (str): Filename.
+            session (str): Session ID, see change_dir().
+
+        Returns:
+            None if the file isn't compressed. Otherwise dict with keys:
+            - encoding (str): HTTP content coding of compressed content, `deflate` or `zstd`
+            - size (int): size of compressed content in bytes
+
+        Raises:
+            RuntimeError: if file does not exist.
+            ValueError: if filename is invalid.
+        """
+
+        if not self.is_pathname_valid(filename):
+            raise ValueError(f"Bad filename: {filename}")
+        path = self._resolve(filename, session)
+        if not self._exists(path):
+            raise RuntimeError(f"File does not exist: {filename}")
+
+        if self._is_packed(path):
+            return None
+        stat_result = os.stat(path)
+        stored_format = self._stored_format(path, stat_result)
+        if stored_format is None:
+            return None
+        return dict(
+            encoding=Compression.CONTENT_ENCODINGS[stored_format[0]],
+            size=stat_result.st_size - Compression.HEADER.size,
+        )
+
+    def create_file(self, filename: str, content: bytes, session: str = DEFAULT_SESSION) -> dict:
+        """Create a new file.
+
+        The content is written to a temporary file which replaces the file atomically, see finish_upload().
+
+        Args:
+            filename (str): Filename.
+            content (str): String with file content.
+            session (str): Session ID, see change_dir().
+
+        Returns:
+            Dict, which contains name of created file. Keys:
+            - name (str): filename
             - content (str): file content
             - create_date (datetime): date of file creation
             - size (int): size of file in bytes
 
         Raises:
+            OSError: EDQUOT, if the file would exceed a quota, see set_quota().
             ValueError: if filename is invalid.
         """
 
         self._logger.debug(f'Creating file "{filename}"')
 
+        if self._packs is not None and len(content) <= self._pack_threshold:
+            return self._store_packed(filename, content, hashlib.sha256(content).hexdigest(), session)
+
+        upload_file = self.open_upload(filename, session=session)
+        try:
+            upload_file.write(content)
+            file_meta = self.finish_upload(upload_file, filename, session=session)
+        except BaseException:
+            self.abort_upload(upload_file)
+            raise
+
+        self._logger.debug(f"{len(content)} bytes written")
+
+        return file_meta
+
+    def open_upload(self, filename: str, session: str = DEFAULT_SESSION) -> _Upload:
+        """Open a temporary file for a chunked upload.
+
+        The temporary file is a hidden file in the target directory, so that
+        finish_upload() can atomically rename it into place.
+
+        Args:
+            filename (str): Filename of a file to be created.
+            session (str): Session ID, see change_dir().
+
+        Returns:
+            Temporary file object with write() method.
+
+        Raises:
+            OSError: EDQUOT, if a new file would exceed a quota, see set_quota().
+            ValueError: if filename is invalid.
+        """
+
+        self._logger.debug(f'Opening upload of file "{filename}"')
+
         if not self.is_pathname_valid(filename):
             raise ValueError(f"Bad filename: {filename}")
+        path = self._resolve(filename, session)
+
+        target_dir, target_name = os.path.split(path)
+        self._usage.check(target_dir, 0, 0 if self._exists(path) else 1)
+        temp_file = tempfile.NamedTemporaryFile(
+            mode="wb", dir=target_dir, prefix=f".{target_name}.", suffix=".part", delete=False
+        )
+        return _Upload(temp_file, self._codec)
+
+    def finish_upload(self, upload_file: _Upload, filename: str, session: str = DEFAULT_SESSION) -> dict:
+        """Close an upload opened by open_upload() and move it into place.
+
+        The temporary file and then its directory are flushed to disk according to `durability` setting,
+        so that a crash leaves either the old or the new file content.
+
+        Args:
+            upload_file (_Upload): Temporary file object returned by open_upload().
+            filename (str): Filename of a file to be created.
+            session (str): Session ID, see change_dir().
+
+        Returns:
+            Dict, which contains name of created file. Keys:
+            - name (str): filename
+            - create_date (datetime): date of file creation
+            - size (int): size of file in bytes
 
-        with open(filename, "wb") as f:
-            f.write(content)
+        Raises:
+            OSError: EDQUOT, if the file would exceed a quota, see set_quota(). The upload should be aborted then.
+        """
 
-        file_meta = self.get_file_metadata(filename)
+        path = self._resolve(filename, session)
+        if self._packs is not None and upload_file.size <= self._pack_threshold:
+            upload_file.close()
+            with open(upload_file.name, "rb") as f:
+                content = f.read()
+            if upload_file.compressed:
+                content = Compression.decompress(content)
+            os.remove(upload_file.name)
+            return self._store_packed(filename, content, upload_file.hexdigest(), session)
+
+        upload_file.close(sync=self._durability.sync_file)
+        if upload_file.compressed:
+            self._mark_compressed()
+        old_stat = os.lstat(path) if self._is_file(path) else None
+        old_record = self._packs.get(path) if self._packs is not None and old_stat is None else None
+        old_size = old_stat.st_size if old_stat is not None else old_record.length if old_record is not None else 0
+        size = os.lstat(upload_file.name).st_size - old_size
+        files = 0 if old_stat is not None or old_record is not None else 1
+        self._usage.charge(os.path.dirname(path), size, files)
+        try:
+            if self._blobs is not None:
+                self._blobs.store_file(upload_file.name, upload_file.hexdigest(), path)
+                if old_stat is not None:
+                    self._blobs.release(old_stat)
+            else:
+                os.replace(upload_file.name, path)
+        except BaseException:
+            self._usage.charge(os.path.dirname(path), -size, -files)
+            raise
+        if old_record is not None:
+            self._packs.delete(path)
+        self._durability.sync_dir(os.path.dirname(path))
+        self._file_changed(path, upload_file.hexdigest(), created=bool(files))
+
+        file_meta = self.get_file_metadata(filename, session=session)
         del file_meta["edit_date"]
 
-        self._logger.debug(f"{len(content)} bytes written")
+        self._logger.debug(f"{file_meta['size']} bytes uploaded")
 
         return file_meta
 
-    def delete_file(self, filename: str) -> None:
+    def _store_packed(self, filename: str, content: bytes, digest: str, session: str) -> dict:
+        """Store a small file in a pack, replacing a plain or a packed file with the same name.
+
+        Args:
+            filename (str): Filename.
+            content (bytes): File content.
+            digest (str): SHA-256 hex digest of the content.
+            session (str): Session ID, see change_dir().
+
+        Returns:
+            See finish_upload().
+
+        Raises:
+            OSError: EDQUOT, if the file would exceed a quota, see set_quota().
+            ValueError: if filename is invalid.
+        """
+
+        if not self.is_pathname_valid(filename):
+            raise ValueError(f"Bad filename: {filename}")
+        path = self._resolve(filename, session)
+        if not os.path.isdir(os.path.dirname(path)):
+            raise ValueError(f"Bad filename: {filename}")
+
+        old_stat = os.lstat(path) if self._is_file(path) else None
+        old_record = self._packs.get(path) if old_stat is None else None
+        old_size = old_stat.st_size if old_stat is not None else old_record.length if old_record is not None else 0
+        files = 0 if old_stat is not None or old_record is not None else 1
+        self._usage.charge(os.path.dirname(path), len(content) - old_size, files)
+        try:
+            record = self._packs.put(path, content, digest)
+        except BaseException:
+            self._usage.charge(os.path.dirname(path), old_size - len(content), -files)
+            raise
+        if old_stat is not None:
+            os.remove(path)
+            if self._blobs is not None:
+                self._blobs.release(old_stat)
+            if old_stat.st_nlink == 1:
+                self._hashes.forget(old_stat)
+        self._file_changed(path, digest, record.stat(), created=bool(files))
+
+        file_meta = self.get_file_metadata(filename, session=session)
+        del file_meta["edit_date"]
+
+        self._logger.debug(f"{len(content)} bytes packed")
+
+        return file_meta
+
+    def abort_upload(self, upload_file: _Upload) -> None:
+        """Close an upload opened by open_upload() and remove the temporary file.
+
+        Args:
+            upload_file (_Upload): Temporary file object returned by open_upload().
+        """
+
+        upload_file.close()
+        if os.path.exists(upload_file.name):
+            os.remove(upload_file.name)
+
+        self._logger.debug(f"Upload aborted")
+
+    def _upload_session_info(self, info: dict) -> dict:
+        """Replace absolute path in session info with a path relative to data directory."""
+
+        info = dict(info)
+        path = info.pop("path")
+        info["filename"] = os.path.relpath(path, os.path.abspath(self._config["data_directory"]))
+        return info
+
+    def open_upload_session(
+        self,
+        filename: str,
+        size: int,
+        chunk_size: typing.Optional[int] = None,
+        sha256: typing.Optional[str] = None,
+        session: str = DEFAULT_SESSION,
+    ) -> dict:
+        """Start a resumable upload of a file in chunks, see UploadSessions.
+
+        Chunks are sent with open_upload_chunk() and finish_upload_chunk(), possibly in parallel,
+        and the file is created by commit_upload_session(). Sessions survive server restarts.
+
+        Args:
+            filename (str): Filename of a file to be created.
+            size (int): Size of the file in bytes.
+            chunk_size (int): Size of every chunk but the last one, `upload_chunk_size` setting by default.
+            sha256 (str): Expected SHA-256 hex digest of the file, checked on commit.
+            session (str): Session ID, see change_dir().
+
+        Returns:
+            Session info, see get_upload_session().
+
+        Raises:
+            OSError: EDQUOT, if the file would exceed a quota, see set_quota().
+            ValueError: if filename or sizes are invalid.
+        """
+
+        self._logger.debug(f'Opening upload session of file "{filename}"')
+
+        if not self.is_pathname_valid(filename):
+            raise ValueError(f"Bad filename: {filename}")
+        path = self._resolve(filename, session)
+        if not os.path.isdir(os.path.dirname(path)):
+            raise ValueError(f"Bad filename: {filename}")
+        if sha256 is not None and not re.fullmatch(r"[0-9a-fA-F]{64}", sha256):
+            raise ValueError(f"Bad SHA-256: {sha256}")
+
+        self._usage.check(os.path.dirname(path), size, 0 if self._exists(path) else 1)
+        info = self._uploads.open(path, size, chunk_size or int(self._config["upload_chunk_size"]), sha256)
+        return self._upload_session_info(info)
+
+    def get_upload_session(self, upload_id: str) -> dict:
+        """Get state of an upload session.
+
+        Args:
+            upload_id (str): Session ID returned by open_upload_session().
+
+        Returns:
+            Dict with keys: upload_id, filename (relative to data directory), size, chunk_size,
+            chunks (number of chunks), received and missing (lists of chunk numbers).
+
+        Raises:
+            RuntimeError: if session does not exist.
+        """
+
+        return self._upload_session_info(self._uploads.get(upload_id))
+
+    def open_upload_chunk(self, upload_id: str, number: int):
+        """Open a chunk of an upload session for writing.
+
+        Args:
+            upload_id (str): Session ID.
+            number (int): Chunk number starting from 0.
+
+        Returns:
+            Chunk writer with write() method.
+
+        Raises:
+            RuntimeError: if session does not exist or is being committed.
+            ValueError: if chunk number is out of range.
+        """
+
+        return self._uploads.open_chunk(upload_id, number)
+
+    def finish_upload_chunk(self, writer) -> dict:
+        """Record a chunk opened by open_upload_chunk() as received.
+
+        Args:
+            writer: Chunk writer returned by open_upload_chunk().
+
+        Returns:
+            Session info, see get_upload_session().
+
+        Raises:
+            RuntimeError: if session does not exist.
+            ValueError: if chunk is incomplete.
+        """
+
+        self._uploads.finish_chunk(writer)
+        return self.get_upload_session(writer.upload_id)
+
+    def abort_upload_chunk(self, writer) -> None:
+        """Close a chunk opened by open_upload_chunk() which failed to arrive."""
+
+        self._uploads.abort_chunk(writer)
+
+    def commit_upload_session(self, upload_id: str, sha256: typing.Optional[str] = None) -> dict:
+        """Create the file of an upload session whose chunks are all received.
+
+        The content is checked against the expected SHA-256 and moved into place like a chunked upload,
+        see finish_upload(). The session is kept if the commit fails, so it can be retried.
+
+        Args:
+            upload_id (str): Session ID.
+            sha256 (str): Expected SHA-256 hex digest of the file, overrides the one given on open.
+
+        Returns:
+            See finish_upload().
+
+        Raises:
+            OSError: EDQUOT, if the file would exceed a quota, see set_quota().
+            RuntimeError: if session does not exist.
+            ValueError: if chunks are missing or the content doesn't match SHA-256.
+        """
+
+        self._logger.debug(f"Committing upload {upload_id}")
+
+        path, temp_path, digest = self._uploads.begin_commit(upload_id, sha256)
+        try:
+            size = os.path.getsize(temp_path)
+            if self._packs is not None and size <= self._pack_threshold:
+                with open(temp_path, "rb") as f:
+                    file_meta = self._store_packed(path, f.read(), digest, DEFAULT_SESSION)
+                os.remove(temp_path)
+            elif self._codec is not None or self._starts_like_compressed(temp_path):
+                upload_file = self.open_upload(path)
+                try:
+                    with open(temp_path, "rb") as f:
+                        for data in iter(lambda: f.read(READ_CHUNK_SIZE), b""):
+                            upload_file.write(data)
+                    file_meta = self.finish_upload(upload_file, path)
+                except BaseException:
+                    self.abort_upload(upload_file)
+                    raise
+                os.remove(temp_path)
+            else:
+                # Content is already in place, the file is only renamed.
+                upload_file = _Upload(open(temp_path, "ab"), size=size, digest=digest)
+                try:
+                    file_meta = self.finish_upload(upload_file, path)
+                finally:
+                    upload_file.close()
+        except BaseException:
+            self._uploads.cancel_commit(upload_id)
+            raise
+        self._uploads.end_commit(upload_id)
+
+        return file_meta
+
+    @staticmethod
+    def _starts_like_compressed(path: str) -> bool:
+        with open(path, "rb") as f:
+            return f.read(len(Compression.MAGIC)) == Compression.MAGIC
+
+    def abort_upload_session(self, upload_id: str) -> None:
+        """Remove an upload session and its received chunks.
+
+        Args:
+            upload_id (str): Session ID.
+
+        Raises:
+            RuntimeError: if session does not exist or is being committed.
+        """
+
+        self._uploads.remove(upload_id)
+
+    def _copy_file(self, source: str, destination: str) -> dict:
+        """Copy a file to a path, replacing an existing file. Content is copied inside the kernel.
+
+        With deduplication the copy is another link to the same blob. Otherwise it's a reflink clone
+        or is copied with copy_file_range(), see FileCopy.copy_data(). Stored format is kept,
+        e.g. a compressed file stays compressed.
+
+        Args:
+            source (str): Absolute path to an existing file.
+            destination (str): Absolute path to the copy.
+
+        Returns:
+            See finish_upload().
+        """
+
+        digest = self._hash(source)
+        if self._is_packed(source) or (
+            self._packs is not None and self._size(source, os.lstat(source)) <= self._pack_threshold
+        ):
+            content = self.get_file_data(source)["content"]
+            return self._store_packed(destination, bytes(content), digest, DEFAULT_SESSION)
+
+        target_dir, target_name = os.path.split(destination)
+        if not os.path.isdir(target_dir):
+            raise ValueError(f"Bad filename: {self._make_path_relative(destination)}")
+        if self._blobs is not None:
+            temp_path = os.path.join(target_dir, f".{target_name}.{os.urandom(8).hex()}.part")
+            os.link(source, temp_path)
+            temp_file = open(temp_path, "ab")
+            size = self._size(temp_path, os.fstat(temp_file.fileno()))
+        else:
+            temp_file = tempfile.NamedTemporaryFile(
+                mode="wb", dir=target_dir, prefix=f".{target_name}.", suffix=".part", delete=False
+            )
+            try:
+                with self._open(source, "rb") as f:
+                    stat_result = os.fstat(f.fileno())
+                    method = copy_data(f.fileno(), temp_file.fileno(), stat_result.st_size)
+                self._logger.debug(f"{stat_result.st_size} bytes copied by {method}")
+                size = self._size(source, stat_result)
+            except BaseException:
+                temp_file.close()
+                os.remove(temp_file.name)
+                raise
+
+        upload_file = _Upload(temp_file, size=size, digest=digest)
+        try:
+            return self.finish_upload(upload_file, destination)
+        except BaseException:
+            self.abort_upload(upload_file)
+            raise
+
+    def copy_file(self, source: str, destination: str, session: str = DEFAULT_SESSION) -> dict:
+        """Copy a file without passing its content through the client.
+
+        Args:
+            source (str): Filename of an existing file.
+            destination (str): Filename of the copy. An existing file is replaced.
+            session (str): Session ID, see change_dir().
+
+        Returns:
+            See finish_upload().
+
+        Raises:
+            OSError: EDQUOT, if the copy would exceed a quota, see set_quota().
+            RuntimeError: if source file does not exist.
+            ValueError: if a filename is invalid or both names refer to the same file.
+        """
+
+        self._logger.debug(f'Copying file "{source}" to "{destination}"')
+
+        for filename in (source, destination):
+            if not self.is_pathname_valid(filename):
+                raise ValueError(f"Bad filename: {filename}")
+        source_path = self._resolve(source, session)
+        destination_path = self._resolve(destination, session)
+        if not self._exists(source_path):
+            raise RuntimeError(f"File does not exist: {source}")
+        if source_path == destination_path:
+            raise ValueError(f"Can't copy a file to itself: {source}")
+
+        return self._copy_file(source_path, destination_path)
+
+    def move_file(self, source: str, destination: str, session: str = DEFAULT_SESSION) -> dict:
+        """Move a file. A plain file is renamed, its content isn't copied.
+
+        Args:
+            source (str): Filename of an existing file.
+            destination (str): New filename. An existing file is replaced.
+            session (str): Session ID, see change_dir().
+
+        Returns:
+            See finish_upload().
+
+        Raises:
+            OSError: EDQUOT, if the file would exceed a quota of the destination, see set_quota().
+            RuntimeError: if source file does not exist.
+            ValueError: if a filename is invalid.
+        """
+
+        self._logger.debug(f'Moving file "{source}" to "{destination}"')
+
+        for filename in (source, destination):
+            if not self.is_pathname_valid(filename):
+                raise ValueError(f"Bad filename: {filename}")
+        path = self._resolve(source, session)
+        new_path = self._resolve(destination, session)
+        if not self._exists(path):
+            raise RuntimeError(f"File does not exist: {source}")
+        if path != new_path:
+            if self._is_packed(path):
+                # Packed files are small, so they are copied.
+                self._copy_file(path, new_path)
+                self.delete_file(path)
+            else:
+                self._rename_file(path, new_path)
+
+        file_meta = self.get_file_metadata(new_path)
+        del file_meta["edit_date"]
+        return file_meta
+
+    def _rename_file(self, path: str, new_path: str) -> None:
+        """Rename a plain file, replacing a plain or a packed file."""
+
+        target_dir = os.path.dirname(new_path)
+        if not os.path.isdir(target_dir):
+            raise ValueError(f"Bad filename: {self._make_path_relative(new_path)}")
+        file_stat = os.lstat(path)
+        old_stat = os.lstat(new_path) if self._is_file(new_path) else None
+        old_record = self._packs.get(new_path) if self._packs is not None and old_stat is None else None
+        old_size = old_stat.st_size if old_stat is not None else old_record.length if old_record is not None else 0
+        files = 0 if old_stat is not None or old_record is not None else 1
+        # The file is taken from the source first, so that common parent directories don't count it twice.
+        self._usage.charge(os.path.dirname(path), -file_stat.st_size, -1)
+        try:
+            self._usage.charge(target_dir, file_stat.st_size - old_size, files)
+            try:
+                os.replace(path, new_path)
+            except BaseException:
+                self._usage.charge(target_dir, old_size - file_stat.st_size, -files)
+                raise
+        except BaseException:
+            self._usage.charge(os.path.dirname(path), file_stat.st_size, 1, force=True)
+            raise
+        if old_stat is not None:
+            if self._blobs is not None:
+                self._blobs.release(old_stat)
+            if old_stat.st_nlink == 1:
+                self._hashes.forget(old_stat)
+        if old_record is not None:
+            self._packs.delete(new_path)
+        self._durability.sync_dir(target_dir)
+        if os.path.dirname(path) != target_dir:
+            self._durability.sync_dir(os.path.dirname(path))
+        self._file_removed(path)
+        # Hash cache is keyed by inode, so the hash of the renamed file is still known.
+        self._file_changed(new_path, None, created=bool(files))
+
+    def _dir_paths(self, path: str, new_path: str, session: str) -> typing.Tuple[str, str]:
+        """Get absolute paths to an existing directory and to a new directory which doesn't exist yet.
+
+        Raises:
+            RuntimeError: if directory does not exist.
+            ValueError: if a path is invalid, the destination exists or is inside the directory.
+        """
+
+        for pathname in (path, new_path):
+            if not self.is_pathname_valid(pathname):
+                raise ValueError(f"Bad path: {pathname}")
+        root = os.path.abspath(self._config["data_directory"])
+        source_dir = self._confine(self._work_dir(session), path, is_dir=True)
+        destination_dir = self._confine(self._work_dir(session), new_path, is_dir=True)
+        if source_dir == root or destination_dir == root:
+            raise ValueError(f"Bad path: {path if source_dir == root else new_path}")
+        if not os.path.isdir(source_dir):
+            raise RuntimeError(f"Directory does not exist: {path}")
+        if os.path.lexists(destination_dir):
+            raise ValueError(f"Path already exists: {new_path}")
+        if not os.path.isdir(os.path.dirname(destination_dir)):
+            raise ValueError(f"Bad path: {new_path}")
+        if destination_dir.startswith(os.path.join(source_dir, "")):
+            raise ValueError(f"Can't copy or move a directory into itself: {path}")
+        return source_dir, destination_dir
+
+    def copy_dir(self, path: str, new_path: str, session: str = DEFAULT_SESSION) -> dict:
+        """Copy a directory tree. Files are copied in parallel by `copy_workers` threads, see copy_file().
+
+        Hidden files and directories and symlinks are skipped. If a file fails to copy, files which are
+        already copied are kept.
+
+        Args:
+            path (str): Path to an existing directory relative to working directory.
+            new_path (str): Path to the copy, which must not exist.
+            session (str): Session ID, see change_dir().
+
+        Returns:
+            Dict with keys: path (path to the copy relative to data directory), files (number of copied files).
+
+        Raises:
+            OSError: EDQUOT, if the copy would exceed a quota, see set_quota().
+            RuntimeError: if directory does not exist.
+            ValueError: if a path is invalid or the destination exists.
+        """
+
+        self._logger.debug(f'Copying directory "{path}" to "{new_path}"')
+
+        source_dir, destination_dir = self._dir_paths(path, new_path, session)
+
+        copies = list()
+        dirs = [(source_dir, destination_dir)]
+        while dirs:
+            cur_dir, new_dir = dirs.pop()
+            os.mkdir(new_dir)
+            for name in self._scan_dir(cur_dir):
+                copies.append((os.path.join(cur_dir, name), os.path.join(new_dir, name)))
+            with os.scandir(cur_dir) as entries:
+                for entry in entries:
+                    if not entry.name.startswith(".") and entry.is_dir(follow_symlinks=False):
+                        dirs.append((entry.path, os.path.join(new_dir, entry.name)))
+
+        workers = max(1, int(self._config["copy_workers"]))
+        with futures.ThreadPoolExecutor(max_workers=workers, thread_name_prefix="CopyWorker") as executor:
+            results = [executor.submit(self._copy_file, source, destination) for source, destination in copies]
+        for result in results:
+            result.result()
+
+        self._logger.debug(f"{len(copies)} files copied")
+
+        return dict(path=self._make_path_relative(destination_dir), files=len(copies))
+
+    def move_dir(self, path: str, new_path: str, session: str = DEFAULT_SESSION) -> str:
+        """Move a directory tree by renaming it. Sessions whose working directory is moved follow it.
+
+        Args:
+            path (str): Path to an existing directory relative to working directory.
+            new_path (str): New path, which must not exist.
+            session (str): Session ID, see change_dir().
+
+        Returns:
+            New path relative to data directory.
+
+        Raises:
+            OSError: EDQUOT, if the tree would exceed a quota of the destination, see set_quota().
+            RuntimeError: if directory does not exist.
+            ValueError: if a path is invalid or the destination exists.
+        """
+
+        self._logger.debug(f'Moving directory "{path}" to "{new_path}"')
+
+        source_dir, destination_dir = self._dir_paths(path, new_path, session)
+
+        self._usage.move_tree(source_dir, destination_dir)
+        try:
+            os.rename(source_dir, destination_dir)
+        except BaseException:
+            self._usage.move_tree(destination_dir, source_dir)
+            raise
+        if self._packs is not None:
+            self._packs.move_tree(source_dir, destination_dir)
+        if self._catalog is not None:
+            self._catalog.move_tree(source_dir, destination_dir)
+        if self._search is not None:
+            self._search.move_tree(source_dir, destination_dir)
+        self._changes.publish("delete", source_dir, is_dir=True)
+        self._changes.publish("create", destination_dir, is_dir=True)
+        self._durability.sync_dir(os.path.dirname(destination_dir))
+        if os.path.dirname(source_dir) != os.path.dirname(destination_dir):
+            self._durability.sync_dir(os.path.dirname(source_dir))
+
+        prefix = os.path.join(source_dir, "")
+        with self._sessions_lock:
+            for work_session, work_dir in list(self._work_dirs.items()):
+                if work_dir == source_dir or work_dir.startswith(prefix):
+                    self._work_dirs[work_session] = destination_dir + work_dir[len(source_dir) :]
+
+        self._forget_dirs(source_dir)
+        if self._cache is not None:
+            self._cache.invalidate_tree(source_dir)
+        if self._contents is not None:
+            self._contents.invalidate_tree(source_dir)
+        self._logger.debug(f"Done")
+
+        return self._make_path_relative(destination_dir)
+
+    def delete_file(self, filename: str, session: str = DEFAULT_SESSION) -> None:
         """Delete file.
 
         Args:
             filename (str): filename
+            session (str): session ID, see change_dir()
 
         Raises:
             RuntimeError: if file does not exist.
@@ -304,9 +2392,26 @@ class FileService:
 
         if not self.is_pathname_valid(filename):
             raise ValueError(f"Bad filename: {filename}")
-        if not os.path.exists(filename):
+        path = self._resolve(filename, session)
+        if not self._exists(path):
             raise RuntimeError(f"File does not exist: {filename}")
 
-        os.remove(filename)
+        if self._is_packed(path):
+            record = self._packs.delete(path)
+            if record is None:
+                raise RuntimeError(f"File does not exist: {filename}")
+            self._usage.charge(os.path.dirname(path), -record.length, -1)
+            self._file_removed(path)
+            self._logger.debug("Done")
+            return
+
+        file_stat = os.lstat(path)
+        os.remove(path)
+        self._usage.charge(os.path.dirname(path), -file_stat.st_size, -1)
+        self._file_removed(path)
+        if self._blobs is not None:
+            self._blobs.release(file_stat)
+        if file_stat.st_nlink == 1:
+            self._hashes.forget(file_stat)
 
         self._logger.debug("Done")
@@ -0,0 +1,166 @@
+"""Persistent cache of file content hashes.
+
+Imports:
+    hashlib
+    os
+    sqlite3
+    threading
+
+Provides class:
+    HashCache
+
+Provides function:
+    is_reserved()
+"""
+
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import typing
+
+from .BlobStore import BLOBS_DIR
+
+# Service data is kept in a hidden directory, so that its updates don't change mtime of the data directory.
+META_DIR = ".meta"
+# Directories of the data directory which belong to the service, clients can't access them.
+RESERVED_DIRS = (META_DIR, BLOBS_DIR)
+HASHES_DB = "hashes.sqlite"
+READ_CHUNK_SIZE = 1024 * 1024
+
+
+def is_reserved(root: str, path: str) -> bool:
+    """Check if a path is in a directory reserved for the service, see RESERVED_DIRS.
+
+    Args:
+        root (str): Absolute path to data directory.
+        path (str): Absolute normalized path within data directory.
+    """
+
+    return os.path.relpath(path, root).split(os.sep, 1)[0] in RESERVED_DIRS
+
+
+def file_sha256(filename: str) -> typing.Tuple[str, os.stat_result]:
+    """Compute SHA-256 of a file content.
+
+    Args:
+        filename (str): Filename.
+
+    Returns:
+        Hex digest and stat result of the file taken before it was read.
+    """
+
+    hasher = hashlib.sha256()
+    with open(filename, "rb") as f:
+        stat_result = os.fstat(f.fileno())
+        for chunk in iter(lambda: f.read(READ_CHUNK_SIZE), b""):
+            hasher.update(chunk)
+    return hasher.hexdigest(), stat_result
+
+
+class HashCache:
+    """SHA-256 hashes of files keyed by (st_dev, st_ino, st_size, st_mtime_ns).
+
+    Hashes are kept in an SQLite database in the data directory, so they survive restarts.
+    A hash is recomputed only if the file has changed.
+    """
+
+    def __init__(self, root: str):
+        self._logger = logging.getLogger(__name__)
+        self._meta_dir = os.path.join(os.path.abspath(root), META_DIR)
+        self._db = None
+        self._lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._db is None:
+            os.makedirs(self._meta_dir, exist_ok=True)
+            db_path = os.path.join(self._meta_dir, HASHES_DB)
+            self._db = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None)
+            # It's a cache: losing the latest entries on a crash is fine, waiting for fsync on every write isn't.
+            self._db.execute("PRAGMA journal_mode = WAL")
+            self._db.execute("PRAGMA synchronous = OFF")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS hashes ("
+                " dev INTEGER, ino INTEGER, size INTEGER, mtime_ns INTEGER, sha256 TEXT,"
+                " PRIMARY KEY (dev, ino))"
+            )
+        return self._db
+
+    def get(self, stat_result: os.stat_result) -> typing.Optional[str]:
+        """Get a cached hash of a file.
+
+        Args:
+            stat_result (stat_result): Current stat result of the file.
+
+        Returns:
+            Hex digest or None if the file is unknown or has changed.
+        """
+
+        with self._lock:
+            row = (
+                self._connect()
+                .execute(
+                    "SELECT size, mtime_ns, sha256 FROM hashes WHERE dev = ? AND ino = ?",
+                    (stat_result.st_dev, stat_result.st_ino),
+                )
+                .fetchone()
+            )
+        if row is None or row[0] != stat_result.st_size or row[1] != stat_result.st_mtime_ns:
+            return None
+        return row[2]
+
+    def put(self, stat_result: os.stat_result, digest: str) -> None:
+        """Remember a hash of a file.
+
+        Args:
+            stat_result (stat_result): Stat result of the file.
+            digest (str): SHA-256 hex digest of the file content.
+        """
+
+        with self._lock:
+            self._connect().execute(
+                "INSERT OR REPLACE INTO hashes VALUES (?, ?, ?, ?, ?)",
+                (stat_result.st_dev, stat_result.st_ino, stat_result.st_size, stat_result.st_mtime_ns, digest),
+            )
+
+    def forget(self, stat_result: os.stat_result) -> None:
+        """Forget a hash of a removed file.
+
+        Args:
+            stat_result (stat_result): Stat result of the file taken before it was removed.
+        """
+
+        with self._lock:
+            self._connect().execute(
+                "DELETE FROM hashes WHERE dev = ? AND ino = ?", (stat_result.st_dev, stat_result.st_ino)
+            )
+
+    def hash_file(self, filename: str) -> str:
+        """Get SHA-256 of a file, computing it only if the file has changed since the last time.
+
+        Args:
+            filename (str): Filename.
+
+        Returns:
+            Hex digest of the file content.
+        """
+
+        digest = self.get(os.stat(filename))
+        if digest is not None:
+            return digest
+
+        self._logger.debug(f'Hashing file "{filename}"')
+        digest, stat_result = file_sha256(filename)
+        # Don't remember a hash of a file which was changed while it was read.
+        if os.stat(filename).st_mtime_ns == stat_result.st_mtime_ns:
+            self.put(stat_result, digest)
+        return digest
+
+    def close(self) -> None:
+        """Close the database."""
+
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
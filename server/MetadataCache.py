@@ -0,0 +1,393 @@
+"""Cache of directory listings.
+
+Imports:
+    collections
+    ctypes
+    os
+    struct
+    threading
+
+Provides class:
+    MetadataCache
+"""
+
+import collections
+import ctypes
+import ctypes.util
+import logging
+import os
+import struct
+import sys
+import threading
+import typing
+import weakref
+
+# Rough memory footprint of a cached file besides its name.
+ENTRY_SIZE = 200
+
+
+class _Inotify:
+    """Minimal ctypes binding of Linux inotify. Events are read without blocking."""
+
+    IN_MODIFY = 0x00000002
+    IN_ATTRIB = 0x00000004
+    IN_CLOSE_WRITE = 0x00000008
+    IN_MOVED_FROM = 0x00000040
+    IN_MOVED_TO = 0x00000080
+    IN_CREATE = 0x00000100
+    IN_DELETE = 0x00000200
+    IN_DELETE_SELF = 0x00000400
+    IN_MOVE_SELF = 0x00000800
+    IN_Q_OVERFLOW = 0x00004000
+    IN_IGNORED = 0x00008000
+    IN_ONLYDIR = 0x01000000
+
+    WATCH_MASK = (
+        IN_MODIFY
+        | IN_ATTRIB
+        | IN_CLOSE_WRITE
+        | IN_MOVED_FROM
+        | IN_MOVED_TO
+        | IN_CREATE
+        | IN_DELETE
+        | IN_DELETE_SELF
+        | IN_MOVE_SELF
+        | IN_ONLYDIR
+    )
+
+    _EVENT = struct.Struct("iIII")
+
+    def __init__(self):
+        self._libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        self._fd = self._libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self._finalizer = weakref.finalize(self, os.close, self._fd)
+
+    def add_watch(self, path: str) -> int:
+        wd = self._libc.inotify_add_watch(self._fd, os.fsencode(path), self.WATCH_MASK)
+        if wd < 0:
+            raise OSError(ctypes.get_errno(), f"inotify_add_watch failed: {path}")
+        return wd
+
+    def fileno(self) -> int:
+        return self._fd
+
+    def rm_watch(self, wd: int) -> None:
+        self._libc.inotify_rm_watch(self._fd, wd)
+
+    def read_events(self) -> typing.Iterator[typing.Tuple[int, int, str]]:
+        """Yield pending (wd, mask, name) events."""
+
+        while True:
+            try:
+                buffer = os.read(self._fd, 64 * 1024)
+            except BlockingIOError:
+                return
+            offset = 0
+            while offset < len(buffer):
+                wd, mask, _, length = self._EVENT.unpack_from(buffer, offset)
+                offset += self._EVENT.size
+                name = os.fsdecode(buffer[offset : offset + length].rstrip(b"\0"))
+                offset += length
+                yield wd, mask, name
+
+    def close(self) -> None:
+        self._finalizer()
+
+
+class _CachedDir:
+    """Cached listing of a directory."""
+
+    __slots__ = ("files", "wd", "mtime_ns", "size")
+
+    def __init__(self, files: dict, wd: typing.Optional[int], mtime_ns: int):
+        self.files = files
+        self.wd = wd
+        self.mtime_ns = mtime_ns
+        self.size = sum(ENTRY_SIZE + len(name) for name in files)
+
+
+class MetadataCache:
+    """LRU cache of stat results of files keyed by directory.
+
+    Entries are invalidated by inotify events on Linux. Elsewhere, or if a directory can't be watched,
+    an entry is valid while modification time of its directory doesn't change. The latter doesn't detect
+    in-place modifications of files made bypassing FileService.
+
+    Hidden files are never cached and changes of them are ignored.
+    """
+
+    def __init__(self, max_entries: int, max_bytes: int):
+        self._logger = logging.getLogger(__name__)
+        self._max_entries = max_entries
+        self._max_bytes = max_bytes
+        self._dirs = collections.OrderedDict()
+        self._entries = 0
+        self._bytes = 0
+        self._lock = threading.RLock()
+        # Watch descriptor -> directory path and number of changes seen in it.
+        self._watched = dict()
+        self._generations = collections.Counter()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        # Created on first use, see _start_inotify().
+        self._inotify = None
+        self._inotify_failed = not sys.platform.startswith("linux")
+
+    def _start_inotify(self) -> None:
+        if self._inotify is not None or self._inotify_failed:
+            return
+        try:
+            self._inotify = _Inotify()
+        except OSError as e:
+            self._inotify_failed = True
+            self._logger.warning(f"inotify is not available, directory mtime is used: {e}")
+
+    def _drain_events(self, ignore: typing.Tuple[str, str] = None) -> None:
+        """Apply pending inotify events.
+
+        Args:
+            ignore (tuple): (directory, name) of a file whose changes are already known to the cache.
+        """
+
+        if self._inotify is None:
+            return
+        for wd, mask, name in self._inotify.read_events():
+            if mask & _Inotify.IN_Q_OVERFLOW:
+                self._logger.debug("inotify queue overflow, cache is cleared")
+                self.clear()
+                continue
+            path = self._watched.get(wd)
+            if path is None or name.startswith(".") or ignore == (path, name):
+                continue
+            self._generations[wd] += 1
+            self._drop(path)
+            if mask & _Inotify.IN_IGNORED:
+                self._watched.pop(wd, None)
+
+    def _drop(self, path: str) -> None:
+        """Remove directory from the cache."""
+
+        cached = self._dirs.pop(path, None)
+        if cached is None:
+            return
+        self._entries -= len(cached.files)
+        self._bytes -= cached.size
+        if cached.wd is not None and self._watched.get(cached.wd) == path:
+            del self._watched[cached.wd]
+            self._generations.pop(cached.wd, None)
+            self._inotify.rm_watch(cached.wd)
+
+    def _lookup(self, path: str) -> typing.Optional[_CachedDir]:
+        """Find a valid cached directory."""
+
+        self._drain_events()
+        cached = self._dirs.get(path)
+        if cached is None:
+            return None
+        if cached.wd is None:
+            try:
+                mtime_ns = os.stat(path).st_mtime_ns
+            except OSError:
+                mtime_ns = None
+            if mtime_ns != cached.mtime_ns:
+                self._drop(path)
+                return None
+        self._dirs.move_to_end(path)
+        return cached
+
+    def get(self, path: str) -> typing.Optional[dict]:
+        """Get cached listing of a directory.
+
+        Args:
+            path (str): Absolute path to a directory.
+
+        Returns:
+            Dict of file names and their stat results or None if the directory isn't cached.
+        """
+
+        with self._lock:
+            cached = self._lookup(path)
+            if cached is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return dict(cached.files)
+
+    def get_file(self, path: str, name: str) -> typing.Optional[os.stat_result]:
+        """Get cached stat result of a file.
+
+        Args:
+            path (str): Absolute path to a directory.
+            name (str): File name.
+
+        Returns:
+            Stat result or None if the directory isn't cached or has no such file.
+        """
+
+        with self._lock:
+            cached = self._lookup(path)
+            stat_result = cached.files.get(name) if cached is not None else None
+            if stat_result is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            return stat_result
+
+    def begin(self, path: str) -> tuple:
+        """Start watching a directory before it's scanned.
+
+        Args:
+            path (str): Absolute path to a directory.
+
+        Returns:
+            Token to be passed to put() along with the scanned listing.
+        """
+
+        with self._lock:
+            wd = None
+            self._start_inotify()
+            if self._inotify is not None:
+                try:
+                    wd = self._inotify.add_watch(path)
+                    self._watched[wd] = path
+                except OSError as e:
+                    self._logger.debug(f"{e}, directory mtime is used")
+            self._drain_events()
+            return wd, self._generations[wd], os.stat(path).st_mtime_ns
+
+    def put(self, path: str, files: dict, token: tuple) -> None:
+        """Cache listing of a directory.
+
+        The listing is dropped if the directory has changed since begin() was called.
+
+        Args:
+            path (str): Absolute path to a directory.
+            files (dict): File names and their stat results.
+            token (tuple): Value returned by begin().
+        """
+
+        wd, generation, mtime_ns = token
+        with self._lock:
+            self._drain_events()
+            try:
+                unchanged = os.stat(path).st_mtime_ns == mtime_ns
+            except OSError:
+                unchanged = False
+            if wd is not None and (self._watched.get(wd) != path or self._generations[wd] != generation):
+                unchanged = False
+
+            cached = _CachedDir(files, wd, mtime_ns)
+            if not unchanged or len(files) > self._max_entries or cached.size > self._max_bytes:
+                if wd is not None and path not in self._dirs and self._watched.get(wd) == path:
+                    del self._watched[wd]
+                    self._generations.pop(wd, None)
+                    self._inotify.rm_watch(wd)
+                return
+
+            old = self._dirs.pop(path, None)
+            if old is not None:
+                self._entries -= len(old.files)
+                self._bytes -= old.size
+            self._dirs[path] = cached
+            self._entries += len(files)
+            self._bytes += cached.size
+
+            while self._entries > self._max_entries or self._bytes > self._max_bytes:
+                oldest = next(iter(self._dirs))
+                self._drop(oldest)
+                self.evictions += 1
+
+    def update_file(self, path: str, name: str, stat_result: os.stat_result) -> None:
+        """Add or replace a file made by FileService in a cached directory.
+
+        Args:
+            path (str): Absolute path to a directory.
+            name (str): File name.
+            stat_result (stat_result): Stat result of the file.
+        """
+
+        if name.startswith("."):
+            return
+        with self._lock:
+            self._drain_events(ignore=(path, name))
+            cached = self._dirs.get(path)
+            if cached is None:
+                return
+            if name not in cached.files:
+                self._entries += 1
+                self._bytes += ENTRY_SIZE + len(name)
+                cached.size += ENTRY_SIZE + len(name)
+            cached.files[name] = stat_result
+            cached.mtime_ns = os.stat(path).st_mtime_ns
+
+    def remove_file(self, path: str, name: str) -> None:
+        """Remove a file deleted by FileService from a cached directory.
+
+        Args:
+            path (str): Absolute path to a directory.
+            name (str): File name.
+        """
+
+        with self._lock:
+            self._drain_events(ignore=(path, name))
+            cached = self._dirs.get(path)
+            if cached is None:
+                return
+            if cached.files.pop(name, None) is not None:
+                self._entries -= 1
+                self._bytes -= ENTRY_SIZE + len(name)
+                cached.size -= ENTRY_SIZE + len(name)
+            try:
+                cached.mtime_ns = os.stat(path).st_mtime_ns
+            except OSError:
+                self._drop(path)
+
+    def invalidate_tree(self, path: str) -> None:
+        """Remove a directory and all its subdirectories from the cache.
+
+        Args:
+            path (str): Absolute path to a directory.
+        """
+
+        prefix = os.path.join(path, "")
+        with self._lock:
+            for cached_path in [p for p in self._dirs if p == path or p.startswith(prefix)]:
+                self._drop(cached_path)
+
+    def clear(self) -> None:
+        """Remove all directories from the cache."""
+
+        with self._lock:
+            for path in list(self._dirs):
+                self._drop(path)
+
+    def stats(self) -> dict:
+        """Get cache counters.
+
+        Returns:
+            Dict with keys: directories, entries, bytes, hits, misses, evictions.
+        """
+
+        with self._lock:
+            return dict(
+                directories=len(self._dirs),
+                entries=self._entries,
+                bytes=self._bytes,
+                hits=self.hits,
+                misses=self.misses,
+                evictions=self.evictions,
+            )
+
+    def close(self) -> None:
+        """Stop watching directories."""
+
+        with self._lock:
+            self.clear()
+            if self._inotify is not None:
+                self._inotify.close()
+                self._inotify = None
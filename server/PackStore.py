@@ -0,0 +1,563 @@
+"""Storage of small files in pack files.
+
+Imports:
+    os
+    sqlite3
+    threading
+
+Provides class:
+    PackStore
+"""
+
+import logging
+import os
+import sqlite3
+import stat
+import threading
+import time
+import typing
+
+from .HashCache import META_DIR
+
+PACKS_DIR = "packs"
+INDEX_DB = "index.sqlite"
+# A new pack is started when the current one grows larger.
+PACK_SIZE = 64 * 1024 * 1024
+# A pack is compacted when at most this part of it is still used.
+COMPACT_RATIO = 0.5
+# Seconds after which removing a compacted pack is tried again if it failed, e.g. while a reader
+# had the pack open on Windows.
+REMOVE_RETRY_DELAY = 1.0
+# Packs are binary files, no newline translation on Windows.
+O_BINARY = getattr(os, "O_BINARY", 0)
+
+
+def _pread(fd: int, size: int, offset: int) -> bytes:
+    if hasattr(os, "pread"):
+        return os.pread(fd, size, offset)
+    # No positional reads on Windows, descriptors of readers aren't shared.
+    os.lseek(fd, offset, os.SEEK_SET)
+    return os.read(fd, size)
+
+
+def _pwrite(fd: int, data: bytes, offset: int) -> None:
+    view = memoryview(data)
+    if not hasattr(os, "pwrite"):
+        # No positional writes on Windows, the descriptor of the current pack is used under the lock.
+        os.lseek(fd, offset, os.SEEK_SET)
+    while view:
+        if hasattr(os, "pwrite"):
+            count = os.pwrite(fd, view, offset)
+        else:
+            count = os.write(fd, view)
+        offset += count
+        view = view[count:]
+
+
+class _Record:
+    """Location and metadata of a packed file."""
+
+    __slots__ = ("rowid", "pack", "offset", "length", "ctime_ns", "mtime_ns", "sha256")
+
+    def __init__(self, rowid: int, pack: int, offset: int, length: int, ctime_ns: int, mtime_ns: int, sha256: str):
+        self.rowid = rowid
+        self.pack = pack
+        self.offset = offset
+        self.length = length
+        self.ctime_ns = ctime_ns
+        self.mtime_ns = mtime_ns
+        self.sha256 = sha256
+
+    def stat(self) -> os.stat_result:
+        """Make a stat result of a regular file. Packed files have st_dev 0 and unique st_ino."""
+
+        return os.stat_result(
+            (
+                stat.S_IFREG | 0o644,
+                self.rowid,
+                0,
+                1,
+                0,
+                0,
+                self.length,
+                self.mtime_ns // 10**9,
+                self.mtime_ns // 10**9,
+                self.ctime_ns // 10**9,
+                self.mtime_ns / 10**9,
+                self.mtime_ns / 10**9,
+                self.ctime_ns / 10**9,
+                self.mtime_ns,
+                self.mtime_ns,
+                self.ctime_ns,
+            )
+        )
+
+
+class _PackReader:
+    """Sequential reader of a packed file."""
+
+    def __init__(self, fd: int, start: int, end: int):
+        self._fd = fd
+        self._position = start
+        self._end = end
+
+    def read(self, size: int) -> bytes:
+        data = _pread(self._fd, min(size, self._end - self._position), self._position)
+        self._position += len(data)
+        return data
+
+    def close(self) -> None:
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+
+class PackStore:
+    """Stores small files appended to large pack files.
+
+    Packs are kept in `<root>/.meta/packs`, an SQLite index maps a directory and a file name
+    to a pack, offset and length of the content. Files of a directory are listed with one index range scan
+    and read with one positional read, no inode is made per file.
+
+    Deleted and replaced files leave unused space in packs. A background thread copies files which are still
+    used out of packs which are mostly unused and removes such packs. Readers which find a pack removed
+    look the file up again. Packs which can't be removed while readers have them open, as on Windows,
+    are removed later.
+
+    Content is appended to a pack and flushed before the index refers to it, so a crash leaves at most
+    unused space at the end of the pack.
+    """
+
+    def __init__(self, root: str, sync_file: typing.Optional[typing.Callable[[int], None]] = None):
+        """
+        Args:
+            root (str): Data directory.
+            sync_file (Callable): Function which flushes a pack to disk before the index refers to its content.
+        """
+
+        self._logger = logging.getLogger(__name__)
+        self._root = os.path.abspath(root)
+        self._dir = os.path.join(self._root, META_DIR, PACKS_DIR)
+        os.makedirs(self._dir, exist_ok=True)
+        self._sync_file = sync_file
+        self._lock = threading.Lock()
+
+        self._db = sqlite3.connect(os.path.join(self._dir, INDEX_DB), check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode = WAL")
+        self._db.execute(f"PRAGMA synchronous = {'FULL' if sync_file is not None else 'NORMAL'}")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS files ("
+            " dir TEXT, name TEXT, pack INTEGER, offset INTEGER, length INTEGER,"
+            " ctime_ns INTEGER, mtime_ns INTEGER, sha256 TEXT,"
+            " PRIMARY KEY (dir, name))"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS files_pack ON files (pack)")
+
+        # Pack ID -> size of the pack file and size of files in it which are still used.
+        self._sizes = dict()
+        self._live = dict()
+        for filename in os.listdir(self._dir):
+            if filename.startswith("pack-") and filename.endswith(".dat"):
+                pack = int(filename[5:-4])
+                self._sizes[pack] = os.path.getsize(os.path.join(self._dir, filename))
+                self._live[pack] = 0
+        for pack, length in self._db.execute("SELECT pack, SUM(length) FROM files GROUP BY pack"):
+            self._live[pack] = length
+        self._current = None
+        self._fd = None
+        # IDs of removed packs aren't reused, so that a stale record never points into another pack.
+        self._last_pack = max(self._sizes, default=0)
+        if self._sizes and self._sizes[max(self._sizes)] < PACK_SIZE:
+            # Appending goes on where the previous run stopped.
+            self._current = max(self._sizes)
+            self._fd = os.open(self._pack_path(self._current), os.O_WRONLY | O_BINARY)
+
+        self._wakeup = threading.Event()
+        # Compacted packs which couldn't be removed yet.
+        self._unremoved = set()
+        # Serializes compactions by the background thread and by callers of compact().
+        self._compaction_lock = threading.Lock()
+        self._stopped = False
+        self._thread = None
+        self.compactions = 0
+        self._schedule_compaction()
+
+    def _pack_path(self, pack: int) -> str:
+        return os.path.join(self._dir, f"pack-{pack:08d}.dat")
+
+    def _key(self, path: str) -> typing.Tuple[str, str]:
+        directory, name = os.path.split(path)
+        return os.path.relpath(directory, self._root), name
+
+    def _tree_condition(self, directory: str, column: str = "dir") -> typing.Tuple[str, tuple]:
+        """Get SQL condition and its parameters which select files of a directory tree by their `column`."""
+
+        key = os.path.relpath(directory, self._root)
+        if key == os.curdir:
+            return "1", ()
+        # Paths of subdirectories sort between `key/` and `key0`.
+        return f"({column} = ? OR ({column} >= ? AND {column} < ?))", (key, key + os.sep, key + chr(ord(os.sep) + 1))
+
+    def _append(self, data: bytes) -> typing.Tuple[int, int]:
+        """Append data to the current pack and flush it.
+
+        Returns:
+            Pack ID and offset of the data.
+        """
+
+        with self._lock:
+            if self._fd is None or self._sizes[self._current] + len(data) > PACK_SIZE:
+                self._start_pack()
+            pack, offset = self._current, self._sizes[self._current]
+            _pwrite(self._fd, data, offset)
+            self._sizes[pack] += len(data)
+            sync_fd = os.dup(self._fd) if self._sync_file is not None else None
+        if sync_fd is not None:
+            try:
+                self._sync_file(sync_fd)
+            finally:
+                os.close(sync_fd)
+        return pack, offset
+
+    def _start_pack(self) -> None:
+        """Switch to a new pack. Called with the lock held."""
+
+        if self._fd is not None:
+            os.close(self._fd)
+        self._last_pack += 1
+        self._current = self._last_pack
+        self._fd = os.open(self._pack_path(self._current), os.O_WRONLY | os.O_CREAT | os.O_EXCL | O_BINARY, 0o644)
+        self._sizes[self._current] = 0
+        self._live[self._current] = 0
+        self._logger.debug(f"Pack {self._current} started")
+
+    def _lookup(self, directory: str, name: str) -> typing.Optional[_Record]:
+        row = self._db.execute(
+            "SELECT rowid, pack, offset, length, ctime_ns, mtime_ns, sha256 FROM files WHERE dir = ? AND name = ?",
+            (directory, name),
+        ).fetchone()
+        return _Record(*row) if row is not None else None
+
+    def get(self, path: str) -> typing.Optional[_Record]:
+        """Find a packed file.
+
+        Args:
+            path (str): Absolute path to the file.
+
+        Returns:
+            Record with stat() method or None if there is no such packed file.
+        """
+
+        with self._lock:
+            return self._lookup(*self._key(path))
+
+    def _open(self, path: str) -> typing.Tuple[typing.Optional[_Record], typing.Optional[int]]:
+        """Find a packed file and open its pack. The file is looked up again if its pack was compacted."""
+
+        record = self.get(path)
+        while record is not None:
+            try:
+                return record, os.open(self._pack_path(record.pack), os.O_RDONLY | O_BINARY)
+            except FileNotFoundError:
+                current = self.get(path)
+                # Unless the file was moved to another pack meanwhile, the pack is really missing.
+                if current is not None and (current.pack, current.offset) == (record.pack, record.offset):
+                    raise
+                record = current
+        return None, None
+
+    def read(self, path: str) -> typing.Optional[bytes]:
+        """Read content of a packed file.
+
+        Args:
+            path (str): Absolute path to the file.
+
+        Returns:
+            File content or None if there is no such packed file.
+        """
+
+        record, fd = self._open(path)
+        if record is None:
+            return None
+        try:
+            return _pread(fd, record.length, record.offset)
+        finally:
+            os.close(fd)
+
+    def open_reader(self, path: str, offset: int = 0) -> typing.Optional[_PackReader]:
+        """Open a packed file for sequential reading.
+
+        Args:
+            path (str): Absolute path to the file.
+            offset (int): Position of the first byte to read.
+
+        Returns:
+            Reader object with read(size) and close() methods or None if there is no such packed file.
+        """
+
+        record, fd = self._open(path)
+        if record is None:
+            return None
+        return _PackReader(fd, record.offset + min(offset, record.length), record.offset + record.length)
+
+    def list_dir(self, directory: str) -> dict:
+        """Get packed files of a directory.
+
+        Args:
+            directory (str): Absolute path to the directory.
+
+        Returns:
+            Dict of file names and their stat results.
+        """
+
+        key = os.path.relpath(directory, self._root)
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT name, rowid, pack, offset, length, ctime_ns, mtime_ns, sha256 FROM files WHERE dir = ?",
+                (key,),
+            ).fetchall()
+        return {row[0]: _Record(*row[1:]).stat() for row in rows}
+
+    def has_tree(self, directory: str) -> bool:
+        """Check if a directory tree has packed files.
+
+        Args:
+            directory (str): Absolute path to the directory.
+        """
+
+        condition, params = self._tree_condition(directory)
+        with self._lock:
+            return self._db.execute(f"SELECT 1 FROM files WHERE {condition} LIMIT 1", params).fetchone() is not None
+
+    def usage(self) -> typing.Iterator[typing.Tuple[str, int, int]]:
+        """Get size and number of packed files of every directory.
+
+        Yields:
+            Absolute path to a directory, total size and number of its packed files.
+        """
+
+        with self._lock:
+            rows = self._db.execute("SELECT dir, SUM(length), COUNT(*) FROM files GROUP BY dir").fetchall()
+        for directory, size, files in rows:
+            yield os.path.normpath(os.path.join(self._root, directory)), size, files
+
+    def put(self, path: str, content: bytes, digest: str) -> _Record:
+        """Store a file, replacing a packed file with the same name.
+
+        Args:
+            path (str): Absolute path to the file.
+            content (bytes): File content.
+            digest (str): SHA-256 hex digest of the content.
+
+        Returns:
+            Record of the stored file.
+        """
+
+        directory, name = self._key(path)
+        pack, offset = self._append(content)
+        now = time.time_ns()
+        with self._lock:
+            old = self._lookup(directory, name)
+            cursor = self._db.execute(
+                "INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (directory, name, pack, offset, len(content), now, now, digest),
+            )
+            self._live[pack] += len(content)
+            if old is not None:
+                self._live[old.pack] -= old.length
+            record = _Record(cursor.lastrowid, pack, offset, len(content), now, now, digest)
+        if old is not None:
+            self._schedule_compaction()
+        return record
+
+    def delete(self, path: str) -> typing.Optional[_Record]:
+        """Delete a packed file.
+
+        Args:
+            path (str): Absolute path to the file.
+
+        Returns:
+            Record of the deleted file or None if there was no such packed file.
+        """
+
+        directory, name = self._key(path)
+        with self._lock:
+            old = self._lookup(directory, name)
+            if old is None:
+                return None
+            self._db.execute("DELETE FROM files WHERE dir = ? AND name = ?", (directory, name))
+            self._live[old.pack] -= old.length
+        self._schedule_compaction()
+        return old
+
+    def remove_tree(self, directory: str) -> None:
+        """Delete packed files of a directory tree.
+
+        Args:
+            directory (str): Absolute path to the directory.
+        """
+
+        condition, params = self._tree_condition(directory)
+        with self._lock:
+            self._db.execute("BEGIN")
+            rows = self._db.execute(
+                f"SELECT pack, SUM(length) FROM files WHERE {condition} GROUP BY pack", params
+            ).fetchall()
+            self._db.execute(f"DELETE FROM files WHERE {condition}", params)
+            self._db.execute("COMMIT")
+            for pack, length in rows:
+                self._live[pack] -= length
+        if rows:
+            self._schedule_compaction()
+
+    def move_tree(self, directory: str, new_directory: str) -> None:
+        """Move packed files of a directory tree which was renamed. Packed files they replace are deleted.
+
+        Args:
+            directory (str): Absolute path to the old directory.
+            new_directory (str): Absolute path to the new directory.
+        """
+
+        condition, params = self._tree_condition(directory, column="moved.dir")
+        key = os.path.relpath(directory, self._root)
+        new_key = os.path.relpath(new_directory, self._root)
+        with self._lock:
+            self._db.execute("BEGIN")
+            replaced = self._db.execute(
+                "SELECT replaced.rowid, replaced.pack, replaced.length FROM files AS moved JOIN files AS replaced"
+                f" ON replaced.dir = ? || substr(moved.dir, ?) AND replaced.name = moved.name WHERE {condition}",
+                (new_key, len(key) + 1) + params,
+            ).fetchall()
+            self._db.executemany("DELETE FROM files WHERE rowid = ?", [(rowid,) for rowid, _, _ in replaced])
+            condition, params = self._tree_condition(directory)
+            self._db.execute(
+                f"UPDATE files SET dir = ? || substr(dir, ?) WHERE {condition}", (new_key, len(key) + 1) + params
+            )
+            self._db.execute("COMMIT")
+            for _, pack, length in replaced:
+                self._live[pack] -= length
+        if replaced:
+            self._schedule_compaction()
+
+    def _sparse_packs(self) -> list:
+        """Get IDs of packs which should be compacted. Called with the lock held."""
+
+        return [
+            pack
+            for pack, size in self._sizes.items()
+            if pack != self._current and self._live.get(pack, 0) <= size * COMPACT_RATIO
+        ]
+
+    def _schedule_compaction(self) -> None:
+        with self._lock:
+            if self._stopped or not self._sparse_packs():
+                return
+            self._wakeup.set()
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="PackCompactor", daemon=True)
+                self._thread.start()
+
+    def _run(self) -> None:
+        retry = False
+        while True:
+            self._wakeup.wait(REMOVE_RETRY_DELAY if retry else None)
+            self._wakeup.clear()
+            if self._stopped:
+                return
+            try:
+                self.compact()
+            except Exception as e:
+                self._logger.error(f"Compaction failed: {e}")
+            with self._lock:
+                retry = bool(self._unremoved)
+
+    def compact(self) -> int:
+        """Move used files out of mostly unused packs and remove the packs.
+
+        Returns:
+            Number of removed packs.
+        """
+
+        with self._compaction_lock:
+            return self._compact()
+
+    def _compact(self) -> int:
+        with self._lock:
+            packs = self._sparse_packs()
+        removed = 0
+        for pack in packs:
+            if self._stopped:
+                break
+            with self._lock:
+                rows = self._db.execute(
+                    "SELECT dir, name, offset, length FROM files WHERE pack = ?", (pack,)
+                ).fetchall()
+            self._logger.debug(f"Compacting pack {pack}: {len(rows)} files")
+            if rows:
+                fd = os.open(self._pack_path(pack), os.O_RDONLY | O_BINARY)
+                try:
+                    for directory, name, offset, length in rows:
+                        new_pack, new_offset = self._append(_pread(fd, length, offset))
+                        with self._lock:
+                            moved = self._db.execute(
+                                "UPDATE files SET pack = ?, offset = ?"
+                                " WHERE dir = ? AND name = ? AND pack = ? AND offset = ?",
+                                (new_pack, new_offset, directory, name, pack, offset),
+                            ).rowcount
+                            if moved:
+                                self._live[new_pack] += length
+                                self._live[pack] -= length
+                finally:
+                    os.close(fd)
+
+            with self._lock:
+                if self._db.execute("SELECT 1 FROM files WHERE pack = ? LIMIT 1", (pack,)).fetchone() is not None:
+                    continue
+                try:
+                    os.remove(self._pack_path(pack))
+                except FileNotFoundError:
+                    pass
+                except OSError as e:
+                    # Windows doesn't remove files which are open, readers of the pack still have it.
+                    self._logger.debug(f"Pack {pack} can't be removed yet: {e}")
+                    self._unremoved.add(pack)
+                    continue
+                self._unremoved.discard(pack)
+                del self._sizes[pack]
+                self._live.pop(pack, None)
+            removed += 1
+
+        with self._lock:
+            self.compactions += removed
+        return removed
+
+    def stats(self) -> dict:
+        """Get pack counters.
+
+        Returns:
+            Dict with keys: packs, files, bytes (size of packs), live_bytes (size of used files), compactions.
+        """
+
+        with self._lock:
+            files = self._db.execute("SELECT COUNT(*) FROM files").fetchone()[0]
+            return dict(
+                packs=len(self._sizes),
+                files=files,
+                bytes=sum(self._sizes.values()),
+                live_bytes=sum(self._live.values()),
+                compactions=self.compactions,
+            )
+
+    def close(self) -> None:
+        """Stop compaction and close the index."""
+
+        with self._lock:
+            self._stopped = True
+            self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join()
+        with self._lock:
+            if self._fd is not None:
+                os.close(self._fd)
+                self._fd = None
+            self._db.close()
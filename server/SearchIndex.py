@@ -0,0 +1,461 @@
+"""Full-text index of text files.
+
+Imports:
+    os
+    sqlite3
+    threading
+
+Provides class:
+    SearchIndex
+"""
+
+import contextlib
+import logging
+import os
+import sqlite3
+import threading
+import time
+import typing
+
+from .HashCache import META_DIR, is_reserved
+
+SEARCH_DB = "search.sqlite"
+# Key of the data directory itself.
+ROOT = "."
+# Lines of a file are rows with rowid `document_id << LINE_BITS | line_number`.
+LINE_BITS = 24
+MAX_LINES = (1 << LINE_BITS) - 1
+# Only the start of larger files is indexed.
+MAX_INDEXED_BYTES = 32 * 1024 * 1024
+# Files with a NUL byte at the start or which aren't UTF-8 there aren't text.
+SNIFF_BYTES = 8192
+# Number of tokens in a snippet.
+SNIPPET_TOKENS = 16
+
+
+class SearchIndex:
+    """Inverted index of lines of text files, kept in an SQLite FTS5 table.
+
+    Added files are queued and indexed in background by a pool of `workers` threads, which run with
+    the lowest scheduling priority, wait while foreground operations run (see foreground()) and read at most
+    `rate` bytes per second. The index stores line text, so searches don't read files. If the index wasn't
+    closed cleanly, all files are compared with it on start. Hidden files and directories aren't indexed.
+    """
+
+    def __init__(
+        self,
+        root: str,
+        read_file: typing.Callable[[str, int], typing.Optional[typing.Tuple[int, int, bytes]]],
+        list_dir: typing.Callable[[str], typing.Dict[str, typing.Tuple[int, int, int]]],
+        workers: int,
+        rate: int,
+    ):
+        """
+        Args:
+            root (str): Data directory.
+            read_file (Callable): Function which reads up to a number of bytes of a file by its absolute path
+                and returns its size, st_mtime_ns and content, or None if it doesn't exist.
+            list_dir (Callable): Function which gets files of a directory by its absolute path, as a dict
+                of names and tuples of size, st_ctime_ns and st_mtime_ns.
+            workers (int): Number of indexing threads.
+            rate (int): Maximum number of bytes read per second, 0 for no limit.
+        """
+
+        self._logger = logging.getLogger(__name__)
+        self._root = os.path.abspath(root)
+        self._read_file = read_file
+        self._list_dir = list_dir
+        self._workers = max(1, workers)
+        self._rate = rate
+
+        self._lock = threading.Lock()
+        # Absolute paths waiting for indexing, in order of addition.
+        self._queue = dict()
+        # Paths being indexed and paths among them removed meanwhile, whose results are dropped.
+        self._indexing = set()
+        self._cancelled = set()
+        self._wakeup = threading.Event()
+        self._done = threading.Event()
+        self._done.set()
+        # Set while no foreground operations run, see foreground().
+        self._foreground = 0
+        self._idle = threading.Event()
+        self._idle.set()
+        self._stopped = False
+        self._thread = None
+        # Time when the next byte may be read, see _throttle().
+        self._next_read = 0.0
+        self.indexed = 0
+        self.indexed_bytes = 0
+
+        os.makedirs(os.path.join(self._root, META_DIR), exist_ok=True)
+        self._db = sqlite3.connect(
+            os.path.join(self._root, META_DIR, SEARCH_DB), check_same_thread=False, isolation_level=None
+        )
+        self._db.execute("PRAGMA journal_mode = WAL")
+        self._db.execute("PRAGMA synchronous = NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS documents ("
+            " id INTEGER PRIMARY KEY, dir TEXT, name TEXT, size INTEGER, mtime_ns INTEGER, UNIQUE (dir, name))"
+        )
+        self._db.execute("CREATE VIRTUAL TABLE IF NOT EXISTS lines USING fts5 (text)")
+        self._db.execute("CREATE TABLE IF NOT EXISTS state (key TEXT PRIMARY KEY, value REAL)")
+
+        clean = self._db.execute("SELECT value FROM state WHERE key = 'clean'").fetchone()
+        self._rebuild = clean is None or not clean[0]
+        self._db.execute("INSERT OR REPLACE INTO state VALUES ('clean', 0)")
+        if self._rebuild:
+            self._logger.info("Search index wasn't saved, comparing it with files")
+            self._start()
+
+    def _start(self) -> None:
+        with self._lock:
+            self._done.clear()
+            self._wakeup.set()
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="SearchIndex", daemon=True)
+                self._thread.start()
+
+    def _key(self, path: str) -> typing.Tuple[str, str]:
+        directory, name = os.path.split(path)
+        return os.path.relpath(directory, self._root), name
+
+    def _tree_condition(self, directory: str) -> typing.Tuple[str, tuple]:
+        """Get SQL condition and its parameters which select documents of a directory tree."""
+
+        key = os.path.relpath(directory, self._root)
+        if key == ROOT:
+            return "1", ()
+        # Paths of subdirectories sort between `key/` and `key0`.
+        return "(dir = ? OR (dir >= ? AND dir < ?))", (key, key + os.sep, key + chr(ord(os.sep) + 1))
+
+    @contextlib.contextmanager
+    def foreground(self):
+        """Context manager which pauses indexing while a foreground operation runs."""
+
+        with self._lock:
+            self._foreground += 1
+            self._idle.clear()
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._foreground -= 1
+                if not self._foreground:
+                    self._idle.set()
+
+    def add(self, path: str) -> None:
+        """Queue a new or changed file for indexing.
+
+        Args:
+            path (str): Absolute path to the file.
+        """
+
+        if os.path.basename(path).startswith(".") or is_reserved(self._root, path):
+            return
+        with self._lock:
+            self._queue.pop(path, None)
+            self._queue[path] = None
+        self._start()
+
+    def _delete(self, document_id: int) -> None:
+        """Delete a document and its lines. Called with the lock held."""
+
+        self._db.execute("DELETE FROM documents WHERE id = ?", (document_id,))
+        self._db.execute(
+            "DELETE FROM lines WHERE rowid BETWEEN ? AND ?",
+            (document_id << LINE_BITS, (document_id << LINE_BITS) | MAX_LINES),
+        )
+
+    def remove(self, path: str) -> None:
+        """Remove a file from the index.
+
+        Args:
+            path (str): Absolute path to the file.
+        """
+
+        with self._lock:
+            self._queue.pop(path, None)
+            if path in self._indexing:
+                self._cancelled.add(path)
+            row = self._db.execute("SELECT id FROM documents WHERE dir = ? AND name = ?", self._key(path)).fetchone()
+            if row is not None:
+                self._db.execute("BEGIN")
+                self._delete(row[0])
+                self._db.execute("COMMIT")
+
+    def _affected(self, directory: str) -> typing.Callable[[str], bool]:
+        prefix = os.path.join(directory, "")
+        return lambda path: path.startswith(prefix)
+
+    def remove_tree(self, directory: str) -> None:
+        """Remove files of a directory tree.
+
+        Args:
+            directory (str): Absolute path to the directory.
+        """
+
+        condition, params = self._tree_condition(directory)
+        in_tree = self._affected(directory)
+        with self._lock:
+            for path in [path for path in self._queue if in_tree(path)]:
+                del self._queue[path]
+            self._cancelled.update(path for path in self._indexing if in_tree(path))
+            self._db.execute("BEGIN")
+            for (document_id,) in self._db.execute(f"SELECT id FROM documents WHERE {condition}", params).fetchall():
+                self._delete(document_id)
+            self._db.execute("COMMIT")
+
+    def move_tree(self, directory: str, new_directory: str) -> None:
+        """Move files of a renamed directory tree. Lines aren't indexed again.
+
+        Args:
+            directory (str): Absolute path to the old directory.
+            new_directory (str): Absolute path to the new directory.
+        """
+
+        condition, params = self._tree_condition(directory)
+        key = os.path.relpath(directory, self._root)
+        new_key = os.path.relpath(new_directory, self._root)
+        in_tree = self._affected(directory)
+        with self._lock:
+            moved = [path for path in self._queue if in_tree(path)]
+            # Files being indexed are read again at their new paths.
+            moved.extend(path for path in self._indexing if in_tree(path) and path not in self._cancelled)
+            self._cancelled.update(path for path in self._indexing if in_tree(path))
+            for path in moved:
+                self._queue.pop(path, None)
+                self._queue[new_directory + path[len(directory) :]] = None
+            self._db.execute(
+                f"UPDATE documents SET dir = ? || substr(dir, ?) WHERE {condition}", (new_key, len(key) + 1) + params
+            )
+        if moved:
+            self._start()
+
+    def _throttle(self, size: int) -> None:
+        """Wait for the time it takes to read `size` bytes according to rate."""
+
+        if not self._rate:
+            return
+        with self._lock:
+            now = time.monotonic()
+            slot = max(self._next_read, now)
+            self._next_read = slot + size / self._rate
+        if slot > now:
+            time.sleep(slot - now)
+
+    @staticmethod
+    def _lines(content: bytes) -> typing.Optional[list]:
+        """Split text into lines, None if it isn't text."""
+
+        head = content[:SNIFF_BYTES]
+        if b"\0" in head:
+            return None
+        try:
+            # A multibyte character may be cut at the end.
+            head.decode("utf-8")
+        except UnicodeDecodeError as e:
+            if e.start < len(head) - 3:
+                return None
+        return content.decode("utf-8", errors="replace").splitlines()[:MAX_LINES]
+
+    def _index(self, path: str) -> None:
+        """Read a file and replace its lines in the index."""
+
+        self._idle.wait()
+        result = self._read_file(path, MAX_INDEXED_BYTES)
+        self._throttle(len(result[2]) if result is not None else 0)
+        lines = self._lines(result[2]) if result is not None else None
+        directory, name = self._key(path)
+        with self._lock:
+            if path in self._cancelled:
+                return
+            row = self._db.execute("SELECT id FROM documents WHERE dir = ? AND name = ?", (directory, name)).fetchone()
+            self._db.execute("BEGIN")
+            if row is not None:
+                self._delete(row[0])
+            if result is not None:
+                # Files which aren't text are kept as documents without lines, so they aren't read again on start.
+                cursor = self._db.execute(
+                    "INSERT INTO documents (dir, name, size, mtime_ns) VALUES (?, ?, ?, ?)",
+                    (directory, name, result[0], result[1]),
+                )
+                first_row = cursor.lastrowid << LINE_BITS
+                self._db.executemany(
+                    "INSERT INTO lines (rowid, text) VALUES (?, ?)",
+                    ((first_row | number, line) for number, line in enumerate(lines or (), 1) if line.strip()),
+                )
+            self._db.execute("COMMIT")
+            self.indexed += 1
+            self.indexed_bytes += len(result[2]) if result is not None else 0
+
+    def _drain(self) -> None:
+        """Index queued files until the queue is empty."""
+
+        with contextlib.suppress(OSError, AttributeError):
+            # Only the calling thread gets the lowest priority on Linux.
+            os.setpriority(os.PRIO_PROCESS, threading.get_native_id(), 19)
+        while not self._stopped:
+            with self._lock:
+                if not self._queue:
+                    return
+                path = next(iter(self._queue))
+                del self._queue[path]
+                self._indexing.add(path)
+            try:
+                self._index(path)
+            except Exception as e:
+                self._logger.error(f"Can't index {path}: {e}")
+            finally:
+                with self._lock:
+                    self._indexing.discard(path)
+                    self._cancelled.discard(path)
+
+    def _compare(self) -> None:
+        """Queue files which differ from the index and remove documents of missing files."""
+
+        with self._lock:
+            documents = {
+                (directory, name): (document_id, size, mtime_ns)
+                for document_id, directory, name, size, mtime_ns in self._db.execute(
+                    "SELECT id, dir, name, size, mtime_ns FROM documents"
+                )
+            }
+
+        dirs = [self._root]
+        while dirs and not self._stopped:
+            path = dirs.pop()
+            key = os.path.relpath(path, self._root)
+            try:
+                files = self._list_dir(path)
+                with os.scandir(path) as entries:
+                    for entry in entries:
+                        if not entry.name.startswith(".") and entry.is_dir(follow_symlinks=False):
+                            dirs.append(entry.path)
+            except FileNotFoundError:
+                continue
+            for name, (size, _, mtime_ns) in files.items():
+                document = documents.pop((key, name), None)
+                if document is None or document[1:] != (size, mtime_ns):
+                    self.add(os.path.join(path, name))
+
+        if not self._stopped:
+            with self._lock:
+                self._db.execute("BEGIN")
+                for document_id, _, _ in documents.values():
+                    self._delete(document_id)
+                self._db.execute("COMMIT")
+
+    def _run(self) -> None:
+        while True:
+            self._wakeup.wait()
+            self._wakeup.clear()
+            if self._stopped:
+                return
+            if self._rebuild:
+                self._rebuild = False
+                try:
+                    self._compare()
+                except Exception as e:
+                    self._logger.error(f"Can't compare search index with files: {e}")
+            # Threads of its own rather than an executor, which refuses work once the interpreter shuts down.
+            indexers = [
+                threading.Thread(target=self._drain, name=f"SearchIndexer-{i}", daemon=True)
+                for i in range(self._workers)
+            ]
+            for indexer in indexers:
+                indexer.start()
+            for indexer in indexers:
+                indexer.join()
+            with self._lock:
+                if not self._queue and not self._wakeup.is_set():
+                    self._done.set()
+
+    def search(
+        self, text: str, directory: str, limit: int, after: typing.Optional[int] = None
+    ) -> typing.Tuple[list, typing.Optional[int]]:
+        """Find lines which contain all words of a text.
+
+        Args:
+            text (str): Words to search for. Words are matched as whole tokens, case-insensitive.
+            directory (str): Absolute path to a directory whose tree is searched.
+            limit (int): Maximum number of lines.
+            after (int): Position of the last line of the previous page, see the returned value.
+
+        Returns:
+            List of dicts with keys: path (absolute path), line (line number starting from 1), snippet
+            (part of the line around matches); and a position to pass as `after` for the next page,
+            None if there are no more lines.
+
+        Raises:
+            ValueError: if the text has no words.
+        """
+
+        words = text.split()
+        if not words:
+            raise ValueError("Nothing to search for")
+        # Each word is a quoted string, so FTS5 operators in the text are searched literally.
+        match = " ".join('"' + word.replace('"', '""') + '"' for word in words)
+        condition, params = self._tree_condition(directory)
+        sql = (
+            f"SELECT lines.rowid, dir, name, snippet(lines, 0, '', '', '...', {SNIPPET_TOKENS})"
+            f" FROM lines JOIN documents ON documents.id = lines.rowid >> {LINE_BITS}"
+            f" WHERE lines MATCH ? AND lines.rowid > ? AND {condition} ORDER BY lines.rowid LIMIT ?"
+        )
+        with self._lock:
+            rows = self._db.execute(sql, (match, after if after is not None else -1) + params + (limit + 1,)).fetchall()
+
+        next_after = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_after = rows[-1][0]
+        results = [
+            dict(
+                path=os.path.normpath(os.path.join(self._root, directory, name)),
+                line=rowid & MAX_LINES,
+                snippet=snippet,
+            )
+            for rowid, directory, name, snippet in rows
+        ]
+        return results, next_after
+
+    def wait(self, timeout: typing.Optional[float] = None) -> bool:
+        """Wait until queued files are indexed.
+
+        Args:
+            timeout (float): Maximum time to wait in seconds, no limit if None.
+
+        Returns:
+            True if no files are waiting for indexing.
+        """
+
+        return self._done.wait(timeout)
+
+    def stats(self) -> dict:
+        """Get index counters.
+
+        Returns:
+            Dict with keys: documents (indexed files), pending (files waiting for indexing),
+            indexed (files indexed since start), indexed_bytes (bytes read since start).
+        """
+
+        with self._lock:
+            documents = self._db.execute("SELECT COUNT(*) FROM documents").fetchone()[0]
+            return dict(
+                documents=documents,
+                pending=len(self._queue) + len(self._indexing),
+                indexed=self.indexed,
+                indexed_bytes=self.indexed_bytes,
+            )
+
+    def close(self) -> None:
+        """Stop indexing. Files which aren't indexed yet are found by comparison on the next start."""
+
+        self._stopped = True
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join()
+        with self._lock:
+            if not self._queue and not self._indexing:
+                self._db.execute("INSERT OR REPLACE INTO state VALUES ('clean', 1)")
+            self._db.close()
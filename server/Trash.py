@@ -0,0 +1,217 @@
+"""Background deletion of directory trees.
+
+Imports:
+    concurrent.futures
+    os
+    shutil
+    threading
+
+Provides class:
+    Trash
+"""
+
+import errno
+import logging
+import os
+import shutil
+import threading
+import time
+import typing
+import uuid
+from concurrent import futures
+
+from .HashCache import META_DIR
+
+TRASH_DIR = "trash"
+
+
+class Trash:
+    """Deletes directory trees in background.
+
+    A tree is renamed into `<root>/.meta/trash`, which is cheap on the same filesystem, and removed later
+    by a purger thread. Directories are scanned by a pool of `workers` threads, at most `purge_rate` entries
+    are removed per second. Trees left in the trash by a previous run are purged on start. Trees on other
+    filesystems, e.g. mount points, can't be renamed there and are removed at once.
+    """
+
+    def __init__(
+        self,
+        root: str,
+        purge_rate: int,
+        workers: int,
+        on_purged: typing.Optional[typing.Callable[[], typing.Any]] = None,
+    ):
+        """
+        Args:
+            root (str): Data directory.
+            purge_rate (int): Maximum number of entries removed per second, 0 for no limit.
+            workers (int): Number of threads which remove a tree.
+            on_purged (Callable): Function called when the trash becomes empty.
+        """
+
+        self._logger = logging.getLogger(__name__)
+        self._dir = os.path.join(os.path.abspath(root), META_DIR, TRASH_DIR)
+        os.makedirs(self._dir, exist_ok=True)
+        self._interval = 1 / purge_rate if purge_rate > 0 else 0
+        self._workers = max(1, workers)
+        self._on_purged = on_purged
+
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._empty = threading.Event()
+        self._stopped = False
+        self._thread = None
+        # Time when the next entry may be removed, see _throttle().
+        self._next_removal = 0.0
+        self.removed = 0
+
+        if os.listdir(self._dir):
+            self._start()
+        else:
+            self._empty.set()
+
+    def _start(self) -> None:
+        with self._lock:
+            self._empty.clear()
+            self._wakeup.set()
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="TrashPurger", daemon=True)
+                self._thread.start()
+
+    def move(self, path: str) -> None:
+        """Move a directory tree to the trash. It's removed in background.
+
+        Args:
+            path (str): Absolute path to a directory.
+        """
+
+        try:
+            os.rename(path, os.path.join(self._dir, uuid.uuid4().hex))
+        except OSError as e:
+            if e.errno != errno.EXDEV:
+                raise
+            self._logger.debug(f"{path} is on another filesystem, removing it at once")
+            shutil.rmtree(path)
+            return
+        self._start()
+
+    def _throttle(self) -> None:
+        """Wait until the next entry may be removed according to purge rate."""
+
+        if not self._interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            slot = max(self._next_removal, now)
+            self._next_removal = slot + self._interval
+        if slot > now:
+            time.sleep(slot - now)
+
+    def _remove(self, func: typing.Callable[[str], None], path: str) -> None:
+        self._throttle()
+        try:
+            func(path)
+        except FileNotFoundError:
+            return
+        except OSError as e:
+            self._logger.error(f"Can't remove {path}: {e}")
+            return
+        with self._lock:
+            self.removed += 1
+
+    def _clear_dir(self, path: str) -> list:
+        """Remove files of a directory.
+
+        Returns:
+            Paths to child directories.
+        """
+
+        child_dirs = list()
+        try:
+            with os.scandir(path) as entries:
+                for entry in entries:
+                    if self._stopped:
+                        break
+                    if entry.is_dir(follow_symlinks=False):
+                        child_dirs.append(entry.path)
+                    else:
+                        self._remove(os.unlink, entry.path)
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            # The directory stays in the trash, the rest of the tree is still removed.
+            self._logger.error(f"Can't clear {path}: {e}")
+        return child_dirs
+
+    def _purge(self, path: str, executor: futures.Executor) -> None:
+        """Remove a directory tree. Directories are cleared in parallel, then removed deepest first."""
+
+        if not os.path.isdir(path) or os.path.islink(path):
+            self._remove(os.unlink, path)
+            return
+
+        dirs = [path]
+        pending = {executor.submit(self._clear_dir, path)}
+        while pending:
+            done, pending = futures.wait(pending, return_when=futures.FIRST_COMPLETED)
+            for future in done:
+                for child_dir in future.result():
+                    dirs.append(child_dir)
+                    pending.add(executor.submit(self._clear_dir, child_dir))
+        if self._stopped:
+            return
+        # Children are found after their parents.
+        for dir_path in reversed(dirs):
+            self._remove(os.rmdir, dir_path)
+
+    def _run(self) -> None:
+        while True:
+            self._wakeup.wait()
+            self._wakeup.clear()
+            if self._stopped:
+                return
+            with futures.ThreadPoolExecutor(max_workers=self._workers, thread_name_prefix="TrashWorker") as executor:
+                for name in os.listdir(self._dir):
+                    if self._stopped:
+                        return
+                    self._logger.debug(f"Purging {name} from trash")
+                    try:
+                        self._purge(os.path.join(self._dir, name), executor)
+                    except Exception as e:
+                        # Other trees are purged anyway, this one is tried again on the next wakeup or start.
+                        self._logger.error(f"Can't purge {name} from trash: {e}")
+            if not os.listdir(self._dir):
+                if self._on_purged is not None:
+                    self._on_purged()
+                with self._lock:
+                    if not self._wakeup.is_set():
+                        self._empty.set()
+
+    def wait(self, timeout: typing.Optional[float] = None) -> bool:
+        """Wait until the trash is empty.
+
+        Args:
+            timeout (float): Maximum time to wait in seconds, no limit if None.
+
+        Returns:
+            True if the trash is empty.
+        """
+
+        return self._empty.wait(timeout)
+
+    def stats(self) -> dict:
+        """Get trash counters.
+
+        Returns:
+            Dict with keys: pending (trees waiting for removal), removed (entries removed).
+        """
+
+        return dict(pending=len(os.listdir(self._dir)), removed=self.removed)
+
+    def close(self) -> None:
+        """Stop the purger. Trees which aren't removed yet are purged on the next start."""
+
+        self._stopped = True
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join()
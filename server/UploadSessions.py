@@ -0,0 +1,367 @@
+"""Resumable uploads of large files in chunks.
+
+Imports:
+    os
+    sqlite3
+    threading
+
+Provides class:
+    UploadSessions
+"""
+
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import time
+import typing
+import uuid
+
+from .HashCache import META_DIR, READ_CHUNK_SIZE
+
+UPLOADS_DIR = "uploads"
+SESSIONS_DB = "sessions.sqlite"
+
+
+class _ChunkWriter:
+    """Writer of one chunk into the temporary file of a session. Uses positional writes where they are available."""
+
+    def __init__(self, upload_id: str, number: int, fd: int, offset: int, length: int):
+        self.upload_id = upload_id
+        self.number = number
+        self._fd = fd
+        self._offset = offset
+        self._length = length
+        self.written = 0
+
+    def write(self, data: bytes) -> int:
+        if self.written + len(data) > self._length:
+            raise ValueError(f"Chunk {self.number} is longer than {self._length} bytes")
+        view = memoryview(data)
+        if not hasattr(os, "pwrite"):
+            # No positional writes on Windows, the descriptor is owned by this writer.
+            os.lseek(self._fd, self._offset + self.written, os.SEEK_SET)
+        while view:
+            if hasattr(os, "pwrite"):
+                count = os.pwrite(self._fd, view, self._offset + self.written)
+            else:
+                count = os.write(self._fd, view)
+            self.written += count
+            view = view[count:]
+        return len(data)
+
+    @property
+    def complete(self) -> bool:
+        return self.written == self._length
+
+    def fileno(self) -> int:
+        return self._fd
+
+    def close(self) -> None:
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+
+class UploadSessions:
+    """Sessions of uploads whose chunks may arrive in any order, in parallel and across server restarts.
+
+    A session declares the total size and the chunk size. Content is written into a preallocated file
+    in `<root>/.meta/uploads` at the offset of each chunk. Received chunks are recorded in an SQLite database
+    after their content is written, so a session is resumed after a restart with the chunks it has got.
+    Sessions which aren't committed within `ttl` seconds are removed.
+    """
+
+    def __init__(self, root: str, ttl: float, sync_file: typing.Optional[typing.Callable[[int], None]] = None):
+        """
+        Args:
+            root (str): Data directory.
+            ttl (float): Time in seconds after which unfinished sessions are removed.
+            sync_file (Callable): Function which flushes a chunk to disk before it's recorded as received.
+        """
+
+        self._logger = logging.getLogger(__name__)
+        self._dir = os.path.join(os.path.abspath(root), META_DIR, UPLOADS_DIR)
+        os.makedirs(self._dir, exist_ok=True)
+        self._ttl = ttl
+        self._sync_file = sync_file
+        self._lock = threading.Lock()
+        # IDs of sessions being committed, no chunks are accepted for them.
+        self._committing = set()
+
+        self._db = sqlite3.connect(os.path.join(self._dir, SESSIONS_DB), check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode = WAL")
+        self._db.execute(f"PRAGMA synchronous = {'FULL' if sync_file is not None else 'NORMAL'}")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS sessions ("
+            " id TEXT PRIMARY KEY, path TEXT, size INTEGER, chunk_size INTEGER, sha256 TEXT, created REAL)"
+        )
+        self._db.execute("CREATE TABLE IF NOT EXISTS chunks (id TEXT, number INTEGER, PRIMARY KEY (id, number))")
+
+        # Temporary files of sessions which were removed while the server was stopped.
+        known = {upload_id for upload_id, in self._db.execute("SELECT id FROM sessions")}
+        for filename in os.listdir(self._dir):
+            if filename.endswith(".part") and filename[: -len(".part")] not in known:
+                os.remove(os.path.join(self._dir, filename))
+        self.expire()
+
+    def _data_path(self, upload_id: str) -> str:
+        return os.path.join(self._dir, f"{upload_id}.part")
+
+    @staticmethod
+    def _chunk_count(size: int, chunk_size: int) -> int:
+        return -(-size // chunk_size)
+
+    def open(self, path: str, size: int, chunk_size: int, sha256: typing.Optional[str] = None) -> dict:
+        """Start a session. Disk space for the whole file is allocated in advance.
+
+        Args:
+            path (str): Absolute path to the file to be created.
+            size (int): Size of the file in bytes.
+            chunk_size (int): Size of every chunk but the last one.
+            sha256 (str): Expected SHA-256 hex digest of the file, checked on commit.
+
+        Returns:
+            Session info, see get().
+
+        Raises:
+            ValueError: if sizes are invalid.
+        """
+
+        if size < 0 or chunk_size <= 0:
+            raise ValueError(f"Bad upload size: {size} in chunks of {chunk_size}")
+        self.expire()
+
+        upload_id = uuid.uuid4().hex
+        flags = os.O_WRONLY | os.O_CREAT | os.O_EXCL | getattr(os, "O_BINARY", 0)
+        fd = os.open(self._data_path(upload_id), flags, 0o600)
+        try:
+            if size:
+                if hasattr(os, "posix_fallocate"):
+                    os.posix_fallocate(fd, 0, size)
+                else:
+                    os.ftruncate(fd, size)
+        except BaseException:
+            os.close(fd)
+            os.remove(self._data_path(upload_id))
+            raise
+        os.close(fd)
+        with self._lock:
+            self._db.execute(
+                "INSERT INTO sessions VALUES (?, ?, ?, ?, ?, ?)",
+                (upload_id, path, size, chunk_size, sha256.lower() if sha256 else None, time.time()),
+            )
+
+        self._logger.debug(f"Upload {upload_id} of {size} bytes to {path} opened")
+
+        return self.get(upload_id)
+
+    def _session(self, upload_id: str) -> tuple:
+        row = self._db.execute(
+            "SELECT path, size, chunk_size, sha256 FROM sessions WHERE id = ?", (upload_id,)
+        ).fetchone()
+        if row is None:
+            raise RuntimeError(f"Upload does not exist: {upload_id}")
+        return row
+
+    def get(self, upload_id: str) -> dict:
+        """Get session info.
+
+        Args:
+            upload_id (str): Session ID.
+
+        Returns:
+            Dict with keys: upload_id, path, size, chunk_size, chunks (number of chunks),
+            received and missing (sorted chunk numbers).
+
+        Raises:
+            RuntimeError: if session does not exist.
+        """
+
+        with self._lock:
+            path, size, chunk_size, _ = self._session(upload_id)
+            received = [
+                number
+                for number, in self._db.execute("SELECT number FROM chunks WHERE id = ? ORDER BY number", (upload_id,))
+            ]
+        chunks = self._chunk_count(size, chunk_size)
+        received_set = set(received)
+        return dict(
+            upload_id=upload_id,
+            path=path,
+            size=size,
+            chunk_size=chunk_size,
+            chunks=chunks,
+            received=received,
+            missing=[number for number in range(chunks) if number not in received_set],
+        )
+
+    def open_chunk(self, upload_id: str, number: int) -> _ChunkWriter:
+        """Open a chunk for writing. A chunk may be written again, e.g. after a failed attempt.
+        It's missing then until it's finished again.
+
+        Args:
+            upload_id (str): Session ID.
+            number (int): Chunk number starting from 0.
+
+        Returns:
+            Writer with write() method, to be passed to finish_chunk() or abort_chunk().
+
+        Raises:
+            RuntimeError: if session does not exist or is being committed.
+            ValueError: if chunk number is out of range.
+        """
+
+        with self._lock:
+            _, size, chunk_size, _ = self._session(upload_id)
+            if upload_id in self._committing:
+                raise RuntimeError(f"Upload is being committed: {upload_id}")
+            if not 0 <= number < self._chunk_count(size, chunk_size):
+                raise ValueError(f"Bad chunk number: {number}")
+            self._db.execute("DELETE FROM chunks WHERE id = ? AND number = ?", (upload_id, number))
+        offset = number * chunk_size
+        fd = os.open(self._data_path(upload_id), os.O_WRONLY | getattr(os, "O_BINARY", 0))
+        return _ChunkWriter(upload_id, number, fd, offset, min(chunk_size, size - offset))
+
+    def finish_chunk(self, writer: _ChunkWriter) -> None:
+        """Flush a chunk and record it as received.
+
+        Args:
+            writer (_ChunkWriter): Writer returned by open_chunk().
+
+        Raises:
+            RuntimeError: if session was removed meanwhile.
+            ValueError: if chunk is shorter than expected.
+        """
+
+        try:
+            if not writer.complete:
+                raise ValueError(f"Chunk {writer.number} is incomplete: {writer.written} bytes")
+            if self._sync_file is not None:
+                self._sync_file(writer.fileno())
+        finally:
+            writer.close()
+        with self._lock:
+            self._session(writer.upload_id)
+            self._db.execute("INSERT OR IGNORE INTO chunks VALUES (?, ?)", (writer.upload_id, writer.number))
+
+    @staticmethod
+    def abort_chunk(writer: _ChunkWriter) -> None:
+        """Close a chunk which failed to arrive. It stays missing unless it was received before."""
+
+        writer.close()
+
+    def begin_commit(self, upload_id: str, sha256: typing.Optional[str] = None) -> typing.Tuple[str, str, str]:
+        """Check that all chunks are received and the content matches its hash. No chunks are accepted after this.
+
+        Args:
+            upload_id (str): Session ID.
+            sha256 (str): Expected SHA-256 hex digest of the file, overrides the one passed to open().
+
+        Returns:
+            Absolute path to the file to be created, path to the temporary file with its content
+            and SHA-256 hex digest of the content. The caller moves the temporary file and calls end_commit().
+
+        Raises:
+            RuntimeError: if session does not exist or is being committed.
+            ValueError: if chunks are missing or the hash doesn't match. Session is kept then.
+        """
+
+        with self._lock:
+            path, size, chunk_size, expected = self._session(upload_id)
+            if upload_id in self._committing:
+                raise RuntimeError(f"Upload is being committed: {upload_id}")
+            received = self._db.execute("SELECT COUNT(*) FROM chunks WHERE id = ?", (upload_id,)).fetchone()[0]
+            if received < self._chunk_count(size, chunk_size):
+                raise ValueError(f"Upload is incomplete: {received} of {self._chunk_count(size, chunk_size)} chunks")
+            self._committing.add(upload_id)
+
+        try:
+            hasher = hashlib.sha256()
+            with open(self._data_path(upload_id), "rb") as f:
+                for data in iter(lambda: f.read(READ_CHUNK_SIZE), b""):
+                    hasher.update(data)
+            digest = hasher.hexdigest()
+            expected = sha256.lower() if sha256 else expected
+            if expected is not None and digest != expected:
+                raise ValueError(f"SHA-256 mismatch: expected {expected}, got {digest}")
+        except BaseException:
+            self.cancel_commit(upload_id)
+            raise
+
+        return path, self._data_path(upload_id), digest
+
+    def cancel_commit(self, upload_id: str) -> None:
+        """Accept chunks of a session again after a failed commit."""
+
+        with self._lock:
+            self._committing.discard(upload_id)
+
+    def end_commit(self, upload_id: str) -> None:
+        """Remove a committed session. Its temporary file must have been moved already."""
+
+        with self._lock:
+            self._delete(upload_id)
+            self._committing.discard(upload_id)
+
+        self._logger.debug(f"Upload {upload_id} committed")
+
+    def _delete(self, upload_id: str) -> None:
+        self._db.execute("DELETE FROM chunks WHERE id = ?", (upload_id,))
+        self._db.execute("DELETE FROM sessions WHERE id = ?", (upload_id,))
+
+    def remove(self, upload_id: str) -> None:
+        """Remove a session and its temporary file.
+
+        Args:
+            upload_id (str): Session ID.
+
+        Raises:
+            RuntimeError: if session does not exist or is being committed.
+        """
+
+        with self._lock:
+            self._session(upload_id)
+            if upload_id in self._committing:
+                raise RuntimeError(f"Upload is being committed: {upload_id}")
+            self._delete(upload_id)
+        if os.path.exists(self._data_path(upload_id)):
+            os.remove(self._data_path(upload_id))
+
+        self._logger.debug(f"Upload {upload_id} removed")
+
+    def expire(self) -> None:
+        """Remove sessions older than ttl."""
+
+        with self._lock:
+            expired = [
+                upload_id
+                for upload_id, in self._db.execute(
+                    "SELECT id FROM sessions WHERE created < ?", (time.time() - self._ttl,)
+                )
+            ]
+        for upload_id in expired:
+            self._logger.info(f"Upload {upload_id} expired")
+            try:
+                self.remove(upload_id)
+            except RuntimeError:
+                # Removed or being committed meanwhile.
+                pass
+
+    def stats(self) -> dict:
+        """Get upload counters.
+
+        Returns:
+            Dict with keys: sessions (open sessions), bytes (their declared total size).
+        """
+
+        with self._lock:
+            sessions, size = self._db.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM sessions").fetchone()
+        return dict(sessions=sessions, bytes=size)
+
+    def close(self) -> None:
+        """Close the database. Unfinished sessions are resumed on the next start."""
+
+        with self._lock:
+            self._db.close()
@@ -0,0 +1,298 @@
+"""Disk usage accounting and quotas.
+
+Imports:
+    os
+    sqlite3
+    threading
+
+Provides class:
+    UsageTracker
+"""
+
+import errno
+import logging
+import os
+import sqlite3
+import stat
+import threading
+import typing
+
+from .HashCache import META_DIR
+
+USAGE_DB = "usage.sqlite"
+# Key of the data directory itself.
+ROOT = "."
+
+
+class UsageTracker:
+    """Size and number of files of every directory tree, with optional quotas.
+
+    Totals of a directory include all its subdirectories. They are kept in memory and updated
+    by every write, so reading them and checking quotas costs a few dict lookups per directory level.
+    Totals are saved to an SQLite database on close. If the service wasn't closed cleanly,
+    they are rebuilt from disk on start, see reconcile(). Hidden files and directories aren't counted.
+
+    Sizes are sizes of stored files, i.e. after compression.
+    """
+
+    def __init__(
+        self,
+        root: str,
+        extra_usage: typing.Optional[typing.Callable[[], typing.Iterable[typing.Tuple[str, int, int]]]] = None,
+    ):
+        """
+        Args:
+            root (str): Data directory.
+            extra_usage (Callable): Function which returns files stored outside the tree as tuples of
+                an absolute path to a directory, size and number of files, see PackStore.usage().
+        """
+
+        self._logger = logging.getLogger(__name__)
+        self._root = os.path.abspath(root)
+        self._meta_dir = os.path.join(self._root, META_DIR)
+        self._extra_usage = extra_usage
+        self._lock = threading.Lock()
+        self._db = None
+        # Directory key -> [bytes, files].
+        self._totals = dict()
+        # Directory key -> (max bytes or None, max files or None).
+        self._quotas = dict()
+        self._load()
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._db is None:
+            os.makedirs(self._meta_dir, exist_ok=True)
+            self._db = sqlite3.connect(
+                os.path.join(self._meta_dir, USAGE_DB), check_same_thread=False, isolation_level=None
+            )
+            self._db.execute("CREATE TABLE IF NOT EXISTS usage (path TEXT PRIMARY KEY, bytes INTEGER, files INTEGER)")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS quotas (path TEXT PRIMARY KEY, max_bytes INTEGER, max_files INTEGER)"
+            )
+            self._db.execute("CREATE TABLE IF NOT EXISTS state (key TEXT PRIMARY KEY, value INTEGER)")
+        return self._db
+
+    def _load(self) -> None:
+        db = self._connect()
+        self._quotas = {
+            path: (max_bytes, max_files) for path, max_bytes, max_files in db.execute("SELECT * FROM quotas")
+        }
+        clean = db.execute("SELECT value FROM state WHERE key = 'clean'").fetchone()
+        if clean is not None and clean[0]:
+            self._totals = {path: [size, files] for path, size, files in db.execute("SELECT * FROM usage")}
+        else:
+            self._logger.info("Disk usage wasn't saved, counting it")
+            self.reconcile()
+        # Totals on disk are stale until close().
+        db.execute("INSERT OR REPLACE INTO state VALUES ('clean', 0)")
+
+    def _key(self, path: str) -> str:
+        return os.path.relpath(path, self._root)
+
+    @staticmethod
+    def _ancestors(key: str) -> typing.Iterator[str]:
+        """Get keys of a directory and all directories above it, starting from the root."""
+
+        yield ROOT
+        if key == ROOT:
+            return
+        current = ""
+        for part in key.split(os.sep):
+            current = os.path.join(current, part)
+            yield current
+
+    def _check(self, key: str, size: int, files: int, skip: typing.Container[str] = ()) -> None:
+        for ancestor in self._ancestors(key):
+            quota = self._quotas.get(ancestor)
+            if quota is None or ancestor in skip:
+                continue
+            used_bytes, used_files = self._totals.get(ancestor, (0, 0))
+            max_bytes, max_files = quota
+            if (max_bytes is not None and size > 0 and used_bytes + size > max_bytes) or (
+                max_files is not None and files > 0 and used_files + files > max_files
+            ):
+                raise OSError(errno.EDQUOT, f"Disk quota exceeded: {ancestor}")
+
+    def _add(self, key: str, size: int, files: int) -> None:
+        for ancestor in self._ancestors(key):
+            totals = self._totals.setdefault(ancestor, [0, 0])
+            totals[0] += size
+            totals[1] += files
+
+    def check(self, directory: str, size: int, files: int) -> None:
+        """Check that files can be added to a directory without exceeding quotas.
+
+        Args:
+            directory (str): Absolute path to a directory.
+            size (int): Number of bytes to add.
+            files (int): Number of files to add.
+
+        Raises:
+            OSError: EDQUOT, if a quota of the directory or a directory above it would be exceeded.
+        """
+
+        with self._lock:
+            self._check(self._key(directory), size, files)
+
+    def charge(self, directory: str, size: int, files: int, force: bool = False) -> None:
+        """Check quotas like check() and add files to totals. Negative values remove files.
+
+        Args:
+            force (bool): Don't check quotas, e.g. to undo a change.
+
+        Raises:
+            OSError: EDQUOT, if a quota would be exceeded. Totals aren't changed then.
+        """
+
+        key = self._key(directory)
+        with self._lock:
+            if not force:
+                self._check(key, size, files)
+            self._add(key, size, files)
+
+    def remove_tree(self, directory: str) -> None:
+        """Remove a deleted directory tree from totals.
+
+        Args:
+            directory (str): Absolute path to the directory.
+        """
+
+        key = self._key(directory)
+        prefix = os.path.join(key, "")
+        with self._lock:
+            size, files = self._totals.get(key, (0, 0))
+            self._add(os.path.dirname(key) or ROOT, -size, -files)
+            for path in [p for p in self._totals if p == key or p.startswith(prefix)]:
+                del self._totals[path]
+
+    def move_tree(self, directory: str, new_directory: str) -> None:
+        """Move totals and quotas of a directory tree which is going to be renamed.
+
+        Args:
+            directory (str): Absolute path to the directory.
+            new_directory (str): Absolute path which the directory is renamed to.
+
+        Raises:
+            OSError: EDQUOT, if the tree would exceed a quota of a directory above the new path.
+                Totals aren't changed then.
+        """
+
+        key = self._key(directory)
+        new_key = self._key(new_directory)
+        prefix = os.path.join(key, "")
+        parent = os.path.dirname(key) or ROOT
+        new_parent = os.path.dirname(new_key) or ROOT
+        with self._lock:
+            size, files = self._totals.get(key, (0, 0))
+            # The tree is already counted by common ancestors.
+            self._check(new_parent, size, files, skip=set(self._ancestors(parent)))
+            self._add(parent, -size, -files)
+            for path in [p for p in self._totals if p == key or p.startswith(prefix)]:
+                self._totals[new_key + path[len(key) :]] = self._totals.pop(path)
+            self._add(new_parent, size, files)
+            for path in [p for p in self._quotas if p == key or p.startswith(prefix)]:
+                new_path = new_key + path[len(key) :]
+                self._quotas[new_path] = self._quotas.pop(path)
+                self._connect().execute("UPDATE quotas SET path = ? WHERE path = ?", (new_path, path))
+
+    def get(self, directory: str) -> dict:
+        """Get usage of a directory tree.
+
+        Args:
+            directory (str): Absolute path to a directory.
+
+        Returns:
+            Dict with keys: bytes, files, max_bytes, max_files. Limits are None if there is no quota.
+        """
+
+        key = self._key(directory)
+        with self._lock:
+            size, files = self._totals.get(key, (0, 0))
+            max_bytes, max_files = self._quotas.get(key, (None, None))
+        return dict(bytes=size, files=files, max_bytes=max_bytes, max_files=max_files)
+
+    def set_quota(
+        self, directory: str, max_bytes: typing.Optional[int] = None, max_files: typing.Optional[int] = None
+    ) -> None:
+        """Set quota of a directory tree. Quota is removed if both limits are None.
+
+        Usage which already exceeds a new quota is kept, only further writes are rejected.
+
+        Args:
+            directory (str): Absolute path to a directory.
+            max_bytes (int): Maximum total size of files.
+            max_files (int): Maximum number of files.
+        """
+
+        key = self._key(directory)
+        with self._lock:
+            if max_bytes is None and max_files is None:
+                self._quotas.pop(key, None)
+                self._connect().execute("DELETE FROM quotas WHERE path = ?", (key,))
+            else:
+                self._quotas[key] = (max_bytes, max_files)
+                self._connect().execute("INSERT OR REPLACE INTO quotas VALUES (?, ?, ?)", (key, max_bytes, max_files))
+
+    def reconcile(self) -> dict:
+        """Rebuild totals from files on disk.
+
+        Files changed while the tree is walked may be counted wrong until the next reconciliation.
+
+        Returns:
+            Totals of the data directory, see get().
+        """
+
+        self._logger.debug("Counting disk usage")
+
+        totals = dict()
+        for dirpath, dirnames, filenames in os.walk(self._root):
+            dirnames[:] = [name for name in dirnames if not name.startswith(".")]
+            size, files = 0, 0
+            for name in filenames:
+                if name.startswith("."):
+                    continue
+                try:
+                    stat_result = os.lstat(os.path.join(dirpath, name))
+                except FileNotFoundError:
+                    continue
+                if stat.S_ISREG(stat_result.st_mode):
+                    size += stat_result.st_size
+                    files += 1
+            key = self._key(dirpath)
+            totals.setdefault(key, [0, 0])
+            if files:
+                for ancestor in self._ancestors(key):
+                    ancestor_totals = totals.setdefault(ancestor, [0, 0])
+                    ancestor_totals[0] += size
+                    ancestor_totals[1] += files
+
+        if self._extra_usage is not None:
+            for directory, size, files in self._extra_usage():
+                for ancestor in self._ancestors(self._key(directory)):
+                    ancestor_totals = totals.setdefault(ancestor, [0, 0])
+                    ancestor_totals[0] += size
+                    ancestor_totals[1] += files
+
+        with self._lock:
+            self._totals = totals
+
+        self._logger.debug(f"Disk usage counted: {totals[ROOT]}")
+
+        return self.get(self._root)
+
+    def close(self) -> None:
+        """Save totals and close the database."""
+
+        with self._lock:
+            if self._db is None:
+                return
+            self._db.execute("BEGIN")
+            self._db.execute("DELETE FROM usage")
+            self._db.executemany(
+                "INSERT INTO usage VALUES (?, ?, ?)",
+                [(path, size, files) for path, (size, files) in self._totals.items()],
+            )
+            self._db.execute("INSERT OR REPLACE INTO state VALUES ('clean', 1)")
+            self._db.execute("COMMIT")
+            self._db.close()
+            self._db = None
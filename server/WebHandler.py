@@ -1,25 +1,188 @@
 """Web handlers module"""
+import asyncio
 import base64
 import copy
+import errno
+import hashlib
+import hmac
 import json
 import logging
+import mimetypes
+import os
+import re
+import secrets
+import time
+import typing
+import urllib.parse
+import uuid
+from datetime import datetime
+from http.cookies import SimpleCookie
 
 from aiohttp import BasicAuth, hdrs, web
 
 from auth import BasicAuthMiddleware as auth
+from config import ServerConfig
 
-from .FileService import FileService
+from . import Archive
+from .AsyncFileService import AsyncFileService
 from .UserService import UserService
 
+# Size of chunks used to stream file content.
+CHUNK_SIZE = 256 * 1024
+# Requests with more ranges are answered with the whole file.
+MAX_RANGES = 16
+# Header with a token returned by /login. It identifies the session of a client.
+TOKEN_HEADER = "X-Token"
+# Cookie with a signed session ID issued to clients which aren't authenticated.
+SESSION_COOKIE = "session"
+# Seconds for which verified credentials select their session without being checked again.
+CREDENTIALS_TTL = 60
+# Verified credentials kept at most; expired ones are dropped when there are more.
+MAX_VERIFIED_CREDENTIALS = 4096
+# Operations accepted by /files/batch.
+BATCH_OPERATIONS = ("create", "read", "delete")
+# Seconds between comments sent to idle change streams, so that proxies keep them open.
+CHANGES_KEEPALIVE = 15
+
+
+class _HashedFileResponse(web.FileResponse):
+    """FileResponse with ETag made from the file content hash.
+
+    ETag is passed in headers. Newer aiohttp versions replace it with a value made from file stats,
+    so such assignments are ignored.
+    """
+
+    @property
+    def etag(self):
+        return web.StreamResponse.etag.fget(self)
+
+    @etag.setter
+    def etag(self, value) -> None:
+        pass
+
 
 class WebHandler:
     """aiohttp handler with coroutines."""
 
     def __init__(self) -> None:
         self._logger = logging.getLogger(__name__)
-        self._fs = FileService()
+        self._config = ServerConfig().config
+        self._fs = AsyncFileService()
         self._us = UserService()
         self._headers = {"Access-Control-Allow-Origin": "*"}
+        # Session cookies are signed with a key of the process, working directories don't outlive it either.
+        self._session_key = secrets.token_bytes(32)
+        # Keyed digest of verified credentials -> time when they have to be checked again.
+        self._verified = dict()
+
+    async def on_cleanup(self, app: web.Application) -> None:
+        """Release resources on application shutdown.
+
+        Args:
+            app (Application): aiohttp application.
+        """
+
+        self._fs.shutdown()
+
+    @web.middleware
+    async def session_middleware(self, request: web.Request, handler) -> web.StreamResponse:
+        """Identify the client session before a request is handled, see _session().
+
+        Args:
+            request (Request): aiohttp request.
+            handler: Request handler.
+        """
+
+        request["session"], request["session_cookie"] = await self._identify(request)
+        return await handler(request)
+
+    async def on_response_prepare(self, request: web.Request, response: web.StreamResponse) -> None:
+        """Issue the cookie of a new client session.
+
+        Args:
+            request (Request): aiohttp request.
+            response (StreamResponse): Response which is about to be sent.
+        """
+
+        cookie = request.get("session_cookie")
+        if cookie is not None:
+            # Cookies of the response are already in its headers at this point.
+            morsel = SimpleCookie({SESSION_COOKIE: cookie})[SESSION_COOKIE]
+            morsel["httponly"] = True
+            morsel["samesite"] = "Strict"
+            response.headers.add(hdrs.SET_COOKIE, morsel.OutputString())
+
+    def _sign(self, session_id: str) -> str:
+        return hmac.new(self._session_key, session_id.encode(), hashlib.sha256).hexdigest()
+
+    async def _verify(self, username: str, password: str, token: str, request: web.Request) -> bool:
+        """Check credentials against the user database, see auth.BasicAuthMiddleware.check_credentials().
+
+        The check queries the database synchronously, so it runs in the default executor. Verified credentials
+        aren't checked again for CREDENTIALS_TTL seconds.
+        """
+
+        key = hmac.new(self._session_key, "\0".join((username, password, token)).encode(), hashlib.sha256).digest()
+        now = time.monotonic()
+        if self._verified.get(key, 0) > now:
+            return True
+        loop = asyncio.get_running_loop()
+        verified = await loop.run_in_executor(
+            None, lambda: asyncio.run(auth.check_credentials(username, password, token, request))
+        )
+        if verified:
+            if len(self._verified) >= MAX_VERIFIED_CREDENTIALS:
+                self._verified = {key: expires for key, expires in self._verified.items() if expires > now}
+            if len(self._verified) < MAX_VERIFIED_CREDENTIALS:
+                self._verified[key] = now + CREDENTIALS_TTL
+        return verified
+
+    async def _identify(self, request: web.Request) -> typing.Tuple[str, typing.Optional[str]]:
+        """Find the session of a client.
+
+        A token from /login passed in `X-Token` header or user credentials from `Authorization` header
+        select the session of the token or of the user once they are verified. Other clients get a session
+        issued by the server in a signed cookie; a new one if the cookie is missing or wasn't issued by it.
+        So clients which neither authenticate nor keep cookies get a new session on every request,
+        and their paths are always relative to the data directory.
+
+        Returns:
+            Session ID and a cookie to issue or None.
+        """
+
+        token = request.headers.get(TOKEN_HEADER)
+        basic_auth = auth.parse_auth_header(request)
+        try:
+            if token and await self._verify("", "", token, request):
+                return f"token:{token}", None
+            if basic_auth is not None and await self._verify(basic_auth.login, basic_auth.password, "", request):
+                return f"user:{basic_auth.login}", None
+        except Exception as e:
+            self._logger.error(f"Credentials can't be verified: {e}")
+
+        session_id, _, signature = request.cookies.get(SESSION_COOKIE, "").partition(".")
+        if session_id and hmac.compare_digest(signature, self._sign(session_id)):
+            return f"client:{session_id}", None
+        session_id = secrets.token_urlsafe(16)
+        return f"client:{session_id}", f"{session_id}.{self._sign(session_id)}"
+
+    @staticmethod
+    def _session(request: web.Request) -> str:
+        """Get ID of the client session, see session_middleware(). Every session has its own working directory."""
+
+        return request["session"]
+
+    @staticmethod
+    def _attachment(filename: str) -> str:
+        """Make Content-Disposition header value for a download.
+
+        Control characters are dropped. The name is given as UTF-8 in `filename*` (RFC 5987) and as ASCII
+        in `filename` for older clients, with other characters, quotes and backslashes replaced with "_".
+        """
+
+        filename = "".join(c for c in filename if c.isprintable())
+        fallback = re.sub(r'[^\x20-\x7e]|["\\]', "_", filename)
+        return f"attachment; filename=\"{fallback}\"; filename*=UTF-8''{urllib.parse.quote(filename, safe='')}"
 
     async def handle(self, request: web.Request, *args, **kwargs) -> web.Response:
         """Basic coroutine for connection testing.
@@ -35,9 +198,128 @@ class WebHandler:
 
         return web.json_response(data={"status": "success"}, headers=self._headers)
 
+    @staticmethod
+    def _error_status(e: Exception) -> int:
+        """Get HTTP status of a failed write: 507 if a quota is exceeded, 400 otherwise."""
+
+        if isinstance(e, OSError) and e.errno == errno.EDQUOT:
+            return web.HTTPInsufficientStorage.status_code
+        return web.HTTPBadRequest.status_code
+
+    async def stats(self, request: web.Request, *args, **kwargs) -> web.Response:
+        """Coroutine for getting file service statistics.
+
+        Args:
+            request (Request): aiohttp request.
+
+        Returns:
+            Response: JSON response with success status, cache and flush counters.
+        """
+
+        self._logger.debug(f"{request.path} was requested.")
+
+        data = {
+            "metadata_cache": await self._fs.cache_stats(),
+            "durability": await self._fs.durability_stats(),
+            "trash": await self._fs.trash_stats(),
+            "packs": await self._fs.pack_stats(),
+            "content_cache": await self._fs.content_cache_stats(),
+            "uploads": await self._fs.upload_stats(),
+            "catalog": await self._fs.catalog_stats(),
+            "search": await self._fs.search_stats(),
+            "changes": await self._fs.change_feed_stats(),
+        }
+        return web.json_response(data={"status": "success", "data": data}, headers=self._headers)
+
+    async def get_usage(self, request: web.Request, *args, **kwargs) -> web.Response:
+        """Coroutine for getting disk usage of a directory tree.
+
+        Args:
+            request (Request): aiohttp request. Optional query parameter `path` - directory relative
+                to data directory (default: data directory).
+
+        Returns:
+            Response: JSON response with success status and usage, see FileService.get_usage(),
+            or error status and error message.
+        """
+
+        self._logger.debug(f"{request.path} was requested.")
+
+        message = "success"
+        status = web.HTTPOk.status_code
+        usage = dict()
+        try:
+            usage = await self._fs.get_usage(request.query.get("path", "."))
+        except RuntimeError as e:
+            message = str(e)
+            status = web.HTTPNotFound.status_code
+            self._logger.error(message)
+        except Exception as e:
+            message = str(e)
+            status = web.HTTPBadRequest.status_code
+            self._logger.error(message)
+        finally:
+            return web.json_response(data={"status": message, "data": usage}, status=status, headers=self._headers)
+
+    async def set_quota(self, request: web.Request, *args, **kwargs) -> web.Response:
+        """Coroutine for setting quota of a directory tree.
+
+        Args:
+            request (Request): aiohttp request, contains JSON in body. JSON format:
+            {
+                "path": "string. Directory relative to data directory. Optional",
+                "max_bytes": "int. Maximum total size of files. Optional",
+                "max_files": "int. Maximum number of files. Optional",
+            }.
+            Quota is removed if no limits are passed.
+
+        Returns:
+            Response: JSON response with success status and usage, see FileService.get_usage(),
+            or error status and error message.
+        """
+
+        self._logger.debug(f"{request.path} was requested.")
+
+        message = "success"
+        status = web.HTTPOk.status_code
+        usage = dict()
+        try:
+            data = await request.json()
+            usage = await self._fs.set_quota(
+                data.get("path", "."), max_bytes=data.get("max_bytes"), max_files=data.get("max_files")
+            )
+        except RuntimeError as e:
+            message = str(e)
+            status = web.HTTPNotFound.status_code
+            self._logger.error(message)
+        except Exception as e:
+            message = str(e)
+            status = web.HTTPBadRequest.status_code
+            self._logger.error(message)
+        finally:
+            return web.json_response(data={"status": message, "data": usage}, status=status, headers=self._headers)
+
+    async def reconcile_usage(self, request: web.Request, *args, **kwargs) -> web.Response:
+        """Coroutine for recounting disk usage from files on disk.
+
+        Args:
+            request (Request): aiohttp request.
+
+        Returns:
+            Response: JSON response with success status and usage of data directory.
+        """
+
+        self._logger.debug(f"{request.path} was requested.")
+
+        usage = await self._fs.reconcile_usage()
+        return web.json_response(data={"status": "success", "data": usage}, headers=self._headers)
+
     async def change_dir(self, request: web.Request, *args, **kwargs) -> web.Response:
         """Coroutine for changing working directory with files.
 
+        Working directory belongs to the client session, see _session(). Files are created, read
+        and listed relative to it.
+
         Args:
             request (Request): aiohttp request, contains JSON in body. JSON format:
             {
@@ -57,9 +339,10 @@ class WebHandler:
         new_path = data.get("path")
         message = "success"
         status = web.HTTPOk.status_code
-        cur_path = self._fs.current_dir()
+        session = self._session(request)
+        cur_path = await self._fs.current_dir(session=session)
         try:
-            cur_path = self._fs.change_dir(new_path, autocreate=True)
+            cur_path = await self._fs.change_dir(new_path, autocreate=True, session=session)
         except Exception as e:
             message = str(e)
             status = web.HTTPBadRequest.status_code
@@ -88,7 +371,7 @@ class WebHandler:
         status = web.HTTPOk.status_code
         cur_path = ""
         try:
-            cur_path = self._fs.current_dir()
+            cur_path = await self._fs.current_dir(session=self._session(request))
         except Exception as e:
             message = str(e)
             status = web.HTTPBadRequest.status_code
@@ -121,7 +404,7 @@ class WebHandler:
         message = "success"
         status = web.HTTPOk.status_code
         try:
-            self._fs.delete_dir(new_dir, recursive=True)
+            await self._fs.delete_dir(new_dir, recursive=True)
         except FileNotFoundError as e:
             message = str(e)
             status = web.HTTPNotFound.status_code
@@ -133,11 +416,54 @@ class WebHandler:
         finally:
             return web.json_response(data={"status": message}, status=status, headers=self._headers)
 
+    @staticmethod
+    def _parse_files_query(query) -> dict:
+        """Convert query parameters of GET /files to arguments of FileService.get_files_page().
+
+        Raises:
+            ValueError: if a parameter value is invalid.
+        """
+
+        page_args = dict()
+        if "limit" in query:
+            page_args["limit"] = int(query["limit"])
+        if "cursor" in query:
+            page_args["cursor"] = query["cursor"]
+        if "sort" in query:
+            page_args["sort_by"] = query["sort"]
+        if "order" in query:
+            if query["order"] not in ("asc", "desc"):
+                raise ValueError(f"Bad order: {query['order']}")
+            page_args["descending"] = query["order"] == "desc"
+        if "prefix" in query:
+            page_args["prefix"] = query["prefix"]
+        if "pattern" in query:
+            page_args["pattern"] = query["pattern"]
+        if "min_size" in query:
+            page_args["min_size"] = int(query["min_size"])
+        if "max_size" in query:
+            page_args["max_size"] = int(query["max_size"])
+        if "modified_since" in query:
+            page_args["modified_since"] = datetime.fromisoformat(query["modified_since"])
+        if query.get("hash", "").lower() in ("1", "true", "yes"):
+            page_args["with_hash"] = True
+        return page_args
+
     async def get_files(self, request: web.Request, *args, **kwargs) -> web.Response:
         """Coroutine for getting info about all files in working directory.
 
         Args:
-            request (Request): aiohttp request.
+            request (Request): aiohttp request. Optional query parameters:
+                limit - maximum number of files in response;
+                cursor - `cursor` value from the previous response to get the next page;
+                sort - sort key: name, size or edit_date (default: name);
+                order - asc or desc (default: asc);
+                prefix - filename prefix;
+                pattern - filename glob pattern;
+                min_size, max_size - file size range in bytes;
+                modified_since - ISO 8601 date and time of the earliest modification;
+                hash - if set, add `sha256` of file content to each file, it's the ETag of the file without quotes.
+                Files are returned unsorted if no parameters are passed.
 
         Returns:
             Response: JSON response with success status and data or error status and error message.
@@ -148,45 +474,95 @@ class WebHandler:
         message = "success"
         status = web.HTTPOk.status_code
         files_meta = []
-        cur_path = self._fs.current_dir()
+        next_cursor = None
+        session = self._session(request)
+        cur_path = await self._fs.current_dir(session=session)
         try:
-            files_meta = self._fs.get_files()
+            if request.query:
+                page = await self._fs.get_files_page(session=session, **self._parse_files_query(request.query))
+                files_meta, next_cursor = page["files"], page["cursor"]
+            else:
+                files_meta = await self._fs.get_files(session=session)
         except Exception as e:
             message = str(e)
             status = web.HTTPBadRequest.status_code
             self._logger.error(message)
         finally:
             return web.json_response(
-                data={"status": message, "data": files_meta, "current path": cur_path},
+                data={"status": message, "data": files_meta, "cursor": next_cursor, "current path": cur_path},
                 status=status,
                 dumps=lambda x: json.dumps(x, default=str),
                 headers=self._headers,
             )
 
-    async def get_file_data(self, request: web.Request, *args, **kwargs) -> web.Response:
-        """Coroutine for getting full info about file in working directory.
+    @staticmethod
+    def _parse_catalog_query(query) -> dict:
+        """Convert query parameters of GET /catalog to arguments of FileService.query_files().
+
+        Raises:
+            ValueError: if a parameter value is invalid.
+        """
+
+        query_args = dict()
+        if "path" in query:
+            query_args["path"] = query["path"]
+        if query.get("recursive", "").lower() in ("0", "false", "no"):
+            query_args["recursive"] = False
+        if "limit" in query:
+            query_args["limit"] = int(query["limit"])
+        if "cursor" in query:
+            query_args["cursor"] = query["cursor"]
+        if "sort" in query:
+            query_args["sort_by"] = query["sort"]
+        if "order" in query:
+            if query["order"] not in ("asc", "desc"):
+                raise ValueError(f"Bad order: {query['order']}")
+            query_args["descending"] = query["order"] == "desc"
+        if "pattern" in query:
+            query_args["pattern"] = query["pattern"]
+        if "ext" in query:
+            query_args["ext"] = query["ext"]
+        if "min_size" in query:
+            query_args["min_size"] = int(query["min_size"])
+        if "max_size" in query:
+            query_args["max_size"] = int(query["max_size"])
+        if "modified_since" in query:
+            query_args["modified_since"] = datetime.fromisoformat(query["modified_since"])
+        if "modified_before" in query:
+            query_args["modified_before"] = datetime.fromisoformat(query["modified_before"])
+        return query_args
+
+    async def query_catalog(self, request: web.Request, *args, **kwargs) -> web.Response:
+        """Coroutine for finding files of a directory tree in the file catalog.
 
         Args:
-            request (Request): aiohttp request, contains filename and is_signed parameters.
+            request (Request): aiohttp request. Optional query parameters:
+                path - directory relative to working directory (default: working directory);
+                recursive - 0 to search only in the directory itself (default: 1);
+                limit - maximum number of files in response;
+                cursor - `cursor` value from the previous response to get the next page;
+                sort - sort key: name (full path), size, create_date or edit_date (default: name);
+                order - asc or desc (default: asc);
+                pattern - filename glob pattern;
+                ext - filename extension, case-insensitive;
+                min_size, max_size - file size range in bytes;
+                modified_since, modified_before - ISO 8601 date and time range of modification.
 
         Returns:
-            Response: JSON response with success status and data or error status and error message.
-
-        Raises:
-            HTTPBadRequest: 400 HTTP error, if error.
+            Response: JSON response with success status, files and cursor or error status and error message.
         """
 
         self._logger.debug(f"{request.path} was requested.")
 
-        filename = request.match_info["filename"]
-
         message = "success"
         status = web.HTTPOk.status_code
-        file_data = dict()
+        files_meta = []
+        next_cursor = None
         try:
-            file_data = self._fs.get_file_data(filename)
-            file_data["content"] = base64.b64encode(file_data["content"]).decode("utf-8")
-            # Use base64.b64decode(file_data['content']) to restore original bytes
+            page = await self._fs.query_files(
+                session=self._session(request), **self._parse_catalog_query(request.query)
+            )
+            files_meta, next_cursor = page["files"], page["cursor"]
         except RuntimeError as e:
             message = str(e)
             status = web.HTTPNotFound.status_code
@@ -197,95 +573,1062 @@ class WebHandler:
             self._logger.error(message)
         finally:
             return web.json_response(
-                data={"status": message, "data": file_data},
+                data={"status": message, "data": files_meta, "cursor": next_cursor},
                 status=status,
                 dumps=lambda x: json.dumps(x, default=str),
                 headers=self._headers,
             )
 
-    async def create_file(self, request: web.Request, *args, **kwargs) -> web.Response:
-        """Coroutine for creating file.
+    async def search_files(self, request: web.Request, *args, **kwargs) -> web.Response:
+        """Coroutine for finding lines of text files which contain all given words.
 
         Args:
-            request (Request): aiohttp request, contains JSON in body. JSON format:
-            {
-                'filename': 'string. filename',
-                'content': 'string. Content string. Optional',
-            }.
+            request (Request): aiohttp request. Query parameters:
+                q - words to search for;
+                path - optional directory relative to working directory (default: working directory);
+                limit - optional maximum number of lines in response (default: 100);
+                cursor - optional `cursor` value from the previous response to get the next page.
 
         Returns:
-            Response: JSON response with success status and data or error status and error message.
-
-        Raises:
-            HTTPBadRequest: 400 HTTP error, if error.
+            Response: JSON response with success status, matching lines and cursor or error status and error message.
         """
 
         self._logger.debug(f"{request.path} was requested.")
 
-        data = await request.json()
-        filename = data.get("filename")
-        # Check content. It should be base64 encoded.
-        try:
-            content = base64.b64decode(data.get("content"))
-        except Exception as e:
-            self._logger.error(f"Bad content for file {filename}")
-            return web.json_response(
-                data={"status": "bad content", "data": {}},
-                status=web.HTTPBadRequest.status_code,
-                headers=self._headers,
-            )
-
         message = "success"
-        status = web.HTTPCreated.status_code
-        file_meta = dict()
+        status = web.HTTPOk.status_code
+        results = []
+        next_cursor = None
         try:
-            file_meta = self._fs.create_file(filename, content)
+            search_args = dict(path=request.query.get("path", "."), cursor=request.query.get("cursor"))
+            if "limit" in request.query:
+                search_args["limit"] = int(request.query["limit"])
+            page = await self._fs.search_files(
+                request.query.get("q", ""), session=self._session(request), **search_args
+            )
+            results, next_cursor = page["results"], page["cursor"]
+        except RuntimeError as e:
+            message = str(e)
+            status = web.HTTPNotFound.status_code
+            self._logger.error(message)
         except Exception as e:
             message = str(e)
             status = web.HTTPBadRequest.status_code
             self._logger.error(message)
         finally:
-            # Add Location header
-            new_headers = copy.copy(self._headers)
-            new_headers["Location"] = request.raw_path + "/" + filename
             return web.json_response(
-                data={"status": message, "data": file_meta},
-                status=status,
-                dumps=lambda x: json.dumps(x, default=str),
-                headers=new_headers,
+                data={"status": message, "data": results, "cursor": next_cursor}, status=status, headers=self._headers
             )
 
-    async def delete_file(self, request: web.Request, *args, **kwargs) -> web.Response:
-        """Coroutine for deleting file.
+    async def reconcile_catalog(self, request: web.Request, *args, **kwargs) -> web.Response:
+        """Coroutine for bringing the file catalog in line with files on disk.
 
         Args:
-            request (Request): aiohttp request, contains filename.
+            request (Request): aiohttp request.
 
         Returns:
-            Response: JSON response with success status and success message or error status and error message.
-
-        Raises:
-            HTTPBadRequest: 400 HTTP error, if error.
-
+            Response: JSON response with success status and numbers of added, updated and removed files,
+            or error status and error message.
         """
-        self._logger.debug(f"{request.path} was requested.")
 
-        filename = request.match_info["filename"]
+        self._logger.debug(f"{request.path} was requested.")
 
         message = "success"
         status = web.HTTPOk.status_code
+        counts = dict()
         try:
-            self._fs.delete_file(filename)
+            counts = await self._fs.reconcile_catalog()
         except RuntimeError as e:
             message = str(e)
             status = web.HTTPNotFound.status_code
             self._logger.error(message)
-        except Exception as e:
-            message = str(e)
-            status = web.HTTPBadRequest.status_code
-            self._logger.error(message)
         finally:
-            return web.json_response(data={"status": message}, status=status, headers=self._headers)
+            return web.json_response(data={"status": message, "data": counts}, status=status, headers=self._headers)
+
+    @staticmethod
+    def _is_raw_requested(request: web.Request) -> bool:
+        """Check if the client asks for raw file content instead of JSON.
+
+        Raw content is requested by `raw` query parameter (e.g. `?raw=1`) or by `Accept` header
+        which prefers `application/octet-stream` to `application/json`.
+        """
+
+        if request.query.get("raw", "").lower() in ("1", "true", "yes"):
+            return True
+
+        accept = request.headers.get(hdrs.ACCEPT, "")
+        media_types = [media_type.split(";")[0].strip().lower() for media_type in accept.split(",")]
+        return "application/octet-stream" in media_types and "application/json" not in media_types
+
+    @staticmethod
+    def _parse_ranges(range_header: str, size: int) -> list:
+        """Parse value of `Range` header.
+
+        Args:
+            range_header (str): `Range` header value, e.g. `bytes=0-99,200-,-50`.
+            size (int): Size of a file in bytes.
+
+        Returns:
+            List of satisfiable (start, end) ranges. End is inclusive.
+
+        Raises:
+            ValueError: if header value is malformed.
+        """
+
+        unit, _, range_specs = range_header.partition("=")
+        if unit.strip().lower() != "bytes" or not range_specs.strip():
+            raise ValueError(f"Bad range: {range_header}")
+
+        ranges = list()
+        for range_spec in range_specs.split(","):
+            start, sep, end = range_spec.strip().partition("-")
+            if not sep or not (start or end) or not (start or "0").isdigit() or not (end or "0").isdigit():
+                raise ValueError(f"Bad range: {range_header}")
+            if not start:
+                # Suffix range: last `end` bytes.
+                suffix_length = int(end)
+                if not suffix_length:
+                    continue
+                start, end = max(size - suffix_length, 0), size - 1
+            else:
+                if end and int(end) < int(start):
+                    raise ValueError(f"Bad range: {range_header}")
+                start, end = int(start), min(int(end) if end else size - 1, size - 1)
+            if start < size:
+                ranges.append((start, end))
+
+        return ranges
+
+    @staticmethod
+    def _accepts_encoding(request: web.Request, encoding: str) -> bool:
+        """Check if `Accept-Encoding` header allows a content coding."""
+
+        for coding in request.headers.get(hdrs.ACCEPT_ENCODING, "").split(","):
+            name, _, params = coding.partition(";")
+            if name.strip().lower() not in (encoding, "*"):
+                continue
+            quality = params.strip().lower()
+            try:
+                return not quality.startswith("q=") or float(quality[2:]) > 0
+            except ValueError:
+                return False
+        return False
+
+    @staticmethod
+    def _is_not_modified(request: web.Request, etag: str, file_meta: dict) -> bool:
+        """Check `If-None-Match` and `If-Modified-Since` conditions. Returns True if the file was not modified."""
+
+        if hdrs.IF_NONE_MATCH in request.headers:
+            tags = [tag.strip() for tag in request.headers[hdrs.IF_NONE_MATCH].split(",")]
+            # Weak comparison, see RFC 7232.
+            return "*" in tags or any((tag[2:] if tag.startswith("W/") else tag) == etag for tag in tags)
+        if request.if_modified_since is not None:
+            return int(file_meta["edit_date"].timestamp()) <= request.if_modified_since.timestamp()
+        return False
+
+    @staticmethod
+    def _is_range_valid(request: web.Request, etag: str, file_meta: dict) -> bool:
+        """Check `If-Range` condition. Returns True if the file was not modified."""
+
+        if_range = request.headers.get(hdrs.IF_RANGE)
+        if if_range is None:
+            return True
+        if if_range.startswith('"') or if_range.startswith("W/"):
+            # Strong comparison, see RFC 7233.
+            return if_range == etag
+        if request.if_range is None:
+            return False
+        return int(file_meta["edit_date"].timestamp()) <= request.if_range.timestamp()
+
+    async def _write_file_range(
+        self, response: web.StreamResponse, path: str, start: int, end: int, decode: bool = True
+    ) -> None:
+        """Write a range of a file to response. The range is read in chunks, see FileService.open_reader()."""
+
+        offset = start
+        async for chunk in self._fs.read_file_chunks(path, start, end - start + 1, CHUNK_SIZE, decode=decode):
+            await response.write(chunk)
+            offset += len(chunk)
+        if offset <= end:
+            raise RuntimeError(f"File was truncated: {path}")
+
+    async def _send_stored_file(
+        self, request: web.Request, path: str, file_meta: dict, stored_format: dict, headers: dict
+    ) -> web.StreamResponse:
+        """Send compressed content of a compressed file as it is stored, with `Content-Encoding` header.
+
+        Args:
+            request (Request): aiohttp request.
+            path (str): Absolute path to a file.
+            file_meta (dict): File metadata.
+            stored_format (dict): See FileService.get_stored_format().
+            headers (dict): Response headers, contains ETag.
+
+        Returns:
+            StreamResponse: 200 OK response with compressed file content.
+        """
+
+        headers = copy.copy(headers)
+        # Encoded content differs from the file content which strong ETag stands for.
+        headers[hdrs.ETAG] = "W/" + headers[hdrs.ETAG]
+        headers[hdrs.CONTENT_ENCODING] = stored_format["encoding"]
+
+        response = web.StreamResponse(headers=headers)
+        response.content_type = mimetypes.guess_type(path)[0] or "application/octet-stream"
+        response.content_length = stored_format["size"]
+        response.last_modified = file_meta["edit_date"].timestamp()
+        await response.prepare(request)
+        if stored_format["size"]:
+            await self._write_file_range(response, path, 0, stored_format["size"] - 1, decode=False)
+        await response.write_eof()
+
+        return response
+
+    async def _send_file_ranges(
+        self, request: web.Request, path: str, file_meta: dict, ranges: typing.Optional[list], headers: dict
+    ) -> web.StreamResponse:
+        """Send ranges of a file. Several ranges are sent as `multipart/byteranges`.
+
+        Args:
+            request (Request): aiohttp request.
+            path (str): Absolute path to a file.
+            file_meta (dict): File metadata.
+            ranges (list): List of (start, end) ranges, see _parse_ranges(). If None, the whole file is sent.
+            headers (dict): Response headers.
+
+        Returns:
+            StreamResponse: 206 Partial Content response or 200 OK response with the whole file.
+        """
+
+        size = file_meta["size"]
+        content_type = mimetypes.guess_type(path)[0] or "application/octet-stream"
+
+        response = web.StreamResponse(headers=headers)
+        response.headers[hdrs.ACCEPT_RANGES] = "bytes"
+        response.last_modified = file_meta["edit_date"].timestamp()
+
+        if ranges is None:
+            response.content_type = content_type
+            response.content_length = size
+            await response.prepare(request)
+            if size:
+                await self._write_file_range(response, path, 0, size - 1)
+            await response.write_eof()
+            return response
+
+        if len(ranges) == 1:
+            start, end = ranges[0]
+            response.set_status(web.HTTPPartialContent.status_code)
+            response.content_type = content_type
+            response.content_length = end - start + 1
+            response.headers[hdrs.CONTENT_RANGE] = f"bytes {start}-{end}/{size}"
+            await response.prepare(request)
+            await self._write_file_range(response, path, start, end)
+            await response.write_eof()
+            return response
+
+        boundary = uuid.uuid4().hex
+        part_headers = [
+            (
+                f"--{boundary}\r\n"
+                f"{hdrs.CONTENT_TYPE}: {content_type}\r\n"
+                f"{hdrs.CONTENT_RANGE}: bytes {start}-{end}/{size}\r\n\r\n"
+            ).encode()
+            for start, end in ranges
+        ]
+        closing = f"--{boundary}--\r\n".encode()
+        content_length = sum(len(part) + end - start + 1 + 2 for part, (start, end) in zip(part_headers, ranges))
+
+        response.set_status(web.HTTPPartialContent.status_code)
+        response.headers[hdrs.CONTENT_TYPE] = f"multipart/byteranges; boundary={boundary}"
+        response.content_length = content_length + len(closing)
+        await response.prepare(request)
+
+        for part, (start, end) in zip(part_headers, ranges):
+            await response.write(part)
+            await self._write_file_range(response, path, start, end)
+            await response.write(b"\r\n")
+        await response.write(closing)
+        await response.write_eof()
+
+        return response
+
+    async def _send_file(self, request: web.Request, path: str, file_meta: dict, headers: dict) -> web.StreamResponse:
+        """Send raw file content. Uses sendfile where the platform supports it.
+
+        Single range requests are handled by aiohttp. Requests with several ranges are answered
+        with `multipart/byteranges`.
+
+        Compressed files are sent as they are stored if the client accepts their encoding
+        and doesn't ask for ranges. Otherwise they are decompressed while they are sent.
+        Packed files are read from their pack, see FileService.is_packed().
+
+        Args:
+            request (Request): aiohttp request.
+            path (str): Absolute path to a file.
+            file_meta (dict): File metadata.
+            headers (dict): Response headers, contains ETag.
+
+        Returns:
+            StreamResponse: file response.
+        """
+
+        range_header = request.headers.get(hdrs.RANGE, "")
+        is_range_valid = self._is_range_valid(request, headers[hdrs.ETAG], file_meta)
+        stored_format = await self._fs.get_stored_format(path)
+        if stored_format is not None:
+            if not range_header and self._accepts_encoding(request, stored_format["encoding"]):
+                return await self._send_stored_file(request, path, file_meta, stored_format, headers)
+        elif "," not in range_header and (is_range_valid or not range_header) and not await self._fs.is_packed(path):
+            return _HashedFileResponse(path, headers=headers)
+
+        # aiohttp can't serve several ranges and doesn't check ETag in If-Range, so it's handled here.
+        # It can't serve compressed files either.
+        ranges = None
+        if range_header.count(",") < MAX_RANGES and is_range_valid:
+            try:
+                ranges = self._parse_ranges(range_header, file_meta["size"])
+            except ValueError:
+                # Malformed Range header is ignored.
+                pass
+        if ranges == []:
+            headers = copy.copy(headers)
+            headers[hdrs.CONTENT_RANGE] = f"bytes */{file_meta['size']}"
+            return web.Response(status=web.HTTPRequestRangeNotSatisfiable.status_code, headers=headers)
+        return await self._send_file_ranges(request, path, file_meta, ranges, headers)
+
+    async def get_file_data(self, request: web.Request, *args, **kwargs) -> web.StreamResponse:
+        """Coroutine for getting full info about file in working directory.
+
+        Responses have ETag header with SHA-256 of the file content. `If-None-Match` and `If-Modified-Since`
+        conditions are checked before the file is read.
+
+        Args:
+            request (Request): aiohttp request, contains filename and is_signed parameters.
+                Raw file content is sent instead of JSON if `raw` query parameter is set
+                or `Accept` header asks for `application/octet-stream`.
+
+        Returns:
+            Response: JSON response with success status and data or error status and error message.
+            FileResponse: raw file content, if requested.
+            Response: 304 Not Modified, if the file matches request conditions.
+
+        Raises:
+            HTTPBadRequest: 400 HTTP error, if error.
+        """
+
+        self._logger.debug(f"{request.path} was requested.")
+
+        filename = request.match_info["filename"]
+        session = self._session(request)
+
+        try:
+            path = await self._fs.get_file_path(filename, session=session)
+            file_meta = await self._fs.get_file_metadata(path)
+            etag = f'"{await self._fs.get_file_hash(path)}"'
+        except RuntimeError as e:
+            message = str(e)
+            status = web.HTTPNotFound.status_code
+            self._logger.error(message)
+            return web.json_response(data={"status": message, "data": {}}, status=status, headers=self._headers)
+        except Exception as e:
+            message = str(e)
+            status = web.HTTPBadRequest.status_code
+            self._logger.error(message)
+            return web.json_response(data={"status": message, "data": {}}, status=status, headers=self._headers)
+
+        headers = copy.copy(self._headers)
+        headers[hdrs.ETAG] = etag
+        headers[hdrs.VARY] = f"{hdrs.ACCEPT}, {hdrs.ACCEPT_ENCODING}"
+        if self._is_not_modified(request, etag, file_meta):
+            return web.Response(status=web.HTTPNotModified.status_code, headers=headers)
+
+        if self._is_raw_requested(request):
+            return await self._send_file(request, path, file_meta, headers)
+
+        try:
+            body = await self._fs.get_encoded_file_data(filename, self._encode_file_data, session=session)
+        except RuntimeError as e:
+            message = str(e)
+            status = web.HTTPNotFound.status_code
+            self._logger.error(message)
+            return web.json_response(data={"status": message, "data": {}}, status=status, headers=headers)
+        except Exception as e:
+            message = str(e)
+            status = web.HTTPBadRequest.status_code
+            self._logger.error(message)
+            return web.json_response(data={"status": message, "data": {}}, status=status, headers=headers)
+
+        return web.Response(body=body, content_type="application/json", headers=headers)
+
+    @staticmethod
+    def _encode_file_data(file_data: dict) -> bytes:
+        """Encode a successful JSON response body with file info, see FileService.get_encoded_file_data().
+
+        Content is base64-encoded straight from the buffer returned by the file service and spliced
+        into the body as the last key of data, so big files aren't copied into intermediate strings.
+
+        Args:
+            file_data (dict): File info with raw content.
+
+        Returns:
+            UTF-8 encoded JSON.
+        """
+
+        content = file_data.pop("content")
+        head = json.dumps({"status": "success", "data": file_data}, default=str)
+        # Use base64.b64decode(file_data['content']) to restore original bytes.
+        # Base64 needs no escaping in JSON strings.
+        return b"".join(
+            (head[: -len("}}")].encode("utf-8"), b', "content": "', base64.b64encode(content), b'"}}')
+        )
+
+    async def _write_archive_file(
+        self, response: web.StreamResponse, archive: typing.Union[Archive.TarStream, Archive.ZipStream], file_meta: dict
+    ) -> None:
+        """Add a file to a streamed archive. Files deleted after the directory was listed are skipped.
+
+        Args:
+            response (StreamResponse): Prepared response.
+            archive (TarStream or ZipStream): Archive encoder.
+            file_meta (dict): File info, see FileService.walk_dir().
+        """
+
+        loop = asyncio.get_running_loop()
+
+        async def send(data: bytes) -> None:
+            if data:
+                await response.write(data)
+
+        chunks = self._fs.read_file_chunks(file_meta["path"], 0, file_meta["size"], CHUNK_SIZE)
+        try:
+            try:
+                first_chunk = await chunks.__anext__()
+            except StopAsyncIteration:
+                first_chunk = b""
+            except RuntimeError as e:
+                self._logger.error(str(e))
+                return
+            await send(archive.add_file(file_meta["name"], file_meta["size"], file_meta["mtime"]))
+            # Encoding may compress the content, so it's done off the event loop.
+            await send(await loop.run_in_executor(None, archive.write, first_chunk))
+            async for chunk in chunks:
+                await send(await loop.run_in_executor(None, archive.write, chunk))
+            await send(archive.end_file())
+        finally:
+            await chunks.aclose()
+
+    async def get_archive(self, request: web.Request, *args, **kwargs) -> web.StreamResponse:
+        """Coroutine for downloading a directory as an archive.
+
+        The archive is made while it's sent: files are read in chunks and no archive is stored on disk.
+
+        Args:
+            request (Request): aiohttp request. Optional query parameters:
+                path - directory relative to working directory (default: working directory);
+                format - tar, tar.gz or zip (default: tar);
+                recursive - 0 to archive only files of the directory itself (default: 1).
+
+        Returns:
+            StreamResponse: archive content.
+            Response: JSON response with error status and error message, if the directory can't be archived.
+        """
+
+        self._logger.debug(f"{request.path} was requested.")
+
+        path = request.query.get("path", ".")
+        archive_format = request.query.get("format", "tar")
+        recursive = request.query.get("recursive", "1").lower() not in ("0", "false", "no")
+        try:
+            archive = Archive.make_archive(archive_format)
+            files = await self._fs.walk_dir(path, recursive=recursive, session=self._session(request))
+        except RuntimeError as e:
+            message = str(e)
+            self._logger.error(message)
+            return web.json_response(
+                data={"status": message}, status=web.HTTPNotFound.status_code, headers=self._headers
+            )
+        except Exception as e:
+            message = str(e)
+            self._logger.error(message)
+            return web.json_response(
+                data={"status": message}, status=web.HTTPBadRequest.status_code, headers=self._headers
+            )
+
+        content_type, extension = Archive.FORMATS[archive_format]
+        archive_name = os.path.basename(os.path.normpath(path).rstrip(os.sep))
+        archive_name = "".join(c for c in archive_name if c.isprintable()).lstrip(".") or "archive"
+        headers = copy.copy(self._headers)
+        headers[hdrs.CONTENT_TYPE] = content_type
+        headers[hdrs.CONTENT_DISPOSITION] = self._attachment(archive_name + extension)
+        response = web.StreamResponse(headers=headers)
+        await response.prepare(request)
+        for file_meta in files:
+            await self._write_archive_file(response, archive, file_meta)
+        await response.write(archive.close())
+        await response.write_eof()
+        return response
+
+    async def watch_changes(self, request: web.Request, *args, **kwargs) -> web.StreamResponse:
+        """Coroutine for streaming changes of a directory tree as server-sent events.
+
+        Every event has `id` set to the event ID, `event` set to its type (create, modify, delete or reset)
+        and JSON `data` with keys: id, type, path, dir, time. After `reset` the tree should be listed again.
+        A comment is sent every `keepalive` seconds without events.
+
+        Args:
+            request (Request): aiohttp request. Optional query parameters:
+                path - directory relative to working directory (default: working directory);
+                after - ID of the last event got before, to resume after it; `Last-Event-ID` header
+                    sent by reconnecting clients works the same.
+
+        Returns:
+            StreamResponse: event stream.
+            Response: JSON response with error status and error message, if the directory can't be watched.
+        """
+
+        self._logger.debug(f"{request.path} was requested.")
+
+        try:
+            after = request.query.get("after", request.headers.get("Last-Event-ID"))
+            subscription = await self._fs.subscribe_changes(
+                request.query.get("path", "."),
+                after=int(after) if after else None,
+                session=self._session(request),
+            )
+        except RuntimeError as e:
+            message = str(e)
+            self._logger.error(message)
+            return web.json_response(
+                data={"status": message}, status=web.HTTPNotFound.status_code, headers=self._headers
+            )
+        except Exception as e:
+            message = str(e)
+            self._logger.error(message)
+            return web.json_response(
+                data={"status": message}, status=web.HTTPBadRequest.status_code, headers=self._headers
+            )
+
+        headers = copy.copy(self._headers)
+        headers[hdrs.CONTENT_TYPE] = "text/event-stream"
+        headers[hdrs.CACHE_CONTROL] = "no-cache"
+        response = web.StreamResponse(headers=headers)
+        changes = self._fs.watch_changes(subscription, CHANGES_KEEPALIVE)
+        try:
+            await response.prepare(request)
+            await response.write(b": subscribed\n\n")
+            async for events in changes:
+                if not events:
+                    await response.write(b": keepalive\n\n")
+                    continue
+                await response.write(
+                    "".join(
+                        f"id: {event['id']}\nevent: {event['type']}\ndata: {json.dumps(event)}\n\n" for event in events
+                    ).encode()
+                )
+        except ConnectionResetError:
+            self._logger.debug("Change stream closed by client")
+        finally:
+            await changes.aclose()
+        return response
+
+    async def _create_file_from_stream(self, request: web.Request) -> web.Response:
+        """Create file from raw request body which is read in chunks.
+
+        Args:
+            request (Request): aiohttp request, contains file content in body and filename in `filename`
+                query parameter.
+
+        Returns:
+            Response: JSON response with success status and data or error status and error message.
+        """
+
+        filename = request.query.get("filename", "")
+
+        message = "success"
+        status = web.HTTPCreated.status_code
+        file_meta = dict()
+        try:
+            file_meta = await self._fs.create_file_stream(
+                filename, request.content.iter_chunked(CHUNK_SIZE), session=self._session(request)
+            )
+        except Exception as e:
+            message = str(e)
+            status = self._error_status(e)
+            self._logger.error(message)
+        finally:
+            # Add Location header
+            new_headers = copy.copy(self._headers)
+            new_headers["Location"] = request.path + "/" + filename
+            return web.json_response(
+                data={"status": message, "data": file_meta},
+                status=status,
+                dumps=lambda x: json.dumps(x, default=str),
+                headers=new_headers,
+            )
+
+    async def create_file(self, request: web.Request, *args, **kwargs) -> web.Response:
+        """Coroutine for creating file.
+
+        Args:
+            request (Request): aiohttp request, contains JSON in body. JSON format:
+            {
+                'filename': 'string. filename',
+                'content': 'string. Content string. Optional',
+            }.
+            If `Content-Type` is `application/octet-stream`, body is raw file content which is streamed
+            to disk, and filename is passed in `filename` query parameter.
+
+        Returns:
+            Response: JSON response with success status and data or error status and error message.
+
+        Raises:
+            HTTPBadRequest: 400 HTTP error, if error.
+        """
+
+        self._logger.debug(f"{request.path} was requested.")
+
+        # aiohttp reports application/octet-stream for a missing Content-Type, so check the header itself.
+        if hdrs.CONTENT_TYPE in request.headers and request.content_type == "application/octet-stream":
+            return await self._create_file_from_stream(request)
+
+        data = await request.json()
+        filename = data.get("filename")
+        # Check content. It should be base64 encoded.
+        try:
+            content = base64.b64decode(data.get("content"))
+        except Exception as e:
+            self._logger.error(f"Bad content for file {filename}")
+            return web.json_response(
+                data={"status": "bad content", "data": {}},
+                status=web.HTTPBadRequest.status_code,
+                headers=self._headers,
+            )
+
+        message = "success"
+        status = web.HTTPCreated.status_code
+        file_meta = dict()
+        try:
+            file_meta = await self._fs.create_file(filename, content, session=self._session(request))
+        except Exception as e:
+            message = str(e)
+            status = self._error_status(e)
+            self._logger.error(message)
+        finally:
+            # Add Location header
+            new_headers = copy.copy(self._headers)
+            new_headers["Location"] = request.raw_path + "/" + filename
+            return web.json_response(
+                data={"status": message, "data": file_meta},
+                status=status,
+                dumps=lambda x: json.dumps(x, default=str),
+                headers=new_headers,
+            )
+
+    async def delete_file(self, request: web.Request, *args, **kwargs) -> web.Response:
+        """Coroutine for deleting file.
+
+        Args:
+            request (Request): aiohttp request, contains filename.
+
+        Returns:
+            Response: JSON response with success status and success message or error status and error message.
+
+        Raises:
+            HTTPBadRequest: 400 HTTP error, if error.
+
+        """
+        self._logger.debug(f"{request.path} was requested.")
+
+        filename = request.match_info["filename"]
+
+        message = "success"
+        status = web.HTTPOk.status_code
+        try:
+            await self._fs.delete_file(filename, session=self._session(request))
+        except RuntimeError as e:
+            message = str(e)
+            status = web.HTTPNotFound.status_code
+            self._logger.error(message)
+        except Exception as e:
+            message = str(e)
+            status = web.HTTPBadRequest.status_code
+            self._logger.error(message)
+        finally:
+            return web.json_response(data={"status": message}, status=status, headers=self._headers)
+
+    async def open_upload_session(self, request: web.Request, *args, **kwargs) -> web.Response:
+        """Coroutine for starting a resumable upload of a file in chunks.
+
+        Args:
+            request (Request): aiohttp request, contains JSON in body. JSON format:
+            {
+                "filename": "string. Filename",
+                "size": "int. File size in bytes",
+                "chunk_size": "int. Size of every chunk but the last one. Optional",
+                "sha256": "string. SHA-256 hex digest of the file, checked on commit. Optional",
+            }.
+
+        Returns:
+            Response: JSON response with success status and session info, see FileService.get_upload_session(),
+            or error status and error message.
+        """
+
+        self._logger.debug(f"{request.path} was requested.")
+
+        message = "success"
+        status = web.HTTPCreated.status_code
+        info = dict()
+        try:
+            data = await request.json()
+            chunk_size = data.get("chunk_size")
+            info = await self._fs.open_upload_session(
+                data.get("filename"),
+                int(data.get("size")),
+                chunk_size=int(chunk_size) if chunk_size is not None else None,
+                sha256=data.get("sha256"),
+                session=self._session(request),
+            )
+        except Exception as e:
+            message = str(e)
+            status = self._error_status(e)
+            self._logger.error(message)
+        finally:
+            headers = copy.copy(self._headers)
+            if info:
+                headers["Location"] = f"{request.path}/{info['upload_id']}"
+            return web.json_response(data={"status": message, "data": info}, status=status, headers=headers)
+
+    async def get_upload_session(self, request: web.Request, *args, **kwargs) -> web.Response:
+        """Coroutine for getting state of an upload session, e.g. to resume it.
+
+        Args:
+            request (Request): aiohttp request, contains upload_id.
+
+        Returns:
+            Response: JSON response with success status and session info with received and missing chunks,
+            or error status and error message.
+        """
+
+        self._logger.debug(f"{request.path} was requested.")
+
+        message = "success"
+        status = web.HTTPOk.status_code
+        info = dict()
+        try:
+            info = await self._fs.get_upload_session(request.match_info["upload_id"])
+        except RuntimeError as e:
+            message = str(e)
+            status = web.HTTPNotFound.status_code
+            self._logger.error(message)
+        except Exception as e:
+            message = str(e)
+            status = web.HTTPBadRequest.status_code
+            self._logger.error(message)
+        finally:
+            return web.json_response(data={"status": message, "data": info}, status=status, headers=self._headers)
+
+    async def put_upload_chunk(self, request: web.Request, *args, **kwargs) -> web.Response:
+        """Coroutine for receiving a chunk of an upload session. Chunks may be sent in parallel and in any order.
+
+        Args:
+            request (Request): aiohttp request, contains upload_id and chunk number, raw chunk content in body.
+
+        Returns:
+            Response: JSON response with success status and session info or error status and error message.
+        """
+
+        self._logger.debug(f"{request.path} was requested.")
+
+        message = "success"
+        status = web.HTTPOk.status_code
+        info = dict()
+        try:
+            info = await self._fs.write_upload_chunk(
+                request.match_info["upload_id"],
+                int(request.match_info["number"]),
+                request.content.iter_chunked(CHUNK_SIZE),
+            )
+        except RuntimeError as e:
+            message = str(e)
+            status = web.HTTPNotFound.status_code
+            self._logger.error(message)
+        except Exception as e:
+            message = str(e)
+            status = self._error_status(e)
+            self._logger.error(message)
+        finally:
+            return web.json_response(data={"status": message, "data": info}, status=status, headers=self._headers)
+
+    async def commit_upload_session(self, request: web.Request, *args, **kwargs) -> web.Response:
+        """Coroutine for creating the file of an upload session whose chunks are all received.
+
+        Args:
+            request (Request): aiohttp request, contains upload_id and optional JSON in body. JSON format:
+            {
+                "sha256": "string. SHA-256 hex digest of the file. Optional",
+            }.
+
+        Returns:
+            Response: JSON response with success status and data of created file or error status and error message.
+            The session is kept if commit fails.
+        """
+
+        self._logger.debug(f"{request.path} was requested.")
+
+        message = "success"
+        status = web.HTTPCreated.status_code
+        file_meta = dict()
+        try:
+            data = await request.json() if request.can_read_body else dict()
+            file_meta = await self._fs.commit_upload_session(request.match_info["upload_id"], sha256=data.get("sha256"))
+        except RuntimeError as e:
+            message = str(e)
+            status = web.HTTPNotFound.status_code
+            self._logger.error(message)
+        except Exception as e:
+            message = str(e)
+            status = self._error_status(e)
+            self._logger.error(message)
+        finally:
+            return web.json_response(
+                data={"status": message, "data": file_meta},
+                status=status,
+                dumps=lambda x: json.dumps(x, default=str),
+                headers=self._headers,
+            )
+
+    async def abort_upload_session(self, request: web.Request, *args, **kwargs) -> web.Response:
+        """Coroutine for removing an upload session and its received chunks.
+
+        Args:
+            request (Request): aiohttp request, contains upload_id.
+
+        Returns:
+            Response: JSON response with success status or error status and error message.
+        """
+
+        self._logger.debug(f"{request.path} was requested.")
+
+        message = "success"
+        status = web.HTTPOk.status_code
+        try:
+            await self._fs.abort_upload_session(request.match_info["upload_id"])
+        except RuntimeError as e:
+            message = str(e)
+            status = web.HTTPNotFound.status_code
+            self._logger.error(message)
+        except Exception as e:
+            message = str(e)
+            status = web.HTTPBadRequest.status_code
+            self._logger.error(message)
+        finally:
+            return web.json_response(data={"status": message}, status=status, headers=self._headers)
+
+    async def _transfer(
+        self, request: web.Request, method: typing.Callable, source_key: str, status: int
+    ) -> web.Response:
+        """Run a copy or move operation with source and destination from JSON body.
+
+        Args:
+            request (Request): aiohttp request.
+            method (Callable): AsyncFileService method which takes source, destination and session.
+            source_key (str): JSON key of the source, "source" for files and "path" for directories.
+            status (int): HTTP status of success.
+
+        Returns:
+            Response: JSON response with success status and data or error status and error message.
+        """
+
+        message = "success"
+        data = dict()
+        try:
+            body = await request.json()
+            result = await method(body.get(source_key), body.get("destination"), session=self._session(request))
+            data = result if isinstance(result, dict) else dict(path=result)
+        except RuntimeError as e:
+            message = str(e)
+            status = web.HTTPNotFound.status_code
+            self._logger.error(message)
+        except Exception as e:
+            message = str(e)
+            status = self._error_status(e)
+            self._logger.error(message)
+        finally:
+            return web.json_response(
+                data={"status": message, "data": data},
+                status=status,
+                dumps=lambda x: json.dumps(x, default=str),
+                headers=self._headers,
+            )
+
+    async def copy_file(self, request: web.Request, *args, **kwargs) -> web.Response:
+        """Coroutine for copying a file on the server.
+
+        Args:
+            request (Request): aiohttp request, contains JSON in body. JSON format:
+            {
+                "source": "string. Filename of an existing file",
+                "destination": "string. Filename of the copy, an existing file is replaced",
+            }.
+
+        Returns:
+            Response: JSON response with success status and data of the copy or error status and error message.
+        """
+
+        self._logger.debug(f"{request.path} was requested.")
+
+        return await self._transfer(request, self._fs.copy_file, "source", web.HTTPCreated.status_code)
+
+    async def move_file(self, request: web.Request, *args, **kwargs) -> web.Response:
+        """Coroutine for moving a file on the server.
+
+        Args:
+            request (Request): aiohttp request, contains JSON in body. JSON format:
+            {
+                "source": "string. Filename of an existing file",
+                "destination": "string. New filename, an existing file is replaced",
+            }.
+
+        Returns:
+            Response: JSON response with success status and data of the moved file
+            or error status and error message.
+        """
+
+        self._logger.debug(f"{request.path} was requested.")
+
+        return await self._transfer(request, self._fs.move_file, "source", web.HTTPOk.status_code)
+
+    async def copy_dir(self, request: web.Request, *args, **kwargs) -> web.Response:
+        """Coroutine for copying a directory tree on the server.
+
+        Args:
+            request (Request): aiohttp request, contains JSON in body. JSON format:
+            {
+                "path": "string. Directory relative to working directory",
+                "destination": "string. Path to the copy, which must not exist",
+            }.
+
+        Returns:
+            Response: JSON response with success status, path to the copy and number of copied files
+            or error status and error message.
+        """
+
+        self._logger.debug(f"{request.path} was requested.")
+
+        return await self._transfer(request, self._fs.copy_dir, "path", web.HTTPCreated.status_code)
+
+    async def move_dir(self, request: web.Request, *args, **kwargs) -> web.Response:
+        """Coroutine for moving a directory tree on the server.
+
+        Args:
+            request (Request): aiohttp request, contains JSON in body. JSON format:
+            {
+                "path": "string. Directory relative to working directory",
+                "destination": "string. New path, which must not exist",
+            }.
+
+        Returns:
+            Response: JSON response with success status and new path relative to data directory
+            or error status and error message.
+        """
+
+        self._logger.debug(f"{request.path} was requested.")
+
+        return await self._transfer(request, self._fs.move_dir, "path", web.HTTPOk.status_code)
+
+    async def _run_batch_operation(self, operation: dict, session: str) -> dict:
+        """Run one operation of a batch.
+
+        Args:
+            operation (dict): Operation from the batch request.
+            session (str): Client session.
+
+        Returns:
+            Dict with keys: status, code and data. Errors are reported in the result, not raised.
+        """
+
+        message = "success"
+        file_data = dict()
+        try:
+            op, filename = operation.get("op"), operation.get("filename")
+            if op not in BATCH_OPERATIONS:
+                raise ValueError(f"Unknown operation: {op}")
+            if op == "create":
+                status = web.HTTPCreated.status_code
+                try:
+                    content = base64.b64decode(operation.get("content") or "")
+                except Exception:
+                    raise ValueError("bad content")
+                file_data = await self._fs.create_file(filename, content, session=session)
+            elif op == "read":
+                status = web.HTTPOk.status_code
+                file_data = await self._fs.get_file_data(filename, session=session)
+                file_data["content"] = base64.b64encode(file_data["content"]).decode("utf-8")
+            else:
+                status = web.HTTPOk.status_code
+                await self._fs.delete_file(filename, session=session)
+        except RuntimeError as e:
+            message = str(e)
+            status = web.HTTPNotFound.status_code
+            self._logger.error(message)
+        except Exception as e:
+            message = str(e)
+            status = self._error_status(e)
+            self._logger.error(message)
+        return dict(status=message, code=status, data=file_data)
+
+    async def batch(self, request: web.Request, *args, **kwargs) -> web.Response:
+        """Coroutine for running many file operations in one request.
+
+        Operations run concurrently, at most `batch_parallelism` at once, and are authenticated once
+        with the whole request. They aren't ordered, so a batch shouldn't change a file and read it back.
+
+        Args:
+            request (Request): aiohttp request, contains JSON in body. JSON format:
+            {
+                "operations": [
+                    {"op": "create", "filename": "string", "content": "string. base64. Optional"},
+                    {"op": "read", "filename": "string"},
+                    {"op": "delete", "filename": "string"},
+                ]
+            }.
+
+        Returns:
+            Response: JSON response with success status and a result of every operation in request order.
+            Result format: {"status": "success or error message", "code": HTTP status, "data": {}}.
+            Response: 400 JSON response, if the request is malformed.
+        """
+
+        self._logger.debug(f"{request.path} was requested.")
+
+        try:
+            operations = (await request.json()).get("operations")
+            if not isinstance(operations, list) or not all(isinstance(op, dict) for op in operations):
+                raise ValueError("operations should be a list of objects")
+            max_operations = int(self._config["batch_max_operations"])
+            if len(operations) > max_operations:
+                raise ValueError(f"Too many operations, at most {max_operations} are allowed")
+        except Exception as e:
+            message = str(e)
+            self._logger.error(message)
+            return web.json_response(
+                data={"status": message, "data": {}}, status=web.HTTPBadRequest.status_code, headers=self._headers
+            )
+
+        session = self._session(request)
+        parallelism = asyncio.Semaphore(int(self._config["batch_parallelism"]))
+
+        async def run(operation: dict) -> dict:
+            async with parallelism:
+                return await self._run_batch_operation(operation, session)
+
+        results = await asyncio.gather(*(run(operation) for operation in operations))
+        return web.json_response(
+            data={"status": "success", "data": {"results": results}},
+            dumps=lambda x: json.dumps(x, default=str),
+            headers=self._headers,
+        )
 
     async def register(self, request: web.Request, *args, **kwargs) -> web.Response:
         """Register a new user"""
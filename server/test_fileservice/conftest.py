@@ -21,6 +21,8 @@ import pytest
 
 from config import ServerConfig
 
+from ..FileService import close_services
+
 MIN_TEST_FILE_LEN = 16
 MAX_TEST_FILE_LEN = 1024
 
@@ -41,6 +43,9 @@ def tmp_dir():
 def chdir_to_tmp_path(tmp_path):
     os.chdir(str(tmp_path))
     ServerConfig().config['data_directory'] = tmp_path
+    yield
+    # Stop background threads of services created by the test.
+    close_services()
 
 
 @pytest.fixture
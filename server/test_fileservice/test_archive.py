@@ -0,0 +1,94 @@
+"""Tests for archives of server.Archive and FileService.walk_dir().
+
+Imports:
+    io
+    os
+    pytest
+    server.Archive
+    server.FileService
+    tarfile
+    zipfile
+"""
+
+import io
+import os
+import tarfile
+import zipfile
+
+import pytest
+
+from .. import Archive
+from ..FileService import FileService
+
+FILES = {"a.txt": b"first file", "docs/b.txt": b"x" * 100000, "docs/empty.txt": b""}
+MTIME = 1650000000
+
+
+def make_archive(archive_format: str, files: dict, truncated: bool = False) -> bytes:
+    archive = Archive.make_archive(archive_format)
+    data = b""
+    for name, content in files.items():
+        data += archive.add_file(name, len(content), MTIME)
+        if truncated:
+            content = content[: len(content) // 2]
+        for offset in range(0, len(content), 4096):
+            data += archive.write(content[offset : offset + 4096])
+        data += archive.end_file()
+    return data + archive.close()
+
+
+class TestArchive:
+    """Test archive encoders and directory walking."""
+
+    @pytest.mark.parametrize("archive_format", ["tar", "tar.gz"])
+    def test_tar(self, archive_format):
+        """Tar archive is read by tarfile."""
+        data = make_archive(archive_format, FILES)
+        with tarfile.open(fileobj=io.BytesIO(data), mode="r:*") as tar:
+            assert tar.getnames() == list(FILES)
+            for name, content in FILES.items():
+                assert tar.extractfile(name).read() == content
+            assert tar.getmember("a.txt").mtime == MTIME
+
+    def test_tar_truncated_file(self):
+        """Content of a file which shrank is filled up to the declared size."""
+        data = make_archive("tar", FILES, truncated=True)
+        with tarfile.open(fileobj=io.BytesIO(data)) as tar:
+            content = tar.extractfile("docs/b.txt").read()
+            assert len(content) == len(FILES["docs/b.txt"])
+            assert tar.extractfile("a.txt").read() == b"first" + b"\0" * 5
+
+    def test_zip(self):
+        """Zip archive is read by zipfile."""
+        data = make_archive("zip", FILES)
+        with zipfile.ZipFile(io.BytesIO(data)) as zip_file:
+            assert zip_file.namelist() == list(FILES)
+            assert zip_file.testzip() is None
+            for name, content in FILES.items():
+                assert zip_file.read(name) == content
+
+    def test_unknown_format(self):
+        """Unknown format is rejected."""
+        with pytest.raises(ValueError):
+            Archive.make_archive("rar")
+
+    def test_walk_dir(self, tmp_path):
+        """Files of a tree are listed with relative names, hidden files and symlinks are skipped."""
+        fs = FileService()
+        os.mkdir(os.path.join(tmp_path, "docs"))
+        for name, content in FILES.items():
+            fs.create_file(name, content)
+        fs.create_file(".hidden", b"hidden")
+        os.symlink(os.path.join(tmp_path, "docs"), os.path.join(tmp_path, "link"))
+
+        files = fs.walk_dir()
+        assert [f["name"] for f in files] == sorted(FILES)
+        assert [f["size"] for f in files] == [len(FILES[name]) for name in sorted(FILES)]
+        assert files[0]["path"] == os.path.join(tmp_path, "a.txt")
+
+        assert [f["name"] for f in fs.walk_dir(recursive=False)] == ["a.txt"]
+        assert [f["name"] for f in fs.walk_dir("docs")] == ["b.txt", "empty.txt"]
+        with pytest.raises(RuntimeError):
+            fs.walk_dir("missing")
+        with pytest.raises(ValueError):
+            fs.walk_dir("..")
@@ -0,0 +1,54 @@
+"""Tests for server.AsyncFileService class.
+
+Imports:
+    asyncio
+    os
+    threading
+    server.AsyncFileService
+"""
+
+import asyncio
+import os
+import threading
+
+from ..AsyncFileService import AsyncFileService
+from ..FileService import DEFAULT_SESSION, FileService
+
+
+class TestAsyncFileService:
+    """Test AsyncFileService facade."""
+
+    def test_create_and_read_file(self, tmp_dir, sample_binary_data_1):
+        """Created file can be read back through the facade."""
+        target_filename = os.path.join(tmp_dir, sample_binary_data_1["name"])
+
+        async def scenario():
+            afs = AsyncFileService()
+            try:
+                await afs.create_file(target_filename, sample_binary_data_1["data"])
+                return await afs.get_file_data(target_filename)
+            finally:
+                afs.shutdown()
+
+        file_data = asyncio.run(scenario())
+        assert file_data["content"] == sample_binary_data_1["data"]
+
+    def test_runs_outside_event_loop_thread(self):
+        """FileService methods are not executed in the event loop thread."""
+        threads = []
+
+        class RecordingFileService(FileService):
+            def current_dir(self, session: str = DEFAULT_SESSION) -> str:
+                threads.append(threading.get_ident())
+                return super().current_dir(session=session)
+
+        async def scenario():
+            afs = AsyncFileService(RecordingFileService())
+            try:
+                await afs.current_dir()
+            finally:
+                afs.shutdown()
+            return threading.get_ident()
+
+        loop_thread = asyncio.run(scenario())
+        assert threads and threads[0] != loop_thread
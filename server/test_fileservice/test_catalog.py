@@ -0,0 +1,125 @@
+"""Tests for the file catalog of server.FileService.
+
+Imports:
+    datetime
+    os
+    pytest
+    server.FileService
+"""
+
+import os
+import time
+from datetime import datetime, timedelta
+
+import pytest
+
+from config import ServerConfig
+
+from ..FileService import FileService
+
+
+def names(page: dict) -> list:
+    return [file_meta["name"] for file_meta in page["files"]]
+
+
+@pytest.fixture(autouse=True)
+def enable_catalog(monkeypatch):
+    monkeypatch.setitem(ServerConfig().config, "catalog", True)
+
+
+class TestCatalog:
+    """Test query_files and reconcile_catalog functions."""
+
+    def test_query_files(self, tmp_path):
+        """Files are found in a subtree, filtered, sorted and paged."""
+        fs = FileService()
+        os.makedirs(tmp_path / "data" / "deep")
+        os.mkdir(tmp_path / "other")
+        fs.create_file("data/a.csv", b"x" * 30)
+        fs.create_file("data/B.CSV", b"x" * 10)
+        fs.create_file("data/deep/c.csv", b"x" * 20)
+        fs.create_file("data/notes.txt", b"x" * 40)
+        fs.create_file("other/d.csv", b"x" * 50)
+
+        assert names(fs.query_files("data", ext="csv")) == ["./data/B.CSV", "./data/a.csv", "./data/deep/c.csv"]
+        assert names(fs.query_files("data", ext="csv", recursive=False)) == ["./data/B.CSV", "./data/a.csv"]
+        assert names(fs.query_files(pattern="*.txt")) == ["./data/notes.txt"]
+        assert names(fs.query_files(min_size=20, max_size=40, sort_by="size")) == [
+            "./data/deep/c.csv",
+            "./data/a.csv",
+            "./data/notes.txt",
+        ]
+        largest = fs.query_files(sort_by="size", descending=True, limit=2)
+        assert names(largest) == ["./other/d.csv", "./data/notes.txt"]
+        assert largest["files"][0]["size"] == 50
+        next_page = fs.query_files(sort_by="size", descending=True, limit=2, cursor=largest["cursor"])
+        assert names(next_page) == ["./data/a.csv", "./data/deep/c.csv"]
+        assert names(fs.query_files(sort_by="size", descending=True, limit=2, cursor=next_page["cursor"])) == [
+            "./data/B.CSV"
+        ]
+
+        hour_ago = datetime.now() - timedelta(hours=1)
+        assert len(fs.query_files(modified_since=hour_ago)["files"]) == 5
+        assert fs.query_files(modified_before=hour_ago)["files"] == []
+
+        with pytest.raises(ValueError):
+            fs.query_files(sort_by="owner")
+        with pytest.raises(ValueError):
+            fs.query_files(sort_by="size", cursor=fs.query_files(limit=1)["cursor"])
+        with pytest.raises(RuntimeError):
+            fs.query_files("missing")
+
+    def test_writes_keep_catalog_in_sync(self, tmp_path):
+        """Deleted, moved and rewritten files are updated in the catalog."""
+        fs = FileService()
+        os.makedirs(tmp_path / "tree" / "sub")
+        fs.create_file("tree/sub/a.txt", b"first")
+        fs.create_file("tree/b.txt", b"second")
+        fs.create_file("c.txt", b"third")
+
+        fs.create_file("c.txt", b"rewritten")
+        fs.move_file("tree/b.txt", "b.txt")
+        fs.move_dir("tree", "moved")
+        fs.delete_file("c.txt")
+        assert {file_meta["name"]: file_meta["size"] for file_meta in fs.query_files()["files"]} == {
+            "./b.txt": 6,
+            "./moved/sub/a.txt": 5,
+        }
+        fs.delete_dir("moved")
+        assert names(fs.query_files()) == ["./b.txt"]
+        assert fs.catalog_stats()["files"] == 1
+
+    def test_reconcile_and_restart(self, tmp_path):
+        """Files changed behind the service are cataloged by reconciliation, the catalog survives a restart."""
+        fs = FileService()
+        os.mkdir(tmp_path / "dir")
+        fs.create_file("dir/kept.txt", b"kept")
+        fs.create_file("removed.txt", b"removed")
+        os.remove(tmp_path / "removed.txt")
+        (tmp_path / "dir" / "added.txt").write_bytes(b"added")
+        (tmp_path / ".hidden.txt").write_bytes(b"hidden")
+
+        fs.reconcile_catalog()
+        assert names(fs.query_files()) == ["./dir/added.txt", "./dir/kept.txt"]
+        fs.close()
+
+        fs = FileService()
+        assert names(fs.query_files()) == ["./dir/added.txt", "./dir/kept.txt"]
+        assert fs.catalog_stats()["reconciled_at"] is not None
+
+    def test_unclean_shutdown_is_reconciled(self, tmp_path):
+        """A catalog which wasn't closed is reconciled in background on start."""
+        (tmp_path / "old.txt").write_bytes(b"old")
+        fs = FileService()
+        deadline = time.monotonic() + 10
+        while fs.catalog_stats()["reconciled_at"] is None and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert names(fs.query_files()) == ["./old.txt"]
+
+    def test_disabled(self, monkeypatch):
+        """Queries fail if the catalog is disabled."""
+        monkeypatch.setitem(ServerConfig().config, "catalog", False)
+        fs = FileService()
+        assert fs.catalog_stats() == dict()
+        with pytest.raises(RuntimeError):
+            fs.query_files()
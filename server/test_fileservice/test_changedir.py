@@ -19,14 +19,47 @@ class TestChangeDir:
 
     def test_change_to_existing_dir(self, tmp_dir):
         """CWD to an existing directory."""
-        FileService().change_dir(tmp_dir)
-        assert os.getcwd() == tmp_dir
+        fs = FileService()
+        new_path = fs.change_dir(tmp_dir)
+        assert fs.current_dir() == new_path == os.path.join(".", os.path.basename(tmp_dir))
 
     def test_change_to_nonexisting_dir_with_autocreate(self, tmp_dir, good_dir):
         """Autocreate a nonexistent directory and CWD to it."""
         target_dir = os.path.join(str(tmp_dir), good_dir)
-        FileService().change_dir(target_dir, autocreate=True)
-        assert os.getcwd() == target_dir
+        fs = FileService()
+        fs.change_dir(target_dir, autocreate=True)
+        assert os.path.isdir(target_dir)
+        assert fs.current_dir() == os.path.join(".", os.path.basename(tmp_dir), good_dir)
+
+    def test_change_to_existing_dir_no_autocreate(self, tmp_dir):
+        """CWD to an existing directory if autocreate is False."""
+        fs = FileService()
+        fs.change_dir(tmp_dir, autocreate=False)
+        assert fs.current_dir() == os.path.join(".", os.path.basename(tmp_dir))
+
+    def test_sessions_are_independent(self, tmp_path):
+        """Sessions have own working directories and don't change the process one."""
+        cwd = os.getcwd()
+        fs = FileService()
+        fs.change_dir("first", session="a")
+        fs.change_dir("second", session="b")
+        fs.create_file("file.txt", b"first", session="a")
+        assert fs.current_dir(session="a") == os.path.join(".", "first")
+        assert fs.current_dir(session="b") == os.path.join(".", "second")
+        assert fs.current_dir() == "."
+        assert os.getcwd() == cwd
+        assert os.path.isfile(os.path.join(tmp_path, "first", "file.txt"))
+        assert [f["name"] for f in fs.get_files(session="a")] == [os.path.join(".", "first", "file.txt")]
+        assert fs.get_files(session="b") == []
+        with pytest.raises(RuntimeError):
+            fs.get_file_data("file.txt", session="b")
+
+    def test_session_leaves_deleted_dir(self, tmp_path):
+        """Session whose working directory is deleted is moved to its parent."""
+        fs = FileService()
+        fs.change_dir(os.path.join("parent", "child"), session="a")
+        fs.delete_dir("parent")
+        assert fs.current_dir(session="a") == "."
 
     def test_change_to_nonexisting_dir_no_autocreate_2(self, good_dir):
         """Raise RuntimeError if directory does not exist and autocreate is False."""
@@ -0,0 +1,124 @@
+"""Tests for the change feed of server.FileService.
+
+Imports:
+    os
+    pytest
+    server.ChangeFeed
+    server.FileService
+"""
+
+import os
+import sys
+import time
+
+import pytest
+
+from .. import ChangeFeed
+from ..FileService import FileService
+
+
+def changes(subscription) -> list:
+    return [(event["type"], event.get("path")) for event in subscription.get()]
+
+
+def wait_for_changes(subscription, count: int, timeout: float = 5) -> list:
+    events = list()
+    deadline = time.monotonic() + timeout
+    while len(events) < count and time.monotonic() < deadline:
+        events.extend(changes(subscription))
+        time.sleep(0.05)
+    return events
+
+
+class TestChangeFeed:
+    """Test subscribe_changes function and the change feed."""
+
+    def test_changes_of_subtree(self, tmp_path):
+        """Subscribers get changes of their tree made through the service."""
+        fs = FileService()
+        os.makedirs(tmp_path / "watched" / "sub")
+        os.mkdir(tmp_path / "other")
+        subscription = fs.subscribe_changes("watched")
+        root_subscription = fs.subscribe_changes()
+        notified = list()
+        subscription.set_notify(lambda: notified.append(True))
+
+        fs.create_file("watched/sub/a.txt", b"first")
+        fs.create_file("watched/sub/a.txt", b"second")
+        fs.create_file("other/b.txt", b"other")
+        fs.move_file("watched/sub/a.txt", "watched/c.txt")
+        fs.delete_file("watched/c.txt")
+        fs.delete_dir("watched/sub")
+
+        assert notified == [True]
+        assert changes(subscription) == [
+            ("create", "./watched/sub/a.txt"),
+            ("modify", "./watched/sub/a.txt"),
+            ("delete", "./watched/sub/a.txt"),
+            ("create", "./watched/c.txt"),
+            ("delete", "./watched/c.txt"),
+            ("delete", "./watched/sub"),
+        ]
+        assert ("create", "./other/b.txt") in changes(root_subscription)
+        assert changes(subscription) == []
+
+        subscription.close()
+        fs.create_file("watched/d.txt", b"after close")
+        assert changes(subscription) == []
+        assert fs.change_feed_stats()["subscribers"] == 1
+
+        with pytest.raises(RuntimeError):
+            fs.subscribe_changes("missing")
+
+    def test_resume_and_overflow(self, tmp_path):
+        """Subscribers resume after the last event they got, slow subscribers are reset."""
+        feed = ChangeFeed.ChangeFeed(str(tmp_path), history=3, capacity=2)
+        subscription = feed.subscribe(str(tmp_path))
+        for i in range(3):
+            feed.publish("create", str(tmp_path / f"{i}.txt"))
+        assert changes(subscription) == [("reset", None), ("create", "./2.txt")]
+        first_id = feed.stats()["last_id"] - 2
+
+        resumed = feed.subscribe(str(tmp_path), after=first_id)
+        assert changes(resumed) == [("create", "./1.txt"), ("create", "./2.txt")]
+        feed.publish("create", str(tmp_path / "3.txt"))
+        feed.publish("create", str(tmp_path / "4.txt"))
+        assert changes(feed.subscribe(str(tmp_path), after=first_id))[0] == ("reset", None)
+        assert changes(feed.subscribe(str(tmp_path), after=first_id + 10**9)) == [("reset", None)]
+        feed.close()
+
+    def test_resume_across_dir_delete(self, tmp_path):
+        """A subscriber resuming after its directory was deleted gets the delete."""
+        feed = ChangeFeed.ChangeFeed(str(tmp_path), history=10, capacity=10)
+        last_id = feed.stats()["last_id"]
+        feed.publish("create", str(tmp_path / "watched" / "a.txt"))
+        feed.publish("create", str(tmp_path / "watched_other" / "b.txt"))
+        feed.publish("delete", str(tmp_path / "watched"), is_dir=True)
+
+        resumed = feed.subscribe(str(tmp_path / "watched"), after=last_id)
+        assert changes(resumed) == [("create", "./watched/a.txt"), ("delete", "./watched")]
+        feed.close()
+
+    @pytest.mark.skipif(not sys.platform.startswith("linux"), reason="inotify is only available on Linux")
+    def test_changes_bypassing_service(self, tmp_path):
+        """Changes made bypassing the service come from inotify, changes made by it aren't repeated."""
+        fs = FileService()
+        subscription = fs.subscribe_changes()
+        fs.create_file("own.txt", b"own")
+        os.mkdir(tmp_path / "external")
+        # The new directory is watched once its creation is seen.
+        time.sleep(0.5)
+        (tmp_path / "external" / "file.txt").write_bytes(b"external")
+        (tmp_path / "external" / "file.txt").write_bytes(b"modified")
+        os.remove(tmp_path / "external" / "file.txt")
+
+        events = wait_for_changes(subscription, 6)
+        assert events == [
+            ("create", "./own.txt"),
+            ("create", "./external"),
+            ("create", "./external/file.txt"),
+            ("modify", "./external/file.txt"),
+            ("modify", "./external/file.txt"),
+            ("delete", "./external/file.txt"),
+        ]
+        assert fs.change_feed_stats()["watched_dirs"] == 2
@@ -0,0 +1,147 @@
+"""Tests for compressed storage of server.FileService.
+
+Imports:
+    hashlib
+    os
+    pytest
+    server.FileService
+    zlib
+"""
+
+import hashlib
+import os
+import zlib
+
+import pytest
+
+from config import ServerConfig
+
+from .. import Compression
+from ..FileService import FileService
+
+CONTENT = b"2022-01-01 12:00:00 INFO request served\n" * 1000
+
+
+@pytest.fixture
+def fs(monkeypatch):
+    """FileService with compressed storage."""
+    monkeypatch.setitem(ServerConfig().config, "compression", "zlib")
+    return FileService()
+
+
+def stored_size(filename) -> int:
+    return os.path.getsize(filename)
+
+
+class TestCompression:
+    """Test compressed storage."""
+
+    def test_created_file_is_compressed(self, fs, tmp_path):
+        """File is compressed at rest and read back transparently."""
+        filename = os.path.join(tmp_path, "log.txt")
+        file_meta = fs.create_file(filename, CONTENT)
+        assert file_meta["size"] == len(CONTENT)
+        assert stored_size(filename) < len(CONTENT) // 5
+        assert fs.get_file_data(filename)["content"] == CONTENT
+        assert fs.get_file_metadata(filename)["size"] == len(CONTENT)
+        assert [f["size"] for f in fs.get_files()] == [len(CONTENT)]
+
+    def test_upload_is_compressed(self, fs, tmp_path):
+        """Chunked upload is compressed while it's written."""
+        filename = os.path.join(tmp_path, "log.txt")
+        upload_file = fs.open_upload(filename)
+        for offset in range(0, len(CONTENT), 1000):
+            upload_file.write(CONTENT[offset : offset + 1000])
+        file_meta = fs.finish_upload(upload_file, filename)
+        assert file_meta["size"] == len(CONTENT)
+        assert stored_size(filename) < len(CONTENT) // 5
+        assert fs.get_file_data(filename)["content"] == CONTENT
+
+    def test_read_range_and_hash(self, fs, tmp_path):
+        """Ranges and hashes are computed from the uncompressed content."""
+        filename = os.path.join(tmp_path, "log.txt")
+        fs.create_file(filename, CONTENT)
+        assert fs.read_file_range(filename, 5000, 100) == CONTENT[5000:5100]
+        assert fs.read_file_range(filename, len(CONTENT) - 10, 100) == CONTENT[-10:]
+
+        # Forget the hash remembered on write, so that it's computed from the file.
+        fs._hashes.forget(os.stat(filename))
+        assert fs.get_file_hash(filename) == hashlib.sha256(CONTENT).hexdigest()
+
+    def test_stored_content(self, fs, tmp_path):
+        """Stored content is a zlib stream which can be sent with deflate encoding."""
+        filename = os.path.join(tmp_path, "log.txt")
+        fs.create_file(filename, CONTENT)
+        stored_format = fs.get_stored_format(filename)
+        assert stored_format == dict(encoding="deflate", size=stored_size(filename) - Compression.HEADER.size)
+
+        reader = fs.open_reader(filename, decode=False)
+        try:
+            assert zlib.decompress(reader.read(stored_format["size"])) == CONTENT
+        finally:
+            reader.close()
+
+    def test_listing_uses_logical_size(self, fs, tmp_path):
+        """Files are sorted and filtered by uncompressed size."""
+        fs.create_file(os.path.join(tmp_path, "big.txt"), CONTENT)
+        fs.create_file(os.path.join(tmp_path, "small.txt"), CONTENT[:1000])
+        page = fs.get_files_page(sort_by="size", min_size=len(CONTENT[:1000]))
+        assert [f["size"] for f in page["files"]] == [1000, len(CONTENT)]
+        page = fs.get_files_page(min_size=len(CONTENT))
+        assert [f["name"] for f in page["files"]] == [os.path.join(".", "big.txt")]
+
+    def test_compressed_files_are_read_when_disabled(self, fs, tmp_path, monkeypatch):
+        """Files stay readable when compression is disabled, plain files are not mistaken for compressed."""
+        compressed, plain = os.path.join(tmp_path, "log.txt"), os.path.join(tmp_path, "plain.txt")
+        fs.create_file(compressed, CONTENT)
+        monkeypatch.setitem(ServerConfig().config, "compression", "none")
+        fs = FileService()
+        fs.create_file(plain, CONTENT)
+        assert stored_size(plain) == len(CONTENT)
+        assert fs.get_file_data(compressed)["content"] == CONTENT
+        assert fs.get_file_data(plain)["content"] == CONTENT
+        assert fs.get_stored_format(plain) is None
+
+    def test_content_like_compressed(self, monkeypatch, tmp_path):
+        """Plain content which starts like a compressed file is read back as is."""
+        monkeypatch.setitem(ServerConfig().config, "compression", "zlib")
+        FileService().close()
+        # Files may be compressed since compression was enabled.
+        monkeypatch.setitem(ServerConfig().config, "compression", "none")
+        content = Compression.pack_header("zlib", 5) + zlib.compress(b"bogus")
+        fs = FileService()
+        upload_file = fs.open_upload("upload.bin")
+        for i in range(len(content)):
+            upload_file.write(content[i : i + 1])
+        fs.finish_upload(upload_file, "upload.bin")
+        fs.create_file("short.bin", Compression.MAGIC[:4])
+
+        upload_id = fs.open_upload_session("session.bin", len(content), 10)["upload_id"]
+        for number, offset in enumerate(range(0, len(content), 10)):
+            writer = fs.open_upload_chunk(upload_id, number)
+            writer.write(content[offset : offset + 10])
+            fs.finish_upload_chunk(writer)
+        fs.commit_upload_session(upload_id)
+
+        fs = FileService()
+        for filename in ("upload.bin", "session.bin"):
+            assert fs.get_file_data(filename)["content"] == content
+            assert fs.get_file_metadata(filename)["size"] == len(content)
+            assert fs.read_file_range(filename, 3, 10) == content[3:13]
+        assert fs.get_file_data("short.bin")["content"] == Compression.MAGIC[:4]
+
+    def test_reader_is_bounded(self, tmp_path):
+        """Highly compressible content is decompressed only as far as it's read."""
+        filename = os.path.join(tmp_path, "zeros.bin")
+        with open(filename, "wb") as f:
+            f.write(Compression.compress(b"\0" * (64 * 1024 * 1024), "zlib"))
+        with open(filename, "rb") as f:
+            reader = Compression.DecompressingReader(f, "zlib", offset=10)
+            assert reader.read(100) == b"\0" * 100
+            assert len(reader._buffer) == 0
+
+    def test_unknown_codec(self, monkeypatch):
+        """Unknown codec is rejected."""
+        monkeypatch.setitem(ServerConfig().config, "compression", "lzma")
+        with pytest.raises(ValueError):
+            FileService()
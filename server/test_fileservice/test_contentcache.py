@@ -0,0 +1,104 @@
+"""Tests for the content cache of server.FileService.
+
+Imports:
+    json
+    os
+    pytest
+    server.ContentCache
+    server.FileService
+"""
+
+import json
+import os
+
+import pytest
+
+from config import ServerConfig
+
+from ..ContentCache import ContentCache
+from ..FileService import FileService
+
+
+@pytest.fixture
+def fs(monkeypatch):
+    """FileService with a small content cache."""
+    monkeypatch.setitem(ServerConfig().config, "content_cache_bytes", 16 * 1024)
+    return FileService()
+
+
+def encode(file_data: dict) -> bytes:
+    return json.dumps({"content": file_data["content"].decode(), "name": file_data["name"]}).encode()
+
+
+class TestContentCache:
+    """Test caching of encoded file content."""
+
+    def test_lru_eviction_by_size(self):
+        """Least recently used values are evicted to keep the total size within the budget."""
+        cache = ContentCache(16 * 100)
+        for name in "abc":
+            cache.put(name, (1,), b"x" * 90)
+        cache.put("b", (1,), b"y" * 90)
+        assert cache.get("a", (1,)) == b"x" * 90
+        for i in range(15):
+            cache.put(str(i), (1,), b"z" * 90)
+        assert cache.get("c", (1,)) is None
+        assert cache.get("a", (1,)) is not None
+        stats = cache.stats()
+        assert stats["bytes"] <= 16 * 100
+        assert stats["evictions"] > 0
+        cache.put("huge", (1,), b"x" * 101)
+        assert cache.get("huge", (1,)) is None
+
+    def test_validator_mismatch(self):
+        """A value is not served for a changed file."""
+        cache = ContentCache(1024)
+        cache.put("a", (1, 2), b"value")
+        assert cache.get("a", (1, 3)) is None
+        assert cache.get("a", (1, 2)) is None
+
+    def test_hits_skip_reading(self, fs):
+        """Repeated requests are served from the cache and counted."""
+        fs.create_file("hot.txt", b"hot content")
+        first = fs.get_encoded_file_data("hot.txt", encode)
+        second = fs.get_encoded_file_data("hot.txt", encode)
+        assert first == second
+        assert json.loads(first) == {"content": "hot content", "name": "hot.txt"}
+        stats = fs.content_cache_stats()
+        assert stats["hits"] == 1 and stats["misses"] == 1
+        assert stats["hit_ratio"] == 0.5
+        assert stats["bytes_served"] == len(first)
+
+    def test_writes_and_deletes_invalidate(self, fs):
+        """Writes and deletes through the service drop cached values."""
+        fs.create_file("file.txt", b"old")
+        fs.get_encoded_file_data("file.txt", encode)
+        fs.create_file("file.txt", b"new")
+        assert json.loads(fs.get_encoded_file_data("file.txt", encode))["content"] == "new"
+
+        fs.delete_file("file.txt")
+        assert fs.content_cache_stats()["entries"] == 0
+        with pytest.raises(RuntimeError):
+            fs.get_encoded_file_data("file.txt", encode)
+
+        os.mkdir("docs")
+        fs.create_file("docs/a.txt", b"a")
+        fs.get_encoded_file_data("docs/a.txt", encode)
+        fs.delete_dir("docs")
+        assert fs.content_cache_stats()["entries"] == 0
+
+    def test_external_change_is_detected(self, fs, tmp_path):
+        """Files changed bypassing the service are read again."""
+        fs.create_file("file.txt", b"old")
+        fs.get_encoded_file_data("file.txt", encode)
+        with open(tmp_path / "file.txt", "wb") as f:
+            f.write(b"changed")
+        assert json.loads(fs.get_encoded_file_data("file.txt", encode))["content"] == "changed"
+
+    def test_disabled(self, monkeypatch):
+        """Files are read every time if the cache is disabled."""
+        monkeypatch.setitem(ServerConfig().config, "content_cache_bytes", 0)
+        fs = FileService()
+        fs.create_file("file.txt", b"content")
+        assert json.loads(fs.get_encoded_file_data("file.txt", encode))["content"] == "content"
+        assert fs.content_cache_stats() == dict()
@@ -0,0 +1,155 @@
+"""Tests for server-side copy and move of server.FileService.
+
+Imports:
+    hashlib
+    os
+    pytest
+    server.FileCopy
+    server.FileService
+"""
+
+import hashlib
+import os
+
+import pytest
+
+from config import ServerConfig
+
+from .. import FileCopy
+from ..FileService import FileService
+
+
+class TestCopyMove:
+    """Test copy_file, move_file, copy_dir and move_dir functions."""
+
+    def test_copy_data(self, tmp_path):
+        """Content is copied by one of the kernel methods or by the fallback."""
+        content = os.urandom(3 * FileCopy.COPY_CHUNK_SIZE + 5)
+        (tmp_path / "src").write_bytes(content)
+        with open(tmp_path / "src", "rb") as src, open(tmp_path / "dst", "wb") as dst:
+            method = FileCopy.copy_data(src.fileno(), dst.fileno(), len(content))
+        assert method in ("reflink", "copy_file_range", "read_write")
+        assert (tmp_path / "dst").read_bytes() == content
+
+    def test_copy_data_fallback(self, monkeypatch, tmp_path):
+        """Content is read and written where kernel copies aren't available."""
+        monkeypatch.setattr(FileCopy, "fcntl", None)
+        monkeypatch.delattr(os, "copy_file_range", raising=False)
+        content = os.urandom(FileCopy.COPY_CHUNK_SIZE + 5)
+        (tmp_path / "src").write_bytes(content)
+        with open(tmp_path / "src", "rb") as src, open(tmp_path / "dst", "wb") as dst:
+            assert FileCopy.copy_data(src.fileno(), dst.fileno(), len(content)) == "read_write"
+        assert (tmp_path / "dst").read_bytes() == content
+
+    def test_copy_data_without_pread(self, monkeypatch, tmp_path):
+        """Content is copied where positional reads aren't available, e.g. on Windows."""
+        monkeypatch.setattr(FileCopy, "fcntl", None)
+        monkeypatch.delattr(os, "copy_file_range", raising=False)
+        monkeypatch.delattr(os, "pread")
+        content = os.urandom(FileCopy.COPY_CHUNK_SIZE + 5)
+        (tmp_path / "src").write_bytes(content)
+        with open(tmp_path / "src", "rb") as src, open(tmp_path / "dst", "wb") as dst:
+            src.read(10)
+            assert FileCopy.copy_data(src.fileno(), dst.fileno(), len(content)) == "read_write"
+        assert (tmp_path / "dst").read_bytes() == content
+
+    def test_copy_file(self, tmp_path):
+        """A copy has the same content and hash and is counted in usage."""
+        fs = FileService()
+        content = os.urandom(5000)
+        fs.create_file("a.bin", content)
+        file_meta = fs.copy_file("a.bin", "b.bin")
+        assert file_meta["size"] == len(content)
+        assert (tmp_path / "b.bin").read_bytes() == content
+        assert fs.get_file_hash("b.bin") == hashlib.sha256(content).hexdigest()
+        assert fs.get_usage()["files"] == 2
+        assert os.stat(tmp_path / "a.bin").st_ino != os.stat(tmp_path / "b.bin").st_ino
+
+        with pytest.raises(RuntimeError):
+            fs.copy_file("missing.bin", "c.bin")
+        with pytest.raises(ValueError):
+            fs.copy_file("a.bin", "a.bin")
+        with pytest.raises(ValueError):
+            fs.copy_file("a.bin", "../outside.bin")
+
+    def test_move_file(self, tmp_path):
+        """A moved file keeps its inode, an existing destination is replaced."""
+        fs = FileService()
+        os.mkdir(tmp_path / "docs")
+        fs.create_file("a.txt", b"moved")
+        fs.create_file("docs/b.txt", b"replaced")
+        inode = os.stat(tmp_path / "a.txt").st_ino
+        fs.move_file("a.txt", "docs/b.txt")
+        assert not (tmp_path / "a.txt").exists()
+        assert os.stat(tmp_path / "docs" / "b.txt").st_ino == inode
+        assert fs.get_file_data("docs/b.txt")["content"] == b"moved"
+        assert fs.get_usage()["files"] == 1
+        assert fs.get_usage("docs") == dict(bytes=5, files=1, max_bytes=None, max_files=None)
+
+    def test_copy_and_move_dir(self, tmp_path):
+        """Trees are copied file by file and moved with one rename."""
+        fs = FileService()
+        os.makedirs(tmp_path / "src" / "sub")
+        for i in range(10):
+            fs.create_file(f"src/file_{i}.txt", f"content {i}".encode())
+        fs.create_file("src/sub/deep.txt", b"deep")
+        fs.change_dir("src/sub", session="user")
+
+        assert fs.copy_dir("src", "copy") == dict(path="./copy", files=11)
+        assert (tmp_path / "copy" / "sub" / "deep.txt").read_bytes() == b"deep"
+        assert (tmp_path / "copy" / "file_3.txt").read_bytes() == b"content 3"
+        assert fs.get_usage("copy")["files"] == 11
+        with pytest.raises(ValueError):
+            fs.copy_dir("src", "copy")
+        with pytest.raises(ValueError):
+            fs.copy_dir("src", "src/sub/inside")
+
+        assert fs.move_dir("src", "copy/moved") == "./copy/moved"
+        assert not (tmp_path / "src").exists()
+        assert fs.get_file_data("copy/moved/sub/deep.txt")["content"] == b"deep"
+        assert fs.get_usage("copy")["files"] == 22
+        assert fs.get_usage("copy/moved/sub")["files"] == 1
+        assert fs.current_dir(session="user") == "./copy/moved/sub"
+        with pytest.raises(RuntimeError):
+            fs.move_dir("src", "other")
+
+    def test_quota_on_move(self, tmp_path):
+        """Moves into a directory over quota are rejected and leave totals unchanged."""
+        fs = FileService()
+        os.mkdir(tmp_path / "limited")
+        os.makedirs(tmp_path / "tree")
+        fs.create_file("big.bin", b"x" * 100)
+        fs.create_file("tree/big.bin", b"x" * 100)
+        fs.set_quota("limited", max_bytes=50)
+        with pytest.raises(OSError):
+            fs.move_file("big.bin", "limited/big.bin")
+        with pytest.raises(OSError):
+            fs.move_dir("tree", "limited/tree")
+        with pytest.raises(OSError):
+            fs.copy_file("big.bin", "limited/copy.bin")
+        assert (tmp_path / "big.bin").exists() and (tmp_path / "tree").exists()
+        assert fs.get_usage()["files"] == 2
+        assert fs.get_usage("limited")["bytes"] == 0
+
+    def test_copy_with_dedup_and_packs(self, monkeypatch, tmp_path):
+        """With deduplication a copy links the same blob, small files are copied between packs."""
+        monkeypatch.setitem(ServerConfig().config, "dedup", True)
+        monkeypatch.setitem(ServerConfig().config, "pack_threshold", 100)
+        fs = FileService()
+        content = os.urandom(1000)
+        fs.create_file("large.bin", content)
+        fs.create_file("small.txt", b"small")
+        fs.copy_file("large.bin", "large_copy.bin")
+        assert os.stat(tmp_path / "large.bin").st_ino == os.stat(tmp_path / "large_copy.bin").st_ino
+        fs.copy_file("small.txt", "small_copy.txt")
+        fs.move_file("small.txt", "small_moved.txt")
+        assert fs.is_packed("small_copy.txt") and fs.is_packed("small_moved.txt")
+        assert fs.get_file_data("small_moved.txt")["content"] == b"small"
+        with pytest.raises(RuntimeError):
+            fs.get_file_data("small.txt")
+
+        os.mkdir(tmp_path / "dir")
+        fs.create_file("dir/packed.txt", b"packed")
+        fs.move_dir("dir", "moved_dir")
+        assert fs.get_file_data("moved_dir/packed.txt")["content"] == b"packed"
+        assert fs.get_usage("moved_dir")["files"] == 1
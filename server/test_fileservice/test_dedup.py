@@ -0,0 +1,91 @@
+"""Tests for deduplicating storage of server.FileService.
+
+Imports:
+    os
+    pytest
+    server.FileService
+"""
+
+import os
+
+import pytest
+
+from config import ServerConfig
+
+from ..BlobStore import BLOBS_DIR
+from ..FileService import FileService
+
+
+@pytest.fixture
+def fs(monkeypatch):
+    """FileService with deduplicating storage."""
+    monkeypatch.setitem(ServerConfig().config, "dedup", True)
+    return FileService()
+
+
+def count_blobs(data_dir) -> int:
+    return sum(len(filenames) for _, _, filenames in os.walk(os.path.join(data_dir, BLOBS_DIR)))
+
+
+class TestDedup:
+    """Test deduplicating storage."""
+
+    def test_same_content_is_stored_once(self, fs, tmp_path):
+        """Files with the same content share a blob until the last of them is deleted."""
+        first, second = os.path.join(tmp_path, "a.bin"), os.path.join(tmp_path, "b.bin")
+        fs.create_file(first, b"same content")
+        fs.create_file(second, b"same content")
+        assert os.path.samefile(first, second)
+        assert count_blobs(tmp_path) == 1
+
+        fs.delete_file(first)
+        assert count_blobs(tmp_path) == 1
+        with open(second, "rb") as f:
+            assert f.read() == b"same content"
+
+        fs.delete_file(second)
+        assert count_blobs(tmp_path) == 0
+
+    def test_overwrite_releases_old_blob(self, fs, tmp_path):
+        """Overwriting a file doesn't change other files and removes an unused blob."""
+        first, second = os.path.join(tmp_path, "a.bin"), os.path.join(tmp_path, "b.bin")
+        fs.create_file(first, b"old content")
+        fs.create_file(second, b"old content")
+        fs.create_file(first, b"new content")
+        fs.create_file(second, b"newer content")
+        with open(first, "rb") as f:
+            assert f.read() == b"new content"
+        assert count_blobs(tmp_path) == 2
+
+    def test_upload_is_deduplicated(self, fs, tmp_path):
+        """Uploaded file shares a blob with a file of the same content."""
+        first, second = os.path.join(tmp_path, "a.bin"), os.path.join(tmp_path, "b.bin")
+        fs.create_file(first, b"same content")
+        upload_file = fs.open_upload(second)
+        upload_file.write(b"same ")
+        upload_file.write(b"content")
+        fs.finish_upload(upload_file, second)
+        assert os.path.samefile(first, second)
+        assert count_blobs(tmp_path) == 1
+
+    def test_delete_dir_collects_garbage(self, fs, tmp_path):
+        """Blobs are removed when a directory with their last links is deleted."""
+        os.makedirs(os.path.join(tmp_path, "sub"))
+        fs.create_file(os.path.join(tmp_path, "sub", "a.bin"), b"content a")
+        fs.create_file(os.path.join(tmp_path, "sub", "b.bin"), b"content b")
+        fs.create_file(os.path.join(tmp_path, "b.bin"), b"content b")
+        fs.delete_dir("sub")
+        assert fs._trash.wait(timeout=5)
+        assert count_blobs(tmp_path) == 1
+
+    def test_concurrent_deletes_release_blob(self, fs, tmp_path):
+        """A blob is removed if its last links were deleted at once and both were stat'ed before removal."""
+        first, second = os.path.join(tmp_path, "a.bin"), os.path.join(tmp_path, "b.bin")
+        fs.create_file(first, b"same content")
+        fs.create_file(second, b"same content")
+        first_stat, second_stat = os.lstat(first), os.lstat(second)
+        os.remove(first)
+        os.remove(second)
+        fs._blobs.release(first_stat)
+        fs._blobs.release(second_stat)
+        assert count_blobs(tmp_path) == 0
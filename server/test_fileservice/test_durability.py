@@ -0,0 +1,88 @@
+"""Tests for atomic and durable writes of server.FileService.
+
+Imports:
+    os
+    pytest
+    server.FileService
+    threading
+"""
+
+import os
+import threading
+
+import pytest
+
+from config import ServerConfig
+
+from ..FileService import FileService
+
+
+def make_fs(monkeypatch, mode: str, group_commit_ms: int = 5) -> FileService:
+    monkeypatch.setitem(ServerConfig().config, "durability", mode)
+    monkeypatch.setitem(ServerConfig().config, "group_commit_ms", group_commit_ms)
+    return FileService()
+
+
+class TestDurability:
+    """Test atomic writes and durability modes."""
+
+    def test_failed_write_keeps_old_content(self, monkeypatch, tmp_path):
+        """A write which fails before the rename leaves the old file and no temporary files."""
+        fs = make_fs(monkeypatch, "none")
+        fs.create_file("file.txt", b"old content")
+
+        def fail(src, dst):
+            raise OSError("disk is full")
+
+        monkeypatch.setattr(os, "replace", fail)
+        with pytest.raises(OSError):
+            fs.create_file("file.txt", b"new content")
+        monkeypatch.undo()
+
+        with open(os.path.join(tmp_path, "file.txt"), "rb") as f:
+            assert f.read() == b"old content"
+        assert set(os.listdir(tmp_path)) - {".meta"} == {"file.txt"}
+
+    def test_none_mode_doesnt_sync(self, monkeypatch):
+        """No flushes are made without durability."""
+        fs = make_fs(monkeypatch, "none")
+        fs.create_file("file.txt", b"content")
+        assert fs.durability_stats()["syncs"] == 0
+
+    def test_fsync_mode(self, monkeypatch):
+        """File and its directory are flushed on every write."""
+        fs = make_fs(monkeypatch, "fsync")
+        fs.create_file("file.txt", b"content")
+        upload_file = fs.open_upload("upload.txt")
+        upload_file.write(b"content")
+        fs.finish_upload(upload_file, "upload.txt")
+        assert fs.durability_stats()["syncs"] == 4
+
+    def test_group_mode_batches_flushes(self, monkeypatch, tmp_path):
+        """Flushes of concurrent writes are batched."""
+        fs = make_fs(monkeypatch, "group", group_commit_ms=50)
+        errors = []
+
+        def write(i):
+            try:
+                fs.create_file(f"file_{i}.txt", f"content {i}".encode())
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=write, args=(i,)) for i in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert errors == []
+        stats = fs.durability_stats()
+        assert stats["syncs"] == 16
+        assert stats["batches"] < stats["syncs"]
+        for i in range(8):
+            assert fs.get_file_data(f"file_{i}.txt")["content"] == f"content {i}".encode()
+
+    def test_unknown_mode(self, monkeypatch):
+        """Unknown durability mode is rejected."""
+        with pytest.raises(ValueError):
+            make_fs(monkeypatch, "sometimes")
@@ -3,6 +3,7 @@
 Imports:
     os
     pytest
+    config.ServerConfig
     server.FileService.get_file_data()
 """
 
@@ -10,6 +11,8 @@ import os
 
 import pytest
 
+from config import ServerConfig
+
 from ..FileService import FileService
 
 
@@ -36,3 +39,21 @@ class TestGetFileData:
         target_filename = os.path.join(tmp_dir, sample_binary_data_1["name"])
         file_full_info = FileService().get_file_data(target_filename)
         assert file_full_info == sample_binary_file_full_info
+
+    def test_large_file_is_mapped(self, monkeypatch):
+        """Test files above mmap threshold are returned as memoryview of the file, small files as bytes."""
+        monkeypatch.setitem(ServerConfig().config, "mmap_threshold", 1024)
+        fs = FileService()
+        content = os.urandom(4096)
+        fs.create_file("large.bin", content)
+        fs.create_file("small.bin", content[:100])
+
+        file_data = fs.get_file_data("large.bin")
+        assert isinstance(file_data["content"], memoryview)
+        assert file_data["content"] == content
+        assert file_data["size"] == len(content)
+        assert isinstance(fs.get_file_data("small.bin")["content"], bytes)
+
+        # Mapping outlives replacing the file.
+        fs.create_file("large.bin", b"x" * 2048)
+        assert file_data["content"] == content
@@ -0,0 +1,59 @@
+"""Tests for server.FileService.get_file_hash() function.
+
+Imports:
+    hashlib
+    os
+    pytest
+    server.FileService.get_file_hash()
+"""
+
+import hashlib
+import os
+
+import pytest
+
+from .. import HashCache
+from ..FileService import FileService
+
+
+class TestGetFileHash:
+    """Test get_file_hash function."""
+
+    def test_bad_file_name(self, os_system, bad_file_name_win, bad_file_name_lnx):
+        """Test bad name raises ValueError"""
+        with pytest.raises(ValueError):
+            if os_system == "Windows":
+                _ = FileService().get_file_hash(bad_file_name_win)
+            elif os_system == "Linux":
+                _ = FileService().get_file_hash(bad_file_name_lnx)
+            else:
+                raise NotImplementedError
+
+    def test_file_not_exists(self):
+        """Test file does not exists raises RuntimeError"""
+        with pytest.raises(RuntimeError):
+            _ = FileService().get_file_hash("non_existing_file")
+
+    def test_hash_is_cached(self, sample_binary_file_meta, tmp_dir, sample_binary_data_1, monkeypatch):
+        """Hash is computed once and survives the service restart."""
+        target_filename = os.path.join(tmp_dir, sample_binary_data_1["name"])
+        expected = hashlib.sha256(sample_binary_data_1["data"]).hexdigest()
+        fs = FileService()
+        assert fs.get_file_hash(target_filename) == expected
+        fs.close()
+
+        def fail(filename):
+            raise AssertionError("File is read again")
+
+        monkeypatch.setattr(HashCache, "file_sha256", fail)
+        assert FileService().get_file_hash(target_filename) == expected
+
+    def test_changed_file_is_rehashed(self, tmp_dir):
+        """Hash of a changed file is recomputed."""
+        target_filename = os.path.join(tmp_dir, "file.txt")
+        fs = FileService()
+        fs.create_file(target_filename, b"first")
+        assert fs.get_file_hash(target_filename) == hashlib.sha256(b"first").hexdigest()
+        with open(target_filename, "ab") as f:
+            f.write(b" and second")
+        assert fs.get_file_hash(target_filename) == hashlib.sha256(b"first and second").hexdigest()
@@ -0,0 +1,44 @@
+"""Tests for server.FileService.get_file_path() function.
+
+Imports:
+    os
+    pytest
+    server.FileService.get_file_path()
+"""
+
+import os
+
+import pytest
+
+from ..FileService import FileService
+
+
+class TestGetFilePath:
+    """Test get_file_path function."""
+
+    def test_bad_file_name(self, os_system, bad_file_name_win, bad_file_name_lnx):
+        """Test bad name raises ValueError"""
+        with pytest.raises(ValueError):
+            if os_system == "Windows":
+                _ = FileService().get_file_path(bad_file_name_win)
+            elif os_system == "Linux":
+                _ = FileService().get_file_path(bad_file_name_lnx)
+            else:
+                raise NotImplementedError
+
+    def test_file_not_exists(self):
+        """Test file does not exists raises RuntimeError"""
+        with pytest.raises(RuntimeError):
+            _ = FileService().get_file_path("non_existing_file")
+
+    def test_directory_is_not_a_file(self, tmp_dir):
+        """Test directory raises RuntimeError"""
+        with pytest.raises(RuntimeError):
+            _ = FileService().get_file_path(tmp_dir)
+
+    def test_get_file_path(self, sample_binary_file_meta, tmp_dir, sample_binary_data_1):
+        """Test if get_file_path returns an absolute path to the file."""
+        target_filename = os.path.join(tmp_dir, sample_binary_data_1["name"])
+        path = FileService().get_file_path(target_filename)
+        assert os.path.isabs(path)
+        assert os.path.samefile(path, target_filename)
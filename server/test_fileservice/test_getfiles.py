@@ -20,8 +20,9 @@ class TestGetFiles:
     def test_get_one_file_meta(self, tmp_dir, sample_binary_file_meta):
         """Test if get_files returns a list with metadata of a file."""
 
-        os.chdir(tmp_dir)
-        file_meta = FileService().get_files()
+        fs = FileService()
+        fs.change_dir(tmp_dir)
+        file_meta = fs.get_files()
         assert file_meta == sample_binary_file_meta
 
     def test_get_two_files_meta(self, two_sample_binary_files_meta):
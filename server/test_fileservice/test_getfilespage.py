@@ -0,0 +1,85 @@
+"""Tests for server.FileService.get_files_page() function.
+
+Imports:
+    os
+    pytest
+    server.FileService.get_files_page()
+"""
+
+import os
+from datetime import datetime
+
+import pytest
+
+from ..FileService import FileService
+
+FILE_SIZES = {"b.txt": 30, "a.txt": 20, "c.log": 10, "d.txt": 40}
+
+
+@pytest.fixture
+def sample_files(tmp_path):
+    """Create files with known names, sizes and modification times."""
+    for i, (name, size) in enumerate(FILE_SIZES.items()):
+        with open(os.path.join(tmp_path, name), "wb") as f:
+            f.write(b"x" * size)
+        os.utime(os.path.join(tmp_path, name), (1000000 + i, 1000000 + i))
+    os.mkdir(os.path.join(tmp_path, "a_dir"))
+    return FILE_SIZES
+
+
+def names(files: list) -> list:
+    return [os.path.basename(file_meta["name"]) for file_meta in files]
+
+
+class TestGetFilesPage:
+    """Test get_files_page function."""
+
+    def test_sorted_by_name(self, sample_files):
+        """All files are sorted by name."""
+        page = FileService().get_files_page()
+        assert names(page["files"]) == sorted(sample_files)
+        assert page["cursor"] is None
+
+    def test_pages_by_size(self, sample_files):
+        """Pages follow each other without gaps and overlaps."""
+        fs = FileService()
+        result = []
+        cursor = None
+        while True:
+            page = fs.get_files_page(limit=3, cursor=cursor, sort_by="size", descending=True)
+            result.extend(page["files"])
+            cursor = page["cursor"]
+            if cursor is None:
+                break
+        assert [file_meta["size"] for file_meta in result] == [40, 30, 20, 10]
+
+    def test_pages_by_edit_date(self, sample_files):
+        """Last page has no cursor."""
+        fs = FileService()
+        page = fs.get_files_page(limit=2, sort_by="edit_date")
+        assert names(page["files"]) == ["b.txt", "a.txt"]
+        page = fs.get_files_page(limit=2, sort_by="edit_date", cursor=page["cursor"])
+        assert names(page["files"]) == ["c.log", "d.txt"]
+        assert page["cursor"] is None
+
+    def test_filters(self, sample_files):
+        """Files are filtered by name, size and modification date."""
+        fs = FileService()
+        assert names(fs.get_files_page(prefix="a")["files"]) == ["a.txt"]
+        assert names(fs.get_files_page(pattern="*.log")["files"]) == ["c.log"]
+        assert names(fs.get_files_page(min_size=20, max_size=30)["files"]) == ["a.txt", "b.txt"]
+        since = datetime.fromtimestamp(1000002)
+        assert names(fs.get_files_page(modified_since=since)["files"]) == ["c.log", "d.txt"]
+
+    @pytest.mark.parametrize("kwargs", [dict(sort_by="color"), dict(limit=0), dict(cursor="not a cursor")])
+    def test_bad_arguments(self, kwargs):
+        """Bad arguments raise ValueError."""
+        with pytest.raises(ValueError):
+            FileService().get_files_page(**kwargs)
+
+    def test_cursor_of_another_sort_key(self, sample_files):
+        """Cursor of a page sorted by name can't be used for sorting by size."""
+        fs = FileService()
+        cursor = fs.get_files_page(limit=1)["cursor"]
+        with pytest.raises(ValueError):
+            fs.get_files_page(limit=1, sort_by="size", cursor=cursor)
@@ -0,0 +1,79 @@
+"""Tests for metadata cache of server.FileService.
+
+Imports:
+    os
+    pytest
+    server.FileService
+    server.MetadataCache
+"""
+
+import os
+
+import pytest
+
+from ..FileService import FileService
+from ..MetadataCache import MetadataCache
+
+
+def names(files: list) -> set:
+    return set(os.path.basename(file_meta["name"]) for file_meta in files)
+
+
+@pytest.fixture(params=["inotify", "mtime"])
+def fs(request):
+    """FileService with metadata cache which is invalidated by inotify or by directory mtime."""
+    fs = FileService()
+    if request.param == "mtime":
+        fs._cache._inotify_failed = True
+    yield fs
+    fs.close()
+
+
+class TestMetadataCache:
+    """Test metadata cache."""
+
+    def test_repeated_listing_is_a_hit(self, fs, two_sample_binary_files_meta):
+        """Second listing of a directory is served from the cache."""
+        assert fs.get_files() == fs.get_files()
+        assert fs.cache_stats()["hits"] == 1
+        assert fs.cache_stats()["entries"] == 2
+
+    def test_writes_update_cache(self, fs, tmp_path):
+        """Files created and deleted by FileService don't invalidate the cache."""
+        fs.get_files()
+        fs.create_file(os.path.join(tmp_path, "a.txt"), b"data")
+        fs.create_file(os.path.join(tmp_path, "b.txt"), b"data")
+        fs.delete_file(os.path.join(tmp_path, "a.txt"))
+        assert names(fs.get_files()) == {"b.txt"}
+        assert fs.cache_stats()["misses"] == 1
+        assert fs.get_file_metadata(os.path.join(tmp_path, "b.txt"))["size"] == 4
+
+    def test_out_of_band_changes_invalidate_cache(self, fs, tmp_path):
+        """Files created bypassing FileService are noticed."""
+        fs.get_files()
+        with open(os.path.join(tmp_path, "c.txt"), "wb") as f:
+            f.write(b"data")
+        assert names(fs.get_files()) == {"c.txt"}
+
+    def test_deleted_dir_is_invalidated(self, fs, tmp_path):
+        """Deleted directory is removed from the cache."""
+        os.makedirs(os.path.join(tmp_path, "sub"))
+        fs.change_dir(os.path.join(tmp_path, "sub"))
+        fs.get_files()
+        fs.delete_dir(os.path.join(tmp_path, "sub"))
+        assert fs.cache_stats()["directories"] == 0
+
+    def test_lru_eviction(self, tmp_path):
+        """Least recently used directories are evicted when the budget is exceeded."""
+        cache = MetadataCache(max_entries=2, max_bytes=1024 * 1024)
+        dirs = []
+        for name in ["a", "b", "c"]:
+            path = os.path.join(tmp_path, name)
+            os.makedirs(path)
+            dirs.append(path)
+            stat_result = os.stat(path)
+            cache.put(path, {"file": stat_result}, cache.begin(path))
+        assert cache.get(dirs[0]) is None
+        assert cache.get(dirs[2]) is not None
+        assert cache.stats()["evictions"] == 1
+        cache.close()
@@ -0,0 +1,188 @@
+"""Tests for small files packing of server.FileService.
+
+Imports:
+    hashlib
+    os
+    pytest
+    server.FileService
+    server.PackStore
+    time
+"""
+
+import hashlib
+import os
+import time
+
+import pytest
+
+from config import ServerConfig
+
+from .. import PackStore
+from ..FileService import FileService
+
+THRESHOLD = 4096
+
+
+@pytest.fixture
+def fs(monkeypatch):
+    """FileService which packs files up to THRESHOLD bytes."""
+    monkeypatch.setitem(ServerConfig().config, "pack_threshold", THRESHOLD)
+    return FileService()
+
+
+def plain_files(path) -> list:
+    return sorted(name for name in os.listdir(path) if not name.startswith("."))
+
+
+class TestPackStore:
+    """Test packed storage of small files."""
+
+    def test_small_files_are_packed(self, fs, tmp_path):
+        """Small files make no files on disk and are read, listed and hashed like plain files."""
+        for i in range(10):
+            fs.create_file(f"file_{i}.txt", f"content {i}".encode())
+        fs.create_file("big.bin", b"x" * (THRESHOLD + 1))
+        assert plain_files(tmp_path) == ["big.bin"]
+
+        assert fs.get_file_data("file_3.txt")["content"] == b"content 3"
+        assert fs.read_file_range("file_3.txt", 2, 3) == b"nte"
+        assert fs.get_file_hash("file_3.txt") == hashlib.sha256(b"content 3").hexdigest()
+        assert fs.get_file_metadata("file_3.txt")["size"] == 9
+        assert fs.is_packed("file_3.txt") and not fs.is_packed("big.bin")
+        assert fs.get_stored_format("file_3.txt") is None
+        assert len(fs.get_files()) == 11
+        page = fs.get_files_page(sort_by="size", limit=2)
+        assert [f["size"] for f in page["files"]] == [9, 9]
+        assert [f["name"] for f in fs.walk_dir()][:2] == ["big.bin", "file_0.txt"]
+
+    def test_upload_is_packed(self, fs, tmp_path):
+        """Small chunked uploads are packed too."""
+        upload_file = fs.open_upload("upload.txt")
+        upload_file.write(b"small ")
+        upload_file.write(b"upload")
+        assert fs.finish_upload(upload_file, "upload.txt")["size"] == 12
+        assert plain_files(tmp_path) == []
+        assert fs.get_file_data("upload.txt")["content"] == b"small upload"
+
+    def test_replace_between_storages(self, fs, tmp_path):
+        """A file moves between plain and packed storage when its size changes."""
+        fs.create_file("file.bin", b"x" * (THRESHOLD + 1))
+        fs.create_file("file.bin", b"small")
+        assert plain_files(tmp_path) == []
+        assert fs.get_file_data("file.bin")["content"] == b"small"
+        fs.create_file("file.bin", b"y" * (THRESHOLD + 1))
+        assert plain_files(tmp_path) == ["file.bin"]
+        assert not fs.is_packed("file.bin")
+        assert fs.get_usage() == dict(bytes=THRESHOLD + 1, files=1, max_bytes=None, max_files=None)
+
+    def test_delete(self, fs, tmp_path):
+        """Packed files are deleted with their directories."""
+        fs.create_file("file.txt", b"content")
+        fs.delete_file("file.txt")
+        with pytest.raises(RuntimeError):
+            fs.get_file_data("file.txt")
+
+        fs.change_dir("sub")
+        fs.create_file("file.txt", b"content")
+        with pytest.raises(RuntimeError):
+            fs.delete_dir("sub", recursive=False)
+        fs.delete_dir("sub")
+        fs.change_dir("sub")
+        assert fs.get_files() == []
+        assert fs.get_usage()["files"] == 0
+
+    def test_compaction(self, fs, monkeypatch):
+        """Mostly unused packs are compacted, files stay readable."""
+        monkeypatch.setattr(PackStore, "PACK_SIZE", 1000)
+        for i in range(100):
+            fs.create_file(f"file_{i}.txt", b"x" * 90 + f"{i:10d}".encode())
+        packs_before = fs.pack_stats()["packs"]
+        for i in range(100):
+            if i % 10:
+                fs.delete_file(f"file_{i}.txt")
+        fs._packs.compact()
+
+        stats = fs.pack_stats()
+        assert stats["packs"] < packs_before
+        assert stats["files"] == 10
+        for i in range(0, 100, 10):
+            assert fs.get_file_data(f"file_{i}.txt")["content"].endswith(f"{i:10d}".encode())
+
+    def test_without_positional_io(self, fs, monkeypatch):
+        """Packs are written, read and compacted where positional reads and writes aren't available."""
+        monkeypatch.setattr(PackStore, "PACK_SIZE", 1000)
+        monkeypatch.delattr(os, "pread")
+        monkeypatch.delattr(os, "pwrite")
+        for i in range(30):
+            fs.create_file(f"file_{i}.txt", b"x" * 90 + f"{i:10d}".encode())
+        for i in range(30):
+            if i % 10:
+                fs.delete_file(f"file_{i}.txt")
+        fs._packs.compact()
+        for i in range(0, 30, 10):
+            assert fs.get_file_data(f"file_{i}.txt")["content"].endswith(f"{i:10d}".encode())
+        reader = fs._packs.open_reader(os.path.join(os.getcwd(), "file_10.txt"), offset=95)
+        assert reader.read(3) + reader.read(100) == f"{10:10d}".encode()[-5:]
+        reader.close()
+
+    def test_pack_removal_is_retried(self, fs, monkeypatch):
+        """A compacted pack which can't be removed, e.g. while it's open on Windows, is removed later."""
+        monkeypatch.setattr(PackStore, "PACK_SIZE", 1000)
+        monkeypatch.setattr(PackStore, "REMOVE_RETRY_DELAY", 0.05)
+        for i in range(30):
+            fs.create_file(f"file_{i}.txt", b"x" * 100)
+        packs_before = fs.pack_stats()["packs"]
+        failures = list()
+        remove = os.remove
+
+        def failing_remove(path):
+            if os.path.basename(path).startswith("pack-") and locked:
+                failures.append(path)
+                raise PermissionError(13, "The process cannot access the file", path)
+            remove(path)
+
+        locked = True
+        monkeypatch.setattr(os, "remove", failing_remove)
+        for i in range(30):
+            fs.delete_file(f"file_{i}.txt")
+        deadline = time.monotonic() + 5
+        while locked and time.monotonic() < deadline:
+            time.sleep(0.01)
+            # Once compactions scheduled by the deletes are done, only the retry removes the pack.
+            with fs._packs._compaction_lock:
+                locked = not failures or fs._packs._wakeup.is_set()
+        while fs.pack_stats()["packs"] > 1 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert failures and not os.path.exists(failures[0])
+        assert fs.pack_stats()["packs"] == 1 < packs_before
+
+    def test_index_survives_restart(self, fs):
+        """Packed files and their usage are found after a restart, clean or not."""
+        fs.create_file("file.txt", b"content")
+        fs = FileService()
+        assert fs.get_file_data("file.txt")["content"] == b"content"
+        assert fs.get_usage()["bytes"] == 7
+        fs.create_file("other.txt", b"other")
+        assert fs.get_file_data("other.txt")["content"] == b"other"
+
+    def test_missing_pack(self, fs, tmp_path):
+        """A missing pack is an error, not a reason to look the file up forever."""
+        fs.create_file("file.txt", b"content")
+        record = fs._packs.get(os.path.join(tmp_path, "file.txt"))
+        os.remove(fs._packs._pack_path(record.pack))
+        with pytest.raises(FileNotFoundError):
+            fs.get_file_data("file.txt")
+
+    def test_move_tree_replaces_files(self, fs, tmp_path):
+        """Packed files replaced by a moved tree are deleted and stop counting as live data."""
+        packs = fs._packs
+        packs.put(os.path.join(tmp_path, "a", "x.txt"), b"moved", "")
+        packs.put(os.path.join(tmp_path, "b", "x.txt"), b"replaced", "")
+        packs.put(os.path.join(tmp_path, "b", "y.txt"), b"kept", "")
+        packs.move_tree(os.path.join(tmp_path, "a"), os.path.join(tmp_path, "b"))
+
+        assert packs.read(os.path.join(tmp_path, "b", "x.txt")) == b"moved"
+        assert packs.read(os.path.join(tmp_path, "b", "y.txt")) == b"kept"
+        assert packs.get(os.path.join(tmp_path, "a", "x.txt")) is None
+        assert packs.stats()["files"] == 2
+        assert packs.stats()["live_bytes"] == len(b"moved") + len(b"kept")
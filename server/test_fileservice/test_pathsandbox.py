@@ -0,0 +1,149 @@
+"""Tests for path validation and resolution of server.FileService.
+
+Imports:
+    os
+    pytest
+    server.FileService
+"""
+
+import os
+
+import pytest
+
+from config import ServerConfig
+
+from ..FileService import FileService
+
+
+@pytest.fixture
+def outside_dir(tmp_path_factory):
+    """Directory outside data directory with a secret file."""
+    path = tmp_path_factory.mktemp("outside")
+    with open(os.path.join(path, "secret.txt"), "wb") as f:
+        f.write(b"secret")
+    return str(path)
+
+
+class TestPathSandbox:
+    """Test that file operations stay within data directory."""
+
+    @pytest.mark.parametrize("pathname", ["file.txt", os.path.join("a", "b", "file.txt"), os.path.join(".", "file")])
+    def test_valid_pathname(self, pathname):
+        """Relative paths without parent references are valid."""
+        assert FileService.is_pathname_valid(pathname)
+
+    @pytest.mark.parametrize("pathname", ["", " ", "a\0b", os.path.join("a", "..", "b"), "a" * 256, None])
+    def test_invalid_pathname(self, pathname):
+        """Empty, traversing and too long paths are invalid."""
+        assert not FileService.is_pathname_valid(pathname)
+
+    def test_absolute_path_outside(self, outside_dir):
+        """Absolute paths outside data directory are rejected."""
+        with pytest.raises(ValueError):
+            FileService().get_file_data(os.path.join(outside_dir, "secret.txt"))
+        with pytest.raises(ValueError):
+            FileService().change_dir(outside_dir)
+
+    def test_symlinked_file(self, tmp_path, outside_dir):
+        """Symlinks to files are neither listed, read, followed on write nor deleted."""
+        os.symlink(os.path.join(outside_dir, "secret.txt"), os.path.join(tmp_path, "link.txt"))
+        fs = FileService()
+        assert fs.get_files() == []
+        assert fs.get_files_page()["files"] == []
+        with pytest.raises(RuntimeError):
+            fs.get_file_data("link.txt")
+        with pytest.raises(RuntimeError):
+            fs.get_file_path("link.txt")
+        with pytest.raises(RuntimeError):
+            fs.delete_file("link.txt")
+
+        # A new file replaces the link itself.
+        fs.create_file("link.txt", b"overwritten")
+        assert not os.path.islink(os.path.join(tmp_path, "link.txt"))
+        with open(os.path.join(outside_dir, "secret.txt"), "rb") as f:
+            assert f.read() == b"secret"
+
+    def test_symlinked_dir(self, tmp_path, outside_dir):
+        """Paths through symlinked directories are rejected."""
+        os.symlink(outside_dir, os.path.join(tmp_path, "link"))
+        fs = FileService()
+        with pytest.raises(ValueError):
+            fs.get_file_data(os.path.join("link", "secret.txt"))
+        with pytest.raises(ValueError):
+            fs.create_file(os.path.join("link", "new.txt"), b"data")
+        with pytest.raises(ValueError):
+            fs.change_dir("link")
+        assert sorted(os.listdir(outside_dir)) == ["secret.txt"]
+
+    def test_delete_data_directory(self):
+        """Data directory itself can't be deleted."""
+        with pytest.raises(ValueError):
+            FileService().delete_dir(".")
+
+
+class TestReservedDirs:
+    """Test that directories reserved for the service can't be reached."""
+
+    @pytest.fixture(autouse=True)
+    def reserved_dirs(self, tmp_path):
+        """Service directories with a file each."""
+        for name in (".meta", ".blobs"):
+            os.makedirs(os.path.join(tmp_path, name, "sub"), exist_ok=True)
+            with open(os.path.join(tmp_path, name, "state"), "wb") as f:
+                f.write(b"state")
+
+    @pytest.mark.parametrize("name", [".meta", ".blobs"])
+    def test_change_dir(self, name):
+        """Reserved directories and their subdirectories can't be working directories."""
+        fs = FileService()
+        for path in (name, os.path.join(name, "sub"), os.path.join(name, "new")):
+            with pytest.raises(ValueError):
+                fs.change_dir(path)
+        fs.change_dir("dir")
+        with pytest.raises(ValueError):
+            fs.change_dir(os.path.join("..", name))
+
+    def test_get_files(self, monkeypatch):
+        """Reserved directories aren't listed."""
+        monkeypatch.setitem(ServerConfig().config, "catalog", True)
+        monkeypatch.setitem(ServerConfig().config, "search_index", True)
+        fs = FileService()
+        fs.create_file("visible.txt", b"visible")
+        assert [file_meta["name"] for file_meta in fs.get_files()] == ["./visible.txt"]
+        assert [file_meta["name"] for file_meta in fs.get_files_page()["files"]] == ["./visible.txt"]
+        with pytest.raises(ValueError):
+            fs.query_files(".meta")
+        with pytest.raises(ValueError):
+            fs.search_files("state", path=".blobs")
+
+    @pytest.mark.parametrize("name", [".meta", ".blobs"])
+    def test_create_file(self, tmp_path, name):
+        """Files can't be written into reserved directories."""
+        fs = FileService()
+        with pytest.raises(ValueError):
+            fs.create_file(os.path.join(name, "state"), b"overwritten")
+        with pytest.raises(ValueError):
+            fs.create_file(os.path.join(name, "sub", "new"), b"new")
+        with open(os.path.join(tmp_path, name, "state"), "rb") as f:
+            assert f.read() == b"state"
+        assert os.listdir(os.path.join(tmp_path, name, "sub")) == []
+
+    @pytest.mark.parametrize("name", [".meta", ".blobs"])
+    def test_delete_file(self, tmp_path, name):
+        """Files in reserved directories can't be deleted or read."""
+        fs = FileService()
+        with pytest.raises(ValueError):
+            fs.delete_file(os.path.join(name, "state"))
+        with pytest.raises(ValueError):
+            fs.get_file_data(os.path.join(name, "state"))
+        assert os.path.exists(os.path.join(tmp_path, name, "state"))
+
+    @pytest.mark.parametrize("name", [".meta", ".blobs"])
+    def test_delete_dir(self, tmp_path, name):
+        """Reserved directories and their subdirectories can't be deleted."""
+        fs = FileService()
+        with pytest.raises(ValueError):
+            fs.delete_dir(name)
+        with pytest.raises(ValueError):
+            fs.delete_dir(os.path.join(name, "sub"))
+        assert os.path.isdir(os.path.join(tmp_path, name, "sub"))
@@ -0,0 +1,45 @@
+"""Tests for server.FileService.read_file_range() function.
+
+Imports:
+    os
+    pytest
+    server.FileService.read_file_range()
+"""
+
+import os
+
+import pytest
+
+from ..FileService import FileService
+
+
+class TestReadFileRange:
+    """Test read_file_range function."""
+
+    def test_bad_file_name(self, os_system, bad_file_name_win, bad_file_name_lnx):
+        """Test bad name raises ValueError"""
+        with pytest.raises(ValueError):
+            if os_system == "Windows":
+                _ = FileService().read_file_range(bad_file_name_win, 0, 1)
+            elif os_system == "Linux":
+                _ = FileService().read_file_range(bad_file_name_lnx, 0, 1)
+            else:
+                raise NotImplementedError
+
+    def test_file_not_exists(self):
+        """Test file does not exists raises RuntimeError"""
+        with pytest.raises(RuntimeError):
+            _ = FileService().read_file_range("non_existing_file", 0, 1)
+
+    def test_read_range(self, sample_binary_file_meta, tmp_dir, sample_binary_data_1):
+        """Test if a part of a file is read."""
+        target_filename = os.path.join(tmp_dir, sample_binary_data_1["name"])
+        data = sample_binary_data_1["data"]
+        assert FileService().read_file_range(target_filename, 3, 5) == data[3:8]
+
+    def test_read_past_end(self, sample_binary_file_meta, tmp_dir, sample_binary_data_1):
+        """Test if reading past the end of a file returns the rest of it."""
+        target_filename = os.path.join(tmp_dir, sample_binary_data_1["name"])
+        data = sample_binary_data_1["data"]
+        assert FileService().read_file_range(target_filename, len(data) - 2, 100) == data[-2:]
+        assert FileService().read_file_range(target_filename, len(data), 100) == b""
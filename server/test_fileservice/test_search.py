@@ -0,0 +1,109 @@
+"""Tests for full-text search of server.FileService.
+
+Imports:
+    os
+    pytest
+    server.FileService
+    server.SearchIndex
+"""
+
+import os
+
+import pytest
+
+from config import ServerConfig
+
+from .. import SearchIndex
+from ..FileService import FileService
+
+
+def found(fs: FileService, text: str, **kwargs) -> list:
+    """Get sorted (name, line) of found lines. Files are indexed in parallel, so results come in any file order."""
+    assert fs._search.wait(timeout=5)
+    return sorted((line["name"], line["line"]) for line in fs.search_files(text, **kwargs)["results"])
+
+
+@pytest.fixture(autouse=True)
+def enable_search_index(monkeypatch):
+    monkeypatch.setitem(ServerConfig().config, "search_index", True)
+
+
+class TestSearch:
+    """Test search_files function and the search index."""
+
+    def test_search_files(self, tmp_path):
+        """Lines with all words are found in a subtree, files which aren't text are skipped."""
+        fs = FileService()
+        os.makedirs(tmp_path / "logs" / "old")
+        fs.create_file("logs/app.log", b"started server\nERROR disk full\nstopped server\n")
+        fs.create_file("logs/old/app.log", b"error: Disk quota exceeded\n")
+        fs.create_file("notes.txt", "disk — notes\n".encode())
+        fs.create_file("image.bin", b"\0disk full\n")
+
+        assert found(fs, "disk") == [("./logs/app.log", 2), ("./logs/old/app.log", 1), ("./notes.txt", 1)]
+        assert found(fs, "error DISK") == [("./logs/app.log", 2), ("./logs/old/app.log", 1)]
+        assert found(fs, "disk", path="logs/old") == [("./logs/old/app.log", 1)]
+        assert found(fs, 'server" OR "disk') == []
+        line = fs.search_files("full")["results"][0]
+        assert line["snippet"] == "ERROR disk full"
+
+        with pytest.raises(ValueError):
+            fs.search_files(" ")
+        with pytest.raises(RuntimeError):
+            fs.search_files("disk", path="missing")
+
+    def test_pages(self, tmp_path):
+        """Results are paged with a cursor."""
+        fs = FileService()
+        fs.create_file("many.txt", "".join(f"match {i}\n" for i in range(25)).encode())
+        assert fs._search.wait(timeout=5)
+        page = fs.search_files("match", limit=10)
+        lines = [line["line"] for line in page["results"]]
+        while page["cursor"] is not None:
+            page = fs.search_files("match", limit=10, cursor=page["cursor"])
+            lines.extend(line["line"] for line in page["results"])
+        assert lines == list(range(1, 26))
+
+    def test_updates(self, tmp_path):
+        """Rewritten, deleted and moved files are updated in the index."""
+        fs = FileService()
+        os.mkdir(tmp_path / "dir")
+        fs.create_file("dir/a.txt", b"old words")
+        fs.create_file("b.txt", b"deleted words")
+        assert found(fs, "words") == [("./b.txt", 1), ("./dir/a.txt", 1)]
+        fs.create_file("dir/a.txt", b"new\nwords")
+        fs.delete_file("b.txt")
+        fs.move_dir("dir", "moved")
+        assert found(fs, "words") == [("./moved/a.txt", 2)]
+        assert found(fs, "old") == []
+        fs.delete_dir("moved")
+        assert found(fs, "words") == []
+
+    def test_build_on_start(self, monkeypatch, tmp_path):
+        """Files written while the index was closed are indexed on start, compressed files are decoded."""
+        (tmp_path / "offline.txt").write_bytes(b"written offline")
+        fs = FileService()
+        assert found(fs, "offline") == [("./offline.txt", 1)]
+        fs.close()
+
+        monkeypatch.setitem(ServerConfig().config, "compression", "zlib")
+        fs = FileService()
+        fs.create_file("compressed.txt", b"compressed text " * 100)
+        assert fs.get_stored_format("compressed.txt") is not None
+        assert found(fs, "compressed") == [("./compressed.txt", 1)]
+        assert fs.search_stats()["documents"] == 2
+
+    def test_foreground_pauses_indexing(self, tmp_path):
+        """Files aren't indexed while a foreground operation runs."""
+        fs = FileService()
+        with fs.foreground():
+            fs.create_file("paused.txt", b"paused")
+            assert not fs._search.wait(timeout=0.2)
+        assert found(fs, "paused") == [("./paused.txt", 1)]
+
+    def test_lines(self):
+        """Text is split into lines, binary content isn't text."""
+        assert SearchIndex.SearchIndex._lines(b"one\r\ntwo") == ["one", "two"]
+        assert SearchIndex.SearchIndex._lines("ä".encode() * 5000) is not None
+        assert SearchIndex.SearchIndex._lines(b"\xff\xfe binary") is None
+        assert SearchIndex.SearchIndex._lines(b"a\0b") is None
@@ -0,0 +1,126 @@
+"""Tests for background deletion of server.Trash.
+
+Imports:
+    errno
+    os
+    pytest
+    server.Trash
+    time
+"""
+
+import errno
+import os
+import time
+
+import pytest
+
+from ..FileService import FileService
+from ..HashCache import META_DIR
+from ..Trash import TRASH_DIR, Trash
+
+
+def make_tree(path: str, dirs: int, files: int) -> int:
+    """Make a directory tree. Returns number of entries in it."""
+    for i in range(dirs):
+        sub_dir = os.path.join(path, f"dir_{i}", "nested")
+        os.makedirs(sub_dir)
+        for j in range(files):
+            open(os.path.join(sub_dir, f"file_{j}"), "wb").close()
+    os.symlink(path, os.path.join(path, "link"))
+    return dirs * (files + 2) + 2
+
+
+class TestTrash:
+    """Test background deletion."""
+
+    def test_delete_dir_is_purged(self, tmp_path):
+        """Deleted directory disappears at once and is removed in background."""
+        fs = FileService()
+        entries = make_tree(os.path.join(tmp_path, "tree"), dirs=5, files=20)
+        fs.delete_dir("tree")
+        assert not os.path.exists(os.path.join(tmp_path, "tree"))
+        assert fs._trash.wait(timeout=5)
+        assert fs.trash_stats() == dict(pending=0, removed=entries)
+        assert os.listdir(os.path.join(tmp_path, META_DIR, TRASH_DIR)) == []
+
+    def test_leftovers_are_purged_on_start(self, tmp_path):
+        """Trees left in the trash by a previous run are removed."""
+        trash_dir = os.path.join(tmp_path, META_DIR, TRASH_DIR)
+        make_tree(os.path.join(trash_dir, "old"), dirs=2, files=2)
+        trash = Trash(tmp_path, purge_rate=0, workers=2)
+        assert trash.wait(timeout=5)
+        assert os.listdir(trash_dir) == []
+        trash.close()
+
+    def test_purge_rate(self, tmp_path):
+        """Entries are removed not faster than purge rate."""
+        trash = Trash(tmp_path, purge_rate=200, workers=4)
+        entries = make_tree(os.path.join(tmp_path, "tree"), dirs=4, files=10)
+        start = time.monotonic()
+        trash.move(os.path.join(tmp_path, "tree"))
+        assert trash.wait(timeout=5)
+        assert time.monotonic() - start >= (entries - 1) / 200
+        trash.close()
+
+    def test_on_purged(self, tmp_path):
+        """Callback is called when the trash becomes empty."""
+        calls = []
+        trash = Trash(tmp_path, purge_rate=0, workers=1, on_purged=lambda: calls.append(True))
+        os.makedirs(os.path.join(tmp_path, "tree"))
+        trash.move(os.path.join(tmp_path, "tree"))
+        assert trash.wait(timeout=5)
+        assert calls == [True]
+        trash.close()
+
+    def test_non_recursive_delete(self, tmp_path):
+        """Empty directory is removed at once, not empty one is kept."""
+        fs = FileService()
+        os.makedirs(os.path.join(tmp_path, "empty"))
+        os.makedirs(os.path.join(tmp_path, "full", "child"))
+        fs.delete_dir("empty", recursive=False)
+        assert not os.path.exists(os.path.join(tmp_path, "empty"))
+        with pytest.raises(RuntimeError):
+            fs.delete_dir("full", recursive=False)
+        assert os.path.isdir(os.path.join(tmp_path, "full", "child"))
+        assert fs.trash_stats()["removed"] == 0
+
+    def test_purger_survives_errors(self, monkeypatch, tmp_path):
+        """Trees which can't be purged are kept and logged, other trees are purged."""
+        trash_dir = os.path.join(tmp_path, META_DIR, TRASH_DIR)
+        make_tree(os.path.join(trash_dir, "unreadable"), dirs=1, files=1)
+        make_tree(os.path.join(trash_dir, "failing"), dirs=1, files=1)
+        scandir = os.scandir
+
+        def failing_scandir(path):
+            if os.path.basename(path) == "unreadable":
+                raise PermissionError(errno.EACCES, "Permission denied", path)
+            if os.path.basename(path) == "failing":
+                raise RuntimeError("unexpected")
+            return scandir(path)
+
+        monkeypatch.setattr(os, "scandir", failing_scandir)
+        trash = Trash(tmp_path, purge_rate=0, workers=2)
+        make_tree(os.path.join(tmp_path, "tree"), dirs=2, files=2)
+        trash.move(os.path.join(tmp_path, "tree"))
+        deadline = time.monotonic() + 5
+        while len(os.listdir(trash_dir)) > 2 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert sorted(os.listdir(trash_dir)) == ["failing", "unreadable"]
+        assert sorted(os.listdir(os.path.join(trash_dir, "unreadable"))) == ["dir_0", "link"]
+        trash.close()
+
+    def test_other_filesystem(self, monkeypatch, tmp_path):
+        """A tree which can't be renamed into the trash is removed at once."""
+        trash = Trash(tmp_path, purge_rate=0, workers=1)
+        make_tree(os.path.join(tmp_path, "mount"), dirs=2, files=2)
+
+        def cross_device_rename(src, dst):
+            raise OSError(errno.EXDEV, "Invalid cross-device link", src)
+
+        monkeypatch.setattr(os, "rename", cross_device_rename)
+        trash.move(os.path.join(tmp_path, "mount"))
+        assert not os.path.exists(os.path.join(tmp_path, "mount"))
+        monkeypatch.undo()
+        with pytest.raises(FileNotFoundError):
+            trash.move(os.path.join(tmp_path, "missing"))
+        trash.close()
@@ -0,0 +1,55 @@
+"""Tests for server.FileService.open_upload(), finish_upload() and abort_upload() functions.
+
+Imports:
+    os
+    pytest
+    server.FileService
+"""
+
+import os
+
+import pytest
+
+from ..FileService import FileService
+
+
+class TestUpload:
+    """Test chunked upload functions."""
+
+    def test_bad_file_name(self, os_system, bad_file_name_win, bad_file_name_lnx):
+        """Bad file name raises ValueError"""
+        with pytest.raises(ValueError):
+            if os_system == "Windows":
+                _ = FileService().open_upload(bad_file_name_win)
+            elif os_system == "Linux":
+                _ = FileService().open_upload(bad_file_name_lnx)
+            else:
+                raise NotImplementedError
+
+    def test_finish_upload(self, tmp_dir, sample_binary_data_1):
+        """Chunks written to an upload appear in the target file only after finish_upload."""
+        target_filename = os.path.join(tmp_dir, sample_binary_data_1["name"])
+        data = sample_binary_data_1["data"]
+        fs = FileService()
+
+        upload_file = fs.open_upload(target_filename)
+        upload_file.write(data[: len(data) // 2])
+        upload_file.write(data[len(data) // 2 :])
+        assert not os.path.exists(target_filename)
+
+        file_meta = fs.finish_upload(upload_file, target_filename)
+        assert file_meta["size"] == len(data)
+        with open(target_filename, "rb") as f:
+            assert f.read() == data
+        assert os.listdir(tmp_dir) == [sample_binary_data_1["name"]]
+
+    def test_abort_upload(self, tmp_dir, sample_binary_data_1):
+        """Aborted upload leaves nothing behind."""
+        target_filename = os.path.join(tmp_dir, sample_binary_data_1["name"])
+        fs = FileService()
+
+        upload_file = fs.open_upload(target_filename)
+        upload_file.write(sample_binary_data_1["data"])
+        fs.abort_upload(upload_file)
+
+        assert os.listdir(tmp_dir) == []
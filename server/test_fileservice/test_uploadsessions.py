@@ -0,0 +1,150 @@
+"""Tests for resumable upload sessions of server.FileService.
+
+Imports:
+    hashlib
+    os
+    pytest
+    server.FileService
+"""
+
+import hashlib
+import os
+
+import pytest
+
+from config import ServerConfig
+
+from ..FileService import FileService
+
+CHUNK_SIZE = 1000
+
+
+def send_chunk(fs: FileService, upload_id: str, number: int, data: bytes) -> dict:
+    writer = fs.open_upload_chunk(upload_id, number)
+    try:
+        writer.write(data)
+        return fs.finish_upload_chunk(writer)
+    except BaseException:
+        fs.abort_upload_chunk(writer)
+        raise
+
+
+def chunks(content: bytes) -> list:
+    return [content[i : i + CHUNK_SIZE] for i in range(0, len(content), CHUNK_SIZE)]
+
+
+class TestUploadSessions:
+    """Test chunked upload sessions."""
+
+    def test_chunks_in_any_order(self, tmp_path):
+        """Chunks sent in any order make the file on commit."""
+        fs = FileService()
+        content = os.urandom(3500)
+        info = fs.open_upload_session("big.bin", len(content), CHUNK_SIZE, hashlib.sha256(content).hexdigest())
+        assert info["chunks"] == 4 and info["missing"] == [0, 1, 2, 3]
+        assert info["filename"] == "big.bin"
+
+        parts = chunks(content)
+        for number in (3, 1, 0):
+            info = send_chunk(fs, info["upload_id"], number, parts[number])
+        assert info["received"] == [0, 1, 3] and info["missing"] == [2]
+        assert not os.path.exists(tmp_path / "big.bin")
+
+        with pytest.raises(ValueError):
+            fs.commit_upload_session(info["upload_id"])
+        send_chunk(fs, info["upload_id"], 2, parts[2])
+        file_meta = fs.commit_upload_session(info["upload_id"])
+
+        assert file_meta["size"] == len(content)
+        assert (tmp_path / "big.bin").read_bytes() == content
+        assert fs.get_file_hash("big.bin") == hashlib.sha256(content).hexdigest()
+        assert fs.upload_stats()["sessions"] == 0
+        with pytest.raises(RuntimeError):
+            fs.get_upload_session(info["upload_id"])
+
+    def test_without_pwrite(self, monkeypatch, tmp_path):
+        """Chunks are written where positional writes aren't available, e.g. on Windows."""
+        monkeypatch.delattr(os, "pwrite")
+        fs = FileService()
+        content = os.urandom(2500)
+        info = fs.open_upload_session("big.bin", len(content), CHUNK_SIZE)
+        for number, part in reversed(list(enumerate(chunks(content)))):
+            writer = fs.open_upload_chunk(info["upload_id"], number)
+            writer.write(part[:300])
+            writer.write(part[300:])
+            fs.finish_upload_chunk(writer)
+        fs.commit_upload_session(info["upload_id"])
+        assert (tmp_path / "big.bin").read_bytes() == content
+
+    def test_resume_after_restart(self, tmp_path):
+        """Received chunks survive a restart of the service."""
+        fs = FileService()
+        content = os.urandom(2500)
+        parts = chunks(content)
+        upload_id = fs.open_upload_session("resumed.bin", len(content), CHUNK_SIZE)["upload_id"]
+        send_chunk(fs, upload_id, 0, parts[0])
+        fs.close()
+
+        fs = FileService()
+        info = fs.get_upload_session(upload_id)
+        assert info["received"] == [0] and info["missing"] == [1, 2]
+        for number in info["missing"]:
+            send_chunk(fs, upload_id, number, parts[number])
+        fs.commit_upload_session(upload_id)
+        assert (tmp_path / "resumed.bin").read_bytes() == content
+
+    def test_bad_chunks_and_hash(self, tmp_path):
+        """Wrong chunk sizes and numbers are rejected, a hash mismatch keeps the session."""
+        fs = FileService()
+        content = os.urandom(1500)
+        upload_id = fs.open_upload_session("file.bin", len(content), CHUNK_SIZE)["upload_id"]
+        with pytest.raises(ValueError):
+            send_chunk(fs, upload_id, 2, b"x")
+        with pytest.raises(ValueError):
+            send_chunk(fs, upload_id, 1, content[:CHUNK_SIZE])
+        with pytest.raises(ValueError):
+            send_chunk(fs, upload_id, 0, content[:10])
+        assert fs.get_upload_session(upload_id)["received"] == []
+
+        for number, part in enumerate(chunks(content)):
+            send_chunk(fs, upload_id, number, part)
+        with pytest.raises(ValueError):
+            fs.commit_upload_session(upload_id, sha256="0" * 64)
+        assert fs.get_upload_session(upload_id)["missing"] == []
+        fs.commit_upload_session(upload_id, sha256=hashlib.sha256(content).hexdigest())
+        assert (tmp_path / "file.bin").read_bytes() == content
+
+    def test_abort(self, tmp_path):
+        """Aborted sessions leave no files."""
+        fs = FileService()
+        upload_id = fs.open_upload_session("aborted.bin", 1500, CHUNK_SIZE)["upload_id"]
+        send_chunk(fs, upload_id, 0, b"x" * CHUNK_SIZE)
+        fs.abort_upload_session(upload_id)
+        assert not [name for name in os.listdir(tmp_path / ".meta" / "uploads") if name.endswith(".part")]
+        with pytest.raises(RuntimeError):
+            fs.get_upload_session(upload_id)
+        with pytest.raises(ValueError):
+            fs.open_upload_session("../outside.bin", 10)
+
+    def test_compressed_and_packed(self, monkeypatch, tmp_path):
+        """Committed files are stored like other uploads: compressed or packed."""
+        monkeypatch.setitem(ServerConfig().config, "compression", "zlib")
+        monkeypatch.setitem(ServerConfig().config, "pack_threshold", 100)
+        fs = FileService()
+        for filename, content in (("large.txt", b"text " * 500), ("small.txt", b"small")):
+            upload_id = fs.open_upload_session(filename, len(content), CHUNK_SIZE)["upload_id"]
+            for number, part in enumerate(chunks(content)):
+                send_chunk(fs, upload_id, number, part)
+            fs.commit_upload_session(upload_id)
+            assert fs.get_file_data(filename)["content"] == content
+        assert fs.get_stored_format("large.txt") is not None
+        assert fs.is_packed("small.txt")
+
+    def test_expired_sessions_are_removed(self, monkeypatch):
+        """Sessions older than upload_session_ttl are removed."""
+        monkeypatch.setitem(ServerConfig().config, "upload_session_ttl", -1)
+        fs = FileService()
+        upload_id = fs.open_upload_session("old.bin", 10)["upload_id"]
+        fs.open_upload_session("new.bin", 10)
+        with pytest.raises(RuntimeError):
+            fs.get_upload_session(upload_id)
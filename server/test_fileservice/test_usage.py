@@ -0,0 +1,101 @@
+"""Tests for disk usage accounting of server.FileService.
+
+Imports:
+    errno
+    os
+    pytest
+    server.FileService
+"""
+
+import errno
+import os
+
+import pytest
+
+from ..FileService import FileService
+
+
+def usage(fs: FileService, path: str = ".") -> tuple:
+    result = fs.get_usage(path)
+    return result["bytes"], result["files"]
+
+
+class TestUsage:
+    """Test disk usage counters and quotas."""
+
+    def test_counters(self, tmp_path):
+        """Writes and deletions update totals of the directory and all directories above it."""
+        fs = FileService()
+        fs.change_dir(os.path.join("a", "b"))
+        fs.create_file("one.bin", b"x" * 100)
+        fs.create_file("two.bin", b"x" * 50)
+        fs.change_dir("a")
+        fs.create_file("three.bin", b"x" * 10)
+        assert usage(fs) == (160, 3)
+        assert usage(fs, "a") == (160, 3)
+        assert usage(fs, os.path.join("a", "b")) == (150, 2)
+
+        fs.change_dir(os.path.join("a", "b"))
+        fs.create_file("one.bin", b"x" * 30)
+        fs.delete_file("two.bin")
+        assert usage(fs) == (40, 2)
+        assert usage(fs, os.path.join("a", "b")) == (30, 1)
+
+        fs.delete_dir(os.path.join("a", "b"))
+        assert usage(fs) == (10, 1)
+        with pytest.raises(RuntimeError):
+            fs.get_usage(os.path.join("a", "b"))
+
+    def test_quota(self, tmp_path):
+        """Writes exceeding a quota are rejected and leave no files behind."""
+        fs = FileService()
+        fs.change_dir("user")
+        fs.set_quota("user", max_bytes=100, max_files=2)
+        fs.create_file("one.bin", b"x" * 60)
+        with pytest.raises(OSError) as e:
+            fs.create_file("two.bin", b"x" * 60)
+        assert e.value.errno == errno.EDQUOT
+        fs.create_file("two.bin", b"x" * 40)
+        with pytest.raises(OSError):
+            fs.open_upload("three.bin")
+        # Replacing a file doesn't add a file.
+        fs.create_file("two.bin", b"x" * 10)
+        assert sorted(os.listdir(os.path.join(tmp_path, "user"))) == ["one.bin", "two.bin"]
+        assert fs.get_usage("user") == dict(bytes=70, files=2, max_bytes=100, max_files=2)
+
+        fs.set_quota("user")
+        fs.create_file("three.bin", b"x" * 100)
+        assert usage(fs, "user") == (170, 3)
+
+    def test_bad_quota(self):
+        """Negative limits are rejected."""
+        with pytest.raises(ValueError):
+            FileService().set_quota(".", max_bytes=-1)
+
+    def test_counters_survive_restart(self, tmp_path):
+        """Totals and quotas are saved on close."""
+        fs = FileService()
+        fs.create_file("one.bin", b"x" * 100)
+        fs.set_quota(".", max_files=10)
+        fs.close()
+        # A file added behind the service isn't counted after a clean restart.
+        open(os.path.join(tmp_path, "external.bin"), "wb").close()
+        fs = FileService()
+        assert fs.get_usage() == dict(bytes=100, files=1, max_bytes=None, max_files=10)
+
+    def test_reconcile_after_unclean_shutdown(self, tmp_path):
+        """Totals are counted from disk if the service wasn't closed."""
+        fs = FileService()
+        fs.create_file("one.bin", b"x" * 100)
+        os.makedirs(os.path.join(tmp_path, "sub"))
+        with open(os.path.join(tmp_path, "sub", "external.bin"), "wb") as f:
+            f.write(b"x" * 20)
+        os.symlink(os.path.join(tmp_path, "one.bin"), os.path.join(tmp_path, "link.bin"))
+
+        fs = FileService()
+        assert usage(fs) == (120, 2)
+        assert usage(fs, "sub") == (20, 1)
+
+        os.remove(os.path.join(tmp_path, "sub", "external.bin"))
+        assert fs.reconcile_usage()["files"] == 1
+        assert usage(fs, "sub") == (0, 0)
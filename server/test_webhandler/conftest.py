@@ -1,4 +1,5 @@
 import pytest
+import requests
 
 from config import ServerConfig
 
@@ -21,3 +22,10 @@ def test_content():
 @pytest.fixture()
 def config():
     return ServerConfig().config
+
+
+@pytest.fixture()
+def http():
+    """HTTP client keeping the session issued by the server."""
+    with requests.Session() as session:
+        yield session
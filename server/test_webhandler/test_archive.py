@@ -0,0 +1,55 @@
+import base64
+import io
+import json
+import tarfile
+import zipfile
+
+import requests
+
+
+def test_archive(http, config, test_dir, test_content):
+    host = config["host"]
+    port = config["port"]
+    content = base64.b64encode(test_content).decode("utf-8")
+
+    http.post(f"http://{host}:{port}/change_dir", data=json.dumps({"path": f"{test_dir}/archive/nested"}))
+    http.post(f"http://{host}:{port}/files", data=json.dumps({"filename": "b.txt", "content": content}))
+    http.post(f"http://{host}:{port}/change_dir", data=json.dumps({"path": f"{test_dir}/archive"}))
+    http.post(f"http://{host}:{port}/files", data=json.dumps({"filename": "a.txt", "content": content}))
+
+    response = http.get(f"http://{host}:{port}/archive", params={"format": "tar.gz"})
+    assert response.status_code == 200
+    assert response.headers["Content-Type"] == "application/gzip"
+    assert 'filename="archive.tar.gz"' in response.headers["Content-Disposition"]
+    with tarfile.open(fileobj=io.BytesIO(response.content), mode="r:gz") as tar:
+        assert tar.getnames() == ["a.txt", "nested/b.txt"]
+        assert tar.extractfile("nested/b.txt").read() == test_content
+
+    response = http.get(f"http://{host}:{port}/archive", params={"format": "zip", "recursive": "0"})
+    assert response.status_code == 200
+    with zipfile.ZipFile(io.BytesIO(response.content)) as zip_file:
+        assert zip_file.namelist() == ["a.txt"]
+        assert zip_file.read("a.txt") == test_content
+
+
+def test_archive_name(http, config, test_dir):
+    host = config["host"]
+    port = config["port"]
+    name = 'naïve "name"\x7f'
+
+    # Another client creates the directory, the session of this one stays in data directory.
+    requests.post(f"http://{host}:{port}/change_dir", data=json.dumps({"path": f"{test_dir}/{name}"}))
+    response = http.get(f"http://{host}:{port}/archive", params={"path": f"{test_dir}/{name}", "format": "zip"})
+    assert response.status_code == 200
+    assert response.headers["Content-Disposition"] == (
+        "attachment; filename=\"na_ve _name_.zip\"; filename*=UTF-8''na%C3%AFve%20%22name%22.zip"
+    )
+
+
+def test_archive_errors(http, config):
+    host = config["host"]
+    port = config["port"]
+    response = http.get(f"http://{host}:{port}/archive", params={"path": "missing-dir"})
+    assert response.status_code == 404
+    response = http.get(f"http://{host}:{port}/archive", params={"format": "rar"})
+    assert response.status_code == 400
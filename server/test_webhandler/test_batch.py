@@ -0,0 +1,43 @@
+import base64
+import json
+import os
+
+
+def test_batch(http, config, test_dir, test_content):
+    host = config["host"]
+    port = config["port"]
+    datadir = config["data_directory"]
+    content = base64.b64encode(test_content).decode("utf-8")
+
+    response = http.post(f"http://{host}:{port}/change_dir", data=json.dumps({"path": f"{test_dir}/batch"}))
+    assert response.status_code == 200
+
+    operations = [{"op": "create", "filename": f"{i}.txt", "content": content} for i in range(20)]
+    response = http.post(f"http://{host}:{port}/files/batch", data=json.dumps({"operations": operations}))
+    assert response.status_code == 200
+    results = response.json()["data"]["results"]
+    assert [result["code"] for result in results] == [201] * 20
+    assert os.path.exists(os.path.join(datadir, test_dir, "batch", "19.txt"))
+
+    operations = [
+        {"op": "read", "filename": "0.txt"},
+        {"op": "delete", "filename": "1.txt"},
+        {"op": "read", "filename": "missing.txt"},
+        {"op": "rename", "filename": "2.txt"},
+    ]
+    response = http.post(f"http://{host}:{port}/files/batch", data=json.dumps({"operations": operations}))
+    assert response.status_code == 200
+    results = response.json()["data"]["results"]
+    assert results[0]["code"] == 200
+    assert base64.b64decode(results[0]["data"]["content"]) == test_content
+    assert results[1]["code"] == 200
+    assert not os.path.exists(os.path.join(datadir, test_dir, "batch", "1.txt"))
+    assert results[2]["code"] == 404
+    assert results[3]["code"] == 400
+
+
+def test_batch_malformed(http, config):
+    host = config["host"]
+    port = config["port"]
+    response = http.post(f"http://{host}:{port}/files/batch", data=json.dumps({"operations": "create"}))
+    assert response.status_code == 400
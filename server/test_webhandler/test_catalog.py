@@ -0,0 +1,44 @@
+import base64
+import json
+
+import pytest
+
+
+def test_query_catalog(http, config, test_dir):
+    host = config["host"]
+    port = config["port"]
+    if not http.get(f"http://{host}:{port}/stats").json()["data"]["catalog"]:
+        pytest.skip("The server runs without the catalog")
+
+    http.post(f"http://{host}:{port}/change_dir", data=json.dumps({"path": f"{test_dir}/catalog"}))
+    for filename, size in (("small.csv", 10), ("large.csv", 300), ("notes.txt", 100)):
+        http.post(
+            f"http://{host}:{port}/files",
+            data=json.dumps({"filename": filename, "content": base64.b64encode(b"x" * size).decode("utf-8")}),
+        )
+
+    response = http.get(f"http://{host}:{port}/catalog", params={"ext": "csv", "sort": "size", "order": "desc"})
+    assert response.status_code == 200
+    files = response.json()["data"]
+    assert [file_meta["size"] for file_meta in files] == [300, 10]
+    assert files[0]["name"].endswith("/catalog/large.csv")
+
+    response = http.get(f"http://{host}:{port}/catalog", params={"sort": "size", "limit": 1})
+    assert [file_meta["size"] for file_meta in response.json()["data"]] == [10]
+    response = http.get(
+        f"http://{host}:{port}/catalog",
+        params={"sort": "size", "limit": 1, "cursor": response.json()["cursor"]},
+    )
+    assert [file_meta["size"] for file_meta in response.json()["data"]] == [100]
+
+    response = http.get(f"http://{host}:{port}/catalog", params={"sort": "owner"})
+    assert response.status_code == 400
+    response = http.get(f"http://{host}:{port}/catalog", params={"path": "missing"})
+    assert response.status_code == 404
+
+    response = http.post(f"http://{host}:{port}/catalog/reconcile")
+    assert response.status_code == 200
+    assert response.json()["data"]["removed"] == 0
+
+    response = http.get(f"http://{host}:{port}/stats")
+    assert response.json()["data"]["catalog"]["files"] >= 3
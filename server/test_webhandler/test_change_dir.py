@@ -4,10 +4,62 @@ import os
 import requests
 
 
-def test_change_dir(config, test_dir):
+def test_change_dir(http, config, test_dir):
     host = config["host"]
     port = config["port"]
     datadir = config["data_directory"]
-    response = requests.post(f"http://{host}:{port}/change_dir", data=json.dumps({"path": f"{test_dir}"}))
+    response = http.post(f"http://{host}:{port}/change_dir", data=json.dumps({"path": f"{test_dir}"}))
     assert response.status_code == 200
     assert os.path.exists(os.path.join(datadir, f"{test_dir}"))
+
+
+def test_change_dir_per_session(config, test_dir):
+    host = config["host"]
+    port = config["port"]
+
+    with requests.Session() as first, requests.Session() as second:
+        response = first.post(f"http://{host}:{port}/change_dir", data=json.dumps({"path": f"{test_dir}/first"}))
+        assert response.status_code == 200
+        response = second.post(f"http://{host}:{port}/change_dir", data=json.dumps({"path": f"{test_dir}/second"}))
+        assert response.status_code == 200
+
+        response = first.get(f"http://{host}:{port}/current_dir")
+        assert response.json()["current path"] == os.path.join(".", test_dir, "first")
+        response = second.get(f"http://{host}:{port}/current_dir")
+        assert response.json()["current path"] == os.path.join(".", test_dir, "second")
+
+
+def test_session_cant_be_reused(http, config, test_dir):
+    host = config["host"]
+    port = config["port"]
+
+    response = http.post(f"http://{host}:{port}/change_dir", data=json.dumps({"path": f"{test_dir}/private"}))
+    assert response.status_code == 200
+    session_id, _, signature = http.cookies["session"].partition(".")
+    assert session_id and signature
+
+    # Unverified tokens and credentials, or session IDs which the server didn't sign, get a new session.
+    for kwargs in (
+        dict(headers={"X-Token": session_id}),
+        dict(auth=("user", "wrong password")),
+        dict(cookies={"session": session_id}),
+        dict(cookies={"session": f"{session_id}.{'0' * len(signature)}"}),
+    ):
+        response = requests.get(f"http://{host}:{port}/current_dir", **kwargs)
+        assert response.json()["current path"] == "."
+        assert response.cookies["session"] != http.cookies["session"]
+
+    response = http.get(f"http://{host}:{port}/current_dir")
+    assert response.json()["current path"] == os.path.join(".", test_dir, "private")
+
+
+def test_change_dir_without_cookies(config, test_dir):
+    host = config["host"]
+    port = config["port"]
+
+    # Clients which neither authenticate nor keep cookies get a new session on every request.
+    response = requests.post(f"http://{host}:{port}/change_dir", data=json.dumps({"path": f"{test_dir}/lost"}))
+    assert response.status_code == 200
+    assert "session" in response.cookies
+    response = requests.get(f"http://{host}:{port}/current_dir")
+    assert response.json()["current path"] == "."
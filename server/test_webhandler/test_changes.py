@@ -0,0 +1,58 @@
+import base64
+import json
+import threading
+
+
+def read_events(lines, count: int) -> list:
+    events = list()
+    event = dict()
+    for line in lines:
+        if line.startswith("data: "):
+            event = json.loads(line[len("data: ") :])
+        elif not line and event:
+            events.append(event)
+            event = dict()
+            if len(events) == count:
+                break
+    return events
+
+
+def test_watch_changes(http, config, test_dir):
+    host = config["host"]
+    port = config["port"]
+
+    http.post(f"http://{host}:{port}/change_dir", data=json.dumps({"path": f"{test_dir}/changes"}))
+
+    def create(filename: str) -> None:
+        http.post(
+            f"http://{host}:{port}/files",
+            data=json.dumps({"filename": filename, "content": base64.b64encode(b"change").decode("utf-8")}),
+        )
+
+    with http.get(f"http://{host}:{port}/changes", stream=True, timeout=10) as response:
+        assert response.status_code == 200
+        assert response.headers["Content-Type"].startswith("text/event-stream")
+        lines = response.iter_lines(chunk_size=1, decode_unicode=True)
+        assert next(lines) == ": subscribed"
+        writer = threading.Thread(target=lambda: [create("first.txt"), create("second.txt")])
+        writer.start()
+        events = read_events(lines, 2)
+        writer.join()
+    assert [(event["type"], event["path"].rsplit("/", 1)[-1]) for event in events] == [
+        ("create", "first.txt"),
+        ("create", "second.txt"),
+    ]
+
+    with http.get(
+        f"http://{host}:{port}/changes",
+        params={"after": events[0]["id"]},
+        stream=True,
+        timeout=10,
+    ) as response:
+        lines = response.iter_lines(chunk_size=1, decode_unicode=True)
+        assert read_events(lines, 1)[0]["id"] == events[1]["id"]
+
+    response = http.get(f"http://{host}:{port}/changes", params={"path": "missing"})
+    assert response.status_code == 404
+    response = http.get(f"http://{host}:{port}/changes", params={"after": "x"})
+    assert response.status_code == 400
@@ -0,0 +1,72 @@
+import base64
+import json
+
+
+def test_copy_and_move_file(http, config, test_dir, test_file, test_content):
+    host = config["host"]
+    port = config["port"]
+
+    http.post(f"http://{host}:{port}/change_dir", data=json.dumps({"path": f"{test_dir}/copy"}))
+    http.post(
+        f"http://{host}:{port}/files",
+        data=json.dumps({"filename": test_file, "content": base64.b64encode(test_content).decode("utf-8")}),
+    )
+
+    response = http.post(
+        f"http://{host}:{port}/files/copy",
+        data=json.dumps({"source": test_file, "destination": "copy.txt"}),
+    )
+    assert response.status_code == 201
+    assert response.json()["data"]["size"] == len(test_content)
+
+    response = http.post(
+        f"http://{host}:{port}/files/move",
+        data=json.dumps({"source": "copy.txt", "destination": "moved.txt"}),
+    )
+    assert response.status_code == 200
+
+    response = http.get(f"http://{host}:{port}/files/moved.txt", params={"raw": "1"})
+    assert response.content == test_content
+    response = http.get(f"http://{host}:{port}/files/copy.txt")
+    assert response.status_code == 404
+
+    response = http.post(
+        f"http://{host}:{port}/files/copy",
+        data=json.dumps({"source": "missing.txt", "destination": "copy.txt"}),
+    )
+    assert response.status_code == 404
+
+
+def test_copy_and_move_dir(http, config, test_dir, test_file, test_content):
+    host = config["host"]
+    port = config["port"]
+
+    http.post(f"http://{host}:{port}/change_dir", data=json.dumps({"path": f"{test_dir}/tree"}))
+    http.post(
+        f"http://{host}:{port}/files",
+        data=json.dumps({"filename": test_file, "content": base64.b64encode(test_content).decode("utf-8")}),
+    )
+    http.post(f"http://{host}:{port}/change_dir", data=json.dumps({"path": test_dir}))
+
+    response = http.post(
+        f"http://{host}:{port}/copy_dir", data=json.dumps({"path": "tree", "destination": "tree_copy"})
+    )
+    assert response.status_code == 201
+    assert response.json()["data"]["files"] == 1
+
+    response = http.post(
+        f"http://{host}:{port}/move_dir",
+        data=json.dumps({"path": "tree_copy", "destination": "tree_moved"}),
+    )
+    assert response.status_code == 200
+
+    http.post(f"http://{host}:{port}/change_dir", data=json.dumps({"path": f"{test_dir}/tree_moved"}))
+    response = http.get(f"http://{host}:{port}/files/{test_file}", params={"raw": "1"})
+    assert response.content == test_content
+    http.post(f"http://{host}:{port}/change_dir", data=json.dumps({"path": test_dir}))
+
+    response = http.post(
+        f"http://{host}:{port}/move_dir",
+        data=json.dumps({"path": "tree", "destination": "tree_moved"}),
+    )
+    assert response.status_code == 400
@@ -2,17 +2,15 @@ import base64
 import json
 import os
 
-import requests
 
-
-def test_create_file(config, test_dir, test_file, test_content):
+def test_create_file(http, config, test_dir, test_file, test_content):
     host = config["host"]
     port = config["port"]
     datadir = config["data_directory"]
     target_file = os.path.join(datadir, test_dir, test_file)
 
-    response = requests.post(f"http://{host}:{port}/change_dir", data=json.dumps({"path": f"{test_dir}"}))
-    response = requests.post(
+    response = http.post(f"http://{host}:{port}/change_dir", data=json.dumps({"path": f"{test_dir}"}))
+    response = http.post(
         f"http://{host}:{port}/files",
         data=json.dumps(
             {
@@ -27,3 +25,24 @@ def test_create_file(config, test_dir, test_file, test_content):
     with open(target_file, "rb") as f:
         data = f.read()
     assert data == test_content
+
+
+def test_create_file_raw(http, config, test_dir, test_file, test_content):
+    host = config["host"]
+    port = config["port"]
+    datadir = config["data_directory"]
+    target_file = os.path.join(datadir, test_dir, test_file)
+
+    response = http.post(f"http://{host}:{port}/change_dir", data=json.dumps({"path": f"{test_dir}"}))
+    response = http.post(
+        f"http://{host}:{port}/files",
+        params={"filename": test_file},
+        data=test_content,
+        headers={"Content-Type": "application/octet-stream"},
+    )
+    assert response.status_code == 201
+    assert json.loads(response.text)["data"]["size"] == len(test_content)
+
+    with open(target_file, "rb") as f:
+        data = f.read()
+    assert data == test_content
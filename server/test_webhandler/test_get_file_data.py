@@ -1,18 +1,18 @@
 import base64
+import hashlib
 import json
 
-import requests
 
 RESPONSE_KEYS = set(['status', 'data'])
 DATA_KEYS = set(['name', 'create_date', 'edit_date', 'size', 'content'])
 
 
-def test_get_file_data(config, test_dir, test_file, test_content):
+def test_get_file_data(http, config, test_dir, test_file, test_content):
     host = config["host"]
     port = config["port"]
 
-    response = requests.post(f"http://{host}:{port}/change_dir", data=json.dumps({"path": f"{test_dir}"}))
-    response = requests.post(
+    response = http.post(f"http://{host}:{port}/change_dir", data=json.dumps({"path": f"{test_dir}"}))
+    response = http.post(
         f"http://{host}:{port}/files",
         data=json.dumps(
             {
@@ -21,7 +21,7 @@ def test_get_file_data(config, test_dir, test_file, test_content):
             }
         ),
     )
-    response = requests.get(f'http://{host}:{port}/files/{test_file}')
+    response = http.get(f'http://{host}:{port}/files/{test_file}')
 
     resp_dict = json.loads(response.text)
 
@@ -29,3 +29,149 @@ def test_get_file_data(config, test_dir, test_file, test_content):
     assert set(resp_dict.keys()) == RESPONSE_KEYS
     assert set(resp_dict['data'].keys()) == DATA_KEYS
     assert resp_dict['data']['content'] == base64.b64encode(test_content).decode("utf-8")
+
+
+def test_get_file_data_raw(http, config, test_dir, test_file, test_content):
+    host = config["host"]
+    port = config["port"]
+
+    response = http.post(f"http://{host}:{port}/change_dir", data=json.dumps({"path": f"{test_dir}"}))
+    response = http.post(
+        f"http://{host}:{port}/files",
+        data=json.dumps(
+            {
+                "filename": test_file,
+                "content": base64.b64encode(test_content).decode("utf-8"),
+            }
+        ),
+    )
+    response = http.get(f'http://{host}:{port}/files/{test_file}', params={"raw": "1"})
+
+    assert response.status_code == 200
+    assert response.headers['Content-Length'] == str(len(test_content))
+    assert response.headers['Content-Type'] == 'text/plain'
+    assert response.content == test_content
+
+    response = http.get(
+        f'http://{host}:{port}/files/{test_file}', headers={"Accept": "application/octet-stream"}
+    )
+
+    assert response.status_code == 200
+    assert response.content == test_content
+
+
+def test_get_file_data_ranges(http, config, test_dir, test_file, test_content):
+    host = config["host"]
+    port = config["port"]
+
+    response = http.post(f"http://{host}:{port}/change_dir", data=json.dumps({"path": f"{test_dir}"}))
+    response = http.post(
+        f"http://{host}:{port}/files",
+        data=json.dumps(
+            {
+                "filename": test_file,
+                "content": base64.b64encode(test_content).decode("utf-8"),
+            }
+        ),
+    )
+
+    response = http.get(f'http://{host}:{port}/files/{test_file}?raw=1', headers={"Range": "bytes=2-5"})
+    assert response.status_code == 206
+    assert response.content == test_content[2:6]
+
+    response = http.get(f'http://{host}:{port}/files/{test_file}?raw=1', headers={"Range": "bytes=0-1,-3"})
+    assert response.status_code == 206
+    assert response.headers['Content-Type'].startswith('multipart/byteranges; boundary=')
+    assert int(response.headers['Content-Length']) == len(response.content)
+    size = len(test_content)
+    assert f"Content-Range: bytes 0-1/{size}".encode() in response.content
+    assert f"Content-Range: bytes {size - 3}-{size - 1}/{size}".encode() in response.content
+    assert test_content[-3:] + b"\r\n" in response.content
+
+    response = http.get(
+        f'http://{host}:{port}/files/{test_file}?raw=1', headers={"Range": f"bytes={size}-,{size + 5}-"}
+    )
+    assert response.status_code == 416
+
+
+def test_get_file_data_etag(http, config, test_dir, test_file, test_content):
+    host = config["host"]
+    port = config["port"]
+
+    response = http.post(f"http://{host}:{port}/change_dir", data=json.dumps({"path": f"{test_dir}"}))
+    response = http.post(
+        f"http://{host}:{port}/files",
+        data=json.dumps(
+            {
+                "filename": test_file,
+                "content": base64.b64encode(test_content).decode("utf-8"),
+            }
+        ),
+    )
+    etag = f'"{hashlib.sha256(test_content).hexdigest()}"'
+
+    response = http.get(f'http://{host}:{port}/files/{test_file}')
+    assert response.headers['ETag'] == etag
+
+    response = http.get(f'http://{host}:{port}/files/{test_file}?raw=1')
+    assert response.headers['ETag'] == etag
+
+    for raw in ("0", "1"):
+        response = http.get(f'http://{host}:{port}/files/{test_file}?raw={raw}', headers={"If-None-Match": etag})
+        assert response.status_code == 304
+        assert response.content == b""
+
+    response = http.get(
+        f'http://{host}:{port}/files/{test_file}?raw=1', headers={"Range": "bytes=0-1", "If-Range": '"other"'}
+    )
+    assert response.status_code == 200
+    assert response.content == test_content
+
+    response = http.get(f'http://{host}:{port}/files', params={"hash": "1"})
+    assert f'"{json.loads(response.text)["data"][0]["sha256"]}"' == etag
+
+
+def test_get_file_data_cached(http, config, test_dir, test_file, test_content):
+    host = config["host"]
+    port = config["port"]
+
+    response = http.post(f"http://{host}:{port}/change_dir", data=json.dumps({"path": f"{test_dir}"}))
+    for content in (test_content, test_content[::-1]):
+        response = http.post(
+            f"http://{host}:{port}/files",
+            data=json.dumps(
+                {
+                    "filename": test_file,
+                    "content": base64.b64encode(content).decode("utf-8"),
+                }
+            ),
+        )
+        for _ in range(2):
+            response = http.get(f'http://{host}:{port}/files/{test_file}')
+            assert response.status_code == 200
+            assert response.headers['Content-Type'].startswith('application/json')
+            assert json.loads(response.text)['data']['content'] == base64.b64encode(content).decode("utf-8")
+
+    response = http.get(f"http://{host}:{port}/stats")
+    assert json.loads(response.text)['data']['content_cache']['hits'] >= 2
+
+
+def test_get_file_data_large(http, config, test_dir, test_file):
+    host = config["host"]
+    port = config["port"]
+
+    # Larger than the default mmap_threshold.
+    content = bytes(range(256)) * 8192
+    response = http.post(f"http://{host}:{port}/change_dir", data=json.dumps({"path": f"{test_dir}"}))
+    response = http.post(
+        f"http://{host}:{port}/files",
+        params={"filename": test_file},
+        data=content,
+        headers={"Content-Type": "application/octet-stream"},
+    )
+    response = http.get(f'http://{host}:{port}/files/{test_file}')
+
+    resp_dict = json.loads(response.text)
+    assert response.status_code == 200
+    assert set(resp_dict['data'].keys()) == DATA_KEYS
+    assert base64.b64decode(resp_dict['data']['content']) == content
@@ -1,17 +1,16 @@
 import base64
 import json
 
-import requests
 
 DATA_KEYS = set(["name", "create_date", "edit_date", "size"])
 
 
-def test_get_files(config, test_dir, test_file, test_content):
+def test_get_files(http, config, test_dir, test_file, test_content):
     host = config["host"]
     port = config["port"]
 
-    response = requests.post(f"http://{host}:{port}/change_dir", data=json.dumps({"path": f"{test_dir}"}))
-    response = requests.post(
+    response = http.post(f"http://{host}:{port}/change_dir", data=json.dumps({"path": f"{test_dir}"}))
+    response = http.post(
         f"http://{host}:{port}/files",
         data=json.dumps(
             {
@@ -20,7 +19,7 @@ def test_get_files(config, test_dir, test_file, test_content):
             }
         ),
     )
-    response = requests.get(f"http://{host}:{port}/files")
+    response = http.get(f"http://{host}:{port}/files")
 
     assert response.status_code == 200
 
@@ -30,3 +29,31 @@ def test_get_files(config, test_dir, test_file, test_content):
     file_info = resp_dict["data"][0]
     assert set(file_info.keys()) == DATA_KEYS
     assert test_file in file_info["name"]
+
+
+def test_get_files_page(http, config, test_dir, test_file, test_content):
+    host = config["host"]
+    port = config["port"]
+
+    response = http.post(f"http://{host}:{port}/change_dir", data=json.dumps({"path": f"{test_dir}"}))
+    response = http.post(
+        f"http://{host}:{port}/files",
+        data=json.dumps(
+            {
+                "filename": test_file,
+                "content": base64.b64encode(test_content).decode("utf-8"),
+            }
+        ),
+    )
+    response = http.get(f"http://{host}:{port}/files", params={"limit": 1, "sort": "size", "order": "desc"})
+
+    assert response.status_code == 200
+
+    resp_dict = json.loads(response.text)
+    assert len(resp_dict["data"]) == 1
+    assert resp_dict["cursor"] is None
+    assert test_file in resp_dict["data"][0]["name"]
+
+    response = http.get(f"http://{host}:{port}/files", params={"sort": "color"})
+
+    assert response.status_code == 400
@@ -0,0 +1,43 @@
+import base64
+import json
+import time
+
+import pytest
+
+
+def test_search_files(http, config, test_dir):
+    host = config["host"]
+    port = config["port"]
+    if not http.get(f"http://{host}:{port}/stats").json()["data"]["search"]:
+        pytest.skip("The server runs without the search index")
+
+    http.post(f"http://{host}:{port}/change_dir", data=json.dumps({"path": f"{test_dir}/search"}))
+    content = "".join(f"line {i}: needle in a haystack\n" for i in range(3)).encode()
+    http.post(
+        f"http://{host}:{port}/files",
+        data=json.dumps({"filename": "haystack.log", "content": base64.b64encode(content).decode("utf-8")}),
+    )
+
+    deadline = time.monotonic() + 10
+    while True:
+        response = http.get(f"http://{host}:{port}/search", params={"q": "needle", "limit": 2})
+        if response.json()["data"] or time.monotonic() > deadline:
+            break
+        time.sleep(0.1)
+    assert response.status_code == 200
+    lines = response.json()["data"]
+    assert [line["line"] for line in lines] == [1, 2]
+    assert lines[0]["name"].endswith("/search/haystack.log")
+    assert "needle" in lines[0]["snippet"]
+
+    response = http.get(
+        f"http://{host}:{port}/search",
+        params={"q": "needle", "limit": 2, "cursor": response.json()["cursor"]},
+    )
+    assert [line["line"] for line in response.json()["data"]] == [3]
+    assert response.json()["cursor"] is None
+
+    response = http.get(f"http://{host}:{port}/search")
+    assert response.status_code == 400
+    response = http.get(f"http://{host}:{port}/search", params={"q": "needle", "path": "missing"})
+    assert response.status_code == 404
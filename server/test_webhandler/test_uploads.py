@@ -0,0 +1,62 @@
+import hashlib
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+
+def test_upload_session(http, config, test_dir):
+    host = config["host"]
+    port = config["port"]
+    content = os.urandom(10000)
+    chunk_size = 4096
+
+    http.post(f"http://{host}:{port}/change_dir", data=json.dumps({"path": test_dir}))
+    response = http.post(
+        f"http://{host}:{port}/uploads",
+        data=json.dumps({"filename": "chunked.bin", "size": len(content), "chunk_size": chunk_size}),
+    )
+    assert response.status_code == 201
+    upload_id = response.json()["data"]["upload_id"]
+    assert response.headers["Location"].endswith(upload_id)
+
+    def put_chunk(number):
+        return http.put(
+            f"http://{host}:{port}/uploads/{upload_id}/{number}",
+            data=content[number * chunk_size : (number + 1) * chunk_size],
+        )
+
+    assert put_chunk(2).status_code == 200
+    response = http.get(f"http://{host}:{port}/uploads/{upload_id}")
+    assert response.json()["data"]["missing"] == [0, 1]
+
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        assert [r.status_code for r in executor.map(put_chunk, [0, 1])] == [200, 200]
+
+    response = http.post(
+        f"http://{host}:{port}/uploads/{upload_id}/commit",
+        data=json.dumps({"sha256": hashlib.sha256(content).hexdigest()}),
+    )
+    assert response.status_code == 201
+    assert response.json()["data"]["size"] == len(content)
+
+    response = http.get(f"http://{host}:{port}/files/chunked.bin", params={"raw": "1"})
+    assert response.content == content
+    assert http.get(f"http://{host}:{port}/uploads/{upload_id}").status_code == 404
+
+
+def test_upload_session_errors(http, config, test_dir):
+    host = config["host"]
+    port = config["port"]
+
+    response = http.post(f"http://{host}:{port}/uploads", data=json.dumps({"filename": "bad.bin", "size": "many"}))
+    assert response.status_code == 400
+
+    response = http.post(
+        f"http://{host}:{port}/uploads", data=json.dumps({"filename": "aborted.bin", "size": 10, "chunk_size": 5})
+    )
+    upload_id = response.json()["data"]["upload_id"]
+    assert http.put(f"http://{host}:{port}/uploads/{upload_id}/2", data=b"12345").status_code == 400
+    assert http.put(f"http://{host}:{port}/uploads/{upload_id}/0", data=b"123").status_code == 400
+    assert http.post(f"http://{host}:{port}/uploads/{upload_id}/commit").status_code == 400
+    assert http.delete(f"http://{host}:{port}/uploads/{upload_id}").status_code == 200
+    assert http.put(f"http://{host}:{port}/uploads/{upload_id}/0", data=b"12345").status_code == 404
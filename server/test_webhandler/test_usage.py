@@ -0,0 +1,37 @@
+import base64
+import json
+
+
+def test_usage_and_quota(http, config, test_dir):
+    host = config["host"]
+    port = config["port"]
+    path = f"{test_dir}/usage"
+
+    http.post(f"http://{host}:{port}/change_dir", data=json.dumps({"path": path}))
+    response = http.post(f"http://{host}:{port}/usage/quota", data=json.dumps({"path": path, "max_bytes": 10}))
+    assert response.status_code == 200
+    assert response.json()["data"]["max_bytes"] == 10
+
+    content = base64.b64encode(b"x" * 8).decode("utf-8")
+    response = http.post(f"http://{host}:{port}/files", data=json.dumps({"filename": "a.txt", "content": content}))
+    assert response.status_code == 201
+    response = http.post(f"http://{host}:{port}/files", data=json.dumps({"filename": "b.txt", "content": content}))
+    assert response.status_code == 507
+
+    response = http.get(f"http://{host}:{port}/usage", params={"path": path})
+    assert response.status_code == 200
+    assert response.json()["data"]["bytes"] == 8
+    assert response.json()["data"]["files"] == 1
+
+    response = http.post(f"http://{host}:{port}/usage/quota", data=json.dumps({"path": path}))
+    assert response.json()["data"]["max_bytes"] is None
+    response = http.post(f"http://{host}:{port}/usage/reconcile")
+    assert response.status_code == 200
+    assert response.json()["data"]["files"] >= 1
+
+
+def test_usage_of_missing_dir(http, config):
+    host = config["host"]
+    port = config["port"]
+    response = http.get(f"http://{host}:{port}/usage", params={"path": "missing-dir"})
+    assert response.status_code == 404